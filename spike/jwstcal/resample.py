@@ -46,6 +46,7 @@ import json
 
 import numpy as np
 import psutil
+from astropy.io import fits
 from drizzle.resample import Drizzle
 from spherical_geometry.polygon import SphericalPolygon
 
@@ -56,6 +57,7 @@ from stdatamodels.jwst import datamodels
 ## removing that stringent requirement for now though
 
 import spike.jwstcal.resample_utils as resample_utils
+from spike.stcal.pixmap_cache import get_pixmap_cache
 
 from spike.jwstcal.associations_asn_from_list import asn_from_list
 
@@ -115,6 +117,35 @@ class ResampleData:
                 should be kept in memory or written out to disk and
                 deleted from memory. Default value is `True` to keep
                 all products in memory.
+
+            .. note::
+                ``data_bbox`` restricts resampling of each input to a box
+                around its data: `True` to find the box of finite, non-zero
+                science pixels, or a dict of ``(xmin, xmax, ymin, ymax)``
+                keyed by input filename. The pixel map is only computed
+                inside the box.
+
+            .. note::
+                ``pixmap_step`` (input pixels), if set, computes pixel maps
+                by interpolating the exact transforms evaluated on a grid
+                with that spacing, to within ``pixmap_tol`` output pixels.
+                See `~resample_utils.calc_gwcs_pixmap`.
+
+            .. note::
+                ``pixmap_cache`` (MB), if set, keeps pixel maps in a
+                process-wide cache keyed by the input and output WCS, so
+                resampling e.g. model PSFs and then the images they model
+                onto the same output frame computes each map once. Maps are
+                also written to ``pixmap_cache_dir``, if given, and reused
+                from there as memory maps. Maps are cached per ``data_bbox``
+                limits (a cached map of the full input also serves limited
+                requests) and stored as float32.
+
+            .. note::
+                ``skip_variance`` skips resampling the variance arrays and
+                computing the error array, and ``skip_context`` skips the
+                context array, e.g. for model PSFs, whose error and variance
+                arrays are empty.
         """
         self.output_dir = None
         self.output_filename = output
@@ -132,6 +163,16 @@ class ResampleData:
         self.weight_type = wht_type
         self.good_bits = good_bits
         self.in_memory = kwargs.get('in_memory', True)
+        self.data_bbox = kwargs.get('data_bbox', False)
+        self.pixmap_step = kwargs.get('pixmap_step', None)
+        self.pixmap_tol = kwargs.get('pixmap_tol', 1e-3)
+        self.skip_variance = kwargs.get('skip_variance', False)
+        self.skip_context = kwargs.get('skip_context', False)
+        self.pixmap_cache = None
+        if kwargs.get('pixmap_cache'):
+            self.pixmap_cache = get_pixmap_cache(
+                kwargs['pixmap_cache'] * 2**20, kwargs.get('pixmap_cache_dir')
+            )
         self.input_pixscale0 = None  # computed pixel scale of the first image (deg)
         self._recalc_pscale_ratio = pscale is not None
 
@@ -374,14 +415,12 @@ class ResampleData:
             else:
                 data = img.data
 
-            xmin, xmax, ymin, ymax = resample_utils._resample_range(
-                data.shape,
-                img.meta.wcs.bounding_box
-            )
-            pixmap = resample_utils.calc_gwcs_pixmap(
-                img.meta.wcs,
+            xmin, xmax, ymin, ymax = self._resample_limits(img, data)
+            pixmap = self._calc_pixmap(
+                img,
                 self.output_wcs,
                 img.data.shape,
+                (xmin, xmax, ymin, ymax) if self.data_bbox else None,
             )
 
             driz.add_image(
@@ -486,12 +525,16 @@ class ResampleData:
             kernel=self.kernel,
             fillval=self.fillval,
             max_ctx_id=len(input_models),
-            disable_ctx=False,
+            disable_ctx=self.skip_context,
         )
-        self._init_variance_arrays()
+        if not self.skip_variance:
+            self._init_variance_arrays()
         self._init_exptime_counters()
 
-        log.info("Resampling science and variance data")
+        if self.skip_variance:
+            log.info("Resampling science data")
+        else:
+            log.info("Resampling science and variance data")
 
         leading_group_idx = [v[0] for v in input_models.group_indices.values()]
 
@@ -532,16 +575,14 @@ class ResampleData:
                 else:
                     data = img.data.copy()
 
-                in_image_limits = resample_utils._resample_range(
-                    data.shape,
-                    img.meta.wcs.bounding_box
-                )
+                in_image_limits = self._resample_limits(img, data)
                 xmin, xmax, ymin, ymax = in_image_limits
 
-                pixmap = resample_utils.calc_gwcs_pixmap(
-                    img.meta.wcs,
+                pixmap = self._calc_pixmap(
+                    img,
                     output_model.meta.wcs,
                     data.shape,
+                    in_image_limits if self.data_bbox else None,
                 )
 
                 driz.add_image(
@@ -559,14 +600,15 @@ class ResampleData:
                     ymax=ymax,
                 )
                 # Resample variance arrays in input_models to output_model
-                self._resample_variance_arrays(
-                    model=img,
-                    iscale=iscale,
-                    inwht=inwht,
-                    pixmap=pixmap,
-                    in_image_limits=in_image_limits,
-                    output_shape=self.output_array_shape,
-                )
+                if not self.skip_variance:
+                    self._resample_variance_arrays(
+                        model=img,
+                        iscale=iscale,
+                        inwht=inwht,
+                        pixmap=pixmap,
+                        in_image_limits=in_image_limits,
+                        output_shape=self.output_array_shape,
+                    )
 
                 del data, inwht
 
@@ -581,20 +623,21 @@ class ResampleData:
 
         del driz
 
-        # compute final variances:
-        self._compute_resample_variance_totals(output_model)
+        if not self.skip_variance:
+            # compute final variances:
+            self._compute_resample_variance_totals(output_model)
 
-        var_components = [
-            output_model.var_rnoise,
-            output_model.var_poisson,
-            output_model.var_flat
-        ]
-        output_model.err = np.sqrt(np.nansum(var_components, axis=0))
+            var_components = [
+                output_model.var_rnoise,
+                output_model.var_poisson,
+                output_model.var_flat
+            ]
+            output_model.err = np.sqrt(np.nansum(var_components, axis=0))
 
-        # nansum returns zero for input that is all NaN -
-        # set those values to NaN instead
-        all_nan = np.all(np.isnan(var_components), axis=0)
-        output_model.err[all_nan] = np.nan
+            # nansum returns zero for input that is all NaN -
+            # set those values to NaN instead
+            all_nan = np.all(np.isnan(var_components), axis=0)
+            output_model.err[all_nan] = np.nan
 
         if self.blendheaders:
             blender.finalize_model(output_model)
@@ -603,6 +646,175 @@ class ResampleData:
 
         return ModelLibrary([output_model,], on_disk=False)
 
+    def _calc_pixmap(self, img, output_wcs, shape, limits):
+        """Pixel map from ``img`` to ``output_wcs``, only for ``limits`` if
+        given, and from the pixel map cache if enabled."""
+        kwargs = dict(limits=limits, step=self.pixmap_step, tol=self.pixmap_tol)
+        if self.pixmap_cache is None:
+            return resample_utils.calc_gwcs_pixmap(img.meta.wcs, output_wcs, shape, **kwargs)
+        return self.pixmap_cache.pixmap(
+            img.meta.wcs, output_wcs, shape, resample_utils.calc_gwcs_pixmap, **kwargs
+        )
+
+    def resample_targets(self, targets, size):
+        """Resample the inputs of several targets in one pass over their
+        exposures, each onto its own ``size`` x ``size`` box of the output
+        grid, centered on the target.
+
+        The pixel map of each exposure is computed once, for the region
+        covered by all of the targets' inputs on it, and shifted to each
+        target's box, so the cost of the WCS transforms does not grow with
+        the number of targets. Only the ``SCI`` array of the inputs is read,
+        which may be a stamp (see `spike.tools.rewrite_fits`); the WCS,
+        weights, and metadata come from the exposure, and no variance or
+        error arrays are computed (as with ``skip_variance``).
+
+        Parameters
+        ----------
+        targets : dict
+            ``{name: (ra, dec, [(exposure, input), ...])}``, where each
+            ``input`` is a FITS file holding the target's model of
+            ``exposure`` (e.g. a model PSF) with an empty DQ array.
+
+        size : int
+            Side length of each target's output box (output pixels).
+
+        Returns
+        -------
+        output_models : dict
+            ``{name: ImageModel}`` for the targets with any inputs.
+        """
+        by_exposure = {}
+        drizzles, origins, refs = {}, {}, {}
+        for name, (ra, dec, inputs) in targets.items():
+            for exposure, filename in inputs:
+                by_exposure.setdefault(exposure, []).append((name, filename))
+            xc, yc = self.output_wcs.invert(ra, dec, with_bounding_box=False)
+            origins[name] = (
+                int(np.floor(xc + 0.5)) - size // 2,
+                int(np.floor(yc + 0.5)) - size // 2,
+            )
+            drizzles[name] = Drizzle(
+                out_shape=(size, size),
+                kernel=self.kernel,
+                fillval=self.fillval,
+                max_ctx_id=len(inputs),
+                disable_ctx=self.skip_context,
+            )
+            refs[name] = []
+
+        log.info(
+            f"Resampling {len(targets)} targets from {len(by_exposure)} exposures"
+        )
+        for exposure, inputs in by_exposure.items():
+            stamps = []
+            for name, filename in inputs:
+                data, x0, y0 = _read_target_input(filename)
+                if data.size:
+                    stamps.append((name, data, x0, y0))
+            if not stamps:
+                continue
+
+            with datamodels.open(exposure) as img:
+                iscale = self._get_intensity_scale(img)
+                limits = (
+                    min(x0 for _, _, x0, _ in stamps),
+                    max(x0 + d.shape[1] - 1 for _, d, x0, _ in stamps),
+                    min(y0 for _, _, _, y0 in stamps),
+                    max(y0 + d.shape[0] - 1 for _, d, _, y0 in stamps),
+                )
+                weight = self._target_weight(img, limits)
+                pixmap = self._calc_pixmap(img, self.output_wcs, img.data.shape, limits)
+                exptime = img.meta.exposure.exposure_time
+
+                # keep only the metadata, for the output models
+                ref = datamodels.ImageModel(None)
+                ref.update(img)
+
+            for name, data, x0, y0 in stamps:
+                region = np.s_[y0:y0 + data.shape[0], x0:x0 + data.shape[1]]
+                drizzles[name].add_image(
+                    data=data,
+                    exptime=exptime,
+                    pixmap=pixmap[region] - origins[name],
+                    scale=iscale,
+                    weight_map=weight[
+                        y0 - limits[2]:y0 - limits[2] + data.shape[0],
+                        x0 - limits[0]:x0 - limits[0] + data.shape[1]
+                    ],
+                    wht_scale=1.0,  # hard-coded for JWST count-rate data
+                    pixfrac=self.pixfrac,
+                    in_units="cps",
+                )
+                refs[name].append(ref)
+            del pixmap, weight, stamps
+
+        output_models = {}
+        for name, driz in drizzles.items():
+            if not refs[name]:
+                continue
+            output_model = self._create_output_model(ref_input_model=refs[name][0])
+            output_model.meta.wcs = resample_utils.window_wcs(
+                self.output_wcs, origins[name], (size, size)
+            )
+            output_model.meta.resample.weight_type = self.weight_type
+            output_model.meta.resample.pointings = len(refs[name])
+            output_model.data = driz.out_img
+            output_model.wht = driz.out_wht
+            if driz.out_ctx is not None:
+                output_model.con = driz.out_ctx
+
+            self._init_exptime_counters()
+            for ref in refs[name]:
+                self._update_exptime(ref)
+            self._get_exptime_totals(output_model)
+            output_models[name] = output_model
+
+        return output_models
+
+    def _target_weight(self, img, limits):
+        """Drizzle weight map of the inputs of ``resample_targets`` over the
+        ``limits`` of their exposure ``img``, from
+        `~resample_utils.build_driz_weight` for an input with the exposure's
+        metadata and variance and an empty DQ array, as written by
+        `spike.tools.rewrite_fits`."""
+        xmin, xmax, ymin, ymax = limits
+        box = np.s_[ymin:ymax + 1, xmin:xmax + 1]
+        model = datamodels.ImageModel(np.zeros(img.data[box].shape, dtype=np.float32))
+        model.update(img)
+        model.dq = np.zeros(model.data.shape, dtype=np.uint32)
+        if (img.hasattr("var_rnoise") and img.var_rnoise is not None and
+                img.var_rnoise.shape == img.data.shape):
+            model.var_rnoise = img.var_rnoise[box]
+        weight = resample_utils.build_driz_weight(
+            model,
+            weight_type=self.weight_type,
+            good_bits=self.good_bits
+        )
+        model.close()
+        return weight
+
+    def _resample_limits(self, img, data):
+        """Range of input pixels to resample: the WCS bounding box, narrowed
+        to the data bounding box of the input if ``data_bbox`` is set."""
+        limits = resample_utils._resample_range(
+            data.shape,
+            img.meta.wcs.bounding_box
+        )
+        if not self.data_bbox:
+            return limits
+
+        if isinstance(self.data_bbox, dict):
+            bbox = self.data_bbox.get(img.meta.filename)
+        else:
+            bbox = resample_utils.data_bounding_box(data)
+        if bbox is None:
+            return limits
+
+        log.debug(f"Data bounding box of {img.meta.filename}: {bbox}")
+        return (max(limits[0], bbox[0]), min(limits[1], bbox[1]),
+                max(limits[2], bbox[2]), min(limits[3], bbox[3]))
+
     def _init_variance_arrays(self):
         shape = self.output_array_shape
         self._weighted_rn_var = np.full(shape, np.nan, dtype=np.float32)
@@ -851,6 +1063,23 @@ class ResampleData:
         self._get_exptime_totals(output_model)
 
 
+def _read_target_input(filename):
+    """``SCI`` array of a ``resample_targets`` input and its ``x0, y0``
+    origin in the full frame: PSF stamps (see `spike.tools.rewrite_fits`) as
+    stored, full frames cut to their finite, non-zero region."""
+    with fits.open(filename) as hdul:
+        header = hdul['SCI'].header
+        data = hdul['SCI'].data.astype(np.float32)
+    if header.get('SPKSTAMP', False):
+        return data, header['STAMPX0'], header['STAMPY0']
+
+    bbox = resample_utils.data_bounding_box(data, pad=0)
+    if bbox is None:
+        return data[:0, :0], 0, 0
+    xmin, xmax, ymin, ymax = bbox
+    return data[ymin:ymax + 1, xmin:xmax + 1].copy(), xmin, ymin
+
+
 def _get_boundary_points(xmin, xmax, ymin, ymax, dx=None, dy=None, shrink=0):
     """
     xmin, xmax, ymin, ymax - integer coordinates of pixel boundaries
@@ -40,6 +40,7 @@ Original: https://github.com/spacetelescope/jwst/blob/main/jwst/resample/resampl
 
 
 import logging
+import os
 import re
 from copy import deepcopy
 
@@ -96,6 +97,13 @@ class ResampleStep(Step):
         blendheaders = boolean(default=True)  # Blend metadata from inputs into output
         in_memory = boolean(default=True)  # Keep images in memory
         allowed_memory = float(default=None) #fraction of memory to be used
+        data_bbox = boolean(default=False)  # Resample only the non-zero region of each input
+        pixmap_step = integer(min=4, default=None)  # Interpolate pixel maps between exact transforms on this grid
+        pixmap_tol = float(min=0.0, default=0.001)  # Maximum pixel map interpolation error (output pixels)
+        pixmap_cache = float(min=0.0, default=None)  # Pixel map cache size (MB) shared by resample runs in this process
+        pixmap_cache_dir = string(default=None)  # Directory to also store cached pixel maps in, as .npy files
+        skip_variance = boolean(default=False)  # Do not resample variance arrays or compute the error array
+        skip_context = boolean(default=False)  # Do not compute the context array
     """
 
     reference_file_types: list = []
@@ -167,6 +175,55 @@ class ResampleStep(Step):
 
         return result
 
+    def process_targets(self, targets, size, output_dir=None):
+        """
+        Resample the inputs of several targets onto small boxes of one
+        output grid, in a single pass over their exposures (see
+        `~resample.ResampleData.resample_targets`).
+
+        Parameters
+        ----------
+        targets : dict
+            ``{name: (ra, dec, [(exposure, input), ...])}``, where each
+            ``input`` is the target's model of ``exposure``.
+
+        size : int
+            Side length of each target's output box (output pixels).
+
+        output_dir : str, optional
+            If given, each output is saved there as
+            ``<name>_resamplestep.fits``.
+
+        Returns
+        -------
+        results : dict
+            ``{name: ImageModel}``
+        """
+        exposures = sorted({e for _, _, inputs in targets.values() for e, _ in inputs})
+        input_models = ModelLibrary(exposures, on_disk=not self.in_memory)
+
+        kwargs = self.get_drizpars()
+        # the output grid of all exposures is never allocated, only boxes of it
+        kwargs['allowed_memory'] = None
+        resamp = resample.ResampleData(input_models, output=None, **kwargs)
+        results = resamp.resample_targets(targets, size)
+
+        for name, model in results.items():
+            model.meta.cal_step.resample = 'COMPLETE'
+            self.update_fits_wcs(model)
+            util.update_s_region_imaging(model)
+            if self.pixel_scale is None:
+                model.meta.resample.pixel_scale_ratio = self.pixel_scale_ratio
+            else:
+                model.meta.resample.pixel_scale_ratio = resamp.pscale_ratio
+            model.meta.resample.pixfrac = kwargs['pixfrac']
+            if output_dir is not None:
+                model.meta.filename = f'{name}_resamplestep.fits'
+                model.save(os.path.join(output_dir, model.meta.filename))
+                log.info(f"Saved model in {model.meta.filename}")
+
+        return results
+
     @staticmethod
     def check_list_pars(vals, name, min_vals=None):
         """
@@ -277,7 +334,14 @@ class ResampleStep(Step):
             single=self.single,
             blendheaders=self.blendheaders,
             in_memory=self.in_memory,
-            allowed_memory=self.allowed_memory
+            allowed_memory=self.allowed_memory,
+            data_bbox=self.data_bbox,
+            pixmap_step=self.pixmap_step,
+            pixmap_tol=self.pixmap_tol,
+            pixmap_cache=self.pixmap_cache,
+            pixmap_cache_dir=self.pixmap_cache_dir,
+            skip_variance=self.skip_variance,
+            skip_context=self.skip_context
         )
 
         # Custom output WCS parameters.
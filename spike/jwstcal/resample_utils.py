@@ -45,6 +45,7 @@ import warnings
 import numpy as np
 import astropy.units as u
 import gwcs
+from scipy.interpolate import RectBivariateSpline
 
 from stdatamodels.dqflags import interpret_bit_flags
 from stdatamodels.jwst.datamodels.dqflags import pixel
@@ -167,9 +168,23 @@ def shape_from_bounding_box(bounding_box):
     return tuple(int(axs[1] - axs[0] + 0.5) for axs in bounding_box[::-1])
 
 
-def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None):
+def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None, limits=None, step=None, tol=1e-3):
     """ Return a pixel grid map from input frame to output frame.
+
+    If ``limits`` (``xmin, xmax, ymin, ymax``, inclusive) and ``shape`` are
+    given, the transforms are only evaluated for that region of the input
+    (plus a one pixel border for the drizzle kernel). The rest of the map is
+    NaN, as for pixels outside the WCS bounding box, and is not drizzled.
+
+    If ``step`` and ``shape`` are given, the transforms are evaluated exactly
+    on a grid with a spacing of ``step`` input pixels and interpolated with
+    bicubic splines in between. The interpolation is checked against the
+    exact transforms at the center of every grid cell, and cells that deviate
+    by more than ``tol`` output pixels are evaluated exactly.
     """
+    if (limits is not None or step) and shape:
+        return _calc_gwcs_pixmap_region(in_wcs, out_wcs, shape, limits, step, tol)
+
     if shape:
         bb = wcs_bbox_from_shape(shape)
         log.debug("Bounding box from data shape: {}".format(bb))
@@ -183,6 +198,105 @@ def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None):
     return pixmap
 
 
+def _calc_gwcs_pixmap_region(in_wcs, out_wcs, shape, limits=None, step=None, tol=1e-3):
+    if limits is None:
+        x0, x1, y0, y1 = 0, shape[1] - 1, 0, shape[0] - 1
+    else:
+        xmin, xmax, ymin, ymax = limits
+        x0, x1 = max(xmin - 1, 0), min(xmax + 1, shape[1] - 1)
+        y0, y1 = max(ymin - 1, 0), min(ymax + 1, shape[0] - 1)
+    bb = ((x0 - 0.5, x1 + 0.5), (y0 - 0.5, y1 + 0.5))
+    log.debug("Bounding box from data limits: {}".format(bb))
+
+    pixmap = np.full(tuple(shape) + (2,), np.nan)
+    if step:
+        pixmap[y0:y1 + 1, x0:x1 + 1] = _interp_pixmap(
+            reproject(in_wcs, out_wcs), (x0, x1, y0, y1), step, tol
+        )
+    else:
+        grid = gwcs.wcstools.grid_from_bounding_box(bb)
+        pixmap[y0:y1 + 1, x0:x1 + 1] = np.dstack(reproject(in_wcs, out_wcs)(grid[0], grid[1]))
+
+    return pixmap
+
+
+def _interp_pixmap(transform, limits, step, tol):
+    """ Pixel map of the region ``limits`` from the exact ``transform`` on a
+    grid with spacing ``step``, interpolated with bicubic splines. Grid cells
+    where the interpolation deviates from ``transform`` at the cell center by
+    more than ``tol`` are evaluated exactly.
+    """
+    xmin, xmax, ymin, ymax = limits
+    x = np.arange(xmin, xmax + 1, dtype=float)
+    y = np.arange(ymin, ymax + 1, dtype=float)
+    xs = np.unique(np.r_[np.arange(xmin, xmax, step), xmax])
+    ys = np.unique(np.r_[np.arange(ymin, ymax, step), ymax])
+    if len(xs) < 4 or len(ys) < 4:
+        # too few nodes for a bicubic spline
+        gx, gy = np.meshgrid(x, y)
+        return np.dstack(transform(gx, gy))
+
+    gx, gy = np.meshgrid(xs.astype(float), ys.astype(float))
+    nodes = transform(gx, gy)
+    if not all(np.isfinite(n).all() for n in nodes):
+        log.debug("Transform undefined on the interpolation grid; using exact pixel map")
+        gx, gy = np.meshgrid(x, y)
+        return np.dstack(transform(gx, gy))
+
+    splines = [RectBivariateSpline(ys, xs, n) for n in nodes]
+    pixmap = np.dstack([s(y, x) for s in splines])
+
+    cx, cy = np.meshgrid((xs[:-1] + xs[1:]) / 2., (ys[:-1] + ys[1:]) / 2.)
+    exact = transform(cx, cy)
+    err = np.hypot(exact[0] - splines[0].ev(cy, cx), exact[1] - splines[1].ev(cy, cx))
+    refine = ~(err <= tol)
+    for j, i in zip(*np.nonzero(refine)):
+        sx = slice(xs[i] - xmin, xs[i + 1] - xmin + 1)
+        sy = slice(ys[j] - ymin, ys[j + 1] - ymin + 1)
+        bx, by = np.meshgrid(x[sx], y[sy])
+        pixmap[sy, sx] = np.dstack(transform(bx, by))
+
+    log.debug(
+        f"Interpolated pixel map from {nodes[0].size} nodes: max deviation "
+        f"{np.nanmax(err):.2g} pix, {np.count_nonzero(refine)}/{err.size} cells evaluated exactly"
+    )
+    return pixmap
+
+
+def window_wcs(wcs, origin, shape):
+    """ Return a copy of the resample output ``wcs`` for the ``shape``
+    (``ny, nx``) box of its pixel grid that starts at ``origin`` (``x0, y0``).
+
+    Pixel maps into ``wcs`` map into the box once ``origin`` is subtracted.
+    ``wcs`` must be as made by `make_output_wcs`, with ``crpix1`` and
+    ``crpix2`` shifts.
+    """
+    wcs = deepcopy(wcs)
+    transform = wcs.pipeline[0].transform
+    transform['crpix1'].offset = transform['crpix1'].offset.value + origin[0]
+    transform['crpix2'].offset = transform['crpix2'].offset.value + origin[1]
+    wcs.array_shape = tuple(shape)
+    wcs.bounding_box = wcs_bbox_from_shape(shape)
+    return wcs
+
+
+def data_bounding_box(data, pad=2):
+    """ Return ``(xmin, xmax, ymin, ymax)`` (inclusive) of the finite, non-zero
+    pixels of ``data``, grown by ``pad`` pixels, or `None` if there are none.
+
+    Used to resample only the populated region of sparse inputs, e.g. model
+    PSF frames that are zero away from the PSF.
+    """
+    good = np.isfinite(data) & (data != 0)
+    rows = np.flatnonzero(good.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(good.any(axis=0))
+    ny, nx = data.shape
+    return (max(int(cols[0]) - pad, 0), min(int(cols[-1]) + pad, nx - 1),
+            max(int(rows[0]) - pad, 0), min(int(rows[-1]) + pad, ny - 1))
+
+
 def reproject(wcs1, wcs2):
     """
     Given two WCSs or transforms return a function which takes pixel
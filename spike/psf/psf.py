@@ -1,11 +1,15 @@
 import astropy
 from astropy.io import fits
+from astropy.table import Table
 import astropy.units as u
 from astropy.wcs import WCS, utils
+from functools import partial
 import glob
 from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
 import numpy as np
 import os
+import queue
 from spike import psfgen, tools
 from subprocess import call
 import warnings
@@ -15,6 +19,496 @@ def warning_on_one_line(message, category, filename, lineno, file=None, line=Non
 
 warnings.formatwarning = warning_on_one_line
 
+
+class _SerialPool:
+	"""
+	Stand-in for a worker pool that runs each task in the calling process as it is submitted, so that serial runs 
+	go through the same stage graph (see _rundag) as parallel ones.
+	"""
+	def apply_async(self, func, args = (), kwds = {}, callback = None, error_callback = None):
+		try:
+			result = func(*args, **kwds)
+		except Exception as e:
+			if error_callback is None:
+				raise
+			error_callback(e)
+			return
+		if callback is not None:
+			callback(result)
+
+	def terminate(self):
+		pass
+
+	def join(self):
+		pass
+
+
+def _makepool(nworkers = None, backend = 'process'):
+	"""
+	Create the worker pool shared by every stage of a single run.
+
+	Parameters:
+		nworkers (int): Number of workers. If None, uses one fewer than the number of available CPUs.
+		backend (str): 'process' for a multiprocessing pool, 'thread' for a thread pool, or 'serial' to run each 
+			task in the calling process.
+
+	Returns:
+		pool (multiprocessing.pool.Pool): Worker pool.
+	"""
+	if backend == 'serial':
+		return _SerialPool()
+
+	if nworkers is None:
+		nworkers = max(1, cpu_count() - 1)
+
+	if backend == 'process':
+		return Pool(processes = nworkers)
+	if backend == 'thread':
+		return ThreadPool(processes = nworkers)
+	raise ValueError("backend must be one of 'process', 'thread', 'serial'")
+
+
+def _runstage(func, args = (), kwds = {}, move = None):
+	"""
+	Run one task of a stage graph (see _rundag) in a worker.
+
+	Parameters:
+		func (callable): Function to run.
+		args (tuple): Positional arguments for func.
+		kwds (dict): Keyword arguments for func.
+		move (tuple or list): If specified, (source, destination) to rename the output of func to once it is written,
+			or a list of such pairs.
+
+	Returns:
+		None -- the output of func is discarded so that large data products are not sent back from the worker.
+	"""
+	func(*args, **kwds)
+	if move:
+		for m in (move if type(move) == list else [move]):
+			tools.renamefile(*m)
+
+
+def _fromstamps(func, *args, **kwds):
+	"""
+	Drizzle/resample model PSFs, expanding any PSF stamps (see spike.tools.rewrite_fits) to full-frame, 
+	uncompressed copies in a scratch directory next to the inputs for the duration of the call only.
+
+	Parameters:
+		func (callable): astrodrizzle.AstroDrizzle or ResampleStep().call.
+		args (tuple): Positional arguments for func, the first being the list of model PSFs.
+		kwds (dict): Keyword arguments for func. If args is empty, the model PSFs are taken from 'input_models'.
+
+	Returns:
+		The output of func.
+	"""
+	files = args[0] if args else kwds['input_models']
+	with tools.scratchdir(dir = os.path.dirname(os.path.abspath(files[0]))) as scratch:
+		files = tools.expandstamps(files, scratch)
+		if args:
+			args = (files,) + args[1:]
+		else:
+			kwds['input_models'] = files
+		return func(*args, **kwds)
+
+
+def _windowparams(obj, size, tool):
+	"""
+	Drizzle/resample parameters that restrict the output frame to a size x size pixel box centered on obj 
+	(at the native pixel scale), so that only the region around the object is drizzled.
+
+	Parameters:
+		obj (str or astropy skycoord object): Object on which the output frame is centered.
+		size (int): Side length of the output frame in pixels. If None, no parameters are returned.
+		tool (str): 'astrodrizzle' (HST) or 'resample' (JWST, Roman).
+
+	Returns:
+		dict: Parameters with which to update drizzleparams.
+	"""
+	if size is None:
+		return {}
+	coord = tools.objloc(obj)
+	if tool == 'astrodrizzle':
+		# single (separate) drizzle images are windowed as well, since they are only used for the median
+		return {'driz_sep_wcs':True, 'driz_sep_ra':coord.ra.deg, 'driz_sep_dec':coord.dec.deg, 
+				'driz_sep_outnx':size, 'driz_sep_outny':size, 
+				'final_wcs':True, 'final_ra':coord.ra.deg, 'final_dec':coord.dec.deg, 
+				'final_outnx':size, 'final_outny':size}
+	return {'output_shape':[size, size], 'crval':[coord.ra.deg, coord.dec.deg]}
+
+
+def _resampletargets(step, params, targets, size, output_dir):
+	"""
+	Resample the model PSFs of several objects in one pass over their exposures with 
+	step(**params).process_targets (see spike.jwstcal.resample_step), saving each to output_dir.
+
+	Parameters:
+		step (class): ResampleStep.
+		params (dict): Step parameters.
+		targets (dict): Output name-indexed (ra, dec, [(image, model PSF), ...]) of each object.
+		size (int): Side length of each object's output frame in pixels.
+		output_dir (str): Directory to which outputs are saved as <name>_resamplestep.fits.
+
+	Returns:
+		None -- the outputs are discarded so that they are not sent back from a worker.
+	"""
+	step(**params).process_targets(targets, size, output_dir = output_dir)
+
+
+def _callall(funcs):
+	"""
+	Call each of funcs (with no arguments), e.g., the manifest records of objects resampled together.
+	"""
+	for f in funcs:
+		f()
+
+
+def _modeltask(psffunc, img, imcam, plot, verbose, kwargs, clobber, batch):
+	"""
+	Task (see _rundag) that generates the model PSFs of the objects on one image with one call to 
+	spike.psfgen.batchpsf, so that each PSF grid is read (or ePSF built) once per image.
+
+	Parameters:
+		psffunc (callable): PSF generation function.
+		img (str): Image for which the model PSFs are generated.
+		imcam (str): Instrument/camera, as passed to psffunc.
+		plot (bool), verbose (bool): As passed to psffunc.
+		kwargs (dict): Keyword arguments for psffunc.
+		clobber (bool): If True, existing outputs are overwritten.
+		batch (list): (coords, pos, move, redo, record) of each object whose model PSF is not current, where move 
+			is None or the (source, destination) rename of its output, redo is True if its output is from an 
+			earlier run and can be overwritten, and record is called once the model PSF is written.
+
+	Returns:
+		dict: Task, with func = None if batch is empty.
+	"""
+	if not batch:
+		return {'func':None}
+	coords, pos, moves, redos, records = zip(*batch)
+	return {'func':_runstage, 
+		'args':(psfgen.batchpsf, (psffunc, list(coords), img, imcam, list(pos), plot, verbose), 
+			dict(kwargs, clobber = clobber or any(redos)), [m for m in moves if m]),
+		'callback':partial(_callall, records)}
+
+
+_starparams = ['mask', 'fov_arcsec', 'starselect', 'starselectargs', 'thresh', 'usermask', 'maskval']
+
+def _epsfparams(filterepsf, kwargs):
+	"""
+	Split the parameters of a filter-level ePSF (see spike.psfgen.filterepsf) into star finding keyword arguments 
+	(taken from kwargs, as passed to spike.psfgen.effpsf) and the remaining keyword arguments (from filterepsf, if 
+	a dict, with the epsfargs in kwargs).
+	"""
+	starkwds = {k:v for k, v in kwargs.items() if k in _starparams}
+	buildkwds = dict(filterepsf) if type(filterepsf) == dict else {}
+	if 'epsfargs' in kwargs:
+		buildkwds.setdefault('epsfargs', kwargs['epsfargs'])
+	return starkwds, buildkwds
+
+
+def _epsfname(img, filt):
+	"""
+	Name of the filter-level ePSF (see spike.psfgen.filterepsf) saved next to img.
+	"""
+	return os.path.join(os.path.dirname(img), '%s_epsf.pkl'%filt)
+
+
+def _epsftasks(tasks, filt, imgs, imcam, filterepsf, kwargs, verbose = False):
+	"""
+	Add tasks (see _rundag) that extract the stars of each of a filter's images and then build one ePSF from all 
+	of them (see spike.psfgen.filterepsf), saved as _epsfname(imgs[0], filt).
+
+	Returns:
+		name of the task that builds the ePSF
+	"""
+	starkwds, buildkwds = _epsfparams(filterepsf, kwargs)
+	starfiles = [i.replace('.fits', '_epsfstars.pkl') for i in imgs]
+	for i, starfile in zip(imgs, starfiles): #one task per image, so extraction is spread over the pool
+		tasks[('stars', i)] = {'func':_runstage, 
+			'args':(psfgen.epsfstars, (i, imcam), dict(starkwds, writeto = starfile))}
+	params = dict(buildkwds, writeto = _epsfname(imgs[0], filt))
+	params.setdefault('verbose', verbose)
+	tasks[('epsf', filt)] = {'func':_runstage, 'args':(psfgen.filterepsf, (starfiles, imcam), params), 
+		'deps':[('stars', i) for i in imgs]}
+	return ('epsf', filt)
+
+
+def _topsfname(img, name, filt):
+	"""
+	Name of the _topsf file written for img by spike.tools.rewrite_fits, with name in place of the coordinate string.
+	"""
+	imtype = img.split('_')[-1].replace('.fits', '')
+	return img.replace('%s.fits'%imtype, name+'_%s'%filt+'_topsf_%s.fits'%imtype)
+
+
+def _objnames(o, coord):
+	"""
+	Strings from which the output names of object o (at coord) are built.
+
+	Returns:
+		isname (bool): True if o is a resolvable name rather than coordinates.
+		namestring (str): o without spaces or colons, if isname (otherwise None).
+		coordstring (str): Coordinates of o as used in model PSF names (see _topsfname).
+	"""
+	isname = False
+	namestring = None
+	if type(o) == str:
+		for s in o:
+			if s.isalpha():
+				isname = True
+				break
+		if isname:
+			namestring = o.replace(':', '').replace(' ', '')
+
+	coordstring = coord.ra.to_string(u.hour)
+	if coord.dec.deg >= 0:
+		coordstring += '+'+str(coord.dec)
+	if coord.dec.deg < 0:
+		coordstring += str(coord.dec)
+	return isname, namestring, coordstring
+
+
+def _resampname(o, filt, usename, shortcoord_style):
+	"""
+	Name of the JWST/Roman resampled PSF of object o in filt, written as <name>_resamplestep.fits.
+	"""
+	isname = False
+	namestring = None
+	for s in o:
+		if s.isalpha():
+			isname = True
+			break
+	if isname:
+		namestring = o.replace(':', '').replace(' ', '')
+
+	if usename and isname:
+		return namestring+'_'+filt+'_img'
+
+	if not isname:
+		shortdec, shortra = [cc.split('.')[0] for cc in o.split(' ')]
+	if isname:
+		do_coord = tools.objloc(o).to_string(**shortcoord_style)
+		shortdec, shortra = [cc.split('.')[0] for cc in do_coord.split(' ')]
+
+	if (':' not in shortra) and ('m' not in shortra):
+		shortdec, shortra = ['%.4f'%cc for cc in do_coord.split(' ')] #arcsec differentiation
+		if int(shortra) > 0:
+			shortra = "+"+shortra
+
+	resampname = shortdec+shortra+'_'+filt
+	return resampname.replace(':', '').replace(' ', '')
+
+
+def _tweakedname(imgs, img_dir, img_type):
+	"""
+	Names of the files written by the JWST/Roman TweakRegStep for imgs.
+	"""
+	return [img_dir+os.path.basename(f).replace('_%s.fits'%img_type, '_tweakregstep.fits') for f in imgs]
+
+
+def _resume(runlog, task, files = [], **params):
+	"""
+	Check a run manifest (see spike.tools.loadmanifest) for a task.
+
+	Returns:
+		done (bool): True if the task's outputs are already current.
+		key (str): Hash of task inputs, to record once the task finishes.
+		redo (bool): True if the task's outputs were written by an earlier run, but are out of date, 
+			so can be overwritten.
+	"""
+	if not runlog:
+		return False, None, False
+	key = tools.taskkey(files, runlog, **params)
+	done = tools.checkmanifest(runlog, task, key)
+	return done, key, (not done) and (task in runlog['tasks'])
+
+
+def _record(runlog, task, key, outputs):
+	"""
+	Record a finished task in a run manifest. outputs may be a list of paths or a glob pattern.
+	"""
+	if type(outputs) == str:
+		outputs = sorted(glob.glob(outputs))
+		if len(outputs) == 0: #nothing written, so nothing to resume from
+			return
+	tools.updatemanifest(runlog, task, key, outputs)
+
+
+def _rundag(pool, tasks):
+	"""
+	Run a graph of dependent tasks, starting each task on the pool as soon as all of the 
+	tasks it depends on are finished.
+
+	Parameters:
+		pool (multiprocessing.pool.Pool): Worker pool, as from _makepool.
+		tasks (dict): Task name-indexed dict. Each task is a dict with 'func' and optionally 'args', 
+			'kwds', 'deps' (list of names of tasks that must finish first), 'local', and 'callback'. Local 
+			tasks run in the calling process and may add further tasks to the dict, e.g., once an earlier 
+			stage determines what work remains. A task with func = None is treated as already done. 
+			callback is called (with no arguments) in the calling process once a task finishes.
+
+	Returns:
+		results (dict): Task name-indexed dict of the return value of each task.
+	"""
+	results = {}
+	started = set()
+	finished = queue.Queue()
+	nrunning = 0
+
+	while True:
+		progressed = False
+		for name in list(tasks.keys()):
+			if name in started:
+				continue
+			task = tasks[name]
+			deps = task.get('deps', [])
+			missing = [d for d in deps if d not in tasks]
+			if missing:
+				raise ValueError('Task %s depends on unknown task(s) %s.'%(str(name), str(missing)))
+			if not all(d in results for d in deps):
+				continue
+
+			started.add(name)
+			if task['func'] is None: #nothing left to do, e.g., outputs already current
+				results[name] = None
+				progressed = True
+				continue
+			if task.get('local', False):
+				results[name] = task['func'](*task.get('args', ()), **task.get('kwds', {}))
+				progressed = True
+				continue
+			pool.apply_async(task['func'], args = task.get('args', ()), kwds = task.get('kwds', {}), 
+				callback = lambda r, n = name: finished.put((n, r, None)), 
+				error_callback = lambda e, n = name: finished.put((n, None, e)))
+			nrunning += 1
+
+		if progressed: #local tasks may have freed or added tasks
+			continue
+		if nrunning == 0:
+			break
+
+		name, result, error = finished.get()
+		nrunning -= 1
+		if error is not None:
+			raise error
+		results[name] = result
+		if 'callback' in tasks[name]:
+			tasks[name]['callback']()
+
+	if len(results) < len(tasks):
+		raise ValueError('Could not run task(s) %s; check for circular dependencies.'%str([n for n in tasks if n not in results]))
+
+	return results
+
+def _plancatalog(func, params, kwargs):
+	"""
+	Plan a catalog run chunk by chunk (see spike.tools.planrun), keeping only totals and the largest 
+	memory estimates so that the plan does not grow with the catalog.
+	"""
+	plan = {'nmodels':0, 'ndrizzles':0, 'nimgdrizzles':0, 'noutputs':0, 'peak_memory':0, 
+		'memory':{'model':0, 'drizzle':0, 'imgdrizzle':0}}
+	for chunk in tools.readcatalog(params['obj'], params['chunksize'], params['catalogcols']):
+		chunkplan = func(**dict(params, obj = chunk, verbose = False), **kwargs)
+		plan['nmodels'] += len(chunkplan['models'])
+		plan['ndrizzles'] += len(chunkplan['drizzles'])
+		plan['nimgdrizzles'] += len(chunkplan['imgdrizzles'])
+		plan['noutputs'] += chunkplan['noutputs']
+		plan['peak_memory'] = max(plan['peak_memory'], chunkplan['peak_memory'])
+		for stage in plan['memory'].keys():
+			plan['memory'][stage] = max(plan['memory'][stage], chunkplan['memory'][stage])
+		plan['available_memory'] = chunkplan['available_memory']
+	plan['feasible'] = plan['peak_memory'] <= plan.get('available_memory', 0)
+
+	if params['verbose']:
+		print('%i model PSFs, %i PSF drizzle/resample jobs, %i image drizzle/resample jobs (%i output mosaics).'%(
+			plan['nmodels'], plan['ndrizzles'], plan['nimgdrizzles'], plan['noutputs']))
+		print('Estimated peak memory: %.2f GB per chunk.'%(plan['peak_memory']/1e9))
+
+	return plan
+
+
+def _runcatalog(func, params):
+	"""
+	Run spike.psf.hst, jwst, or roman over a catalog of targets in chunks, writing a row per target and filter 
+	to a results table as each chunk finishes rather than holding all outputs in memory.
+
+	Parameters:
+		func (callable): spike.psf.hst, spike.psf.jwst, or spike.psf.roman.
+		params (dict): Arguments of the call to func, with the catalog as obj.
+
+	Returns:
+		resultsfile (str): Path to results table (CSV) with columns 'obj', 'filter', 'psf' (path to the 
+			drizzled/resampled PSF), and, if returnpsf = 'crop', 'crop' (path to the saved cutout). Targets 
+			that fall on no image are listed once with an empty filter and path.
+	"""
+	kwargs = params.pop('kwargs')
+	if params['dryrun']:
+		return _plancatalog(func, params, kwargs)
+
+	catalog = params['obj']
+	returnpsf = params['returnpsf']
+	verbose = params['verbose']
+
+	resultsfile = params['resultsfile']
+	if not resultsfile:
+		resultsfile = os.path.join(params['savedir'], 'results.csv')
+	if os.path.dirname(resultsfile) and not os.path.exists(os.path.dirname(resultsfile)):
+		os.makedirs(os.path.dirname(resultsfile))
+	colnames = ['obj', 'filter', 'psf']
+	if returnpsf == 'crop':
+		colnames.append('crop')
+
+	done = set() #targets finished by an earlier (interrupted) run
+	if os.path.exists(resultsfile):
+		done = set(str(o) for o in Table.read(resultsfile, format = 'csv')['obj'])
+
+	img_dir = params['img_dir']
+	if img_dir[-1] != '/':
+		img_dir += '/'
+	imgs = sorted(glob.glob(img_dir+'*'+params['img_type']+'.fits'))
+	inst, camera = params['inst'], params['camera']
+
+	with tools.scratchdir() as scratch:
+		if not params['indexfile']: #each chunk reuses the image index rather than re-reading headers
+			params['indexfile'] = os.path.join(scratch, 'index.pkl')
+		index = tools.imgindex(imgs, inst, camera, indexfile = params['indexfile'])
+
+		params['returnpsf'] = 'path'
+		for n, chunk in enumerate(tools.readcatalog(catalog, params['chunksize'], params['catalogcols'])):
+			chunk = [o for o in chunk if o not in done]
+			if not chunk:
+				continue
+			coords = tools.resolvenames(chunk)
+			covered = np.zeros(len(chunk), dtype = bool)
+			for i in imgs: #targets on no image are recorded, but not passed on
+				covered |= tools.batchpixloc(coords, i, inst, camera, index = index)['on_detector']
+			rows = [[o] + ['']*(len(colnames) - 1) for o, c in zip(chunk, covered) if not c]
+			chunk = [o for o, c in zip(chunk, covered) if c]
+
+			if chunk:
+				paths = func(**dict(params, obj = chunk), **kwargs)
+				for o in chunk:
+					for filt, path in paths.get(o, {}).items():
+						row = [o, filt, path]
+						if returnpsf == 'crop':
+							tools.cutout(img = path, coords = tools.objloc(o), fov_pixel = params['cutout_fov'], 
+								save = True, clobber = params['clobber'], compress = params['compress'])
+							row.append(path.replace('.fits', '_crop.fits'))
+						rows.append(row)
+
+				if not params['pretweaked']: #images are aligned once, by the first chunk
+					params['pretweaked'] = True
+					params['keeporig'] = False
+					if func != hst: #continue from the tweaked copies
+						params['img_type'] = 'tweakregstep'
+						imgs = sorted(glob.glob(img_dir+'*_tweakregstep.fits'))
+						index = tools.imgindex(imgs, inst, camera, index = index, indexfile = params['indexfile'])
+
+			tools.appendresults(resultsfile, rows, colnames)
+			if verbose:
+				print('Finished chunk %i; results written to %s'%(n+1, resultsfile))
+
+	return resultsfile
+
 ##########
 # * * * *
 ##########
@@ -44,7 +538,10 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 						 'driz_sep_rot':None,
 						 'final_rot':None},
 		returnpsf = 'full', cutout_fov = 151, savecutout = True, finalonly = False,
-		removedir = 'toremove', clobber = False, usename = False, **kwargs):
+		removedir = 'toremove', clobber = False, usename = False, indexfile = None, 
+		nworkers = None, backend = 'process', manifest = None, 
+		chunksize = 1000, resultsfile = None, catalogcols = None, dryrun = False, stamps = False, compress = None, window = None, 
+		filterepsf = None, **kwargs):
 	"""
 	Generate drizzled HST PSFs.
 
@@ -52,6 +549,8 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 		img_dir (str): Path to directory containing calibrated files for which model PSF will be generated.
 			If using the tweakreg step, best to include a drizzled file, as well, which can be used as a reference.
 		obj(str, arr-like): Name or coordinates of object of interest in HH:MM:DD DD:MM:SS or degree format.
+			May also be a target catalog -- an astropy table or path to a FITS, CSV, or ECSV table -- which is processed
+			in chunks (see chunksize).
 		img_type (str): e.g, 'flc', 'flt', 'cal', 'c0m' -- specifies which file-type to include.
 			spike currently only works with MEF files (since astrodrizzle only works with MEF files).
 		inst (str): 'ACS', 'WFC3', 'WFPC', 'WFPC2', NICMOS'
@@ -75,22 +574,54 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 		plot (bool): If True, saves .pngs of the model PSFs. (Not affected by clobber; 
 			images with the same name are overwritten by default.)
 		verbose (bool): If True, prints progress messages.
-		parallel (bool): If True, runs PSF generation in parallel.
+		parallel (bool): If True, runs alignment, PSF generation (per exposure and object), and drizzling/resampling 
+			in parallel, with each filter moving on to the next stage as soon as its own inputs are ready. (If False, 
+			the same stages run one after another.)
 		out (str): 'fits' or 'asdf'. Output for the drizzled PSF. If 'asdf', .asdf AND .fits are saved.
 		tweakparams (dict): Dictionary of keyword arguments for drizzlepac.tweakreg. See the drizzlepac documentation
 			for a full list.
 		drizzleparams (dict): Dictionary of keyword arguments for drizzlepac.astrodrizzle. See the drizzlepac 
 			documentation for a full list.
-		returnpsf (str): 'full', 'crop', or None. If None, spike.psf.hst does not return anything. If 'full' (default),
+		returnpsf (str): 'full', 'crop', 'path', or None. If None, spike.psf.hst does not return anything. If 'full' (default),
 			returns the PSF in the full spatial context of the processed image. If 'crop', returns the region immediately
-			around the PSF (size of cutout set by cutout_fov).
+			around the PSF (size of cutout set by cutout_fov). If 'path', returns the path to each drizzled/resampled PSF.
 		cutout_fov (int): Side length in pixels of square cutout region centered on PSF. Used if returnpsf = 'crop'.
 		savecutout (bool): If True, save a .fits file with the cutout region, including WCS. Only used if returnpsf = 'crop'.
 		finalonly (bool): If True, only retains final drizzled/resampled data products in savedir and deletes intermediate products.
-		removedir (str): Directory (**to be deleted**) that stores intermediate products for removal. Default is 'toremove'.
+		removedir (str): Directory (**to be deleted**, with its contents) if finalonly = True. Intermediate products are deleted directly. Default is 'toremove'.
 		clobber (bool): If True, will overwrite existing files with the duplicate names.
 			(Default state -- clobber = False -- is recommended.)
 		usename (bool): If True, use resolvable object name (from obj) if provided in generating output files. 
+		indexfile (str): If specified, path to which the image index (filters, chip layout, WCS; see spike.tools.imgindex) 
+			is saved, so that later runs on the same directory only re-read images that have changed.
+		nworkers (int): Number of workers in the pool used if parallel = True. Default is one fewer than the number of CPUs.
+		backend (str): 'process' or 'thread' -- type of worker pool used if parallel = True. One pool is created 
+			per run and shared by PSF generation, PSF drizzling/resampling, and image drizzling/resampling.
+		manifest (str): If specified, path to a run manifest (JSON; see spike.tools.loadmanifest) that records each 
+			alignment, model PSF, and drizzled/resampled product with a hash of its inputs (image checksums, position, 
+			filter, method, keyword arguments). If a run is restarted, tasks with current outputs are skipped.
+		chunksize (int): If obj is a catalog, number of targets processed at a time. Memory use scales with chunksize
+			rather than with the size of the catalog.
+		resultsfile (str): If obj is a catalog, path to the results table (CSV) that each chunk is appended to as it 
+			finishes. Targets already listed there (e.g., by an interrupted run) are skipped. Default is savedir/results.csv.
+		catalogcols (str or tuple): If obj is a catalog, the column of object names or (RA, Dec) columns of ICRS coordinates
+			(see spike.tools.readcatalog). If None, 'ra' and 'dec' columns are used if present and otherwise a 'name' column.
+		dryrun (bool): If True, only reads headers and WCS and returns a plan of the run (see spike.tools.planrun) -- the
+			model PSFs and drizzle/resample jobs that would result and estimates of the memory needed per stage. Runs 
+			whose estimated peak memory exceeds the available memory raise a MemoryError before any work is done.
+		stamps (bool): If True (and method is not 'USER'), model PSFs are saved as compact _topsf files holding only 
+			the PSF stamp and its position, which are expanded to full frames only for drizzle/resample (see 
+			spike.tools.rewrite_fits and spike.tools.expandstamp). Stamp files are kept in this form when moved to savedir,
+			so are read with spike.tools.expandstamp. If False (default), full-frame _topsf files are written.
+		compress (str): If specified, lossless tile compression ('GZIP_1' or 'GZIP_2') for model PSFs and cutouts. Compressed
+			model PSFs are decompressed to scratch only for drizzle/resample (see spike.tools.compimagehdu).
+		window (int): If specified, PSFs are drizzled/resampled only onto a square frame of cutout_fov + 2*window pixels
+			(at the native pixel scale) centered on each object rather than onto the full footprint of the inputs. 
+			Intended for use with returnpsf = 'crop'.
+		filterepsf (bool or dict): If True (method = 'epsf' only), one ePSF is built per filter from the stars of all of 
+			its images (extracted in parallel if parallel = True) and evaluated at each object's position on each image, 
+			rather than one ePSF being built per image (see spike.psfgen.filterepsf). May be a dict of keyword arguments 
+			for spike.psfgen.filterepsf, e.g., {'spatial':3} for an ePSF that varies across each detector.
 		**kwargs: Keyword arguments for PSF generation function.
 
 	Returns:
@@ -98,7 +629,16 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 
 		If returnpsf = 'full', will return each of the full drizzled PSF images in an object, filter indexed dict.
 		If returnpsf = 'crop', will return a cutout region of the drizzled PSF images (around the PSF) in an obj, filt indexed dict.
+		If returnpsf = 'path', will return the path to each drizzled PSF image in an obj, filt indexed dict.
+
+		If obj is a catalog, returns the path to the results table, with columns 'obj', 'filter', 'psf' (path to the 
+		drizzled PSF), and, if returnpsf = 'crop', 'crop' (path to the saved cutout).
+
+		If dryrun = True, returns the plan of the run instead (for a catalog, totals and the largest memory estimates over chunks).
 	"""
+	if tools.iscatalog(obj): #stream targets through in chunks
+		return _runcatalog(hst, dict(locals()))
+
 	from drizzlepac import tweakreg, astrodrizzle
 
 	if img_type.lower() in ['drc', 'drz', 'drw', 'mos']:
@@ -107,10 +647,9 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 	if img_dir[-1] != '/':
 		img_dir += '/' #force paths to work out
 
-	if keeporig and not pretweaked:
-		if not os.path.exists(img_dir+'_orig'):
-			os.makedirs(img_dir+'_orig')
-		os.system('cp -r '+img_dir+'*_'+img_type+'.fits '+img_dir+'_orig')
+	if keeporig and not pretweaked and not dryrun:
+		# copy (or reflink) rather than hard link, since images are updated in place
+		tools.copyfiles(img_dir+'*_'+img_type+'.fits', img_dir+'_orig')
 		if verbose:
 			print('Made copy of '+img_dir)
 
@@ -178,242 +717,41 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 			genpsf = False
 		if type(usermethod) != str: #or function
 			psffunc = method
+	if method.upper() != 'USER': #written as compact stamps, expanded only for drizzle/resample
+		kwargs['stamp'] = stamps
+		if compress:
+			kwargs['compress'] = compress
+	windowsize = None if window is None else cutout_fov + 2*window #output frame side length, if windowed
+	if filterepsf and (method.upper() != 'EPSF'):
+		raise ValueError("filterepsf requires method = 'epsf'.")
+	keykwargs = dict(kwargs, filterepsf = filterepsf) if filterepsf else kwargs #model PSF inputs, as recorded in the manifest
+
+	# read headers and build WCS once, reused by every later stage
+	index = tools.imgindex(imgs, inst, camera, indexfile = indexfile, verbose = verbose)
+
+	# header and WCS work only, so a run that would run out of memory stops before it starts
+	plan = tools.planrun(index, obj, drizzleimgs = drizzleimgs, objonly = objonly, parallel = parallel, 
+		nworkers = nworkers, windowsize = windowsize, verbose = verbose and dryrun)
+	if dryrun:
+		return plan
+	if not plan['feasible']:
+		raise MemoryError('Estimated peak memory (%.2f GB) exceeds available memory (%.2f GB). Use fewer workers '
+			'(nworkers), parallel = False, or window; see dryrun = True for the estimate per stage.'%(
+			plan['peak_memory']/1e9, plan['available_memory']/1e9))
+
+	runlog = None
+	if manifest: #skip work already done by an earlier run
+		runlog = tools.loadmanifest(manifest)
 
 	filelist = {} # generate list of files to tweak -- by filter
 	for fi in imgs:
-		hdu = fits.open(fi)
-		try: #get filter
-			filt = hdu[0].header['FILTER']
-		except:
-			if inst.upper() == 'WFPC2':
-				if str(hdu[0].header['FILTNAM1']).startswith('F'):
-					filt = hdu[0].header['FILTNAM1'].rstrip()
-				else:
-					filt = hdu[0].header['FILTNAM2'].rstrip()
-
-			if inst.upper() != 'WFPC2':
-				if str(hdu[0].header['FILTER1']).startswith('F'):
-					filt = hdu[0].header['FILTER1']
-				else:
-					filt = hdu[0].header['FILTER2']
+		filt = index[fi]['filter']
 		if filt not in filelist.keys():
 			filelist[filt] = []
 		filelist[filt].append(fi)
 
-	if not pretweaked:
-		# note that if there are many input files, tweakreg will be very slow and prone
-		# to overuse of RAM	
-		for fk in filelist.keys():
-			tweakreg.TweakReg(filelist[fk], **tweakparams)
-
-
-	drizzlelist = {} #write file prefixes to drizzle per object per filter
-	imglist = {} #images to drizzle per object per filter (used if objonly = True)
-	if genpsf: #generate model PSFs for each image + object
-		if type(obj) in [str, astropy.coordinates.sky_coordinate.SkyCoord]: #check number of objects
-			drizzlelist[obj] = {}
-			imglist[obj] = {}
-			skycoords = tools.objloc(obj)
-
-			if usename:
-				isname = False
-				namestring = None
-				if type(obj) == str:
-					for s in obj:
-						if s.isalpha():
-							isname = True
-							break
-				if isname:
-					namestring = obj.replace(':', '').replace(' ', '')
-
-			for i in imgs:
-				pos = tools.checkpixloc(skycoords, i, inst, camera)
-
-				coordstring = skycoords.ra.to_string(u.hour)
-				if skycoords.dec.deg >= 0:
-					coordstring += '+'+str(skycoords.dec)
-				if skycoords.dec.deg < 0:
-					coordstring += str(skycoords.dec)
-
-				if usename and isname:
-					modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-					modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-				if not usename or not isname:
-					modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-				if np.isfinite(pos[0]): #confirm object falls onto image
-					if pos[3] not in drizzlelist[obj].keys():
-						drizzlelist[obj][pos[3]] = []
-						imglist[obj][pos[3]] = []
-					drizzlelist[obj][pos[3]].append(modname)
-					imglist[obj][pos[3]].append(i)
-
-					if (method.upper() == 'ACS_EPSF') and (pos[3] not in acs_epsf_allowed):
-						raise ValueError("ACS ePSFs not available for %s. Please select a different PSF generation method."%pos[3])
-					
-					psffunc(skycoords, i, imcam, pos, plot, verbose, **kwargs)
-
-					if usename and isname:
-						# rename output from psffunc
-						os.system('mv %s %s'%(modout, modname))
-
-
-		if type(obj) not in [str, astropy.coordinates.sky_coordinate.SkyCoord]: #if multiple objects, option to parallelize 
-			skycoords = [] #only open each FITS file once
-
-			for o in obj:
-				drizzlelist[o] = {}
-				imglist[o] = {}
-				skycoords.append(tools.objloc(o))
-			
-			for i in imgs:
-
-				if parallel:
-					if method.upper() == 'PSFEX':
-						warnings.warn('Warning: Check your config and param files to ensure output files have unique names.', Warning, stacklevel = 2)
-					pool = Pool(processes=(cpu_count() - 1))
-					for j, coord in enumerate(skycoords):
-
-						pos = tools.checkpixloc(coord, i, inst, camera)
-
-						if usename:
-							isname = False
-							namestring = None
-							if type(obj[j]) == str:
-								for s in obj[j]:
-									if s.isalpha():
-										isname = True
-										break
-							if isname:
-								namestring = obj[j].replace(':', '').replace(' ', '')
-
-						coordstring = coord.ra.to_string(u.hour)
-						if coord.dec.deg >= 0:
-							coordstring += '+'+str(coord.dec)
-						if coord.dec.deg < 0:
-							coordstring += str(coord.dec)
-
-						if usename and isname:
-							modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-							modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if not usename or not isname:
-							modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if np.isfinite(pos[0]): #confirm that object falls onto detector
-							if pos[3] not in drizzlelist[obj[j]].keys():
-								drizzlelist[obj[j]][pos[3]] = []
-								imglist[obj[j]][pos[3]] = []
-							drizzlelist[obj[j]][pos[3]].append(modname)
-							imglist[obj[j]][pos[3]].append(i)
-
-							if (method.upper() == 'ACS_EPSF') and (pos[3] not in acs_epsf_allowed):
-								raise ValueError("ACS ePSFs not available for %s. Please select a different PSF generation method."%pos[3])
-
-							pool.apply_async(psffunc, args = (coord, i, imcam, pos, plot, verbose), 
-								kwds = dict(kwargs, clobber = clobber))
-
-							if usename and isname:
-								# this may not work in the multiprocessing case -- requires testing
-								# rename output from psffunc
-								os.system('mv %s %s'%(modout, modname)) 
-
-					pool.close()
-					pool.join()
-
-				if not parallel:
-					for j, coord in enumerate(skycoords):
-						pos = tools.checkpixloc(coord, i, inst, camera)
-
-						if usename:
-							isname = False
-							namestring = None
-							if type(obj[j]) == str:
-								for s in obj[j]:
-									if s.isalpha():
-										isname = True
-										break
-							if isname:
-								namestring = obj[j].replace(':', '').replace(' ', '')
-
-						coordstring = coord.ra.to_string(u.hour)
-						if coord.dec.deg >= 0:
-							coordstring += '+'+str(coord.dec)
-						if coord.dec.deg < 0:
-							coordstring += str(coord.dec)
-
-						if usename and isname:
-							modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-							modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if not usename or not isname:
-							modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if np.isfinite(pos[0]): #confirm that object falls onto detector
-							if pos[3] not in drizzlelist[obj[j]].keys():
-								drizzlelist[obj[j]][pos[3]] = []
-								imglist[obj[j]][pos[3]] = []
-							drizzlelist[obj[j]][pos[3]].append(modname)
-							imglist[obj[j]][pos[3]].append(i)
-
-						if (method.upper() == 'ACS_EPSF') and (pos[3] not in acs_epsf_allowed):
-							raise ValueError("ACS ePSFs not available for %s. Please select a different PSF generation method."%pos[3])
-
-						psffunc(coord, i, imcam, pos, plot, verbose, clobber = clobber, **kwargs)
-
-						if usename and isname:
-							# rename output from psffunc
-							os.system('mv %s %s'%(modout, modname)) 
-					
-	if not genpsf:
-		userpsfs = sorted(glob.glob(usermethod))
-
-		for up in userpsfs:
-			im, imtype, obj, filt, _ = up.split('_')
-
-			img = img_dir+'%s_%s.fits'%(im, imtype)
-			coord = tools.objloc(obj.replace('-', ' -').replace('+', ' +')) #handles string coordinates
-			pos = tools.checkpixloc(coord)
-
-			psfmodel = fits.open(up)[1].data
-
-			tools.rewrite_fits(psfmodel, img, coord, imcam, pos, method = 'USER', clobber = clobber)
-
-			if usename:
-				isname = False
-				namestring = None
-				if type(obj) == str:
-					for s in obj:
-						if s.isalpha():
-							isname = True
-							break
-				if isname:
-					namestring = obj.replace(':', '').replace(' ', '')
-
-			coordstring = coord.ra.to_string(u.hour)
-			if coord.dec.deg >= 0:
-				coordstring += '+'+str(coord.dec)
-			if coord.dec.deg < 0:
-				coordstring += str(coord.dec)
-
-			if usename and isname:
-				modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-				modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-				os.system('mv %s %s'%(modout, modname)) 
-
-			if not usename or not isname:
-				modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-			if obj not in drizzlelist.keys():
-				drizzlelist[obj] = {}
-				imglist[obj] = {}
-			if filt not in drizzlelist[obj].keys():
-				drizzlelist[obj][filt] = []
-				imglist[obj][filt] = []
-			drizzlelist[obj][filt].append(modname)
-			imglist[obj][filt].append(img)
-			
+	# models are keyed on the SCI data and WCS of each image, which drizzling (updating DQ arrays in place) leaves unchanged
+	tweakkeys = {}
 
 	if keeporig:
 		drizzleparams['preserve'] = True #reset parameter to ensure that original files maintained
@@ -425,47 +763,190 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 	## if build = True poses a problem, contact directly or open an issue -- simple matter of modifying
 	## file types tracked by drzs (below) to e.g. '*_drc*.fits' etc., but note that cropping will not work
 
-	for do in drizzlelist.keys():
-		cstring = tools.objloc(do)
-		coordstring = cstring.ra.to_string(u.hour)
-		if cstring.dec.deg >= 0:
-			coordstring += '+'+str(cstring.dec)
-		if cstring.dec.deg < 0:
-			coordstring += str(cstring.dec)
 
-		if usename: #all do should be strings now as keys, so this is a final (probably unnecesary) check
-			isname = False
-			namestring = None
-			for s in do:
-				if s.isalpha():
-					isname = True
-					break
-			if isname:
-				namestring = do.replace(':', '').replace(' ', '')
+	drizzlelist = {} #write file prefixes to drizzle per object per filter
+	imglist = {} #images to drizzle per object per filter (used if objonly = True)
+	if type(obj) in [str, astropy.coordinates.sky_coordinate.SkyCoord]:
+		objs = [obj]
+		skycoords = tools.objloc(obj)
+		coords = [skycoords]
+	if type(obj) not in [str, astropy.coordinates.sky_coordinate.SkyCoord]:
+		objs = list(obj)
+		skycoords = tools.resolvenames(objs)
+		coords = skycoords
+
+	objnames = {} #(isname, namestring, coordstring) per object
+	objcoords = {} #coordinates per object
+	for o, coord in zip(objs, coords):
+		drizzlelist[o] = {}
+		imglist[o] = {}
+		objnames[o] = _objnames(o, coord)
+		objcoords[o] = coord
 
-		if parallel:
-			pool = Pool(processes=(cpu_count() - 1))
-			for dk in drizzlelist[do].keys():
-				if usename and isname:
-					outname = namestring+'_'+dk+'_psf'
-				if not usename or not isname:
-					outname = coordstring+'_'+dk+'_psf'
-				drizzleparams['output'] = img_dir + outname #set output based on coord, filter
-				pool.apply_async(astrodrizzle.AstroDrizzle, args = (drizzlelist[do][dk]), kwds = drizzleparams)
-			pool.close()
-			pool.join()
-		if not parallel:
-			for dk in drizzlelist[do].keys():
-				if usename and isname:
-					outname = namestring+'_'+dk+'_psf'
-				if not usename or not isname:
-					outname = coordstring+'_'+dk+'_psf'
-				drizzleparams['output'] = img_dir + outname #set output based on coord, filter
-				astrodrizzle.AstroDrizzle(drizzlelist[do][dk], **drizzleparams)
+	if not genpsf:
+		userpsfs = sorted(glob.glob(usermethod))
+
+	def locate(fk):
+		# runs once this filter is tweaked; queues its models, then the drizzles that use them
+		index.update(tools.imgindex(filelist[fk], inst, camera, index = index, indexfile = indexfile))
+
+		models = {} #model tasks per object + filter
+		if genpsf:
+			modelkwargs = dict(kwargs, epsfmodel = _epsfname(filelist[fk][0], fk)) if filterepsf else kwargs
+			for i in filelist[fk]:
+				allpos = tools.checkpixloc(coords, i, inst, camera, index = index) #all objects at once
+				batch = [] #objects on this image, modeled with one call
+				for j, o in enumerate(objs):
+					pos = allpos[j]
+					if not np.isfinite(pos[0]): #confirm that object falls onto detector
+						continue
+					isname, namestring, coordstring = objnames[o]
+
+					move = None
+					if usename and isname:
+						modout = _topsfname(i, coordstring, pos[3])
+						modname  = _topsfname(i, namestring, pos[3])
+						move = (modout, modname) # rename output from psffunc
+
+					if not usename or not isname:
+						modname = _topsfname(i, coordstring, pos[3])
+
+					if (method.upper() == 'ACS_EPSF') and (pos[3] not in acs_epsf_allowed):
+						raise ValueError("ACS ePSFs not available for %s. Please select a different PSF generation method."%pos[3])
 
-	drzs = np.concatenate((sorted(glob.glob('%s*_drc.fits'%img_dir)), 
-		sorted(glob.glob('%s*_drz.fits'%img_dir)), sorted(glob.glob('%s*_mos.fits'%img_dir)), 
-		sorted(glob.glob('%s*_drw.fits'%img_dir))))
+					if pos[3] not in drizzlelist[o].keys():
+						drizzlelist[o][pos[3]] = []
+						imglist[o][pos[3]] = []
+						models[(o, pos[3])] = []
+					drizzlelist[o][pos[3]].append(modname)
+					imglist[o][pos[3]].append(i)
+
+					done, modelkeys[modname], redo = _resume(runlog, 'model:'+modname, images = [i], pos = pos, method = method, kwargs = keykwargs)
+					if not done: #skip models made by an earlier run
+						batch.append((coords[j], pos, move, redo, 
+							partial(_record, runlog, 'model:'+modname, modelkeys[modname], [modname])))
+					models[(o, pos[3])].append(('model', i))
+				tasks[('model', i)] = _modeltask(psffunc, i, imcam, plot, verbose, modelkwargs, clobber, batch)
+
+			if filterepsf: #one ePSF for the filter, built once the stars of all of its images are extracted
+				needed = [('model', i) for i in filelist[fk] if tasks[('model', i)]['func']]
+				if needed:
+					epsftask = _epsftasks(tasks, fk, filelist[fk], imcam, filterepsf, kwargs, verbose)
+					for m in needed:
+						tasks[m]['deps'] = [epsftask]
+
+		if not genpsf:
+			for up in userpsfs: #user-generated PSFs of this filter, rewritten as model PSFs in place
+				im, imtype, o, filt, _ = up.split('_')
+				if filt != fk:
+					continue
+
+				img = img_dir+'%s_%s.fits'%(im, imtype)
+				coord = tools.objloc(o.replace('-', ' -').replace('+', ' +')) #handles string coordinates
+				pos = tools.checkpixloc(coord, img, inst, camera, index = index)
+
+				psfmodel = fits.open(up)[1].data
+
+				tools.rewrite_fits(psfmodel, coord, img, imcam, pos, method = 'USER', clobber = clobber)
+
+				if o not in objnames:
+					objnames[o] = _objnames(o, coord)
+					objcoords[o] = coord
+					drizzlelist[o] = {}
+					imglist[o] = {}
+				isname, namestring, coordstring = objnames[o]
+
+				modname = _topsfname(img, coordstring, pos[3])
+				if usename and isname:
+					tools.renamefile(modname, _topsfname(img, namestring, pos[3]))
+					modname = _topsfname(img, namestring, pos[3])
+
+				if filt not in drizzlelist[o].keys():
+					drizzlelist[o][filt] = []
+					imglist[o][filt] = []
+					models[(o, filt)] = []
+				drizzlelist[o][filt].append(modname)
+				imglist[o][filt].append(img)
+				_, modelkeys[modname], _ = _resume(runlog, 'model:'+modname, [modname])
+
+		filtmodels = [m for mk in models.keys() for m in models[mk]]
+		previmg = {}
+		for o, dk in models.keys():
+			isname, namestring, coordstring = objnames[o]
+			if usename and isname:
+				outname = namestring+'_'+dk
+			if not usename or not isname:
+				outname = coordstring+'_'+dk
+
+			# inputs are distinct per object + filter, so all can be drizzled at once
+			prefix = img_dir + outname + '_psf' #set output based on coord, filter
+			psfparams = dict(drizzleparams, **_windowparams(objcoords[o], windowsize, 'astrodrizzle'))
+			done, key, _ = _resume(runlog, 'drizzle:'+prefix, 
+				models = [modelkeys[m] for m in drizzlelist[o][dk]], params = psfparams)
+			tasks[('drizzle', o, dk)] = {'func':_runstage, 'deps':models[(o, dk)],
+				'args':(_fromstamps, (astrodrizzle.AstroDrizzle, drizzlelist[o][dk]), dict(psfparams, output = prefix)), 
+				'callback':partial(_record, runlog, 'drizzle:'+prefix, key, prefix+'_dr?.fits')}
+			if done:
+				tasks[('drizzle', o, dk)]['func'] = None
+
+			if drizzleimgs and objonly:
+				# objects share input images (and so AstroDrizzle intermediates), so run one after another
+				prefix = img_dir + outname + '_img'
+				imgparams = dict(drizzleparams, driz_cr_corr = True, static = True, output = prefix)
+				done, key, _ = _resume(runlog, 'drizzle:'+prefix, 
+					imgs = imglist[o][dk], tweak = tweakkeys.get(fk), params = imgparams)
+				tasks[('imgdrizzle', o, dk)] = {'func':_runstage, 'deps':filtmodels + previmg.get(dk, []),
+					'args':(astrodrizzle.AstroDrizzle, (imglist[o][dk],), imgparams), 
+					'callback':partial(_record, runlog, 'drizzle:'+prefix, key, prefix+'_dr?.fits')}
+				if done:
+					tasks[('imgdrizzle', o, dk)]['func'] = None
+				previmg[dk] = [('imgdrizzle', o, dk)]
+
+		if drizzleimgs and not objonly:
+			# CR flagging updates the input images, so wait until all models are made from them
+			prefix = img_dir + '%s_img'%fk
+			imgparams = dict(drizzleparams, driz_cr_corr = True, static = True, output = prefix)
+			done, key, _ = _resume(runlog, 'drizzle:'+prefix, imgs = filelist[fk], tweak = tweakkeys.get(fk), params = imgparams)
+			tasks[('imgdrizzle', fk)] = {'func':_runstage, 'deps':filtmodels, 
+				'args':(astrodrizzle.AstroDrizzle, (filelist[fk],), imgparams), 
+				'callback':partial(_record, runlog, 'drizzle:'+prefix, key, prefix+'_dr?.fits')}
+			if done:
+				tasks[('imgdrizzle', fk)]['func'] = None
+
+	# tweak -> model -> drizzle run per filter as soon as each is ready, on the pool if parallel and in turn otherwise
+	tasks = {}
+	modelkeys = {} #input hashes, used to key the drizzles that depend on each model
+	prevtweak = [] #TweakReg writes logs and catalogs to the working directory, so filters are tweaked in turn
+	for fk in filelist.keys():
+		deps = []
+		if not pretweaked:
+			# note that if there are many input files, tweakreg will be very slow and prone
+			# to overuse of RAM	
+			tweakkwds = dict(tweakparams)
+			if tweakkwds.get('outshifts'): #keep shift files of each filter separate
+				tweakkwds['outshifts'] = fk+'_'+tweakkwds['outshifts']
+			# TweakReg updates the images in place, so is keyed on names, not contents
+			done, tweakkeys[fk], _ = _resume(runlog, 'tweak:'+fk, imgs = filelist[fk], params = tweakkwds)
+			tasks[('tweak', fk)] = {'func':_runstage, 'args':(tweakreg.TweakReg, (filelist[fk],), tweakkwds), 
+				'deps':prevtweak, 'callback':partial(_record, runlog, 'tweak:'+fk, tweakkeys[fk], [])}
+			if done:
+				tasks[('tweak', fk)]['func'] = None
+			deps = [('tweak', fk)]
+			prevtweak = deps
+		tasks[('locate', fk)] = {'func':locate, 'args':(fk,), 'deps':deps, 'local':True}
+
+	pool = _makepool(nworkers, backend if parallel else 'serial') #one pool for all stages
+	try:
+		_rundag(pool, tasks)
+	finally: #stop any workers still writing files if a task fails, and keep a record of finished work
+		pool.terminate()
+		pool.join()
+		if runlog:
+			tools.savemanifest(runlog)
+
+	drzs = np.concatenate((sorted(glob.glob('%s*_psf_drc.fits'%img_dir)), 
+		sorted(glob.glob('%s*_psf_drz.fits'%img_dir)), sorted(glob.glob('%s*_psf_mos.fits'%img_dir)), 
+		sorted(glob.glob('%s*_psf_drw.fits'%img_dir)))) #image drizzles are already done by the stage graph
 
 	if len(drzs) == 0:
 		raise Exception('No co-added/resampled output files created. Check your input path, coordinates and the output of the PSF generation steps.')
@@ -476,97 +957,25 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 		filt_ = flist[1]
 		obj_ = flist[0]
 
-		os.system('mv %s %s%s_%s_psf_%s.fits'%(dr, img_dir, obj_, filt_, suff_))
+		tools.renamefile(dr, '%s%s_%s_psf_%s.fits'%(img_dir, obj_, filt_, suff_))
 
 	suff = suff_ # store suffix, as there should be no variation within one run
 
-	
-	if drizzleimgs: # useful for processing all images + PSFs simultaneously
-		drizzleparams['driz_cr_corr'] = True #reset parameters turned off for PSF
-		drizzleparams['static'] = True
-		if not objonly:
-			for fk in filelist.keys():
-				drizzleparams['output'] = img_dir + '%s_img'%fk #set output name with filter
-				astrodrizzle.AstroDrizzle(filelist[fk], **drizzleparams)
-		
-		if objonly:
-			for do in imglist.keys():
-				cstring = tools.objloc(do)
-				coordstring = cstring.ra.to_string(u.hour)
-				if cstring.dec.deg >= 0:
-					coordstring += '+'+str(cstring.dec)
-				if cstring.dec.deg < 0:
-					coordstring += str(cstring.dec)
-
-				if usename: #all do should be strings now as keys, so this is a final (probably unnecesary) check
-					isname = False
-					namestring = None
-					for s in do:
-						if s.isalpha():
-							isname = True
-							break
-					if isname:
-						namestring = do.replace(':', '').replace(' ', '')
-
-				if parallel:
-					pool = Pool(processes=(cpu_count() - 1))
-					for dk in imglist[do].keys():
-						if usename and isname:
-							outname = namestring+'_'+dk+'_img'
-						if not usename or not isname:
-							outname = coordstring+'_'+dk+'_img'
-						drizzleparams['output'] = img_dir + outname #set output based on coord, filter
-						pool.apply_async(astrodrizzle.AstroDrizzle, args = (imglist[do][dk]), kwds = drizzleparams)
-					pool.close()
-					pool.join()
-				if not parallel:
-					for dk in drizzlelist[do].keys():
-						if usename and isname:
-							outname = namestring+'_'+dk+'_img'
-						if not usename or not isname:
-							outname = coordstring+'_'+dk+'_img'
-						drizzleparams['output'] = img_dir + outname #set output based on coord, filter
-						astrodrizzle.AstroDrizzle(imglist[do][dk], **drizzleparams)
-
 	if not finalonly:
 		# clean up step to move all of the PSF files to the relevant directory
 		# should grab all .pngs, .fits etc.
 		if not os.path.exists(savedir):
 			os.makedirs(savedir)
 
-		os.system('mv %s*_drc* %s'%(img_dir, savedir)) # drizzled files
-		os.system('mv %s*_drz* %s'%(img_dir, savedir)) # drizzled files
-		os.system('mv %s*_drw* %s'%(img_dir, savedir)) # drizzled files
-		os.system('mv %s*_mos* %s'%(img_dir, savedir)) # drizzled files
-
-		os.system('mv %s*_psf* %s'%(img_dir, savedir)) # generated PSF models
-		os.system('mv %s*.psf %s'%(img_dir, savedir))
-		os.system('mv %s*_topsf* %s'%(img_dir, savedir)) # tweaked and drizzled PSF models
-
-		## clean up other files generated in the process
-		os.system('mv %s*.cat %s'%(img_dir, savedir))
-		os.system('mv %s*_mask.fits %s'%(img_dir, savedir))
-		os.system('mv ./*_sci1.fits %s'%(savedir))
-
-		## clean up files generated in img drizzle
-		os.system('mv %s*.cat %s'%(img_dir, savedir))
-		os.system('mv %s*_staticMask.fits %s'%(img_dir, savedir))
-		os.system('mv %s*_sci* %s'%(img_dir, savedir))
-		os.system('mv %s*_mask* %s'%(img_dir, savedir))
-		os.system('mv ./*_sci2.fits %s'%(savedir))
-		os.system('mv ./*skymatch_mask* %s'%(savedir))
-		os.system('mv ./*hlet_mask* %s'%(savedir))
-		os.system('mv %s*_wht.fits %s'%(img_dir, savedir))
-		os.system('mv %s*_med.fits %s'%(img_dir, savedir))
-		os.system('mv %s*_blt.fits %s'%(img_dir, savedir))
-		os.system('mv %s*_hlet.fits %s'%(img_dir, savedir))
-		os.system('mv %s*_d2im.fits %s'%(img_dir, savedir))
-		os.system('mv %s*_crclean.fits %s'%(img_dir, savedir))
-		os.system('mv %s*_crmask.fits %s'%(img_dir, savedir))
-		os.system('mv ./astrodrizzle.log %s'%(savedir))
-		os.system('mv ./headerlet.log %s'%(savedir))
-		os.system('mv ./tweakreg.log %s'%(savedir))
-		os.system('mv ./tiny.param %s'%(savedir))
+		tools.movefiles([img_dir+'*_drc*', img_dir+'*_drz*', img_dir+'*_drw*', img_dir+'*_mos*', # drizzled files
+			img_dir+'*_psf*', img_dir+'*.psf', img_dir+'*_topsf*', # generated, tweaked and drizzled PSF models
+			## other files generated in the process
+			img_dir+'*.cat', img_dir+'*_mask.fits', img_dir+'*_epsf*.pkl', './*_sci1.fits',
+			## files generated in img drizzle
+			img_dir+'*_staticMask.fits', img_dir+'*_sci*', img_dir+'*_mask*', './*_sci2.fits', 
+			'./*skymatch_mask*', './*hlet_mask*', img_dir+'*_wht.fits', img_dir+'*_med.fits', 
+			img_dir+'*_blt.fits', img_dir+'*_hlet.fits', img_dir+'*_d2im.fits', img_dir+'*_crclean.fits', 
+			img_dir+'*_crmask.fits', './astrodrizzle.log', './headerlet.log', './tweakreg.log'], savedir)
 		# electing not to include more files in case of similar names
 		# or in cases where the files will be input-specific
 
@@ -580,10 +989,7 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 		if not os.path.exists(savedir):
 			os.makedirs(savedir)
 
-		os.system('mv %s*_drz* %s'%(img_dir, savedir)) #move files to preserve
-		os.system('mv %s*_drc* %s'%(img_dir, savedir))
-		os.system('mv %s*_drw* %s'%(img_dir, savedir))
-		os.system('mv %s*_mos* %s'%(img_dir, savedir))
+		tools.movefiles([img_dir+'*_drz*', img_dir+'*_drc*', img_dir+'*_drw*', img_dir+'*_mos*'], savedir) #move files to preserve
 
 		if verbose:
 			print('Moved drizzled files to %s'%savedir)
@@ -593,36 +999,13 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 			warnings.warn('%s already exists. This directory and its contents will be deleted.'%(removedir),
 				Warning, stacklevel = 2)
 
-		if not os.path.exists(removedir): #directory to remove excess files
-			os.makedirs(removedir)
-
-		os.system('mv %s*_psf* %s'%(img_dir, removedir)) # generated PSF models
-		os.system('mv %s*.psf %s'%(img_dir, removedir))
-		os.system('mv %s*_topsf* %s'%(img_dir, removedir))
-
-		## clean up other files generated in the process
-		os.system('mv %s*.cat %s'%(img_dir, removedir))
-		os.system('mv %s*_mask.fits %s'%(img_dir, removedir))
-		os.system('mv %s*sci1.fits %s'%(img_dir, removedir))
-
-		## clean up files generated in img drizzle
-		os.system('mv %s*.cat %s'%(img_dir, removedir))
-		os.system('mv %s*_staticMask.fits %s'%(img_dir, removedir))
-		os.system('mv %s*_sci* %s'%(img_dir, removedir))
-		os.system('mv %s*sci2.fits %s'%(img_dir, removedir))
-		os.system('mv %s*_wht.fits %s'%(img_dir, removedir))
-		os.system('mv %s*_med.fits %s'%(img_dir, removedir))
-		os.system('mv %s*_blt.fits %s'%(img_dir, removedir))
-		os.system('mv %s*_crclean.fits %s'%(img_dir, removedir))
-		os.system('mv %s*_crmask.fits %s'%(img_dir, removedir))
-		os.system('mv ./*skymatch_mask* %s'%removedir)
-		os.system('mv ./astrodrizzle.log %s'%(removedir))
-		os.system('mv ./tweakreg.log %s'%(removedir))
-		os.system('mv ./tiny.param %s'%(removedir))
-		# electing not to include more files in case of similar names
-		# or in cases where the files will be input-specific
-
-		os.system('rm -r %s'%(removedir))
+		tools.removefiles([img_dir+'*_psf*', img_dir+'*.psf', img_dir+'*_topsf*', # generated PSF models
+			## other files generated in the process
+			img_dir+'*.cat', img_dir+'*_mask.fits', img_dir+'*_epsf*.pkl', img_dir+'*sci1.fits',
+			## files generated in img drizzle
+			img_dir+'*_staticMask.fits', img_dir+'*_sci*', img_dir+'*sci2.fits', img_dir+'*_wht.fits', 
+			img_dir+'*_med.fits', img_dir+'*_blt.fits', img_dir+'*_crclean.fits', img_dir+'*_crmask.fits', 
+			'./*skymatch_mask*', './astrodrizzle.log', './tweakreg.log', removedir])
 
 		if verbose:
 			print('Deleted intermediate products and removedir.')
@@ -677,6 +1060,12 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 				if savedir.split('/')[-1] != '':
 					savedir += '/'
 
+				if returnpsf == 'path':
+					if usename and isname:
+						returndict[do][dk] = savedir+'%s_%s_psf_%s.fits'%(namestring, dk, suff)
+					if not usename or not isname:
+						returndict[do][dk] = savedir+'%s_%s_psf_%s.fits'%(coordstring, dk, suff)
+
 				if returnpsf == 'full':	
 					if usename and isname:
 						dr_psf = fits.open(savedir+'%s_%s_psf_%s.fits'%(namestring, dk, suff))
@@ -690,7 +1079,7 @@ def hst(img_dir, obj, img_type, inst, camera = None, method='TinyTim', usermetho
 					if not usename or not isname:
 						savename = savedir+'%s_%s_psf_%s.fits'%(coordstring, dk, suff)
 					crop = tools.cutout(img = savename, coords = tools.objloc(do), fov_pixel = cutout_fov, 
-						 			save = savecutout, clobber = clobber)
+						 			save = savecutout, clobber = clobber, compress = compress)
 					returndict[do][dk] = crop
 
 		return returndict
@@ -702,7 +1091,10 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 		keeporig = True, plot = False, verbose = False, parallel = False, out = 'fits',
 		returnpsf = 'full', cutout_fov = 151, savecutout = True, finalonly = False, 
 		removedir = 'toremove', clobber = False, usename = False, shortcoord_style = {'style':'hmsdms', 'sep':':'},
-		tweakparams = {}, drizzleparams = {'allowed_memory':0.5}, usest = True, **kwargs):
+		tweakparams = {}, drizzleparams = {'allowed_memory':0.5}, usest = True, indexfile = None, 
+		nworkers = None, backend = 'process', manifest = None, 
+		chunksize = 1000, resultsfile = None, catalogcols = None, dryrun = False, stamps = False, compress = None, window = None, 
+		multitarget = False, filterepsf = None, **kwargs):
 	"""
 	Generate drizzled James Webb Space Telescope PSFs.
 
@@ -710,6 +1102,8 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 		img_dir (str): Path to directory containing calibrated files for which model PSF will be generated.
 				If using the tweakreg step, best to include a drizzled file, as well, which can be used as a reference.
 		obj(str, arr-like): Name or coordinates of object of interest in HH:MM:DD DD:MM:SS or degree format.
+			May also be a target catalog -- an astropy table or path to a FITS, CSV, or ECSV table -- which is processed
+			in chunks (see chunksize).
 		img_type (str): e.g, 'cal', 'calints', 'crf', 'crfints' -- specifies which file-type to include.
 		inst (str): 'MIRI', 'NIRCAM', 'NIRISS'
 		camera (str): 'Imaging', 'AMI' -- MUST BE SPECIFIED FOR NIRISS
@@ -732,15 +1126,17 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 		plot (bool): If True, saves .pngs of the model PSFs. (Not affected by clobber; 
 			images with the same name are overwritten by default.)
 		verbose (bool): If True, prints progress messages.
-		parallel (bool): If True, runs PSF generation in parallel.
+		parallel (bool): If True, runs alignment, PSF generation (per exposure and object), and drizzling/resampling 
+			in parallel, with each filter moving on to the next stage as soon as its own inputs are ready. (If False, 
+			the same stages run one after another.)
 		out (str): 'fits' or 'asdf'. Output for the drizzled PSF. If 'asdf', .asdf AND .fits are saved.
-		returnpsf (str): 'full', 'crop', or None. If None, spike.psf.jwst does not return anything. If 'full' (default),
+		returnpsf (str): 'full', 'crop', 'path', or None. If None, spike.psf.jwst does not return anything. If 'full' (default),
 			returns the PSF in the full spatial context of the processed image. If 'crop', returns the region immediately
-			around the PSF (size of cutout set by cutout_fov).
+			around the PSF (size of cutout set by cutout_fov). If 'path', returns the path to each drizzled/resampled PSF.
 		cutout_fov (int): Side length in pixels of square cutout region centered on PSF. Used if returnpsf = 'crop'.
 		savecutout (bool): If True, save a .fits file with the cutout region, including WCS. Only used if returnpsf = 'crop'.
 		finalonly (bool): If True, only retains final drizzled/resampled data products in savedir and deletes intermediate products.
-		removedir (str): Directory (**to be deleted**) that stores intermediate products for removal. Default is 'toremove'.
+		removedir (str): Directory (**to be deleted**, with its contents) if finalonly = True. Intermediate products are deleted directly. Default is 'toremove'.
 		clobber (bool): If True, will overwrite existing files with the duplicate names.
 			(Default state -- clobber = False -- is recommended.)
 		usename (bool): If True, use resolvable object name (from obj) if provided in generating output files. 
@@ -750,8 +1146,47 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 		tweakparams (dict): Dictionary of keyword arguments for the tweakreg step. See the JWST pipeline documentation
 				for a full list. See here: https://jwst-pipeline.readthedocs.io/en/latest/jwst/tweakreg/README.html#step-arguments
 		drizzleparams (dict): Dictionary of keyword arguments for the resample step. See the JWST pipeline documentation
-		 		for a full list.
+		 		for a full list. With spike.jwstcal (i.e., not the jwst pipeline), e.g. {'pixmap_cache':1024} caches up to 1024 MB of
+		 		pixel maps, so PSFs and images resampled onto the same frame share them; when parallel = True, they are shared 
+		 		between workers through img_dir/spike_pixmaps (deleted after the run; not if window or multitarget, whose output 
+		 		frames are per object), or 'pixmap_cache_dir' if given. 
+		 		Model PSFs are resampled with 'skip_variance':True by spike.jwstcal (no variance or error arrays), 
+		 		which can be overridden here.
 		usest (bool): If True, will import jwst pipeline if available rather than using spike.jwst.
+		indexfile (str): If specified, path to which the image index (filters, detectors, WCS; see spike.tools.imgindex) 
+			is saved, so that later runs on the same directory only re-read images that have changed.
+		nworkers (int): Number of workers in the pool used if parallel = True. Default is one fewer than the number of CPUs.
+		backend (str): 'process' or 'thread' -- type of worker pool used if parallel = True. One pool is created 
+			per run and shared by PSF generation, PSF drizzling/resampling, and image drizzling/resampling.
+		manifest (str): If specified, path to a run manifest (JSON; see spike.tools.loadmanifest) that records each 
+			alignment, model PSF, and drizzled/resampled product with a hash of its inputs (image checksums, position, 
+			filter, method, keyword arguments). If a run is restarted, tasks with current outputs are skipped.
+		chunksize (int): If obj is a catalog, number of targets processed at a time. Memory use scales with chunksize
+			rather than with the size of the catalog.
+		resultsfile (str): If obj is a catalog, path to the results table (CSV) that each chunk is appended to as it 
+			finishes. Targets already listed there (e.g., by an interrupted run) are skipped. Default is savedir/results.csv.
+		catalogcols (str or tuple): If obj is a catalog, the column of object names or (RA, Dec) columns of ICRS coordinates
+			(see spike.tools.readcatalog). If None, 'ra' and 'dec' columns are used if present and otherwise a 'name' column.
+		dryrun (bool): If True, only reads headers and WCS and returns a plan of the run (see spike.tools.planrun) -- the
+			model PSFs and drizzle/resample jobs that would result and estimates of the memory needed per stage. Runs 
+			whose estimated peak memory exceeds the available memory raise a MemoryError before any work is done.
+		stamps (bool): If True (and method is not 'USER'), model PSFs are saved as compact _topsf files holding only 
+			the PSF stamp and its position, which are expanded to full frames only for drizzle/resample (see 
+			spike.tools.rewrite_fits and spike.tools.expandstamp). Stamp files are kept in this form when moved to savedir,
+			so are read with spike.tools.expandstamp. If False (default), full-frame _topsf files are written.
+		compress (str): If specified, lossless tile compression ('GZIP_1' or 'GZIP_2') for model PSFs and cutouts. Compressed
+			model PSFs are decompressed to scratch only for drizzle/resample (see spike.tools.compimagehdu).
+		window (int): If specified, PSFs are drizzled/resampled only onto a square frame of cutout_fov + 2*window pixels
+			(at the native pixel scale) centered on each object rather than onto the full footprint of the inputs. 
+			Intended for use with returnpsf = 'crop'.
+		multitarget (bool): If True, the model PSFs of all objects in a filter are resampled in one pass over the exposures, 
+			each onto its own cutout_fov + 2*window pixel box (window = 0 if not specified) of one output grid, so that 
+			each exposure is read and its pixel map computed once rather than once per object. Requires spike.jwstcal 
+			(i.e., not the jwst pipeline); model PSFs are read as stored, without expanding stamps.
+		filterepsf (bool or dict): If True (method = 'epsf' only), one ePSF is built per filter from the stars of all of 
+			its images (extracted in parallel if parallel = True) and evaluated at each object's position on each image, 
+			rather than one ePSF being built per image (see spike.psfgen.filterepsf). May be a dict of keyword arguments 
+			for spike.psfgen.filterepsf, e.g., {'spatial':3} for an ePSF that varies across each detector.
 		**kwargs: Keyword arguments for PSF generation function.
 
 	Returns:
@@ -759,7 +1194,15 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 
 		If returnpsf = 'full', will return each of the full drizzled PSF images in an object, filter indexed dict.
 		If returnpsf = 'crop', will return a cutout region of the drizzled PSF images (around the PSF) in an obj, filt indexed dict.
+		If returnpsf = 'path', will return the path to each drizzled PSF image in an obj, filt indexed dict.
+
+		If obj is a catalog, returns the path to the results table, with columns 'obj', 'filter', 'psf' (path to the 
+		drizzled PSF), and, if returnpsf = 'crop', 'crop' (path to the saved cutout).
+
+		If dryrun = True, returns the plan of the run instead (for a catalog, totals and the largest memory estimates over chunks).
 	"""
+	if tools.iscatalog(obj): #stream targets through in chunks
+		return _runcatalog(jwst, dict(locals()))
 
 	os.environ['CRDS_SERVER_URL']="https://jwst-crds.stsci.edu"
 
@@ -778,13 +1221,20 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 		from spike.jwstcal import resample_step
 		from spike.jwstcal import tweakreg_tweakreg_step as tweakreg_step
 
+	psfdrizzleparams = drizzleparams
+	if resample_step.__name__.startswith('spike.'):
+		# model PSFs have zeroed ERR/VAR arrays (see tools.rewrite_fits), so there is nothing to resample there
+		psfdrizzleparams = dict({'skip_variance':True}, **drizzleparams)
+	if multitarget and not hasattr(resample_step.ResampleStep, 'process_targets'):
+		warnings.warn('multitarget requires spike.jwstcal; resampling each object separately.', Warning, stacklevel = 2)
+		multitarget = False
+
 	if img_dir[-1] != '/':
 		img_dir += '/' #force paths to work out
 
-	if keeporig and not pretweaked:
-		if not os.path.exists(img_dir+'_orig'):
-			os.makedirs(img_dir+'_orig')
-		os.system('cp -r '+img_dir+'*_'+img_type+'.fits '+'img_dir'+'_orig')
+	if keeporig and not pretweaked and not dryrun:
+		# copy (or reflink) rather than hard link, since images are updated in place
+		tools.copyfiles(img_dir+'*_'+img_type+'.fits', img_dir+'_orig')
 		if verbose:
 			print('Made copy of '+img_dir)
 
@@ -809,340 +1259,238 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 			genpsf = False
 		if type(usermethod) != str: #or function
 			psffunc = method
+	if method.upper() != 'USER': #written as compact stamps, expanded only for drizzle/resample
+		kwargs['stamp'] = stamps
+		if compress:
+			kwargs['compress'] = compress
+	if multitarget and window is None: #each object gets its own small box of the output grid
+		window = 0
+	windowsize = None if window is None else cutout_fov + 2*window #output frame side length, if windowed
+	if filterepsf and (method.upper() != 'EPSF'):
+		raise ValueError("filterepsf requires method = 'epsf'.")
+	keykwargs = dict(kwargs, filterepsf = filterepsf) if filterepsf else kwargs #model PSF inputs, as recorded in the manifest
+
+	# read headers and build WCS once, reused by every later stage
+	index = tools.imgindex(imgs, inst, camera, indexfile = indexfile, verbose = verbose)
+
+	# header and WCS work only, so a run that would run out of memory stops before it starts
+	plan = tools.planrun(index, obj, drizzleimgs = drizzleimgs, objonly = objonly, parallel = parallel, 
+		nworkers = nworkers, windowsize = windowsize, multitarget = multitarget, verbose = verbose and dryrun)
+	if dryrun:
+		return plan
+	if not plan['feasible']:
+		raise MemoryError('Estimated peak memory (%.2f GB) exceeds available memory (%.2f GB). Use fewer workers '
+			'(nworkers), parallel = False, or window; see dryrun = True for the estimate per stage.'%(
+			plan['peak_memory']/1e9, plan['available_memory']/1e9))
+
+	runlog = None
+	if manifest: #skip work already done by an earlier run
+		runlog = tools.loadmanifest(manifest)
 
 	filelist = {} # generate list of files to tweak -- by filter
 	for fi in imgs:
-		hdu = fits.open(fi)
-		try: #get filter
-			filt = hdu[0].header['FILTER']
-		except:
-			if str(hdu[0].header['FILTER1']).startswith('F'):
-				filt = hdu[0].header['FILTER1']
-			else:
-				filt = hdu[0].header['FILTER2']
+		filt = index[fi]['filter']
 		if filt not in filelist.keys():
 			filelist[filt] = []
 		filelist[filt].append(fi)
 
-	if not pretweaked:
-		for fk in filelist.keys():
-			filemodels = tweakreg_step.TweakRegStep().call(filelist[fk], 
-					output_dir = img_dir, save_results = True, **tweakparams)
+	tweakkeys = {} #models are keyed on the SCI data and WCS of each image (as for HST)
 
-		imgs = sorted(glob.glob(img_dir+'*_tweakregstep.fits'))
+	pixmapdir = None
+	if parallel and drizzleparams.get('pixmap_cache') and not drizzleparams.get('pixmap_cache_dir') and not windowsize:
+		# worker processes only share pixel maps through files, so keep them for the length of the run
+		# (under a fixed name, since the directory enters the manifest keys of the resamples); windowed 
+		# output frames are per object, so their maps are never shared between workers and are not written
+		pixmapdir = img_dir+'spike_pixmaps'
+		drizzleparams = dict(drizzleparams, pixmap_cache_dir = pixmapdir)
+		psfdrizzleparams = dict(psfdrizzleparams, pixmap_cache_dir = pixmapdir)
 
 	drizzlelist = {} #write file prefixes to drizzle per object per filter
-	imglist = {} #write file names to drizzle per object per filter
-	if genpsf: #generate model PSFs for each image + object
-		if type(obj) in [str, astropy.coordinates.sky_coordinate.SkyCoord]: #check number of objects
-			drizzlelist[obj] = {}
-			imglist[obj] = {}
-			skycoords = tools.objloc(obj)
-
-			if usename:
-				isname = False
-				namestring = None
-				if type(obj) == str:
-					for s in obj:
-						if s.isalpha():
-							isname = True
-							break
-				if isname:
-					namestring = obj.replace(':', '').replace(' ', '')
-
-			for i in imgs:
-				pos = tools.checkpixloc(skycoords, i, inst, camera)
-				coordstring = skycoords.ra.to_string(u.hour)
-				if skycoords.dec.deg >= 0:
-					coordstring += '+'+str(skycoords.dec)
-				if skycoords.dec.deg < 0:
-					coordstring += str(skycoords.dec)
-
-				if usename and isname:
-					modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-					modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-				if not usename or not isname:
-					modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-				if np.isfinite(pos[0]): #confirm object falls onto image
-					if pos[3] not in drizzlelist[obj].keys():
-						drizzlelist[obj][pos[3]] = []
-						imglist[obj][pos[3]] = []
-					drizzlelist[obj][pos[3]].append(modname)
-					imglist[obj][pos[3]].append(i)
-
-					psffunc(skycoords, i, imcam, pos, plot, verbose, clobber = clobber, **kwargs)
+	imglist = {}
+	if type(obj) in [str, astropy.coordinates.sky_coordinate.SkyCoord]:
+		objs = [obj]
+		skycoords = tools.objloc(obj)
+		coords = [skycoords]
+	if type(obj) not in [str, astropy.coordinates.sky_coordinate.SkyCoord]:
+		objs = list(obj)
+		skycoords = tools.resolvenames(objs)
+		coords = skycoords
+
+	objnames = {} #(isname, namestring, coordstring) per object
+	objcoords = {} #coordinates per object
+	for o, coord in zip(objs, coords):
+		drizzlelist[o] = {}
+		imglist[o] = {}
+		objnames[o] = _objnames(o, coord)
+		objcoords[o] = coord
 
-					if usename and isname:
-						# rename output from psffunc
-						os.system('mv %s %s'%(modout, modname)) 
-
-		if type(obj) not in [str, astropy.coordinates.sky_coordinate.SkyCoord]: #if multiple objects, option to parallelize 
-			skycoords = [] #only open each FITS file once
-
-			for o in obj:
-				drizzlelist[o] = {}
-				imglist[o] = {}
-				skycoords.append(tools.objloc(o))
-			
-			for i in imgs:
-
-				if parallel:
-					if method.upper() == 'PSFEX':
-						warnings.warn('Warning: Check your config and param files to ensure output files have unique names.', Warning, stacklevel = 2)
-					pool = Pool(processes=(cpu_count() - 1))
-					for j, coord in enumerate(skycoords):
-
-						pos = tools.checkpixloc(coord, i, inst, camera)
-
-						if usename:
-							isname = False
-							namestring = None
-							if type(obj[j]) == str:
-								for s in obj[j]:
-									if s.isalpha():
-										isname = True
-										break
-							if isname:
-								namestring = obj[j].replace(':', '').replace(' ', '')
-
-						coordstring = coord.ra.to_string(u.hour)
-						if coord.dec.deg >= 0:
-							coordstring += '+'+str(coord.dec)
-						if coord.dec.deg < 0:
-							coordstring += str(coord.dec)
-
-						if usename and isname:
-							modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-							modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if not usename or not isname:
-							modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if np.isfinite(pos[0]): #confirm that object falls onto detector
-							if pos[3] not in drizzlelist[obj[j]].keys():
-								drizzlelist[obj[j]][pos[3]] = []
-								imglist[obj[j]][pos[3]] = []
-							drizzlelist[obj[j]][pos[3]].append(modname)
-							imglist[obj[j]][pos[3]].append(i)
-
-							pool.apply_async(psffunc, args = (coord, i, imcam, pos, plot, verbose), 
-								kwds = dict(kwargs, clobber = clobber))
-
-							if usename and isname:
-								# this may not work in the multiprocessing case -- requires testing
-								# rename output from psffunc
-								os.system('mv %s %s'%(modout, modname)) 
-
-					pool.close()
-					pool.join()
-
-				if not parallel:
-					for j, coord in enumerate(skycoords):
-						pos = tools.checkpixloc(coord, i, inst, camera)
-
-						if usename:
-							isname = False
-							namestring = None
-							if type(obj[j]) == str:
-								for s in obj[j]:
-									if s.isalpha():
-										isname = True
-										break
-							if isname:
-								namestring = obj[j].replace(':', '').replace(' ', '')
-
-						coordstring = coord.ra.to_string(u.hour)
-						if coord.dec.deg >= 0:
-							coordstring += '+'+str(coord.dec)
-						if coord.dec.deg < 0:
-							coordstring += str(coord.dec)
-
-						if usename and isname:
-							modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-							modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if not usename or not isname:
-							modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if np.isfinite(pos[0]): #confirm that object falls onto detector
-							if pos[3] not in drizzlelist[obj[j]].keys():
-								drizzlelist[obj[j]][pos[3]] = []
-								imglist[obj[j]][pos[3]] = []
-							drizzlelist[obj[j]][pos[3]].append(modname)
-							imglist[obj[j]][pos[3]].append(i)
-
-							psffunc(coord, i, imcam, pos, plot, verbose, clobber = clobber, **kwargs)
-
-							if usename and isname:
-								# rename output from psffunc
-								os.system('mv %s %s'%(modout, modname)) 
-						
 	if not genpsf:
 		userpsfs = sorted(glob.glob(usermethod))
 
-		for up in userpsfs:
-			## JWST names in program_program2_exp_cal.fits form
-
-			im, im2, im3, imtype, obj, filt, _ = up.split('_')
-
-			img = img_dir+'%s_%s_%s_%s.fits'%(im, im2, im3, imtype)
-			coord = tools.objloc(obj.replace('-', ' -').replace('+', ' +')) #handle string coordinates
-			pos = tools.checkpixloc(coord)
-
-			psfmodel = fits.open(up)[1].data
-
-			tools.rewrite_fits(psfmodel, img, coord, imcam, pos, method = 'USER', clobber = clobber)
-
-			if usename:
-				isname = False
-				namestring = None
-				if type(obj) == str:
-					for s in obj:
-						if s.isalpha():
-							isname = True
-							break
-				if isname:
-					namestring = obj.replace(':', '').replace(' ', '')
-
-			coordstring = coord.ra.to_string(u.hour)
-			if coord.dec.deg >= 0:
-				coordstring += '+'+str(coord.dec)
-			if coord.dec.deg < 0:
-				coordstring += str(coord.dec)
-
-			if usename and isname:
-				modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-				modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-				os.system('mv %s %s'%(modout, modname)) 
-
-			if not usename or not isname:
-				modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-			if obj not in drizzlelist.keys():
-				drizzlelist[obj] = {}
-				imglist[obj] = {}
-			if filt not in drizzlelist[obj].keys():
-				drizzlelist[obj][filt] = []
-				imglist[obj][filt] = []
-			drizzlelist[obj][filt].append(modname)
-			imglist[obj][filt].append(img)
-
-	#####################################################################
-	for do in drizzlelist.keys():
-		isname = False
-		namestring = None
-		for s in do:
-			if s.isalpha():
-				isname = True
-				break
-		if isname:
-			namestring = do.replace(':', '').replace(' ', '')
-
-		if not isname:
-			shortdec, shortra = [cc.split('.')[0] for cc in do.split(' ')]
-		if isname:
-			do_coord = tools.objloc(do).to_string(**shortcoord_style)
-			shortdec, shortra = [cc.split('.')[0] for cc in do_coord.split(' ')]
-
-		if (':' not in shortra) and ('m' not in shortra):
-			shortdec, shortra = ['%.4f'%cc for cc in do_coord.split(' ')] #arcsec differentiation
-			if int(shortra) > 0:
-				shortra = "+"+shortra
-
-		if parallel:
-			pool = Pool(processes=(cpu_count() - 1))
-			for dk in drizzlelist[do].keys():
-
-				if usename and isname:
-					resampname = namestring+'_'+dk+'_img'
-				if not usename or not isname:
-					resampname = shortdec+shortra+'_'+dk
-					resampname = resampname.replace(':', '').replace(' ', '')
+	def locate(fk):
+		# runs once this filter is tweaked; queues its models, then the resamples that use them
+		fkimgs = filelist[fk]
+		if not pretweaked:
+			fkimgs = _tweakedname(filelist[fk], img_dir, img_type)
+		index.update(tools.imgindex(fkimgs, inst, camera, index = index, indexfile = indexfile))
+
+		models = {} #model tasks per object + filter
+		if genpsf:
+			modelkwargs = dict(kwargs, epsfmodel = _epsfname(fkimgs[0], fk)) if filterepsf else kwargs
+			for i in fkimgs:
+				allpos = tools.checkpixloc(coords, i, inst, camera, index = index) #all objects at once
+				batch = [] #objects on this image, modeled with one call
+				for j, o in enumerate(objs):
+					pos = allpos[j]
+					if not np.isfinite(pos[0]): #confirm that object falls onto detector
+						continue
+					isname, namestring, coordstring = objnames[o]
+
+					move = None
+					if usename and isname:
+						modout = _topsfname(i, coordstring, pos[3])
+						modname  = _topsfname(i, namestring, pos[3])
+						move = (modout, modname) # rename output from psffunc
 
-				resamp = resample_step.ResampleStep()
-				resampkwds = {**drizzleparams, 
-				  			  'input_models': drizzlelist[do][dk], 
-							  'output_file': resampname,
-							  'output_dir':img_dir, 
-							  'save_results':True}
-				pool.apply_async(resamp.call, kwds = resampkwds)
-			pool.close()
-			pool.join()
-		if not parallel:
-			for dk in drizzlelist[do].keys():
-				
+					if not usename or not isname:
+						modname = _topsfname(i, coordstring, pos[3])
+
+					if pos[3] not in drizzlelist[o].keys():
+						drizzlelist[o][pos[3]] = []
+						imglist[o][pos[3]] = []
+						models[(o, pos[3])] = []
+					drizzlelist[o][pos[3]].append(modname)
+					imglist[o][pos[3]].append(i)
+
+					done, modelkeys[modname], redo = _resume(runlog, 'model:'+modname, images = [i], pos = pos, method = method, kwargs = keykwargs)
+					if not done: #skip models made by an earlier run
+						batch.append((coords[j], pos, move, redo, 
+							partial(_record, runlog, 'model:'+modname, modelkeys[modname], [modname])))
+					models[(o, pos[3])].append(('model', i))
+				tasks[('model', i)] = _modeltask(psffunc, i, imcam, plot, verbose, modelkwargs, clobber, batch)
+
+			if filterepsf: #one ePSF for the filter, built once the stars of all of its images are extracted
+				needed = [('model', i) for i in fkimgs if tasks[('model', i)]['func']]
+				if needed:
+					epsftask = _epsftasks(tasks, fk, fkimgs, imcam, filterepsf, kwargs, verbose)
+					for m in needed:
+						tasks[m]['deps'] = [epsftask]
+
+		if not genpsf:
+			for up in userpsfs: #user-generated PSFs of this filter, rewritten as model PSFs in place
+				## JWST names in program_program2_exp_cal.fits form
+				im, im2, im3, imtype, o, filt, _ = up.split('_')
+				if filt != fk:
+					continue
+
+				img = img_dir+'%s_%s_%s_%s.fits'%(im, im2, im3, imtype)
+				coord = tools.objloc(o.replace('-', ' -').replace('+', ' +')) #handle string coordinates
+				pos = tools.checkpixloc(coord, img, inst, camera, index = index)
+
+				psfmodel = fits.open(up)[1].data
+
+				tools.rewrite_fits(psfmodel, coord, img, imcam, pos, method = 'USER', clobber = clobber)
+
+				if o not in objnames:
+					objnames[o] = _objnames(o, coord)
+					objcoords[o] = coord
+					drizzlelist[o] = {}
+					imglist[o] = {}
+				isname, namestring, coordstring = objnames[o]
+
+				modname = _topsfname(img, coordstring, pos[3])
 				if usename and isname:
-					resampname = namestring+'_'+dk+'_img'
-				if not usename or not isname:
-					resampname = shortdec+shortra+'_'+dk
-					resampname = resampname.replace(':', '').replace(' ', '')
-
-				resamp = resample_step.ResampleStep().call(drizzlelist[do][dk],
-					output_file = resampname, 
-					output_dir = img_dir, save_results = True, **drizzleparams)
-
-
-	
-	if drizzleimgs: # useful for processing all images + PSFs simultaneously
-		if not objonly:
-			for fk in filelist.keys():
-				resamp = resample_step.ResampleStep().call(filelist[fk],
-						output_file = '%s_img'%fk, output_dir = img_dir, save_results = True, **drizzleparams)
-		if objonly:
-			for do in imglist.keys():
-
-				isname = False
-				namestring = None
-				for s in do:
-					if s.isalpha():
-						isname = True
-						break
-				if isname:
-					namestring = do.replace(':', '').replace(' ', '')
-
-				if not isname:
-					shortdec, shortra = [cc.split('.')[0] for cc in do.split(' ')]
-				if isname:
-					do_coord = tools.objloc(do).to_string(**shortcoord_style)
-					shortdec, shortra = [cc.split('.')[0] for cc in do_coord.split(' ')]
-
-				if (':' not in shortra) and ('m' not in shortra):
-					shortdec, shortra = ['%.4f'%cc for cc in do_coord.split(' ')] #arcsec differentiation
-					if int(shortra) > 0:
-						shortra = "+"+shortra
-
-				if parallel:
-					pool = Pool(processes=(cpu_count() - 1))
-					for dk in imglist[do].keys():
-
-						if usename and isname:
-							resampname = namestring+'_'+dk+'_img'
-						if not usename or not isname:
-							resampname = shortdec+shortra+'_'+dk
-							resampname = resampname.replace(':', '').replace(' ', '')
-
-						resamp = resample_step.ResampleStep()
-						resampkwds = {**drizzleparams,
-									'input_models': imglist[do][dk], 
-									'output_file': resampname,
-									'output_dir':img_dir, 
-									'save_results':True}
-						pool.apply_async(resamp.call, kwds = resampkwds)
-					pool.close()
-					pool.join()
-				if not parallel:
-					for dk in imglist[do].keys():
-						if usename and isname:
-							resampname = namestring+'_'+dk+'_img'
-						if not usename or not isname:
-							resampname = shortdec+shortra+'_'+dk
-							resampname = resampname.replace(':', '').replace(' ', '')
-
-						resamp = resample_step.ResampleStep().call(imglist[do][dk],
-							output_file = resampname, 
-							output_dir = img_dir, save_results = True, **drizzleparams)
+					tools.renamefile(modname, _topsfname(img, namestring, pos[3]))
+					modname = _topsfname(img, namestring, pos[3])
+
+				if filt not in drizzlelist[o].keys():
+					drizzlelist[o][filt] = []
+					imglist[o][filt] = []
+					models[(o, filt)] = []
+				drizzlelist[o][filt].append(modname)
+				imglist[o][filt].append(img)
+				_, modelkeys[modname], _ = _resume(runlog, 'model:'+modname, [modname])
+
+		multi = {} #filter-indexed (targets, deps, records) resampled together if multitarget
+		for o, dk in models.keys():
+			resampname = _resampname(o, dk, usename, shortcoord_style)
+
+			resampout = img_dir+resampname+'_resamplestep.fits'
+			psfparams = dict(psfdrizzleparams, **_windowparams(objcoords[o], windowsize, 'resample'))
+			done, key, _ = _resume(runlog, 'resample:'+resampout, 
+				models = [modelkeys[m] for m in drizzlelist[o][dk]], params = psfparams)
+			if multitarget:
+				targets, deps, records = multi.setdefault(dk, ({}, [], []))
+				if not done:
+					targets[resampname] = (objcoords[o].ra.deg, objcoords[o].dec.deg, 
+						list(zip(imglist[o][dk], drizzlelist[o][dk])))
+					deps.extend(models[(o, dk)])
+					records.append(partial(_record, runlog, 'resample:'+resampout, key, [resampout]))
+			else:
+				tasks[('resample', o, dk)] = {'func':_runstage, 'deps':models[(o, dk)], 
+					'args':(_fromstamps, (resample_step.ResampleStep().call,), {**psfparams, 
+						'input_models': drizzlelist[o][dk], 'output_file': resampname, 
+						'output_dir':img_dir, 'save_results':True}), 
+					'callback':partial(_record, runlog, 'resample:'+resampout, key, [resampout])}
+				if done:
+					tasks[('resample', o, dk)]['func'] = None
+
+			if drizzleimgs and objonly:
+				imgout = img_dir+resampname+'_img_resamplestep.fits' #kept apart from the PSF
+				done, key, _ = _resume(runlog, 'imgresample:'+imgout, imglist[o][dk], params = drizzleparams)
+				tasks[('imgresample', o, dk)] = {'func':_runstage, 
+					'args':(resample_step.ResampleStep().call, (), {**drizzleparams, 
+						'input_models': imglist[o][dk], 'output_file': resampname+'_img', 
+						'output_dir':img_dir, 'save_results':True}), 
+					'callback':partial(_record, runlog, 'imgresample:'+imgout, key, [imgout])}
+				if done:
+					tasks[('imgresample', o, dk)]['func'] = None
+
+		for dk, (targets, deps, records) in multi.items(): #all objects in one pass over the exposures
+			tasks[('resample', dk)] = {'func':_resampletargets, 'deps':deps, 
+				'args':(resample_step.ResampleStep, psfdrizzleparams, targets, windowsize, img_dir), 
+				'callback':partial(_callall, records)}
+			if not targets:
+				tasks[('resample', dk)]['func'] = None
+
+		if drizzleimgs and not objonly:
+			resampout = img_dir+'%s_img_resamplestep.fits'%fk
+			done, key, _ = _resume(runlog, 'imgresample:'+resampout, filelist[fk], params = drizzleparams)
+			tasks[('imgresample', fk)] = {'func':_runstage, 
+				'args':(resample_step.ResampleStep().call, (), {**drizzleparams, 
+					'input_models': filelist[fk], 'output_file': '%s_img'%fk, 
+					'output_dir':img_dir, 'save_results':True}), 
+				'callback':partial(_record, runlog, 'imgresample:'+resampout, key, [resampout])}
+			if done:
+				tasks[('imgresample', fk)]['func'] = None
+
+	# tweak -> model -> resample run per filter as soon as each is ready, on the pool if parallel and in turn otherwise
+	tasks = {}
+	modelkeys = {} #input hashes, used to key the resamples that depend on each model
+	prevtweak = [] #TweakRegStep writes catalogs and logs to shared locations, so filters are tweaked in turn
+	for fk in filelist.keys():
+		deps = []
+		if not pretweaked:
+			done, tweakkeys[fk], _ = _resume(runlog, 'tweak:'+fk, filelist[fk], params = tweakparams)
+			tasks[('tweak', fk)] = {'func':_runstage, 'args':(tweakreg_step.TweakRegStep().call, (filelist[fk],), 
+				{'output_dir':img_dir, 'save_results':True, **tweakparams}), 'deps':prevtweak, 
+				'callback':partial(_record, runlog, 'tweak:'+fk, tweakkeys[fk], _tweakedname(filelist[fk], img_dir, img_type))}
+			if done:
+				tasks[('tweak', fk)]['func'] = None
+			deps = [('tweak', fk)]
+			prevtweak = deps
+		tasks[('locate', fk)] = {'func':locate, 'args':(fk,), 'deps':deps, 'local':True}
+
+	pool = _makepool(nworkers, backend if parallel else 'serial') #one pool for all stages
+	try:
+		_rundag(pool, tasks)
+	finally: #stop any workers still writing files if a task fails, and keep a record of finished work
+		pool.terminate()
+		pool.join()
+		if pixmapdir:
+			tools.removefiles([pixmapdir])
+		if runlog:
+			tools.savemanifest(runlog)
 
 	#####################################################################
 	suff = "resamplestep"
@@ -1152,16 +1500,11 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 		# should grab all .pngs, .fits etc.
 		if not os.path.exists(savedir):
 			os.makedirs(savedir)
-		os.system('mv %s*_%s* %s'%(img_dir, suff, savedir)) # generated PSF models
-		os.system('mv %s*_psf %s'%(img_dir, savedir))
-		os.system('mv %s*.psf %s'%(img_dir, savedir))
-		os.system('mv %s*_topsf* %s'%(img_dir, savedir)) # tweaked and drizzled PSF models
-
-		## clean up other files generated in the process
-		os.system('mv %s*.cat %s'%(img_dir, savedir))
-		os.system('mv %s*_mask.fits %s'%(img_dir, savedir))
-		# retain tweaked version in working directory for re-runs etc.
-		# os.system('mv %s*_tweakregstep.fits %s'%(img_dir, savedir))
+		tools.movefiles([img_dir+'*_%s*'%suff, img_dir+'*_psf', img_dir+'*.psf', # generated PSF models
+			img_dir+'*_topsf*', # tweaked and drizzled PSF models
+			## other files generated in the process
+			img_dir+'*.cat', img_dir+'*_mask.fits', img_dir+'*_epsf*.pkl'], savedir)
+		# retain tweaked version (*_tweakregstep.fits) in working directory for re-runs etc.
 
 		if verbose:
 			print('Moved PSF files to %s'%savedir)
@@ -1171,8 +1514,8 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 		if not os.path.exists(savedir):
 			os.makedirs(savedir)
 
-		os.system('mv %s*_resamplestep* %s'%(img_dir, savedir)) #move files to preserve
-		os.system('mv %s*_%s* %s'%(img_dir, suff, savedir)) # generic name for flexibility
+		tools.movefiles([img_dir+'*_resamplestep*', # files to preserve
+			img_dir+'*_%s*'%suff], savedir) # generic name for flexibility
 
 		if verbose:
 			print('Moved resampled files to %s'%savedir)
@@ -1183,18 +1526,9 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 			warnings.warn('%s already exists. This directory and its contents will be deleted.'%(removedir),
 				Warning, stacklevel = 2)
 
-		if not os.path.exists(removedir): #directory to remove excess files
-			os.makedirs(removedir)
-
-		os.system('mv %s*_psf %s'%(img_dir, removedir))
-		os.system('mv %s*.psf %s'%(img_dir, removedir))
-		os.system('mv %s*_topsf* %s'%(img_dir, removedir))
-
-		## clean up other files generated in the process
-		os.system('mv %s*.cat %s'%(img_dir, removedir))
-		os.system('mv %s*_mask.fits %s'%(img_dir, removedir))
-
-		os.system('rm -r %s'%(removedir))
+		tools.removefiles([img_dir+'*_psf', img_dir+'*.psf', img_dir+'*_topsf*', 
+			## other files generated in the process
+			img_dir+'*.cat', img_dir+'*_mask.fits', img_dir+'*_epsf*.pkl', removedir])
 
 		if verbose:
 			print('Deleted intermediate products and removedir.')
@@ -1249,6 +1583,9 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 				if savedir.split('/')[-1] != '':
 					savedir += '/'
 
+				if returnpsf == 'path':
+					returndict[do][dk] = savedir+'%s_%s.fits'%(resampname, suff)
+
 				if returnpsf == 'full':	
 					dr_psf = fits.open(savedir+'%s_%s.fits'%(resampname, suff))
 					returndict[do][dk] = dr_psf[1].data
@@ -1256,7 +1593,7 @@ def jwst(img_dir, obj, inst, img_type = 'cal', camera = None, method = 'WebbPSF'
 				if returnpsf == 'crop':
 					crop = tools.cutout(img = savedir+'%s_%s.fits'%(resampname, suff), 
 						 			coords = tools.objloc(do), fov_pixel = cutout_fov, save = savecutout, 
-									clobber = clobber)
+									clobber = clobber, compress = compress)
 					returndict[do][dk] = crop
 
 		return returndict
@@ -1266,7 +1603,10 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 		usecrds = False, keeporig = True, plot = False, verbose = False, parallel = False, out = 'fits', 
 		returnpsf = 'full', cutout_fov = 151, savecutout = True, finalonly = False, removedir = 'toremove', 
 		clobber = False, usename = False, shortcoord_style = {'style':'hmsdms', 'sep':':'}, tweakparams = {},
-		drizzleparams = {}, usest = True, **kwargs):
+		drizzleparams = {}, usest = True, indexfile = None, 
+		nworkers = None, backend = 'process', manifest = None, 
+		chunksize = 1000, resultsfile = None, catalogcols = None, dryrun = False, stamps = False, compress = None, window = None, 
+		filterepsf = None, **kwargs):
 	"""
 	Generate drizzled Roman Space Telescope PSFs.
 
@@ -1274,6 +1614,8 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 		img_dir (str): Path to directory containing calibrated files for which model PSF will be generated.
 				If using the tweakreg step, best to include a drizzled file, as well, which can be used as a reference.
 		obj(str, arr-like): Name or coordinates of object of interest in HH:MM:DD DD:MM:SS or degree format.
+			May also be a target catalog -- an astropy table or path to a FITS, CSV, or ECSV table -- which is processed
+			in chunks (see chunksize).
 		img_type (str): e.g, 'cal' -- specifies which file-type to include.
 		file_type (str): 'fits' or 'asdf' -- format to use for reading and manipulating data files.
 		inst (str): 'WFI', 'CGI'
@@ -1297,15 +1639,17 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 		plot (bool): If True, saves .pngs of the model PSFs. (Not affected by clobber; 
 			images with the same name are overwritten by default.)
 		verbose (bool): If True, prints progress messages.
-		parallel (bool): If True, runs PSF generation in parallel.
+		parallel (bool): If True, runs alignment, PSF generation (per exposure and object), and drizzling/resampling 
+			in parallel, with each filter moving on to the next stage as soon as its own inputs are ready. (If False, 
+			the same stages run one after another.)
 		out (str): 'fits' or 'asdf'. Output for the drizzled PSF. If 'asdf', .asdf AND .fits are saved.
-		returnpsf (str): 'full', 'crop', or None. If None, spike.psf.roman does not return anything. If 'full' (default),
+		returnpsf (str): 'full', 'crop', 'path', or None. If None, spike.psf.roman does not return anything. If 'full' (default),
 			returns the PSF in the full spatial context of the processed image. If 'crop', returns the region immediately
-			around the PSF (size of cutout set by cutout_fov).
+			around the PSF (size of cutout set by cutout_fov). If 'path', returns the path to each drizzled/resampled PSF.
 		cutout_fov (int): Side length in pixels of square cutout region centered on PSF. Used if returnpsf = 'crop'.
 		savecutout (bool): If True, save a .fits file with the cutout region, including WCS.
 		finalonly (bool): If True, only retains final drizzled/resampled data products in savedir and deletes intermediate products.
-		removedir (str): Directory (**to be deleted**) that stores intermediate products for removal. Default is 'toremove'.
+		removedir (str): Directory (**to be deleted**, with its contents) if finalonly = True. Intermediate products are deleted directly. Default is 'toremove'.
 		clobber (bool): If True, will overwrite existing files with the duplicate names.
 			(Default state -- clobber = False -- is recommended.)
 		usename (bool): If True, use resolvable object name (from obj) if provided in generating output files. 
@@ -1315,8 +1659,42 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 		tweakparams (dict): Dictionary of keyword arguments for the tweakreg step. See the Roman pipeline documentation
 				for a full list.
 		drizzleparams (dict): Dictionary of keyword arguments for resample step. See the Roman pipeline 
-				documentation for a full list.
+				documentation for a full list. With spike.romancal (i.e., not the romancal pipeline), e.g. {'pixmap_cache':1024} caches 
+				up to 1024 MB of pixel maps, so PSFs and images resampled onto the same frame share them; when 
+				parallel = True, they are shared between workers through img_dir/spike_pixmaps (deleted after the run; 
+				not if window is set, since output frames are then per object), or 'pixmap_cache_dir' if given. Model PSFs are resampled with 'skip_variance':True by spike.romancal 
+				(no variance or error arrays), which can be overridden here.
 		usest (bool): If True, will import romancal pipeline if available rather than using spike.romancal.
+		indexfile (str): If specified, path to which the image index (filters, detectors, WCS; see spike.tools.imgindex) 
+			is saved, so that later runs on the same directory only re-read images that have changed.
+		nworkers (int): Number of workers in the pool used if parallel = True. Default is one fewer than the number of CPUs.
+		backend (str): 'process' or 'thread' -- type of worker pool used if parallel = True. One pool is created 
+			per run and shared by PSF generation, PSF drizzling/resampling, and image drizzling/resampling.
+		manifest (str): If specified, path to a run manifest (JSON; see spike.tools.loadmanifest) that records each 
+			alignment, model PSF, and drizzled/resampled product with a hash of its inputs (image checksums, position, 
+			filter, method, keyword arguments). If a run is restarted, tasks with current outputs are skipped.
+		chunksize (int): If obj is a catalog, number of targets processed at a time. Memory use scales with chunksize
+			rather than with the size of the catalog.
+		resultsfile (str): If obj is a catalog, path to the results table (CSV) that each chunk is appended to as it 
+			finishes. Targets already listed there (e.g., by an interrupted run) are skipped. Default is savedir/results.csv.
+		catalogcols (str or tuple): If obj is a catalog, the column of object names or (RA, Dec) columns of ICRS coordinates
+			(see spike.tools.readcatalog). If None, 'ra' and 'dec' columns are used if present and otherwise a 'name' column.
+		dryrun (bool): If True, only reads headers and WCS and returns a plan of the run (see spike.tools.planrun) -- the
+			model PSFs and drizzle/resample jobs that would result and estimates of the memory needed per stage. Runs 
+			whose estimated peak memory exceeds the available memory raise a MemoryError before any work is done.
+		stamps (bool): If True (and method is not 'USER'), model PSFs are saved as compact _topsf files holding only 
+			the PSF stamp and its position, which are expanded to full frames only for drizzle/resample (see 
+			spike.tools.rewrite_fits and spike.tools.expandstamp). Stamp files are kept in this form when moved to savedir,
+			so are read with spike.tools.expandstamp. If False (default), full-frame _topsf files are written.
+		compress (str): If specified, lossless tile compression ('GZIP_1' or 'GZIP_2') for model PSFs and cutouts. Compressed
+			model PSFs are decompressed to scratch only for drizzle/resample (see spike.tools.compimagehdu).
+		window (int): If specified, PSFs are drizzled/resampled only onto a square frame of cutout_fov + 2*window pixels
+			(at the native pixel scale) centered on each object rather than onto the full footprint of the inputs. 
+			Intended for use with returnpsf = 'crop'.
+		filterepsf (bool or dict): If True (method = 'epsf' only), one ePSF is built per filter from the stars of all of 
+			its images (extracted in parallel if parallel = True) and evaluated at each object's position on each image, 
+			rather than one ePSF being built per image (see spike.psfgen.filterepsf). May be a dict of keyword arguments 
+			for spike.psfgen.filterepsf, e.g., {'spatial':3} for an ePSF that varies across each detector.
 		**kwargs: Keyword arguments for PSF generation function.
 
 	Returns:
@@ -1324,7 +1702,16 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 
 		If returnpsf = 'full', will return each of the full drizzled PSF images in an object, filter indexed dict.
 		If returnpsf = 'crop', will return a cutout region of the drizzled PSF images (around the PSF) in an obj, filt indexed dict.
+		If returnpsf = 'path', will return the path to each drizzled PSF image in an obj, filt indexed dict.
+
+		If obj is a catalog, returns the path to the results table, with columns 'obj', 'filter', 'psf' (path to the 
+		drizzled PSF), and, if returnpsf = 'crop', 'crop' (path to the saved cutout).
+
+		If dryrun = True, returns the plan of the run instead (for a catalog, totals and the largest memory estimates over chunks).
 	"""
+	if tools.iscatalog(obj): #stream targets through in chunks
+		return _runcatalog(roman, dict(locals()))
+
 	os.environ['CRDS_SERVER_URL']="https://roman-crds.stsci.edu"
 
 	if not usecrds:
@@ -1340,13 +1727,17 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 	if not usest:
 		from spike.romancal import tweakreg_step, resample_step
 
+	psfdrizzleparams = drizzleparams
+	if resample_step.__name__.startswith('spike.'):
+		# model PSFs have zeroed ERR/VAR arrays (see tools.rewrite_fits), so there is nothing to resample there
+		psfdrizzleparams = dict({'skip_variance':True}, **drizzleparams)
+
 	if img_dir[-1] != '/':
 		img_dir += '/' #force paths to work out
 
-	if keeporig and not pretweaked:
-		if not os.path.exists(img_dir+'_orig'):
-			os.makedirs(img_dir+'_orig')
-		os.system('cp -r '+img_dir+'*_'+img_type+'.fits '+'img_dir'+'_orig')
+	if keeporig and not pretweaked and not dryrun:
+		# copy (or reflink) rather than hard link, since images are updated in place
+		tools.copyfiles(img_dir+'*_'+img_type+'.fits', img_dir+'_orig')
 		if verbose:
 			print('Made copy of '+img_dir)
 
@@ -1369,340 +1760,222 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 			genpsf = False
 		if type(usermethod) != str: #or function
 			psffunc = method
+	if method.upper() != 'USER': #written as compact stamps, expanded only for drizzle/resample
+		kwargs['stamp'] = stamps
+		if compress:
+			kwargs['compress'] = compress
+	windowsize = None if window is None else cutout_fov + 2*window #output frame side length, if windowed
+	if filterepsf and (method.upper() != 'EPSF'):
+		raise ValueError("filterepsf requires method = 'epsf'.")
+	keykwargs = dict(kwargs, filterepsf = filterepsf) if filterepsf else kwargs #model PSF inputs, as recorded in the manifest
+
+	# read headers and build WCS once, reused by every later stage
+	index = tools.imgindex(imgs, inst, camera, indexfile = indexfile, verbose = verbose)
+
+	# header and WCS work only, so a run that would run out of memory stops before it starts
+	plan = tools.planrun(index, obj, drizzleimgs = drizzleimgs, objonly = objonly, parallel = parallel, 
+		nworkers = nworkers, windowsize = windowsize, verbose = verbose and dryrun)
+	if dryrun:
+		return plan
+	if not plan['feasible']:
+		raise MemoryError('Estimated peak memory (%.2f GB) exceeds available memory (%.2f GB). Use fewer workers '
+			'(nworkers), parallel = False, or window; see dryrun = True for the estimate per stage.'%(
+			plan['peak_memory']/1e9, plan['available_memory']/1e9))
+
+	runlog = None
+	if manifest: #skip work already done by an earlier run
+		runlog = tools.loadmanifest(manifest)
 
 	filelist = {} # generate list of files to tweak -- by filter
 	for fi in imgs:
-		hdu = fits.open(fi)
-		try: #get filter
-			filt = hdu[0].header['FILTER']
-		except:
-			if str(hdu[0].header['FILTER1']).startswith('F'):
-				filt = hdu[0].header['FILTER1']
-			else:
-				filt = hdu[0].header['FILTER2']
+		filt = index[fi]['filter']
 		if filt not in filelist.keys():
 			filelist[filt] = []
 		filelist[filt].append(fi)
 
-	if not pretweaked:
-		for fk in filelist.keys():
-			filemodels = tweakreg_step.TweakRegStep().call(filelist[fk], 
-					output_dir = img_dir, save_results = True, **tweakparams)
+	tweakkeys = {} #models are keyed on the SCI data and WCS of each image (as for HST)
 
-		imgs = sorted(glob.glob(img_dir+'*_tweakregstep.fits'))
+	pixmapdir = None
+	if parallel and drizzleparams.get('pixmap_cache') and not drizzleparams.get('pixmap_cache_dir') and not windowsize:
+		# worker processes only share pixel maps through files, so keep them for the length of the run
+		# (under a fixed name, since the directory enters the manifest keys of the resamples); windowed 
+		# output frames are per object, so their maps are never shared between workers and are not written
+		pixmapdir = img_dir+'spike_pixmaps'
+		drizzleparams = dict(drizzleparams, pixmap_cache_dir = pixmapdir)
+		psfdrizzleparams = dict(psfdrizzleparams, pixmap_cache_dir = pixmapdir)
 
 	drizzlelist = {} #write file prefixes to drizzle per object per filter
-	imglist = {}
-	if genpsf: #generate model PSFs for each image + object
-		if type(obj) in [str, astropy.coordinates.sky_coordinate.SkyCoord]: #check number of objects
-			drizzlelist[obj] = {}
-			imglist[obj] = {}
-			skycoords = tools.objloc(obj)
-
-			if usename:
-				isname = False
-				namestring = None
-				if type(obj) == str:
-					for s in obj:
-						if s.isalpha():
-							isname = True
-							break
-				if isname:
-					namestring = obj.replace(':', '').replace(' ', '')
-
-			for i in imgs:
-				pos = tools.checkpixloc(skycoords, i, inst, camera)
-				coordstring = skycoords.ra.to_string(u.hour)
-				if skycoords.dec.deg >= 0:
-					coordstring += '+'+str(skycoords.dec)
-				if skycoords.dec.deg < 0:
-					coordstring += str(skycoords.dec)
-
-				if usename and isname:
-					modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-					modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-				if not usename or not isname:
-					modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-				if np.isfinite(pos[0]): #confirm object falls onto image
-					if pos[3] not in drizzlelist[obj].keys():
-						drizzlelist[obj][pos[3]] = []
-						imglist[obj][pos[3]] = []
-					drizzlelist[obj][pos[3]].append(modname)
-					imglist[obj][pos[3]].append(i)
-
-					psffunc(skycoords, i, imcam, pos, plot, verbose, clobber = clobber, **kwargs)
+	imglist = {} #write file names to drizzle per object per filter
+	if type(obj) in [str, astropy.coordinates.sky_coordinate.SkyCoord]:
+		objs = [obj]
+		skycoords = tools.objloc(obj)
+		coords = [skycoords]
+	if type(obj) not in [str, astropy.coordinates.sky_coordinate.SkyCoord]:
+		objs = list(obj)
+		skycoords = tools.resolvenames(objs)
+		coords = skycoords
+
+	objnames = {} #(isname, namestring, coordstring) per object
+	objcoords = {} #coordinates per object
+	for o, coord in zip(objs, coords):
+		drizzlelist[o] = {}
+		imglist[o] = {}
+		objnames[o] = _objnames(o, coord)
+		objcoords[o] = coord
 
-					if usename and isname:
-						# rename output from psffunc
-						os.system('mv %s %s'%(modout, modname)) 
-
-		if type(obj) not in [str, astropy.coordinates.sky_coordinate.SkyCoord]: #if multiple objects, option to parallelize 
-			skycoords = [] #only open each FITS file once
-
-			for o in obj:
-				drizzlelist[o] = {}
-				imglist[o] = {}
-				skycoords.append(tools.objloc(o))
-			
-			for i in imgs:
-
-				if parallel:
-					if method.upper() == 'PSFEX':
-						warnings.warn('Warning: Check your config and param files to ensure output files have unique names.', Warning, stacklevel = 2)
-					pool = Pool(processes=(cpu_count() - 1))
-					for j, coord in enumerate(skycoords):
-
-						pos = tools.checkpixloc(coord, i, inst, camera)
-
-						if usename:
-							isname = False
-							namestring = None
-							if type(obj[j]) == str:
-								for s in obj[j]:
-									if s.isalpha():
-										isname = True
-										break
-							if isname:
-								namestring = obj[j].replace(':', '').replace(' ', '')
-
-						coordstring = coord.ra.to_string(u.hour)
-						if coord.dec.deg >= 0:
-							coordstring += '+'+str(coord.dec)
-						if coord.dec.deg < 0:
-							coordstring += str(coord.dec)
-
-						if usename and isname:
-							modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-							modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if not usename or not isname:
-							modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if np.isfinite(pos[0]): #confirm that object falls onto detector
-							if pos[3] not in drizzlelist[obj[j]].keys():
-								drizzlelist[obj[j]][pos[3]] = []
-								imglist[obj[j]][pos[3]] = []
-							drizzlelist[obj[j]][pos[3]].append(modname)
-							imglist[obj[j]][pos[3]].append(i)
-
-							pool.apply_async(psffunc, args = (coord, i, imcam, pos, plot, verbose), 
-								kwds = dict(kwargs, clobber = clobber))
-
-							if usename and isname:
-								# this may not work in the multiprocessing case -- requires testing
-								# rename output from psffunc
-								os.system('mv %s %s'%(modout, modname)) 
-
-					pool.close()
-					pool.join()
-
-				if not parallel:
-					for j, coord in enumerate(skycoords):
-						pos = tools.checkpixloc(coord, i, inst, camera)
-
-						if usename:
-							isname = False
-							namestring = None
-							if type(obj[j]) == str:
-								for s in obj[j]:
-									if s.isalpha():
-										isname = True
-										break
-							if isname:
-								namestring = obj[j].replace(':', '').replace(' ', '')
-
-						coordstring = coord.ra.to_string(u.hour)
-						if coord.dec.deg >= 0:
-							coordstring += '+'+str(coord.dec)
-						if coord.dec.deg < 0:
-							coordstring += str(coord.dec)
-
-						if usename and isname:
-							modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-							modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if not usename or not isname:
-							modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-						if np.isfinite(pos[0]): #confirm that object falls onto detector
-							if pos[3] not in drizzlelist[obj[j]].keys():
-								drizzlelist[obj[j]][pos[3]] = []
-								imglist[obj[j]][pos[3]] = []
-							drizzlelist[obj[j]][pos[3]].append(modname)
-							imglist[obj[j]][pos[3]].append(i)
-
-							psffunc(coord, i, imcam, pos, plot, verbose, clobber = clobber, **kwargs)
-
-							if usename and isname:
-								# rename output from psffunc
-								os.system('mv %s %s'%(modout, modname)) 
-					
 	if not genpsf:
 		userpsfs = sorted(glob.glob(usermethod))
 
-		for up in userpsfs:
-			## Roman names in dc2_filt_NNNNN_det.fits form
-			# based on simulations
-
-			im, imf, imn, imd, imtype, obj, filt, _ = up.split('_')
-
-			img = img_dir+'%s_%s_%s_%s_%s.fits'%(im, imf, imn, imd, imtype)
-			coord = tools.objloc(obj.replace('-', ' -').replace('+', ' +')) #handles string coordinates
-			pos = tools.checkpixloc(coord)
-
-			psfmodel = fits.open(up)[1].data
-
-			tools.rewrite_fits(psfmodel, img, coord, imcam, pos, method = 'USER', clobber = clobber)
-
-			if usename:
-				isname = False
-				namestring = None
-				if type(obj) == str:
-					for s in obj:
-						if s.isalpha():
-							isname = True
-							break
-				if isname:
-					namestring = obj.replace(':', '').replace(' ', '')
-
-			coordstring = coord.ra.to_string(u.hour)
-			if coord.dec.deg >= 0:
-				coordstring += '+'+str(coord.dec)
-			if coord.dec.deg < 0:
-				coordstring += str(coord.dec)
-
-			if usename and isname:
-				modout = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-				modname  = i.replace('%s.fits'%img_type, namestring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-				os.system('mv %s %s'%(modout, modname)) 
-
-			if not usename or not isname:
-				modname = i.replace('%s.fits'%img_type, coordstring+'_%s'%pos[3]+'_topsf_%s.fits'%img_type)
-
-			if obj not in drizzlelist.keys():
-				drizzlelist[obj] = {}
-				imglist[obj] = {}
-			if filt not in drizzlelist[obj].keys():
-				drizzlelist[obj][filt] = []
-				imglist[obj][filt] = []
-			drizzlelist[obj][filt].append(modname)
-			imglist[obj][filt].append(img)
-
-	#####################################################################
-	for do in drizzlelist.keys():
-		isname = False
-		namestring = None
-		for s in do:
-			if s.isalpha():
-				isname = True
-				break
-		if isname:
-			namestring = do.replace(':', '').replace(' ', '')
-
-		if not isname:
-			shortdec, shortra = [cc.split('.')[0] for cc in do.split(' ')]
-		if isname:
-			do_coord = tools.objloc(do).to_string(**shortcoord_style)
-			shortdec, shortra = [cc.split('.')[0] for cc in do_coord.split(' ')]
-
-		if (':' not in shortra) and ('m' not in shortra):
-			shortdec, shortra = ['%.4f'%cc for cc in do_coord.split(' ')] #arcsec differentiation
-			if int(shortra) > 0:
-				shortra = "+"+shortra
-
-		if parallel:
-			pool = Pool(processes=(cpu_count() - 1))
-			for dk in drizzlelist[do].keys():
-
-				if usename and isname:
-					resampname = namestring+'_'+dk+'_img'
-				if not usename or not isname:
-					resampname = shortdec+shortra+'_'+dk
-					resampname = resampname.replace(':', '').replace(' ', '')
-
-				resamp = resample_step.ResampleStep()
-				resampkwds = {**drizzleparams, 
-				  			  'input_models': drizzlelist[do][dk], 
-							  'output_file': resampname,
-							  'output_dir':img_dir, 
-							  'save_results':True}
-				pool.apply_async(resamp.call, kwds = resampkwds)
-			pool.close()
-			pool.join()
-		if not parallel:
-			for dk in drizzlelist[do].keys():
+	def locate(fk):
+		# runs once this filter is tweaked; queues its models, then the resamples that use them
+		fkimgs = filelist[fk]
+		if not pretweaked:
+			fkimgs = _tweakedname(filelist[fk], img_dir, img_type)
+		index.update(tools.imgindex(fkimgs, inst, camera, index = index, indexfile = indexfile))
+
+		models = {} #model tasks per object + filter
+		if genpsf:
+			modelkwargs = dict(kwargs, epsfmodel = _epsfname(fkimgs[0], fk)) if filterepsf else kwargs
+			for i in fkimgs:
+				allpos = tools.checkpixloc(coords, i, inst, camera, index = index) #all objects at once
+				batch = [] #objects on this image, modeled with one call
+				for j, o in enumerate(objs):
+					pos = allpos[j]
+					if not np.isfinite(pos[0]): #confirm that object falls onto detector
+						continue
+					isname, namestring, coordstring = objnames[o]
+
+					move = None
+					if usename and isname:
+						modout = _topsfname(i, coordstring, pos[3])
+						modname  = _topsfname(i, namestring, pos[3])
+						move = (modout, modname) # rename output from psffunc
 
+					if not usename or not isname:
+						modname = _topsfname(i, coordstring, pos[3])
+
+					if pos[3] not in drizzlelist[o].keys():
+						drizzlelist[o][pos[3]] = []
+						imglist[o][pos[3]] = []
+						models[(o, pos[3])] = []
+					drizzlelist[o][pos[3]].append(modname)
+					imglist[o][pos[3]].append(i)
+
+					done, modelkeys[modname], redo = _resume(runlog, 'model:'+modname, images = [i], pos = pos, method = method, kwargs = keykwargs)
+					if not done: #skip models made by an earlier run
+						batch.append((coords[j], pos, move, redo, 
+							partial(_record, runlog, 'model:'+modname, modelkeys[modname], [modname])))
+					models[(o, pos[3])].append(('model', i))
+				tasks[('model', i)] = _modeltask(psffunc, i, imcam, plot, verbose, modelkwargs, clobber, batch)
+
+			if filterepsf: #one ePSF for the filter, built once the stars of all of its images are extracted
+				needed = [('model', i) for i in fkimgs if tasks[('model', i)]['func']]
+				if needed:
+					epsftask = _epsftasks(tasks, fk, fkimgs, imcam, filterepsf, kwargs, verbose)
+					for m in needed:
+						tasks[m]['deps'] = [epsftask]
+
+		if not genpsf:
+			for up in userpsfs: #user-generated PSFs of this filter, rewritten as model PSFs in place
+				## Roman names in dc2_filt_NNNNN_det.fits form
+				# based on simulations
+				im, imf, imn, imd, imtype, o, filt, _ = up.split('_')
+				if filt != fk:
+					continue
+
+				img = img_dir+'%s_%s_%s_%s_%s.fits'%(im, imf, imn, imd, imtype)
+				coord = tools.objloc(o.replace('-', ' -').replace('+', ' +')) #handles string coordinates
+				pos = tools.checkpixloc(coord, img, inst, camera, index = index)
+
+				psfmodel = fits.open(up)[1].data
+
+				tools.rewrite_fits(psfmodel, coord, img, imcam, pos, method = 'USER', clobber = clobber)
+
+				if o not in objnames:
+					objnames[o] = _objnames(o, coord)
+					objcoords[o] = coord
+					drizzlelist[o] = {}
+					imglist[o] = {}
+				isname, namestring, coordstring = objnames[o]
+
+				modname = _topsfname(img, coordstring, pos[3])
 				if usename and isname:
-					resampname = namestring+'_'+dk+'_img'
-				if not usename or not isname:
-					resampname = shortdec+shortra+'_'+dk
-					resampname = resampname.replace(':', '').replace(' ', '')
-
-				resamp = resample_step.ResampleStep().call(drizzlelist[do][dk],
-					output_file = resampname, output_dir = img_dir, save_results = True, **drizzleparams)
-
-
-	
-	if drizzleimgs: # useful for processing all images + PSFs simultaneously
-		if not objonly:
-			for fk in filelist.keys():
-				resamp = resample_step.ResampleStep().call(filelist[fk],
-						output_file = '%s_img'%fk, output_dir = img_dir, save_results = True, **drizzleparams)
-		if objonly:
-			for do in imglist.keys():
-				isname = False
-				namestring = None
-				for s in do:
-					if s.isalpha():
-						isname = True
-						break
-				if isname:
-					namestring = do.replace(':', '').replace(' ', '')
+					tools.renamefile(modname, _topsfname(img, namestring, pos[3]))
+					modname = _topsfname(img, namestring, pos[3])
+
+				if filt not in drizzlelist[o].keys():
+					drizzlelist[o][filt] = []
+					imglist[o][filt] = []
+					models[(o, filt)] = []
+				drizzlelist[o][filt].append(modname)
+				imglist[o][filt].append(img)
+				_, modelkeys[modname], _ = _resume(runlog, 'model:'+modname, [modname])
+
+		for o, dk in models.keys():
+			resampname = _resampname(o, dk, usename, shortcoord_style)
+
+			resampout = img_dir+resampname+'_resamplestep.fits'
+			psfparams = dict(psfdrizzleparams, **_windowparams(objcoords[o], windowsize, 'resample'))
+			done, key, _ = _resume(runlog, 'resample:'+resampout, 
+				models = [modelkeys[m] for m in drizzlelist[o][dk]], params = psfparams)
+			tasks[('resample', o, dk)] = {'func':_runstage, 'deps':models[(o, dk)], 
+				'args':(_fromstamps, (resample_step.ResampleStep().call,), {**psfparams, 
+					'input_models': drizzlelist[o][dk], 'output_file': resampname, 
+					'output_dir':img_dir, 'save_results':True}), 
+				'callback':partial(_record, runlog, 'resample:'+resampout, key, [resampout])}
+			if done:
+				tasks[('resample', o, dk)]['func'] = None
+
+			if drizzleimgs and objonly:
+				imgout = img_dir+resampname+'_img_resamplestep.fits' #kept apart from the PSF
+				done, key, _ = _resume(runlog, 'imgresample:'+imgout, imglist[o][dk], params = drizzleparams)
+				tasks[('imgresample', o, dk)] = {'func':_runstage, 
+					'args':(resample_step.ResampleStep().call, (), {**drizzleparams, 
+						'input_models': imglist[o][dk], 'output_file': resampname+'_img', 
+						'output_dir':img_dir, 'save_results':True}), 
+					'callback':partial(_record, runlog, 'imgresample:'+imgout, key, [imgout])}
+				if done:
+					tasks[('imgresample', o, dk)]['func'] = None
+
+		if drizzleimgs and not objonly:
+			resampout = img_dir+'%s_img_resamplestep.fits'%fk
+			done, key, _ = _resume(runlog, 'imgresample:'+resampout, filelist[fk], params = drizzleparams)
+			tasks[('imgresample', fk)] = {'func':_runstage, 
+				'args':(resample_step.ResampleStep().call, (), {**drizzleparams, 
+					'input_models': filelist[fk], 'output_file': '%s_img'%fk, 
+					'output_dir':img_dir, 'save_results':True}), 
+				'callback':partial(_record, runlog, 'imgresample:'+resampout, key, [resampout])}
+			if done:
+				tasks[('imgresample', fk)]['func'] = None
+
+	# tweak -> model -> resample run per filter as soon as each is ready, on the pool if parallel and in turn otherwise
+	tasks = {}
+	modelkeys = {} #input hashes, used to key the resamples that depend on each model
+	prevtweak = [] #TweakRegStep writes catalogs and logs to shared locations, so filters are tweaked in turn
+	for fk in filelist.keys():
+		deps = []
+		if not pretweaked:
+			done, tweakkeys[fk], _ = _resume(runlog, 'tweak:'+fk, filelist[fk], params = tweakparams)
+			tasks[('tweak', fk)] = {'func':_runstage, 'args':(tweakreg_step.TweakRegStep().call, (filelist[fk],), 
+				{'output_dir':img_dir, 'save_results':True, **tweakparams}), 'deps':prevtweak, 
+				'callback':partial(_record, runlog, 'tweak:'+fk, tweakkeys[fk], _tweakedname(filelist[fk], img_dir, img_type))}
+			if done:
+				tasks[('tweak', fk)]['func'] = None
+			deps = [('tweak', fk)]
+			prevtweak = deps
+		tasks[('locate', fk)] = {'func':locate, 'args':(fk,), 'deps':deps, 'local':True}
+
+	pool = _makepool(nworkers, backend if parallel else 'serial') #one pool for all stages
+	try:
+		_rundag(pool, tasks)
+	finally: #stop any workers still writing files if a task fails, and keep a record of finished work
+		pool.terminate()
+		pool.join()
+		if pixmapdir:
+			tools.removefiles([pixmapdir])
+		if runlog:
+			tools.savemanifest(runlog)
 
-				if not isname:
-					shortdec, shortra = [cc.split('.')[0] for cc in do.split(' ')]
-				if isname:
-					do_coord = tools.objloc(do).to_string(**shortcoord_style)
-					shortdec, shortra = [cc.split('.')[0] for cc in do_coord.split(' ')]
-
-				if (':' not in shortra) and ('m' not in shortra):
-					shortdec, shortra = ['%.4f'%cc for cc in do_coord.split(' ')] #arcsec differentiation
-					if int(shortra) > 0:
-						shortra = "+"+shortra
-				
-				if parallel:
-					pool = Pool(processes=(cpu_count() - 1))
-					for dk in imglist[do].keys():
-
-						if usename and isname:
-							resampname = namestring+'_'+dk+'_img'
-						if not usename or not isname:
-							resampname = shortdec+shortra+'_'+dk
-							resampname = resampname.replace(':', '').replace(' ', '')
-
-						resamp = resample_step.ResampleStep()
-						resampkwds = {**drizzleparams,
-									'input_models': imglist[do][dk], 
-									'output_file': resampname,
-									'output_dir':img_dir, 
-									'save_results':True}
-						pool.apply_async(resamp.call, kwds = resampkwds)
-					pool.close()
-					pool.join()
-
-				if not parallel:
-					for dk in imglist[do].keys():
-
-						if usename and isname:
-							resampname = namestring+'_'+dk+'_img'
-						if not usename or not isname:
-							resampname = shortdec+shortra+'_'+dk
-							resampname = resampname.replace(':', '').replace(' ', '')
-
-						resamp = resample_step.ResampleStep().call(imglist[do][dk],
-							output_file = resampname, output_dir = img_dir, save_results = True, **drizzleparams)
 	#####################################################################
 	suff = "resamplestep"
 
@@ -1711,16 +1984,11 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 		# should grab all .pngs, .fits etc.
 		if not os.path.exists(savedir):
 			os.makedirs(savedir)
-		os.system('mv %s*_%s* %s'%(img_dir, suff, savedir)) # generated PSF models
-		os.system('mv %s*_psf %s'%(img_dir, savedir))
-		os.system('mv %s*.psf %s'%(img_dir, savedir))
-		os.system('mv %s*_topsf* %s'%(img_dir, savedir)) # tweaked and drizzled PSF models
-
-		## clean up other files generated in the process
-		os.system('mv %s*.cat %s'%(img_dir, savedir))
-		os.system('mv %s*_mask.fits %s'%(img_dir, savedir))
-		# retain tweaked version in working directory for re-runs etc.
-		# os.system('mv %s*_tweakregstep.fits %s'%(img_dir, savedir))
+		tools.movefiles([img_dir+'*_%s*'%suff, img_dir+'*_psf', img_dir+'*.psf', # generated PSF models
+			img_dir+'*_topsf*', # tweaked and drizzled PSF models
+			## other files generated in the process
+			img_dir+'*.cat', img_dir+'*_mask.fits', img_dir+'*_epsf*.pkl'], savedir)
+		# retain tweaked version (*_tweakregstep.fits) in working directory for re-runs etc.
 
 		if verbose:
 			print('Moved PSF files to %s'%savedir)
@@ -1730,8 +1998,8 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 		if not os.path.exists(savedir):
 			os.makedirs(savedir)
 
-		os.system('mv %s*_resamplestep* %s'%(img_dir, savedir)) #move files to preserve
-		os.system('mv %s*_%s* %s'%(img_dir, suff, savedir)) # generic name for flexibility
+		tools.movefiles([img_dir+'*_resamplestep*', # files to preserve
+			img_dir+'*_%s*'%suff], savedir) # generic name for flexibility
 
 		if verbose:
 			print('Moved resampled files to %s'%savedir)
@@ -1742,18 +2010,9 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 			warnings.warn('%s already exists. This directory and its contents will be deleted.'%(removedir),
 				Warning, stacklevel = 2)
 
-		if not os.path.exists(removedir): #directory to remove excess files
-			os.makedirs(removedir)
-
-		os.system('mv %s*_psf %s'%(img_dir, removedir))
-		os.system('mv %s*.psf %s'%(img_dir, removedir))
-		os.system('mv %s*_topsf* %s'%(img_dir, removedir))
-
-		## clean up other files generated in the process
-		os.system('mv %s*.cat %s'%(img_dir, removedir))
-		os.system('mv %s*_mask.fits %s'%(img_dir, removedir))
-
-		os.system('rm -r %s'%(removedir))
+		tools.removefiles([img_dir+'*_psf', img_dir+'*.psf', img_dir+'*_topsf*', 
+			## other files generated in the process
+			img_dir+'*.cat', img_dir+'*_mask.fits', img_dir+'*_epsf*.pkl', removedir])
 
 		if verbose:
 			print('Deleted intermediate products and removedir.')
@@ -1806,6 +2065,9 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 				if savedir.split('/')[-1] != '':
 					savedir += '/'
 
+				if returnpsf == 'path':
+					returndict[do][dk] = savedir+'%s_%s.fits'%(resampname, suff)
+
 				if returnpsf == 'full':	
 					dr_psf = fits.open(savedir+'%s_%s.fits'%(resampname, suff))
 					returndict[do][dk] = dr_psf[1].data
@@ -1813,7 +2075,7 @@ def roman(img_dir, obj, inst, img_type= 'cal', file_type = 'fits', camera = None
 				if returnpsf == 'crop':
 					crop = tools.cutout(img = savedir+'%s_%s.fits'%(resampname, suff), 
 						 			coords = tools.objloc(do), fov_pixel = cutout_fov, save = savecutout, 
-									clobber = clobber)
+									clobber = clobber, compress = compress)
 					returndict[do][dk] = crop
 
 		return returndict
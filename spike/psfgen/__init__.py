@@ -1 +1,2 @@
-from .psfgen import tinypsf, tinygillispsf, stdpsf, jwpsf, effpsf, psfex, acsepsf
\ No newline at end of file
+from .psfgen import tinypsf, tinygillispsf, stdpsf, jwpsf, effpsf, psfex, acsepsf
+from .psfgen import stdpsfs, jwpsfs, effpsfs, acsepsfs, batchpsf, evalgrid, epsfstars, filterepsf
\ No newline at end of file
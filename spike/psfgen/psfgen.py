@@ -5,13 +5,21 @@ from astropy.nddata import NDData
 from astropy.stats import sigma_clipped_stats
 from astropy.table import Table
 import astropy.units as u
+from collections import OrderedDict
+from functools import partial
 import glob
+import hashlib
+import importlib.util
+import json
 import matplotlib.pyplot as plt
+from multiprocessing import Pool
 import numpy as np
 import os
 from photutils.detection import DAOStarFinder, IRAFStarFinder
-from photutils.psf import extract_stars, EPSFBuilder, GriddedPSFModel
+from photutils.psf import extract_stars, EPSFBuilder, EPSFStars, GriddedPSFModel
+import pickle
 from spike import tools
+import shutil
 import subprocess
 import urllib
 import warnings
@@ -51,6 +59,27 @@ try:
 except:
 	TINY_PATH = None
 
+try: #where STDPSF grids are stored once downloaded
+	STDPSF_CACHE = os.environ['SPIKE_STDPSF_CACHE']
+except:
+	STDPSF_CACHE = os.path.join(os.path.expanduser('~'), '.spike', 'stdpsfs')
+
+STDPSF_NGRIDS = 8 #number of STDPSF grids kept in memory per process
+
+try: #where built ePSFs are stored, if set
+	EPSF_CACHE = os.environ['SPIKE_EPSFCACHE']
+except:
+	EPSF_CACHE = None
+
+EPSF_NMODELS = 16 #number of built ePSFs kept in memory per process
+
+try: #where WebbPSF/STPSF PSF grids are stored once computed
+	JWPSF_CACHE = os.environ['SPIKE_JWPSFCACHE']
+except:
+	JWPSF_CACHE = os.path.join(os.path.expanduser('~'), '.spike', 'psfgrids')
+
+JWPSF_NGRIDS = 8 #number of WebbPSF/STPSF grids kept in memory per process
+
 
 stdpsf_jwdet = {'NRCA1':1, 'NRCA2':2, 'NRCA3':3, 'NRCA4':4, 
 'NRCB1':5, 'NRCB2':6, 'NRCB3':7, 'NRCB7':8} #for STDPSFs
@@ -67,7 +96,7 @@ plate_scale = {'ACS/WFC':0.05, 'ACS/HRC':0.025 , 'WFC3/IR':0.13, 'WFC3/UVIS':0.0
 
 
 def tinypsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = True,
-	clobber = False, ebmv = None, av = None, wmag = None,
+	clobber = False, stamp = False, compress = None, ebmv = None, av = None, wmag = None,
 	jitter = None, major = None, minor = None, angle = None,
 	specchoice = 'blackbody', listchoice = 'G5V', temp = 6000., 
 	specalpha = 1., specbeta = 1., fov_arcsec = 6., despace = 0.):
@@ -92,6 +121,10 @@ def tinypsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = Tr
 			This is in addition to the 2D PSF model saved by TinyTim.
 		clobber (bool): If True, will overwrite existing files with the same name on save.
 			(Default state -- clobber = False -- is recommended.)
+		stamp (bool): If True (and writeto = True), only the PSF stamp and its position are saved in the _topsf
+			file (see spike.tools.rewrite_fits).
+		compress (str): If specified (and writeto = True), tile compression for the _topsf file, e.g., 'GZIP_2'
+			(see spike.tools.compimagehdu).
 		ebmv (float): Interstellar extinction, specified by reddening in mag. 
 			If specified, av should not be.
 		av (float): Interstellar extinction, specified by visual extinction in mag. 
@@ -185,12 +218,13 @@ def tinypsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = Tr
 	# modname = img.replace('.fits', '_'+coordstring+'_%s'%pos[3]+'_psf')
 	modname = img.replace('.fits', '_'+coordstring+'_%s'%pos[3]+'_psf')
 
+	rootname = 'psf' #short rootname in the scratch directory; outputs are renamed to modname
 	if imcam in ['ACS/WFC', 'WFC3/UVIS']:
 		command_list = [tinyparams['imcam'][imcam], pos[2], '%i %i'%(pos[0], pos[1]), 
-		pos[3], spec, specparam, fov_arcsec, despace, modname]
+		pos[3], spec, specparam, fov_arcsec, despace, rootname]
 	if imcam in ['ACS/HRC', 'WFC3/IR']:
 		command_list = [16, '%i %i'%(pos[0], pos[1]), pos[3], 
-		spec, specparam, fov_arcsec, despace, modname]
+		spec, specparam, fov_arcsec, despace, rootname]
 	if imcam in ['WFPC1', 'WFPC']:
 		if pos[2] <= 4:
 			imcam_ = 'WFPC/WFC'
@@ -199,15 +233,15 @@ def tinypsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = Tr
 		imfits = fits.open(img)
 		yyyy, mm, dd = imfits[0].header['DATE'].split('T')[0].split('-')
 		command_list = [tinyparams['imcam'][imcam_], pos[2], '%i %i'%(pos[0], pos[1]), 
-		'%i %i %i'%(dd, mm, yyyy), pos[3], spec, specparam, fov_arcsec, 'N', despace, modname]
+		'%i %i %i'%(dd, mm, yyyy), pos[3], spec, specparam, fov_arcsec, 'N', despace, rootname]
 	if (imcam == 'WFPC2') and (pos[2] == 1):
 		imcam_ = 'WFPC2/PC'
 		command_list = [tinyparams['imcam'][imcam_], '%i %i'%(pos[0], pos[1]), 
-		pos[3], spec, specparam, fov_arcsec, 'N', despace, modname]
+		pos[3], spec, specparam, fov_arcsec, 'N', despace, rootname]
 	if (imcam == 'WFPC2') and (pos[2] >= 2):
 		imcam_ = 'WFPC2/WFC'
 		command_list = [tinyparams['imcam'][imcam_], pos[2], '%i %i'%(pos[0], pos[1]), 
-		pos[3], spec, specparam, fov_arcsec, 'N', despace, modname]
+		pos[3], spec, specparam, fov_arcsec, 'N', despace, rootname]
 
 
 
@@ -216,20 +250,26 @@ def tinypsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = Tr
 
 	commandlist = [str(clt) for clt in command_list]
 
-	tiny = subprocess.Popen(tiny1, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-	newline = os.linesep
+	with tools.scratchdir() as scratch: #tiny.param and outputs are unique to this call, so calls can run concurrently
+		tiny = subprocess.Popen(tiny1, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=scratch)
+		newline = os.linesep
 
-	tiny.communicate(newline.join(commandlist).encode())
-
-	
-	os.system(TINY_PATH+'/tiny2 tiny.param')
-	if verbose:
-		print("Completed PSF modeling.")
+		tiny.communicate(newline.join(commandlist).encode())
 
-	if imcam in ['ACS/WFC', 'ACS/HRC', 'WFC3/UVIS', 'WFC3/IR']: 
-		os.system(TINY_PATH+'/tiny3 tiny.param')
+		subprocess.call(TINY_PATH+'/tiny2 tiny.param', shell=True, cwd=scratch)
 		if verbose:
-			print("Completed geometric distortion correction.")
+			print("Completed PSF modeling.")
+
+		if imcam in ['ACS/WFC', 'ACS/HRC', 'WFC3/UVIS', 'WFC3/IR']: 
+			subprocess.call(TINY_PATH+'/tiny3 tiny.param', shell=True, cwd=scratch)
+			if verbose:
+				print("Completed geometric distortion correction.")
+
+		for f in os.listdir(scratch): #keep outputs (and parameter file) under modname
+			if f.startswith(rootname):
+				tools.renamefile(os.path.join(scratch, f), modname+f[len(rootname):])
+			if f == 'tiny.param':
+				tools.renamefile(os.path.join(scratch, f), modname+'.param')
 
 	# deal with NICMOS and STIS -- will add later
 	# inclined to include NICMOS but not STIS
@@ -256,15 +296,56 @@ def tinypsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = Tr
 	if writeto:
 		if verbose:
 			print('Writing to %s.fits.'%modname.replace('_psf', '_topsf'))
-		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'TinyTim', clobber = clobber)
+		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'TinyTim', clobber = clobber, stamp = stamp, compress = compress)
 
 
 	return psfmodel
 
 
 
+_gillis = None #make_psf module and its source, loaded once per process
+
+def _gillismodule(keep = False, verbose = False):
+	"""
+	Load the Gillis et al. (2020) make_psf.py, from the working directory if present and otherwise by
+	downloading it to a temporary directory, so that concurrent calls do not share (or delete) one copy.
+
+	Parameters:
+		keep (bool): If True, also save make_psf.py to the working directory.
+		verbose (bool): If True, prints progress messages.
+
+	Returns:
+		make_psf module
+	"""
+	global _gillis
+
+	if _gillis is None:
+		with tools.scratchdir() as scratch:
+			gillispath = 'make_psf.py'
+			if not os.path.exists(gillispath):
+				# download Gillis et al. (2020) code; https://bitbucket.org/brgillis/tinytim_psfs/src/master/
+				rawurl = 'https://bitbucket.org/brgillis/tinytim_psfs/raw/55299ae1a9b3c299b7910a14622e88c0ffd9d8a1/make_psf.py'
+				gillispath = os.path.join(scratch, 'make_psf.py')
+				urllib.request.urlretrieve(rawurl, gillispath)
+				if verbose:
+					print('Retrieved make_psf.py')
+
+			spec = importlib.util.spec_from_file_location('make_psf', gillispath)
+			module = importlib.util.module_from_spec(spec)
+			spec.loader.exec_module(module)
+			with open(gillispath, 'rb') as file:
+				_gillis = (module, file.read())
+
+	module, source = _gillis
+	if keep and not os.path.exists('make_psf.py'):
+		with open('make_psf.py', 'wb') as file:
+			file.write(source)
+
+	return module
+
+
 def tinygillispsf(coords, img, imcam, pos, plot = False, verbose = False, keep = False, writeto = True, 
-	clobber = False, specchoice = 'blackbody', listchoice = 'G5V', temp = 6000., specalpha = 1., 
+	clobber = False, stamp = False, compress = None, specchoice = 'blackbody', listchoice = 'G5V', temp = 6000., specalpha = 1., 
 	specbeta = 1., fov_arcsec = 6., despace = 0., sample = 1., linearfit = False, regrid = True):
 	"""
 	Generate HST PSFs using TinyTim and the parameter changes laid out in Gillis et al. (2020), 
@@ -272,8 +353,8 @@ def tinygillispsf(coords, img, imcam, pos, plot = False, verbose = False, keep =
 	other than ACS or cameras other than WFC.
 	
 
-	Note that the Gillis et al. (2020) code will be downloaded to your working directory. If keep = False (default), 
-	it will be removed after use.
+	Note that the Gillis et al. (2020) code will be downloaded (once per process) unless make_psf.py is already 
+	in your working directory. If keep = True, it will be saved there.
 
 	Parameters:
 		coords (str or astropy skycoord object): Coordinates of object of interest.
@@ -290,6 +371,10 @@ def tinygillispsf(coords, img, imcam, pos, plot = False, verbose = False, keep =
 			This is in addition to the 2D PSF model saved by TinyTim.
 		clobber (bool): If True, will overwrite existing files with the same name on save.
 			(Default state -- clobber = False -- is recommended.)
+		stamp (bool): If True (and writeto = True), only the PSF stamp and its position are saved in the _topsf
+			file (see spike.tools.rewrite_fits).
+		compress (str): If specified (and writeto = True), tile compression for the _topsf file, e.g., 'GZIP_2'
+			(see spike.tools.compimagehdu).
 		specchoice (str): 'list', 'blackbody', 'plaw_nu', 'plaw_lam' -- if 'list', must also specify
 			listchoice; if 'blackbody', must also specify temp; if 'plaw_nu', must also specify specalpha;
 			and if 'plaw_lam', must also specify specbeta.
@@ -326,12 +411,7 @@ def tinygillispsf(coords, img, imcam, pos, plot = False, verbose = False, keep =
 		# in the working directory
 		warnings.warn('Tiny Tim is not in your path. Make sure that it is installed -- https://github.com/spacetelescope/tinytim/releases/tag/7.5 -- and your TINYTIM environment variable is set or select a different PSF generation mode.', Warning, stacklevel = 2)
 
-	if not os.path.exists('make_psf.py'):
-		# download Gillis et al. (2020) code; https://bitbucket.org/brgillis/tinytim_psfs/src/master/
-		rawurl = 'https://bitbucket.org/brgillis/tinytim_psfs/raw/55299ae1a9b3c299b7910a14622e88c0ffd9d8a1/make_psf.py'
-		urllib.request.urlretrieve(rawurl, 'make_psf.py')
-		if verbose:
-			print('Retrieved make_psf.py')
+	make_subsampled_model_psf = _gillismodule(keep, verbose).make_subsampled_model_psf
 
 
 	if specchoice == 'list':
@@ -351,8 +431,6 @@ def tinygillispsf(coords, img, imcam, pos, plot = False, verbose = False, keep =
 		specparam = specbeta
 
 	speccall = (spec, specparam)
-	
-	from make_psf import make_subsampled_model_psf
 
 	coordstring = coords.ra.to_string(u.hour)
 	if coords.dec.deg >= 0:
@@ -365,33 +443,28 @@ def tinygillispsf(coords, img, imcam, pos, plot = False, verbose = False, keep =
 	if verbose:
 		print('Generating model PSF')
 
-	make_subsampled_model_psf(modname+'.fits',
-		    psf_position=(pos[0], pos[1]),
-		    focus=despace,
-		    chip=pos[2],
-		    spec_type=speccall,
-		    detector=tinyparams['imcam'][imcam],
-		    filter_name=pos[3],
-		    psf_size=fov_arcsec,
-		    tinytim_path=TINY_PATH,
-		    subsampling_factor=sample,
-		    linear_fit=linearfit,
-		    clobber=True)
-
-
-	if os.path.exists('make_psf.py') and not keep:
-		os.remove('make_psf.py')
-		if verbose:
-			print('Removed make_psf.py')
-
-	try:
-		psfmodel = fits.open(modname+'.fits')[0].data
-	except:
-		if imcam not in  ['ACS/WFC', 'ACS/HRC']:
-			psfmodel = fits.open(modname+'00_psf.fits')[0].data
-
-		if imcam in ['ACS/WFC', 'ACS/HRC']:
-			psfmodel = fits.open(modname+'00.fits')[0].data
+	# make_psf names its TinyTim parameter files and intermediates after the output file, so writing to a 
+	# scratch directory keeps concurrent calls from overwriting each other (as in tinypsf)
+	with tools.scratchdir() as scratch:
+		make_subsampled_model_psf(os.path.join(scratch, 'psf.fits'),
+			    psf_position=(pos[0], pos[1]),
+			    focus=despace,
+			    chip=pos[2],
+			    spec_type=speccall,
+			    detector=tinyparams['imcam'][imcam],
+			    filter_name=pos[3],
+			    psf_size=fov_arcsec,
+			    tinytim_path=TINY_PATH,
+			    subsampling_factor=sample,
+			    linear_fit=linearfit,
+			    clobber=True)
+
+		for out in ['psf.fits', 'psf00_psf.fits', 'psf00.fits']: #output name depends on instrument/camera
+			if os.path.exists(os.path.join(scratch, out)):
+				tools.renamefile(os.path.join(scratch, out), modname+'.fits')
+				break
+
+	psfmodel = fits.open(modname+'.fits')[0].data
 
 
 	if regrid:
@@ -413,54 +486,24 @@ def tinygillispsf(coords, img, imcam, pos, plot = False, verbose = False, keep =
 	if writeto:
 		if verbose:
 			print('Writing to %s.fits.'%modname.replace('_psf', '_topsf'))
-		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'TinyTim (Gillis+ mod)', clobber = clobber)
+		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'TinyTim (Gillis+ mod)', clobber = clobber, stamp = stamp, compress = compress)
 
 	return psfmodel
 
 
-def stdpsf(coords, img, imcam, pos, plot = False, verbose = False, 
-	writeto = True, clobber = False, fov_arcsec = 6, norm = 1, regrid = True):
-	"""
-	Coordinate-specific PSFs from STDPSF model grids for HST, JWST.
+_stdpsfgrids = OrderedDict() #parsed STDPSF grids per (grid file, detector), least recently used first
 
-	Makes use of https://www.stsci.edu/~jayander/HST1PASS/LIB/PSFs/STDPSFs/ and 
-	https://www.stsci.edu/~jayander/JWST1PASS/LIB/PSFs/STDPSFs/.
+def _stdpsfurl(imcam, pos):
+	"""
+	Locate the STDPSF grid for an instrument/camera, detector, and filter.
 
 	Parameters:
-		coords (str or astropy skycoord object): Coordinates of object of interest.
-		img (str): Path to image for which PSF is generated.
-		imcam (str): Specification of instrument/camera used to capture the images (e.g., 'ACS/WFC', 'WFC3/IR', 'WFPC', 
-			'WFPC2', 'MIRI', 'NIRCAM', 'NIRISS/Imaging'). For 'WFPC' and 'WFPC2', the camera is selected by-chip and 
-			should not be specified here. If 'NIRISS' specified alone, assumes the imaging mode.
+		imcam (str): Specification of instrument/camera (see stdpsf).
 		pos (list): Location of object of interest (spatial and spectral).[X, Y, chip, filter]
-			If None, will find location based on coordinates and instrument/camera.
-		plot (bool): If True, saves .pngs of the model PSFs. (Not affected by clobber; 
-			images with the same name are overwritten by default.)
-		verbose (bool): If True, prints progress messages.
-		writeto (bool): If True, will write 2D model PSF (differentiated with '_topsf' 
-			suffix) and will amend relevant image WCS information/remove extraneous extensions.
-		clobber (bool): If True, will overwrite existing files with the same name on save.
-			(Default state -- clobber = False -- is recommended.)
-		fov_arcsec (float): "Diameter" of model PSF image in arcsec.
-		norm (float): Flux normalization for output PSF model.
 
 	Returns:
-		STDPSF model PSF
-
+		URL of the STDPSF grid file, detector ID for photutils (None for single-detector grids)
 	"""
-
-	if type(coords) == str:
-		coords = tools.objloc(coords)
-
-	if not pos:
-		im_cam = imcam.split('/')
-		inst = im_cam[0]
-		if len(im_cam) == 1:
-			camera = None
-		if len(im_cam) == 2:
-			camera = im_cam[1]
-		pos = tools.checkpixloc(coords, img, inst, camera)
-
 	# build the url that points to the STDPSF
 	imcamurl = imcam.replace('/', '')
 	if imcamurl == 'WFC3UVIS':
@@ -514,70 +557,169 @@ def stdpsf(coords, img, imcam, pos, plot = False, verbose = False,
 	if (imcam == 'NIRCAM') and (pos[2] not in ['NGCA5', 'NRCB5']):
 		det = stdpsf_jwdet[pos[2]]
 
-	coordstring = coords.ra.to_string(u.hour)
-	if coords.dec.deg >= 0:
-		coordstring += '+'+str(coords.dec)
-	if coords.dec.deg < 0:
-		coordstring += str(coords.dec)
+	return url, det
 
-	modname = img.replace('.fits', '_'+coordstring+'_%s'%pos[3]+'_psf')
 
+def _stdpsfgrid(url, det = None, cache_dir = None, mirror = None, verbose = False):
+	"""
+	Read an STDPSF grid, downloading it to (or copying it from mirror into) cache_dir on first use.
 
-	pixkey = imcam #set pixel scale to get the dimensions of x, y
-	if imcam in ['WFPC', 'WFPC1']:
-		if pos[2] <= 4:
-			pixkey += '_wf'
-		if pos[2] >= 5:
-			pixkey += '_pc'
-	if (imcam == 'WFPC2') and (pos[2] == 1):
-		pixkey += '_pc'
-	if (imcam == 'WFPC2') and (pos[2] >= 2):
-		pixkey += 'wf'
-	if imcam == 'NIRCAM':
-		if pos[2] in ['NRCA5', 'NRCB5', 'NRCALONG', 'NRCBLONG']:
-			pixkey += '_long'
-		if pos[2] not in ['NRCA5', 'NRCB5', 'NRCALONG', 'NRCBLONG']:
-			pixkey += '_short'
+	Grids are parsed once and kept in memory per process (up to STDPSF_NGRIDS grids, least recently used 
+	dropped first). The parsed grid data are also saved next to the grid file as .npy (with the grid positions 
+	and oversampling in a .json file) and read back as memory maps, so that processes reading the same grid 
+	share a single copy and skip parsing.
 
-	dimxy = fov_arcsec/plate_scale[pixkey] #make square PSF
-	halfdim = dimxy//2
-	xmin = int(pos[0]) - halfdim
-	xmax = int(pos[0]) + halfdim
-	ymin = int(pos[1]) - halfdim
-	ymax = int(pos[1]) + halfdim
+	Parameters:
+		url (str): URL of the STDPSF grid file.
+		det (int): Detector ID for photutils (None for single-detector grids).
+		cache_dir (str): Directory in which grids are stored. Defaults to STDPSF_CACHE.
+		mirror (str): Local directory of STDPSF grid files from which grids are copied instead of downloaded.
+		verbose (bool): If True, prints progress messages.
 
-	x, y = np.meshgrid(np.arange(xmin, xmax+1), np.arange(ymin, ymax+1))
+	Returns:
+		photutils GriddedPSFModel
+	"""
+	fname = os.path.basename(url)
+	key = (fname, det)
+	if key in _stdpsfgrids:
+		_stdpsfgrids.move_to_end(key)
+		return _stdpsfgrids[key]
+
+	cache_dir = cache_dir or STDPSF_CACHE
+	os.makedirs(cache_dir, exist_ok = True)
+	path = os.path.join(cache_dir, fname)
+	if not os.path.exists(path):
+		tmp = path+'.%s.tmp'%os.getpid() #written then renamed, so concurrent readers never see a partial file
+		if mirror and os.path.exists(os.path.join(mirror, fname)):
+			if verbose:
+				print('Copying STDPSF grid %s from %s'%(fname, mirror))
+			shutil.copyfile(os.path.join(mirror, fname), tmp)
+		else:
+			if verbose:
+				print('Downloading STDPSF grid %s'%url)
+			urllib.request.urlretrieve(url, tmp)
+		os.replace(tmp, path)
 
-	#preferred equivalent to using photutils.psf.stdpsf_reader directly
+	gridname = path.replace('.fits', '' if det is None else '_%s'%det)
+	if not (os.path.exists(gridname+'.npy') and os.path.exists(gridname+'.json')):
+		_savegrid(GriddedPSFModel.read(filename = path, detector_id = det, format = 'stdpsf'), gridname)
+	model = _readgrid(gridname)
 
-	model = GriddedPSFModel.read(filename = url, detector_id = det, format= 'stdpsf')
-	
-	if verbose:
-		print('Finished reading STDPSF grid, generating PSF model')
-	psfmodel = model.evaluate(x = x, y = y, flux = norm, x_0 = int(pos[0]), y_0 = int(pos[1]))
+	_stdpsfgrids[key] = model
+	while len(_stdpsfgrids) > STDPSF_NGRIDS:
+		_stdpsfgrids.popitem(last = False)
+	return model
 
-	if plot:
-		fig= plt.figure(figsize = (5, 5))
-		plt.imshow(psfmodel, origin = 'lower', cmap = 'Greys', 
-			vmin = np.nanpercentile(psfmodel, 20), vmax = np.nanpercentile(psfmodel, 97))
-		plt.colorbar()
-		fig.savefig(modname+'.png', bbox_inches = 'tight', dpi = 100)
 
-		if verbose:
-			print('PSF model image written to %s.png'%(modname))
+def _savegrid(grid, gridname):
+	"""
+	Save the data of a GriddedPSFModel as gridname.npy, with its grid positions and oversampling in gridname.json.
+	"""
+	meta = {'grid_xypos':np.asarray(grid.grid_xypos, dtype = float).tolist(),
+		'oversampling':np.atleast_1d(grid.oversampling).tolist()}
+	tmp = '.%s.tmp'%os.getpid() #written then renamed, so concurrent readers never see a partial file
+	with open(gridname+'.npy'+tmp, 'wb') as file:
+		np.save(file, np.asarray(grid.data, dtype = float))
+	with open(gridname+'.json'+tmp, 'w') as file:
+		json.dump(meta, file)
+	os.replace(gridname+'.npy'+tmp, gridname+'.npy')
+	os.replace(gridname+'.json'+tmp, gridname+'.json')
+
+
+def _readgrid(gridname):
+	"""
+	Read a GriddedPSFModel saved by _savegrid, with its data as a (read-only) memory map.
+	"""
+	with open(gridname+'.json') as file:
+		meta = json.load(file)
+	meta['grid_xypos'] = [tuple(xy) for xy in meta['grid_xypos']]
+	return GriddedPSFModel(NDData(np.load(gridname+'.npy', mmap_mode = 'r'), meta = meta))
 
-	if writeto:
+
+def stdpsf(coords, img, imcam, pos, plot = False, verbose = False, 
+	writeto = True, clobber = False, stamp = False, compress = None, fov_arcsec = 6, norm = 1, regrid = True,
+	cache_dir = None, mirror = None):
+	"""
+	Coordinate-specific PSFs from STDPSF model grids for HST, JWST.
+
+	Makes use of https://www.stsci.edu/~jayander/HST1PASS/LIB/PSFs/STDPSFs/ and 
+	https://www.stsci.edu/~jayander/JWST1PASS/LIB/PSFs/STDPSFs/. Each grid is downloaded once to a local 
+	cache (see cache_dir) and read once per process.
+
+	Parameters:
+		coords (str or astropy skycoord object): Coordinates of object of interest.
+		img (str): Path to image for which PSF is generated.
+		imcam (str): Specification of instrument/camera used to capture the images (e.g., 'ACS/WFC', 'WFC3/IR', 'WFPC', 
+			'WFPC2', 'MIRI', 'NIRCAM', 'NIRISS/Imaging'). For 'WFPC' and 'WFPC2', the camera is selected by-chip and 
+			should not be specified here. If 'NIRISS' specified alone, assumes the imaging mode.
+		pos (list): Location of object of interest (spatial and spectral).[X, Y, chip, filter]
+			If None, will find location based on coordinates and instrument/camera.
+		plot (bool): If True, saves .pngs of the model PSFs. (Not affected by clobber; 
+			images with the same name are overwritten by default.)
+		verbose (bool): If True, prints progress messages.
+		writeto (bool): If True, will write 2D model PSF (differentiated with '_topsf' 
+			suffix) and will amend relevant image WCS information/remove extraneous extensions.
+		clobber (bool): If True, will overwrite existing files with the same name on save.
+			(Default state -- clobber = False -- is recommended.)
+		stamp (bool): If True (and writeto = True), only the PSF stamp and its position are saved in the _topsf
+			file (see spike.tools.rewrite_fits).
+		compress (str): If specified (and writeto = True), tile compression for the _topsf file, e.g., 'GZIP_2'
+			(see spike.tools.compimagehdu).
+		fov_arcsec (float): "Diameter" of model PSF image in arcsec.
+		norm (float): Flux normalization for output PSF model.
+		cache_dir (str): Directory in which STDPSF grids are stored once downloaded. Defaults to STDPSF_CACHE
+			(the SPIKE_STDPSF_CACHE environment variable, if set, and otherwise ~/.spike/stdpsfs).
+		mirror (str): Local directory of STDPSF grid files (as named on the STScI server) from which grids are 
+			copied into cache_dir instead of downloaded, e.g., for nodes without internet access.
+
+	Returns:
+		STDPSF model PSF
+
+	"""
+
+	return stdpsfs([coords], img, imcam, [pos], plot, verbose, writeto = writeto, clobber = clobber, stamp = stamp, 
+		compress = compress, fov_arcsec = fov_arcsec, norm = norm, regrid = regrid, cache_dir = cache_dir, mirror = mirror)[0]
+
+
+def stdpsfs(coords, img, imcam, pos, plot = False, verbose = False, 
+	writeto = True, clobber = False, stamp = False, compress = None, fov_arcsec = 6, norm = 1, regrid = True,
+	cache_dir = None, mirror = None):
+	"""
+	Coordinate-specific PSFs from STDPSF model grids for several objects on one image.
+
+	Each grid (per detector) is read once and evaluated at all of its objects' positions together (see evalgrid). 
+	Parameters are as for stdpsf, except:
+		coords (list): Coordinates (str or astropy skycoord objects) of the objects.
+		pos (list): Location of each object ([X, Y, chip, filter] or None).
+
+	Returns:
+		list of STDPSF model PSFs
+	"""
+	coords, pos = _batchpos(coords, img, imcam, pos)
+
+	grids = {} #objects per STDPSF grid + detector
+	for k, p in enumerate(pos):
+		grids.setdefault(_stdpsfurl(imcam, p), []).append(k)
+
+	psfmodels = [None] * len(pos)
+	for (url, det), objs in grids.items():
+		model = _stdpsfgrid(url, det, cache_dir = cache_dir, mirror = mirror, verbose = verbose)
 		if verbose:
-			print('Writing to %s.fits.'%modname.replace('_psf', '_topsf'))
-		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'STDPSFs', clobber = clobber)
+			print('Finished reading STDPSF grid, generating %i PSF model(s)'%len(objs))
+		dimxy = _stampdim(imcam, pos[objs[0]][2], fov_arcsec)
+		for k, psfmodel in zip(objs, evalgrid(model, [pos[k] for k in objs], dimxy, norm = norm)):
+			psfmodels[k] = psfmodel
 
+	for k, psfmodel in enumerate(psfmodels):
+		_savepsf(psfmodel, coords[k], img, imcam, pos[k], 'STDPSFs', plot = plot, verbose = verbose, writeto = writeto,
+			clobber = clobber, stamp = stamp, compress = compress)
 
-	return psfmodel
+	return psfmodels
 
 
 def jwpsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = True,
-	clobber = False, fov_arcsec = 6, sample = 4, regrid = True, image_mask = None, 
-	pupil_mask = None, savefull = False, **calckwargs):
+	clobber = False, stamp = False, compress = None, fov_arcsec = 6, sample = 4, regrid = True, image_mask = None, 
+	pupil_mask = None, savefull = False, grid = None, grid_dir = None, **calckwargs):
 	"""
 	Generate JWST and Roman PSFs using WebbPSF/STPSF. Note: reference to the WebbPSF name is 
 	maintained here in lieu of STPSF to avoid confusion with the generation of empirical STDPSFs.
@@ -597,12 +739,21 @@ def jwpsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = True
 			This is in addition to the 2D PSF models saved by WebbPSF (which will be saved as img_psf.fits).
 		clobber (bool): If True, will overwrite existing files with the same name on save.
 			(Default state -- clobber = False -- is recommended.)
+		stamp (bool): If True (and writeto = True), only the PSF stamp and its position are saved in the _topsf
+			file (see spike.tools.rewrite_fits).
+		compress (str): If specified (and writeto = True), tile compression for the _topsf file, e.g., 'GZIP_2'
+			(see spike.tools.compimagehdu).
 		fov_arcsec (float): "Diameter" of model PSF image in arcsec.
 		sample (float): Factor by which to oversample the PSF.
 		regrid (bool): If True, will (interpolate and) regrid model PSF to image pixel scale.
 		image_mask (str): Image mask argument for WebbPSF.
 		pupil_mask (str): Pupil mask argument for WebbPSF.
-		savefull (bool): If True, save the full multi-extension WebbPSF/STPSF output.
+		savefull (bool): If True, save the full multi-extension WebbPSF/STPSF output. (Not used if grid is specified.)
+		grid (int): If specified, number of PSFs (a square number, e.g., 16) in a grid (psf_grid) computed once per 
+			instrument, detector, filter, and observation date (which sets the OPD), from which PSFs are interpolated 
+			at each position rather than computed with calc_psf (see jwpsfs).
+		grid_dir (str): Directory in which PSF grids are saved and reused by later calls and runs. Defaults to the 
+			SPIKE_JWPSFCACHE environment variable, if set, or ~/.spike/psfgrids.
 		**calckwargs: Additional arguments for calc_psf() -- see 
 			https://stpsf.readthedocs.io/en/latest/usage.html#.
 			Should be fed to spike.psf.jwst/roman in kwargs as a dictionary called calckwargs.
@@ -611,6 +762,10 @@ def jwpsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = True
 		WebbPSF model PSF
 
 	"""
+	if grid:
+		return jwpsfs([coords], img, imcam, [pos], plot, verbose, writeto = writeto, clobber = clobber, stamp = stamp, 
+			compress = compress, fov_arcsec = fov_arcsec, sample = sample, regrid = regrid, image_mask = image_mask, 
+			pupil_mask = pupil_mask, grid = grid, grid_dir = grid_dir, **calckwargs)[0]
 
 	if type(coords) == str:
 		coords = tools.objloc(coords)
@@ -670,15 +825,109 @@ def jwpsf(coords, img, imcam, pos, plot = False, verbose = False, writeto = True
 	if writeto:
 		if verbose:
 			print('Writing to %s.fits.'%modname.replace('_psf', '_topsf'))
-		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'WebbPSF', clobber = clobber)
+		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'WebbPSF', clobber = clobber, stamp = stamp, compress = compress)
 
 
 	return psfmodel
 
+def jwpsfs(coords, img, imcam, pos, plot = False, verbose = False, writeto = True,
+	clobber = False, stamp = False, compress = None, fov_arcsec = 6, sample = 4, regrid = True, image_mask = None, 
+	pupil_mask = None, savefull = False, grid = None, grid_dir = None, **calckwargs):
+	"""
+	Generate JWST and Roman PSFs using WebbPSF/STPSF for several objects on one image.
+
+	If grid is specified, the PSF grid of each detector is computed once (or read; see _jwpsfgrid) and interpolated 
+	to all of its objects' positions together (see evalgrid). Otherwise, each PSF is computed by jwpsf.
+	Parameters are as for jwpsf, except:
+		coords (list): Coordinates (str or astropy skycoord objects) of the objects.
+		pos (list): Location of each object ([X, Y, chip, filter] or None).
+
+	Returns:
+		list of WebbPSF model PSFs
+	"""
+	if not grid:
+		return [jwpsf(c, img, imcam, p, plot, verbose, writeto = writeto, clobber = clobber, stamp = stamp, 
+			compress = compress, fov_arcsec = fov_arcsec, sample = sample, regrid = regrid, image_mask = image_mask, 
+			pupil_mask = pupil_mask, savefull = savefull, **calckwargs) for c, p in zip(coords, pos)]
+
+	coords, pos = _batchpos(coords, img, imcam, pos)
+
+	grids = {} #objects per detector + filter
+	for k, p in enumerate(pos):
+		grids.setdefault((p[2], p[3]), []).append(k)
+
+	psfmodels = [None] * len(pos)
+	for (chip, filt), objs in grids.items():
+		dimxy = _stampdim(imcam, chip, fov_arcsec)
+		model = _jwpsfgrid(img, imcam, chip, filt, int(2 * (dimxy//2) + 1), sample, grid, grid_dir = grid_dir, 
+			image_mask = image_mask, pupil_mask = pupil_mask, verbose = verbose, **calckwargs)
+		if verbose:
+			print('Interpolating PSF grid at %i position(s).'%len(objs))
+		for k, psfmodel in zip(objs, evalgrid(model, [pos[k] for k in objs], dimxy)):
+			psfmodels[k] = psfmodel
+
+	for k, psfmodel in enumerate(psfmodels):
+		_savepsf(psfmodel, coords[k], img, imcam, pos[k], 'WebbPSF', plot = plot, verbose = verbose, writeto = writeto,
+			clobber = clobber, stamp = stamp, compress = compress)
+
+	return psfmodels
+
+
+_jwpsfgrids = OrderedDict() #WebbPSF/STPSF grids per key (see _jwpsfgrid), least recently used first
+
+def _jwpsfgrid(img, imcam, chip, filt, fov_pixels, sample, num_psfs, grid_dir = None, image_mask = None, 
+	pupil_mask = None, verbose = False, **calckwargs):
+	"""
+	Read the WebbPSF/STPSF PSF grid (detector-sampled, with distortion) of one detector and filter for the 
+	observation date of img, computing it with psf_grid and saving it to grid_dir (default JWPSF_CACHE) on first use.
+
+	Grids are keyed by instrument, detector, filter, and observation date (the OPD used by setup_sim_to_match_file), 
+	and by the grid parameters and WebbPSF/STPSF version, so exposures of a detector and filter from the same day 
+	share a grid. A grid is computed by one process at a time (see spike.tools.filelock), so workers that need 
+	the same grid wait for it rather than repeat it. Saved grids are read as memory maps (see _readgrid) and kept 
+	in memory per process (up to JWPSF_NGRIDS grids, least recently used dropped first).
+
+	Returns:
+		photutils GriddedPSFModel
+	"""
+	hdr = fits.getheader(img)
+	date = str(hdr.get('DATE-BEG', hdr.get('DATE-OBS', '')))[:10]
+	params = [imcam, chip, filt, date, fov_pixels, sample, num_psfs, image_mask, pupil_mask, calckwargs, 
+		webbpsf.__version__]
+	key = hashlib.sha1(json.dumps(params, sort_keys = True, default = str).encode()).hexdigest()
+	if key in _jwpsfgrids:
+		_jwpsfgrids.move_to_end(key)
+		return _jwpsfgrids[key]
+
+	grid_dir = grid_dir or JWPSF_CACHE
+	os.makedirs(grid_dir, exist_ok = True)
+	gridname = os.path.join(grid_dir, '_'.join(str(p) for p in [imcam.replace('/', '-'), chip, filt, date, key[:12]]))
+	saved = lambda: os.path.exists(gridname+'.npy') and os.path.exists(gridname+'.json')
+	if not saved():
+		with tools.filelock(gridname+'.lock'): #one worker computes the grid, the others wait and read it
+			if not saved():
+				if verbose:
+					print('Computing %i-PSF grid for %s %s %s (%s)'%(num_psfs, imcam, chip, filt, date))
+				psf = webbpsf.setup_sim_to_match_file(img)
+				if image_mask:
+					psf.image_mask = image_mask
+				if pupil_mask:
+					psf.pupil_mask = pupil_mask
+				model = psf.psf_grid(num_psfs = num_psfs, all_detectors = False, use_detsampled_psf = True, save = False, 
+					verbose = verbose, fov_pixels = fov_pixels, oversample = sample, **calckwargs)
+				_savegrid(model, gridname)
+	model = _readgrid(gridname)
+
+	_jwpsfgrids[key] = model
+	while len(_jwpsfgrids) > JWPSF_NGRIDS:
+		_jwpsfgrids.popitem(last = False)
+	return model
+
+
 def effpsf(coords, img, imcam, pos, plot = False, verbose = False, mask = True, writeto = True, 
-	clobber = False, fov_arcsec = 6, norm = 1., starselect = 'DAO', starselectargs = {'fwhm':10}, 
+	clobber = False, stamp = False, compress = None, fov_arcsec = 6, norm = 1., starselect = 'DAO', starselectargs = {'fwhm':10}, 
 	thresh = 125, usermask = None, maskval = None, 
-	epsfargs = {'oversampling':1, 'progress_bar':True, 'maxiters':10}):
+	epsfargs = {'oversampling':1, 'progress_bar':True, 'maxiters':10}, epsfcache = None, epsfmodel = None):
 	"""
 	Generate PSFs using the empirical photutils.epsf routine. 
 
@@ -702,6 +951,10 @@ def effpsf(coords, img, imcam, pos, plot = False, verbose = False, mask = True,
 			suffix) and will amend relevant image WCS information/remove extraneous extensions.
 		clobber (bool): If True, will overwrite existing files with the same name on save.
 			(Default state -- clobber = False -- is recommended.)
+		stamp (bool): If True (and writeto = True), only the PSF stamp and its position are saved in the _topsf
+			file (see spike.tools.rewrite_fits).
+		compress (str): If specified (and writeto = True), tile compression for the _topsf file, e.g., 'GZIP_2'
+			(see spike.tools.compimagehdu).
 		fov_arcsec (float): "Diameter" of model PSF image in arcsec.
 		norm (float): Flux normalization for output PSF model.
 		starselect (str): 'DAO', 'IRAF', or 'peak', which use DAOStarFinder, IRAFStarFinder, and 
@@ -716,61 +969,91 @@ def effpsf(coords, img, imcam, pos, plot = False, verbose = False, mask = True,
 			Otherwise, can be np.nan or number. Default for 'IRAF' is np.nan, default for 'DAO' is 0.
 		epsfargs (dict): Keyword arguments for the EPSFBuilder. Default in spike is to not oversample
 			the PSF, but the regridding is all handled during the creation of the coord-specific model.
+		epsfcache (str): Directory in which each built ePSF (and the table of stars it was built from) is saved, 
+			keyed by image (path, size, and modification time), chip, and the star selection and builder parameters, 
+			so that later runs reuse it. Defaults to the SPIKE_EPSFCACHE environment variable, if set. Built ePSFs 
+			are always reused within a process.
+		epsfmodel (str or dict): If specified, ePSF models per chip (or a path to them, pickled), e.g., built from 
+			the stars of every image in the filter by filterepsf, which are evaluated in place of an ePSF built 
+			from this image alone. Chips without a model use the one under None.
 
 	Returns:
 		ePSF model PSF
 	
 	"""
 
-	if type(coords) == str:
-		coords = tools.objloc(coords)
+	return effpsfs([coords], img, imcam, [pos], plot, verbose, mask = mask, writeto = writeto, clobber = clobber, 
+		stamp = stamp, compress = compress, fov_arcsec = fov_arcsec, norm = norm, starselect = starselect, 
+		starselectargs = starselectargs, thresh = thresh, usermask = usermask, maskval = maskval, epsfargs = epsfargs,
+		epsfcache = epsfcache, epsfmodel = epsfmodel)[0]
 
-	if not pos:
-		im_cam = imcam.split('/')
-		inst = im_cam[0]
-		if len(im_cam) == 1:
-			camera = None
-		if len(im_cam) == 2:
-			camera = im_cam[1]
-		pos = tools.checkpixloc(coords, img, inst, camera)
 
+def effpsfs(coords, img, imcam, pos, plot = False, verbose = False, mask = True, writeto = True, 
+	clobber = False, stamp = False, compress = None, fov_arcsec = 6, norm = 1., starselect = 'DAO', starselectargs = {'fwhm':10}, 
+	thresh = 125, usermask = None, maskval = None, 
+	epsfargs = {'oversampling':1, 'progress_bar':True, 'maxiters':10}, epsfcache = None, epsfmodel = None):
+	"""
+	Generate PSFs using the empirical photutils.epsf routine for several objects on one image.
+
+	The ePSF is built once per chip (or reused; see epsfcache and epsfmodel) and evaluated for all of its objects 
+	together (see evalgrid). 
+	Parameters are as for effpsf, except:
+		coords (list): Coordinates (str or astropy skycoord objects) of the objects.
+		pos (list): Location of each object ([X, Y, chip, filter] or None).
+
+	Returns:
+		list of ePSF model PSFs
+	"""
+	coords, pos = _batchpos(coords, img, imcam, pos)
+
+	chips = {} #objects per chip
+	for k, p in enumerate(pos):
+		chips.setdefault(p[2], []).append(k)
+
+	if type(epsfmodel) == str:
+		with open(epsfmodel, 'rb') as file:
+			epsfmodel = pickle.load(file)
+
+	psfmodels = [None] * len(pos)
+	for chip, objs in chips.items():
+		if epsfmodel is not None:
+			model = epsfmodel.get(chip, epsfmodel.get(None))
+		else:
+			model, _ = _cachedepsf(img, imcam, chip, epsfcache = epsfcache, verbose = verbose, mask = mask, 
+				fov_arcsec = fov_arcsec, starselect = starselect, starselectargs = starselectargs, thresh = thresh, 
+				usermask = usermask, maskval = maskval, epsfargs = epsfargs)
+		if verbose:
+			print('Evaluating model at %i position(s).'%len(objs))
+		dimxy = _stampdim(imcam, chip, fov_arcsec)
+		for k, psfmodel in zip(objs, evalgrid(model, [pos[k] for k in objs], dimxy, norm = norm)):
+			psfmodels[k] = psfmodel
+
+	for k, psfmodel in enumerate(psfmodels):
+		_savepsf(psfmodel, coords[k], img, imcam, pos[k], 'ePSFs', plot = plot, verbose = verbose, writeto = writeto,
+			clobber = clobber, stamp = stamp, compress = compress)
+
+	return psfmodels
+
+
+def _findstars(img, imcam, chip, verbose = False, mask = True, fov_arcsec = 6, starselect = 'DAO', 
+	starselectargs = {'fwhm':10}, thresh = 125, usermask = None, maskval = None):
+	"""
+	Find and extract the stars of one chip of an image (see effpsf for parameters).
+
+	Returns:
+		photutils EPSFStars, table of the positions (x, y) of the stars
+	"""
 	ext = 1 #read data from relevant SCI extension
 	extv = 1
-	if (imcam in ['ACS/WFC', 'WFC3/UVIS']) and (pos[2] == 1):
+	if (imcam in ['ACS/WFC', 'WFC3/UVIS']) and (chip == 1):
 		ext = 4
 		extv = 2
-	if (imcam in ['ACS/WFC', 'WFC3/UVIS']) and (pos[2] == 2):
+	if (imcam in ['ACS/WFC', 'WFC3/UVIS']) and (chip == 2):
 		ext = 1 #yes, it's already 1, but this is to make things explicit
 		extv = 1
 	if imcam in ['WFPC', 'WFPC1', 'WFPC2']:
-		ext = pos[2]
-		extv = pos[2]
-
-
-	coordstring = coords.ra.to_string(u.hour)
-	if coords.dec.deg >= 0:
-		coordstring += '+'+str(coords.dec)
-	if coords.dec.deg < 0:
-		coordstring += str(coords.dec)
-
-	modname = img.replace('.fits', '_'+coordstring+'_%s'%pos[3]+'_psf')
-
-
-	pixkey = imcam #set pixel scale to get the dimensions of x, y
-	if imcam in ['WFPC', 'WFPC1']:
-		if pos[2] <= 4:
-			pixkey += '_wf'
-		if pos[2] >= 5:
-			pixkey += '_pc'
-	if (imcam == 'WFPC2') and (pos[2] == 1):
-		pixkey += '_pc'
-	if (imcam == 'WFPC2') and (pos[2] >= 2):
-		pixkey += 'wf'
-	if imcam == 'NIRCAM':
-		if pos[2] in ['NRCA5', 'NRCB5', 'NRCALONG', 'NRCBLONG']:
-			pixkey += '_long'
-		if pos[2] not in ['NRCA5', 'NRCB5', 'NRCALONG', 'NRCBLONG']:
-			pixkey += '_short'
+		ext = chip
+		extv = chip
 
 	dat = fits.open(img)[ext].data
 
@@ -808,7 +1091,7 @@ def effpsf(coords, img, imcam, pos, plot = False, verbose = False, mask = True,
 	if not mask:
 		sources = find(dat)
 
-	exsize = int(2 * ((fov_arcsec/plate_scale[pixkey])//2) + 1) #size of extraction box
+	exsize = int(2 * (_stampdim(imcam, chip, fov_arcsec)//2) + 1) #size of extraction box
 	xs = sources['xcentroid']
 	ys = sources['ycentroid']
 	exmask = ((xs > (exsize//2)) & (xs < (dat.shape[1] -1 - (exsize//2))) &
@@ -821,14 +1104,18 @@ def effpsf(coords, img, imcam, pos, plot = False, verbose = False, mask = True,
 		print('Beginning stellar extraction.')
 	stars = extract_stars(nddata, tab, size = exsize)
 
-	dimxy = fov_arcsec/plate_scale[pixkey] #make square PSF
-	halfdim = dimxy//2
-	xmin = int(pos[0]) - halfdim
-	xmax = int(pos[0]) + halfdim
-	ymin = int(pos[1]) - halfdim
-	ymax = int(pos[1]) + halfdim
+	return stars, tab
 
-	x, y = np.meshgrid(np.arange(xmin, xmax+1), np.arange(ymin, ymax+1))
+
+def _buildepsf(img, imcam, chip, verbose = False, 
+	epsfargs = {'oversampling':1, 'progress_bar':True, 'maxiters':10}, **params):
+	"""
+	Build the ePSF of one chip of an image from its stars (see effpsf for parameters).
+
+	Returns:
+		photutils ePSF model, table of the positions (x, y) of the stars it was built from
+	"""
+	stars, tab = _findstars(img, imcam, chip, verbose = verbose, **params)
 
 	if verbose:
 		# ensure progress bar is toggled if verbose is true
@@ -842,38 +1129,216 @@ def effpsf(coords, img, imcam, pos, plot = False, verbose = False, mask = True,
 		print('Starting PSF construction.')
 	model, fitstars = epsfbuilder(stars)
 
-	if verbose:
-		print('Evaluating model at (%i, %i).'%(pos[0], pos[1]))
-	psfmodel = model.evaluate(x = x, y = y, flux = norm, x_0 = int(pos[0]), y_0 = int(pos[1]))
+	return model, tab
 
-	if plot:
-		fig= plt.figure(figsize = (5, 5))
-		plt.imshow(psfmodel, origin = 'lower', cmap = 'Greys', 
-			vmin = np.nanpercentile(psfmodel, 20), vmax = np.nanpercentile(psfmodel, 97))
-		plt.colorbar()
-		fig.savefig(modname+'.png', bbox_inches = 'tight', dpi = 100)
 
+_epsfs = OrderedDict() #built ePSFs and their stars per (image, chip, parameters), least recently used first
+
+def _epsfkey(img, imcam, chip, **params):
+	"""
+	Key of the ePSF built from one chip of img with params (see _buildepsf): a hash of the image path, size, and 
+	modification time, the chip, and the parameters.
+	"""
+	stat = os.stat(img)
+	params = dict(params, epsfargs = {k:v for k, v in params.get('epsfargs', {}).items() if k != 'progress_bar'})
+	if params.get('usermask') is not None:
+		params['usermask'] = hashlib.sha1(np.ascontiguousarray(params['usermask'])).hexdigest()
+	key = json.dumps([os.path.abspath(img), stat.st_size, stat.st_mtime_ns, imcam, chip, params], 
+		sort_keys = True, default = str)
+	return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _cachedepsf(img, imcam, chip, epsfcache = None, verbose = False, **params):
+	"""
+	Build the ePSF of one chip of an image (see _buildepsf), or reuse one built with the same parameters earlier
+	in the process or, if epsfcache (default EPSF_CACHE) is set, saved there by an earlier run.
+
+	Built ePSFs are kept in memory per process (up to EPSF_NMODELS, least recently used dropped first).
+
+	Returns:
+		photutils ePSF model, table of the positions (x, y) of the stars it was built from
+	"""
+	key = _epsfkey(img, imcam, chip, **params)
+	if key in _epsfs:
+		_epsfs.move_to_end(key)
+		return _epsfs[key]
+
+	epsfcache = epsfcache or EPSF_CACHE
+	path = os.path.join(epsfcache, key+'.pkl') if epsfcache else None
+	if path and os.path.exists(path):
+		if verbose:
+			print('Reading ePSF of %s (chip %s) from %s'%(img, chip, path))
+		with open(path, 'rb') as file:
+			built = pickle.load(file)
+	else:
+		built = _buildepsf(img, imcam, chip, verbose = verbose, **params)
+		if path:
+			os.makedirs(epsfcache, exist_ok = True)
+			tmp = path+'.%s.tmp'%os.getpid() #written then renamed, so concurrent readers never see a partial file
+			with open(tmp, 'wb') as file:
+				pickle.dump(built, file)
+			os.replace(tmp, path)
+
+	_epsfs[key] = built
+	while len(_epsfs) > EPSF_NMODELS:
+		_epsfs.popitem(last = False)
+	return built
+
+
+def epsfstars(img, imcam, chips = None, verbose = False, writeto = None, **params):
+	"""
+	Find and extract the stars of each chip of an image, e.g., for an ePSF built from all of the images in a 
+	filter (see filterepsf).
+
+	Parameters:
+		img (str): Path to image.
+		imcam (str): Specification of instrument/camera used to capture the image (see effpsf).
+		chips (list): Chips (HST) or detectors (JWST/Roman) from which stars are extracted. 
+			If None, uses every chip of the image (see spike.tools.imgindex).
+		verbose (bool): If True, prints progress messages.
+		writeto (str): If specified, path to which the stars are saved (pickled).
+		**params: Star finding keyword arguments (mask, fov_arcsec, starselect, starselectargs, thresh, usermask, 
+			maskval; see effpsf).
+
+	Returns:
+		dict of photutils EPSFStars per chip
+	"""
+	if chips is None:
+		inst, camera = (imcam.split('/') + [None])[:2]
+		chips = [c['chip'] for c in tools.imgindex(img, inst, camera)[img]['chips']]
+
+	stars = {}
+	for chip in chips:
 		if verbose:
-			print('PSF model image written to %s.png.'%(modname))
+			print('Extracting stars from %s (chip %s)'%(img, chip))
+		stars[chip], _ = _findstars(img, imcam, chip, verbose = verbose, **params)
 
 	if writeto:
+		tmp = writeto+'.%s.tmp'%os.getpid()
+		with open(tmp, 'wb') as file:
+			pickle.dump(stars, file)
+		os.replace(tmp, writeto)
+
+	return stars
+
+
+def filterepsf(imgs, imcam, spatial = None, minstars = 10, nworkers = None, verbose = False, writeto = None, 
+	epsfargs = {'oversampling':1, 'progress_bar':False, 'maxiters':10}, **params):
+	"""
+	Build one ePSF from the stars of every image in a filter.
+
+	Stars are extracted from each image in parallel (see epsfstars) and combined, so that one EPSFBuilder run 
+	models all of them, rather than one (noisier) ePSF being built per image and chip. The model is evaluated 
+	at the position of each object on each image by effpsf (epsfmodel).
+
+	Parameters:
+		imgs (list): Paths to the images of one filter, or their stars (dicts of EPSFStars per chip, or paths to 
+			those saved by epsfstars).
+		imcam (str): Specification of instrument/camera used to capture the images (see effpsf).
+		spatial (int or tuple): If specified, number of cells (nx, ny; or nx = ny) over each chip/detector in which 
+			separate ePSFs are built, so that the model varies with detector position (as a photutils 
+			GriddedPSFModel per chip). Cells are spaced over the extent of the chip's stars.
+		minstars (int): If spatial, the minimum number of stars for a cell's own ePSF; sparser cells use the ePSF 
+			of all stars.
+		nworkers (int): Number of processes used to extract stars. If None, uses one fewer than the number of 
+			available CPUs. If 1, extracts stars serially.
+		verbose (bool): If True, prints progress messages.
+		writeto (str): If specified, path to which the model is saved (pickled), e.g., for effpsf(epsfmodel = writeto).
+		epsfargs (dict): Keyword arguments for the EPSFBuilder.
+		**params: Star finding keyword arguments for epsfstars (e.g., thresh, starselect, mask).
+
+	Returns:
+		dict of ePSF models per chip (the same ePSF for every chip unless spatial), plus the ePSF of all stars 
+		under None
+	"""
+	paths = [i for i in imgs if (type(i) == str) and not i.endswith('.pkl')]
+	if paths:
+		extract = partial(epsfstars, imcam = imcam, **params)
+		if nworkers is None:
+			nworkers = max(1, os.cpu_count() - 1)
 		if verbose:
-			print('Writing to %s.fits.'%modname.replace('_psf', '_topsf'))
-		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'ePSFs', clobber = clobber)
+			print('Extracting stars from %i image(s).'%len(paths))
+		if (nworkers == 1) or (len(paths) == 1):
+			found = [extract(i) for i in paths]
+		else:
+			with Pool(processes = min(nworkers, len(paths))) as pool:
+				found = pool.map(extract, paths)
+		found = dict(zip(paths, found))
+
+	bychip = {} #stars of every image per chip
+	for i in imgs:
+		if type(i) != str:
+			stars = i
+		elif i in paths:
+			stars = found[i]
+		else:
+			with open(i, 'rb') as file:
+				stars = pickle.load(file)
+		for chip, chipstars in stars.items():
+			bychip.setdefault(chip, []).extend(chipstars.all_stars)
 
-	return psfmodel
+	allstars = [star for chipstars in bychip.values() for star in chipstars]
+	if verbose:
+		print('Building ePSF from %i stars.'%len(allstars))
+	model, _ = EPSFBuilder(**epsfargs)(EPSFStars(allstars))
+
+	models = {chip:model for chip in bychip}
+	if spatial:
+		nx, ny = (spatial, spatial) if np.isscalar(spatial) else spatial
+		for chip, chipstars in bychip.items():
+			if len(chipstars) < minstars:
+				continue
+			models[chip] = _spatialepsf(chipstars, model, nx, ny, minstars, epsfargs, verbose = verbose)
+	models[None] = model
+
+	if writeto:
+		tmp = writeto+'.%s.tmp'%os.getpid()
+		with open(tmp, 'wb') as file:
+			pickle.dump(models, file)
+		os.replace(tmp, writeto)
+
+	return models
+
+
+def _spatialepsf(stars, model, nx, ny, minstars, epsfargs, verbose = False):
+	"""
+	Build an ePSF in each of nx x ny cells spanning the positions of stars (a list of EPSFStar) on one chip
+	(cells with fewer than minstars stars use model; see filterepsf).
+
+	Returns:
+		photutils GriddedPSFModel
+	"""
+	centers = np.array([star.center for star in stars])
+	xedges = np.linspace(centers[:,0].min(), centers[:,0].max(), nx + 1)
+	yedges = np.linspace(centers[:,1].min(), centers[:,1].max(), ny + 1)
+	ix = np.clip(np.searchsorted(xedges, centers[:,0], side = 'right') - 1, 0, nx - 1)
+	iy = np.clip(np.searchsorted(yedges, centers[:,1], side = 'right') - 1, 0, ny - 1)
+
+	data = []
+	grid_xypos = []
+	for j in range(ny):
+		for i in range(nx):
+			cell = [star for star, a, b in zip(stars, ix, iy) if (a == i) and (b == j)]
+			cellmodel = model
+			if len(cell) >= minstars:
+				if verbose:
+					print('Building ePSF of cell (%i, %i) from %i stars.'%(i, j, len(cell)))
+				cellmodel, _ = EPSFBuilder(**epsfargs)(EPSFStars(cell))
+			data.append(np.asarray(cellmodel.data))
+			grid_xypos.append(((xedges[i] + xedges[i+1]) / 2., (yedges[j] + yedges[j+1]) / 2.))
+
+	meta = {'grid_xypos':grid_xypos, 'oversampling':model.oversampling}
+	return GriddedPSFModel(NDData(np.array(data), meta = meta))
 
 
 def psfex(coords, img, imcam, pos, plot = False, verbose = False, writeto = True, 
-	clobber = False, savepsfex = False, seconf = None, psfconf = None, regrid = True,
+	clobber = False, stamp = False, compress = None, savepsfex = False, seconf = None, psfconf = None, regrid = True,
 	mask = True, maskparams = {}):
 	"""
 	Generate PSFs using PSFEx.
 
 	NOTE: For frames with fewer stars, this method is prone to artifacts, which is exacerbated by 
-	using a lower detection threshold. (Also important to note that using the parallel option with 
-	PSFEx may require additional attention to ensuring files do not overwrite each other given the
-	default naming scheme for .cat and .psf files and subsequent steps to rename them.)
+	using a lower detection threshold.
 
 	Parameters:
 		coords (str or astropy skycoord object): Coordinates of object of interest.
@@ -892,6 +1357,10 @@ def psfex(coords, img, imcam, pos, plot = False, verbose = False, writeto = True
 			by default, but this can be toggled in the tools.pypsfex arguments.
 		clobber (bool): If True, will overwrite existing files with the same name on save.
 			(Default state -- clobber = False -- is recommended.)
+		stamp (bool): If True (and writeto = True), only the PSF stamp and its position are saved in the _topsf
+			file (see spike.tools.rewrite_fits).
+		compress (str): If specified (and writeto = True), tile compression for the _topsf file, e.g., 'GZIP_2'
+			(see spike.tools.compimagehdu).
 		savepsfex (str): If 'fits' or 'arr' save 2D model to that format.
 		seconf (str): Path to SExtractor configuration file if not using default.
 		peconf (str): Path to PSFEx configuration file if not using default.
@@ -962,13 +1431,13 @@ def psfex(coords, img, imcam, pos, plot = False, verbose = False, writeto = True
 	if writeto:
 		if verbose:
 			print('Writing to %s.fits.'%modname.replace('_psf', '_topsf'))
-		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'PSFEx', clobber = clobber)
+		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'PSFEx', clobber = clobber, stamp = stamp, compress = compress)
 
 	return psfmodel
 
 
 def acsepsf(coords, img, imcam, pos, plot = False, verbose = False, 
-	writeto = True, clobber = False):
+	writeto = True, clobber = False, stamp = False, compress = None):
 	"""
 	Generate ACS/WFC Focus-Diverse ePSFs from STScI web tool.
 
@@ -989,17 +1458,37 @@ def acsepsf(coords, img, imcam, pos, plot = False, verbose = False,
 			by default, but this can be toggled in the tools.pypsfex arguments.
 		clobber (bool): If True, will overwrite existing files with the same name on save.
 			(Default state -- clobber = False -- is recommended.)
+		stamp (bool): If True (and writeto = True), only the PSF stamp and its position are saved in the _topsf
+			file (see spike.tools.rewrite_fits).
+		compress (str): If specified (and writeto = True), tile compression for the _topsf file, e.g., 'GZIP_2'
+			(see spike.tools.compimagehdu).
+	"""
+
+	return acsepsfs([coords], img, imcam, [pos], plot, verbose, writeto = writeto, clobber = clobber, stamp = stamp, 
+		compress = compress)[0]
+
+
+def acsepsfs(coords, img, imcam, pos, plot = False, verbose = False, 
+	writeto = True, clobber = False, stamp = False, compress = None):
+	"""
+	Generate ACS/WFC Focus-Diverse ePSFs from STScI web tool for several objects on one image.
+
+	The ePSF model grid is retrieved and read once and interpolated to each object's position. 
+	Parameters are as for acsepsf, except:
+		coords (list): Coordinates (str or astropy skycoord objects) of the objects.
+		pos (list): [X, Y, chip, filter] of each object, as output from spike.tools.checkpixloc.
+
+	Returns:
+		list of ePSF model PSFs
 	"""
 
 	if imcam.upper() != 'ACS/WFC':
 		raise ValueError("ACS ePSFs will not work with %s. Please select a different PSF generation method."%imcam)
 
-	x, y, chip, filt = pos
-	xin, yin = int(x), int(y) #pixel position for interpolation
-	xad, yad = x - xin, y - yin #fine adjustment for interpolation
-	chip = 'WFC'+str(chip)
+	coords, pos = _batchpos(coords, img, imcam, pos)
 
 	acs_epsf_allowed = ['F435W', 'F475W', 'F502N', 'F555W', 'F606W', 'F625W', 'F658N', 'F660N', 'F775W', 'F814W', 'F850LP']
+	filt = pos[0][3] #one filter per image
 	if filt not in acs_epsf_allowed:
 		raise ValueError("ACS ePSFs not available for %s. Please select a different PSF generation method."%filt)	
 
@@ -1029,9 +1518,172 @@ def acsepsf(coords, img, imcam, pos, plot = False, verbose = False,
 		psfs = fits.open(psfgrid)
 
 	if verbose:
-		print('Interpolating ePSF model grid.')
-	psfmodel = interp_epsf(psfs, xin, yin, chip, pixel_space=True, subpixel_x=xad, subpixel_y=yad)
+		print('Interpolating ePSF model grid at %i position(s).'%len(pos))
+	psfmodels = []
+	for p in pos:
+		x, y, chip, _ = p
+		xin, yin = int(x), int(y) #pixel position for interpolation
+		xad, yad = x - xin, y - yin #fine adjustment for interpolation
+		psfmodels.append(interp_epsf(psfs, xin, yin, 'WFC'+str(chip), pixel_space=True, subpixel_x=xad, subpixel_y=yad))
+
+	for k, psfmodel in enumerate(psfmodels):
+		_savepsf(psfmodel, coords[k], img, imcam, pos[k], 'ePSFs', plot = plot, verbose = verbose, writeto = writeto,
+			clobber = clobber, stamp = stamp, compress = compress)
+
+	return psfmodels
 
+
+def batchpsf(psffunc, coords, img, imcam, pos, plot = False, verbose = False, **kwargs):
+	"""
+	Generate the coordinate-specific PSFs of several objects on one image with one call.
+
+	stdpsf, jwpsf (with grid), effpsf, and acsepsf read their model grid (or build their ePSF) once per image and 
+	chip and evaluate all of the positions together (see stdpsfs, jwpsfs, effpsfs, acsepsfs); other methods are 
+	called once per object.
+
+	Parameters:
+		psffunc (callable): PSF generation function, e.g., spike.psfgen.stdpsf, or a user function with the same
+			call signature.
+		coords (list): Coordinates (str or astropy skycoord objects) of the objects.
+		img (str): Path to image for which PSFs are generated.
+		imcam (str): Specification of instrument/camera used to capture the images (see psffunc).
+		pos (list): Location of each object ([X, Y, chip, filter] or None; see psffunc).
+		plot (bool): If True, saves .pngs of the model PSFs.
+		verbose (bool): If True, prints progress messages.
+		**kwargs: Keyword arguments for psffunc.
+
+	Returns:
+		list of model PSFs
+	"""
+	batchfuncs = {stdpsf:stdpsfs, jwpsf:jwpsfs, effpsf:effpsfs, acsepsf:acsepsfs}
+	if psffunc in batchfuncs:
+		return batchfuncs[psffunc](coords, img, imcam, pos, plot, verbose, **kwargs)
+	return [psffunc(c, img, imcam, p, plot, verbose, **kwargs) for c, p in zip(coords, pos)]
+
+
+def evalgrid(model, pos, dimxy, norm = 1):
+	"""
+	Evaluate a PSF model at several positions on one image at once.
+
+	As in stdpsf and effpsf, each PSF is a square stamp centered on the integer pixel of its position, so the 
+	stamp pixels fall on the same nodes of the model for every position. A photutils GriddedPSFModel is 
+	interpolated to all of the positions with one bilinear weighting of its grid (in place of one 
+	model.evaluate call per position), and a single ePSF is evaluated once.
+
+	Parameters:
+		model (photutils GriddedPSFModel or ePSF model): PSF model.
+		pos (list): Location ([X, Y, ...]) of each object.
+		dimxy (float): "Diameter" of the PSF stamps in pixels.
+		norm (float): Flux normalization of the PSFs.
+
+	Returns:
+		N x ny x nx array of model PSFs
+	"""
+	halfdim = dimxy//2
+	offsets = np.arange(-halfdim, halfdim+1)
+	x_0 = np.array([int(p[0]) for p in pos])
+	y_0 = np.array([int(p[1]) for p in pos])
+
+	if not hasattr(model, 'grid_xypos'): #single ePSF, the same at every integer pixel
+		x, y = np.meshgrid(offsets, offsets)
+		psfmodel = model.evaluate(x = x, y = y, flux = norm, x_0 = 0, y_0 = 0)
+		return np.repeat(psfmodel[np.newaxis], len(pos), axis = 0)
+
+	data = np.asarray(model.data, dtype = float)
+	oversampling = np.atleast_1d(model.oversampling) #(y, x) if two elements
+	ny, nx = data.shape[1:]
+	xi = oversampling[-1] * offsets + (nx - 1) / 2. #stamp pixels on the oversampled grid
+	yi = oversampling[0] * offsets + (ny - 1) / 2.
+	weights = _gridweights(model.grid_xypos, x_0, y_0)
+
+	if (weights is None) or np.any(xi % 1) or np.any(yi % 1): #not on the nodes of the grid
+		psfmodels = []
+		for x0, y0 in zip(x_0, y_0):
+			x, y = np.meshgrid(x0 + offsets, y0 + offsets)
+			psfmodels.append(model.evaluate(x = x, y = y, flux = norm, x_0 = x0, y_0 = y0))
+		return np.array(psfmodels)
+
+	# stamp pixels off the model grid are 0 (the photutils fill value)
+	inx = np.flatnonzero((xi >= 0) & (xi <= nx - 1))
+	iny = np.flatnonzero((yi >= 0) & (yi <= ny - 1))
+	nodes = data[:, yi[iny].astype(int)][:, :, xi[inx].astype(int)]
+	psfmodels = np.zeros((len(pos), len(offsets), len(offsets)))
+	psfmodels[:, iny[:, np.newaxis], inx] = norm * np.tensordot(weights, nodes, axes = 1)
+	return psfmodels
+
+
+def _gridweights(grid_xypos, x, y):
+	"""
+	Bilinear interpolation weights (N x number of grid points) of the PSFs of a rectangular PSF grid at positions 
+	x, y (as in photutils GriddedPSFModel; positions off the grid take the values at its edge), or None if the grid 
+	is not rectangular.
+	"""
+	xypos = np.asarray(grid_xypos, dtype = float)
+	xgrid, ygrid = np.unique(xypos[:, 0]), np.unique(xypos[:, 1])
+	if len(xgrid) * len(ygrid) != len(xypos):
+		return None
+	lookup = np.zeros((len(ygrid), len(xgrid)), dtype = int) #grid point index at each (y, x) node
+	lookup[np.searchsorted(ygrid, xypos[:, 1]), np.searchsorted(xgrid, xypos[:, 0])] = np.arange(len(xypos))
+
+	def bracket(grid, v):
+		v = np.clip(np.asarray(v, dtype = float), grid[0], grid[-1])
+		if len(grid) == 1:
+			return np.zeros(len(v), dtype = int), np.zeros(len(v), dtype = int), np.zeros(len(v))
+		i = np.clip(np.searchsorted(grid, v, side = 'right') - 1, 0, len(grid) - 2)
+		return i, i + 1, (v - grid[i]) / (grid[i + 1] - grid[i])
+
+	ix0, ix1, tx = bracket(xgrid, x)
+	iy0, iy1, ty = bracket(ygrid, y)
+	weights = np.zeros((len(tx), len(xypos)))
+	rows = np.arange(len(tx))
+	for iy, ix, w in [(iy0, ix0, (1 - tx) * (1 - ty)), (iy0, ix1, tx * (1 - ty)), 
+						(iy1, ix0, (1 - tx) * ty), (iy1, ix1, tx * ty)]:
+		np.add.at(weights, (rows, lookup[iy, ix]), w)
+	return weights
+
+
+def _batchpos(coords, img, imcam, pos):
+	"""
+	Resolve the coordinates and, where None, the locations ([X, Y, chip, filter]) of objects on img.
+	"""
+	coords = [tools.objloc(c) if type(c) == str else c for c in coords]
+	if not all(pos):
+		im_cam = imcam.split('/')
+		inst = im_cam[0]
+		camera = im_cam[1] if len(im_cam) == 2 else None
+		allpos = tools.checkpixloc(coords, img, inst, camera)
+		pos = [p if p else allpos[k] for k, p in enumerate(pos)]
+	return coords, list(pos)
+
+
+def _stampdim(imcam, chip, fov_arcsec):
+	"""
+	"Diameter" in pixels of a model PSF stamp fov_arcsec across on the given instrument/camera and chip.
+	"""
+	pixkey = imcam #set pixel scale to get the dimensions of x, y
+	if imcam in ['WFPC', 'WFPC1']:
+		if chip <= 4:
+			pixkey += '_wf'
+		if chip >= 5:
+			pixkey += '_pc'
+	if (imcam == 'WFPC2') and (chip == 1):
+		pixkey += '_pc'
+	if (imcam == 'WFPC2') and (chip >= 2):
+		pixkey += 'wf'
+	if imcam == 'NIRCAM':
+		if chip in ['NRCA5', 'NRCB5', 'NRCALONG', 'NRCBLONG']:
+			pixkey += '_long'
+		if chip not in ['NRCA5', 'NRCB5', 'NRCALONG', 'NRCBLONG']:
+			pixkey += '_short'
+
+	return fov_arcsec/plate_scale[pixkey] #make square PSF
+
+
+def _savepsf(psfmodel, coords, img, imcam, pos, method, plot = False, verbose = False, writeto = True, 
+	clobber = False, stamp = False, compress = None):
+	"""
+	Plot and/or write (see spike.tools.rewrite_fits) the model PSF of one object.
+	"""
 	coordstring = coords.ra.to_string(u.hour)
 	if coords.dec.deg >= 0:
 		coordstring += '+'+str(coords.dec)
@@ -1046,6 +1698,7 @@ def acsepsf(coords, img, imcam, pos, plot = False, verbose = False,
 			vmin = np.nanpercentile(psfmodel, 20), vmax = np.nanpercentile(psfmodel, 97))
 		plt.colorbar()
 		fig.savefig(modname+'.png', bbox_inches = 'tight', dpi = 100)
+		plt.close(fig)
 
 		if verbose:
 			print('PSF model image written to %s.png'%(modname))
@@ -1053,6 +1706,4 @@ def acsepsf(coords, img, imcam, pos, plot = False, verbose = False,
 	if writeto:
 		if verbose:
 			print('Writing to %s.fits.'%modname.replace('_psf', '_topsf'))
-		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = 'ePSFs', clobber = clobber)
-
-	return psfmodel
\ No newline at end of file
+		tools.rewrite_fits(psfmodel, coords, img, imcam, pos, method = method, clobber = clobber, stamp = stamp, compress = compress)
@@ -41,6 +41,7 @@ Original: https://github.com/spacetelescope/romancal/blob/main/romancal/resample
 import json
 import logging
 import os
+import tempfile
 from typing import List
 
 import numpy as np
@@ -55,6 +56,7 @@ from spike.romancal.associations_asn_from_list import asn_from_list
 import spike.romancal.assign_wcs_utils as utils
 from spike.romancal.datamodels_library import ModelLibrary
 from spike.romancal import resample_gwcs_drizzle, resample_utils
+from spike.stcal.pixmap_cache import get_pixmap_cache
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
@@ -121,6 +123,44 @@ class ResampleData:
                 should be kept in memory or written out to disk and
                 deleted from memory. Default value is `True` to keep
                 all products in memory.
+
+            .. note::
+                ``data_bbox`` restricts resampling of each input to a box
+                around its data: `True` to find the box of finite, non-zero
+                science pixels, or a dict of ``(xmin, xmax, ymin, ymax)``
+                keyed by input filename. The pixel map is only computed
+                inside the box.
+
+            .. note::
+                ``pixmap_step`` (input pixels), if set, computes pixel maps
+                by interpolating the exact transforms evaluated on a grid
+                with that spacing, to within ``pixmap_tol`` output pixels.
+                See `~resample_utils.calc_gwcs_pixmap`.
+
+            .. note::
+                ``pixmap_cache`` (MB), if set, keeps pixel maps in a
+                process-wide cache keyed by the input and output WCS, so
+                resampling e.g. model PSFs and then the images they model
+                onto the same output frame computes each map once. Maps are
+                also written to ``pixmap_cache_dir``, if given, and reused
+                from there as memory maps. Maps are cached per ``data_bbox``
+                limits (a cached map of the full input also serves limited
+                requests) and stored as float32.
+
+            .. note::
+                ``skip_variance`` skips resampling the variance arrays and
+                computing the error array, and ``skip_exptime`` skips the
+                exposure time image (exposure time metadata then comes from
+                the input exposure times), e.g. for model PSFs, whose error
+                and variance arrays are empty.
+
+            .. note::
+                ``tile_size`` (output pixels), if set, resamples the combined
+                output one ``tile_size`` x ``tile_size`` tile at a time, from
+                the inputs overlapping each tile only, into output arrays
+                memory-mapped to temporary files in ``tile_dir`` (default:
+                the system temporary directory). Peak memory is then set by
+                the tile and input sizes rather than the output size.
         """
         if (input_models is None) or (len(input_models) == 0):
             raise ValueError(
@@ -138,6 +178,18 @@ class ResampleData:
         self.weight_type = wht_type
         self.good_bits = good_bits
         self.in_memory = kwargs.get("in_memory", True)
+        self.data_bbox = kwargs.get("data_bbox", False)
+        self.pixmap_step = kwargs.get("pixmap_step", None)
+        self.pixmap_tol = kwargs.get("pixmap_tol", 1e-3)
+        self.skip_variance = kwargs.get("skip_variance", False)
+        self.skip_exptime = kwargs.get("skip_exptime", False)
+        self.tile_size = kwargs.get("tile_size", None)
+        self.tile_dir = kwargs.get("tile_dir", None)
+        self.pixmap_cache = None
+        if kwargs.get("pixmap_cache"):
+            self.pixmap_cache = get_pixmap_cache(
+                kwargs["pixmap_cache"] * 2**20, kwargs.get("pixmap_cache_dir")
+            )
         if "target" in input_models.asn:
             self.location_name = input_models.asn["target"]
         else:
@@ -203,8 +255,14 @@ class ResampleData:
 
         # n_images sets the number of context image planes.
         # This should be 1 to start (not the default of 2).
+        # A tiled resample (many to one only) replaces the arrays with memory
+        # maps, so its blank output is not allocated at full size. Per-group
+        # outputs (``single``, outlier detection) still drizzle into copies of
+        # the blank output.
         self.blank_output = maker_utils.mk_datamodel(
-            datamodels.MosaicModel, n_images=1, shape=tuple(self.output_wcs.array_shape)
+            datamodels.MosaicModel,
+            n_images=1,
+            shape=(1, 1) if (self.tile_size and not self.single) else tuple(self.output_wcs.array_shape),
         )
 
         with self.input_models:
@@ -245,6 +303,8 @@ class ResampleData:
         """Pick the correct drizzling mode based on ``self.single``."""
         if self.single:
             return self.resample_many_to_many()
+        elif self.tile_size:
+            return self.resample_many_to_one_tiled()
         else:
             return self.resample_many_to_one()
 
@@ -309,9 +369,7 @@ class ResampleData:
                 else:
                     data = img.data
 
-                xmin, xmax, ymin, ymax = resample_utils.resample_range(
-                    data.shape, img.meta.wcs.bounding_box
-                )
+                xmin, xmax, ymin, ymax = self._resample_limits(img, data)
 
                 driz.add_image(
                     data,
@@ -321,6 +379,7 @@ class ResampleData:
                     xmax=xmax,
                     ymin=ymin,
                     ymax=ymax,
+                    pixmap=self._calc_pixmap(img, data.shape, (xmin, xmax, ymin, ymax)),
                 )
                 del data
                 self.input_models.shelve(img, index, modify=False)
@@ -363,10 +422,8 @@ class ResampleData:
         # otherwise just build it as a list of in-memory models
         return ModelLibrary(output_models, on_disk=False)
 
-    def resample_many_to_one(self):
-        """Resample and coadd many inputs to a single output.
-        Used for level 3 resampling
-        """
+    def _many_to_one_output(self):
+        """Copy of the blank output with the metadata of a combined output."""
         output_model = self.blank_output.copy()
         output_model.meta.filename = self.output_filename
         output_model.meta["resample"] = maker_utils.mk_resample()
@@ -385,6 +442,14 @@ class ResampleData:
         if self.blendheaders:
             log.info("Skipping blendheaders for now.")
 
+        return output_model
+
+    def resample_many_to_one(self):
+        """Resample and coadd many inputs to a single output.
+        Used for level 3 resampling
+        """
+        output_model = self._many_to_one_output()
+
         # Initialize the output with the wcs
         driz = gwcs_drizzle.GWCSDrizzle(
             output_model,
@@ -411,9 +476,7 @@ class ResampleData:
                 else:
                     data = img.data
 
-                xmin, xmax, ymin, ymax = resample_utils.resample_range(
-                    data.shape, img.meta.wcs.bounding_box
-                )
+                xmin, xmax, ymin, ymax = self._resample_limits(img, data)
 
                 driz.add_image(
                     data,
@@ -423,6 +486,7 @@ class ResampleData:
                     xmax=xmax,
                     ymin=ymin,
                     ymax=ymax,
+                    pixmap=self._calc_pixmap(img, data.shape, (xmin, xmax, ymin, ymax)),
                 )
                 del data, inwht
                 self.input_models.shelve(img, i, modify=False)
@@ -433,25 +497,29 @@ class ResampleData:
             m["expname"] for m in self.input_models.asn["products"][0]["members"]
         ]
 
-        # Resample variances array in self.input_models to output_model
-        self.resample_variance_array("var_rnoise", output_model)
-        self.resample_variance_array("var_poisson", output_model)
-        self.resample_variance_array("var_flat", output_model)
+        if not self.skip_variance:
+            # Resample variances array in self.input_models to output_model
+            self.resample_variance_array("var_rnoise", output_model)
+            self.resample_variance_array("var_poisson", output_model)
+            self.resample_variance_array("var_flat", output_model)
 
         # Make exposure time image
-        exptime_tot = self.resample_exposure_time(output_model)
-
-        # TODO: fix unit here
-        output_model.err = np.sqrt(
-            np.nansum(
-                [
-                    output_model.var_rnoise,
-                    output_model.var_poisson,
-                    output_model.var_flat,
-                ],
-                axis=0,
+        exptime_tot = None
+        if not self.skip_exptime:
+            exptime_tot = self.resample_exposure_time(output_model)
+
+        if not self.skip_variance:
+            # TODO: fix unit here
+            output_model.err = np.sqrt(
+                np.nansum(
+                    [
+                        output_model.var_rnoise,
+                        output_model.var_poisson,
+                        output_model.var_flat,
+                    ],
+                    axis=0,
+                )
             )
-        )
 
         self.update_exposure_times(output_model, exptime_tot)
 
@@ -460,6 +528,259 @@ class ResampleData:
 
         return ModelLibrary([output_model])
 
+    def resample_many_to_one_tiled(self):
+        """Resample and coadd many inputs to a single output, one output tile
+        of ``tile_size`` pixels at a time.
+
+        Each tile is drizzled from the inputs whose footprints overlap it,
+        using only the input pixels that map into the tile, and copied into
+        output arrays memory-mapped to temporary files, so no array of the
+        full output size is held in memory.
+        """
+        output_model = self._many_to_one_output()
+        ny, nx = self.output_wcs.array_shape
+        size = self.tile_size
+        nplanes = (len(self.input_models) - 1) // 32 + 1
+        names = [] if self.skip_variance else ["var_rnoise", "var_poisson", "var_flat"]
+
+        arrays = {
+            name: self._tile_array((ny, nx))
+            for name in ["data", "weight", "var_rnoise", "var_poisson", "var_flat", "err"]
+        }
+        arrays["context"] = self._tile_array((nplanes, ny, nx), dtype=np.uint32)
+
+        # the input region to resample and its footprint in the output
+        inputs = []
+        with self.input_models:
+            for i, img in enumerate(self.input_models):
+                limits = self._resample_limits(img, img.data)
+                footprint = resample_utils.map_box(
+                    resample_utils.reproject(img.meta.wcs, self.output_wcs), limits
+                )
+                inputs.append((limits, footprint))
+                self.input_models.shelve(img, i, modify=False)
+
+        tiles = [
+            (x0, min(x0 + size, nx) - 1, y0, min(y0 + size, ny) - 1)
+            for y0 in range(0, ny, size)
+            for x0 in range(0, nx, size)
+        ]
+        log.info(
+            f"Resampling {nx} x {ny} output in {len(tiles)} tiles of "
+            f"{size} x {size} pixels"
+        )
+        exptime_sum, exptime_npix, exptime_max = 0.0, 0, 0.0
+        for box in tiles:
+            x0, x1, y0, y1 = box
+            region = np.s_[y0 : y1 + 1, x0 : x1 + 1]
+            tile = self._resample_tile(inputs, box, nplanes, names)
+            for name, values in tile.items():
+                if name == "context":
+                    arrays[name][(slice(None),) + region] = values.view(np.uint32)
+                elif name == "exptime":
+                    m = values > 0
+                    exptime_sum += float(np.sum(values[m]))
+                    exptime_npix += int(np.count_nonzero(m))
+                    exptime_max = max(exptime_max, float(np.max(values)))
+                else:
+                    arrays[name][region] = values
+
+        for name, values in arrays.items():
+            setattr(output_model, name, values)
+        gwcs_into_l3(output_model, self.output_wcs)
+
+        output_model.meta.resample["members"] = [
+            m["expname"] for m in self.input_models.asn["products"][0]["members"]
+        ]
+
+        exptime_tot = None
+        if not self.skip_exptime:
+            exptime_tot = (
+                exptime_sum / exptime_npix if exptime_npix else 0,
+                exptime_max,
+            )
+        self.update_exposure_times(output_model, exptime_tot)
+
+        return ModelLibrary([output_model])
+
+    def _tile_array(self, shape, dtype=np.float32):
+        """Zero array memory-mapped to an anonymous temporary file in
+        ``tile_dir``, which is removed once the array is released."""
+        return np.memmap(
+            tempfile.TemporaryFile(dir=self.tile_dir), dtype=dtype, mode="w+", shape=shape
+        )
+
+    def _resample_tile(self, inputs, box, nplanes, names):
+        """Resample the ``(xmin, xmax, ymin, ymax)`` (inclusive) ``box`` of the
+        output from the ``inputs`` (resample limits and output footprint of
+        each input) that overlap it.
+
+        Returns a dict of the tile arrays: ``data``, ``weight``, ``context``,
+        the variance arrays in ``names`` and ``err`` (if any), and ``exptime``
+        (unless ``skip_exptime``).
+        """
+        x0, x1, y0, y1 = box
+        shape = (y1 - y0 + 1, x1 - x0 + 1)
+        tile = {
+            "data": np.zeros(shape, dtype=np.float32),
+            "weight": np.zeros(shape, dtype=np.float32),
+            "context": np.zeros((nplanes,) + shape, dtype=np.int32),
+        }
+        inverse_variance_sum = {name: np.full(shape, np.nan) for name in names}
+        exptime_tot = None if self.skip_exptime else np.zeros(shape, dtype="f4")
+        ndrizzled = 0
+
+        with self.input_models:
+            for i, (limits, footprint) in enumerate(inputs):
+                # allow a pixel of margin for the drizzle kernel
+                if footprint is None or not (
+                    footprint[0] <= x1 + 1.5
+                    and footprint[1] >= x0 - 1.5
+                    and footprint[2] <= y1 + 1.5
+                    and footprint[3] >= y0 - 1.5
+                ):
+                    continue
+                model = self.input_models.borrow(i)
+                to_input = resample_utils.reproject(self.output_wcs, model.meta.wcs)
+                bounds = resample_utils.map_box(to_input, box)
+                if bounds is None:
+                    self.input_models.shelve(model, i, modify=False)
+                    continue
+
+                # input pixels that map into the tile (with a margin for the
+                # kernel), and the sub-array with the border the pixel map
+                # needs around them
+                xmin = max(limits[0], int(np.floor(bounds[0])) - 2)
+                xmax = min(limits[1], int(np.ceil(bounds[1])) + 2)
+                ymin = max(limits[2], int(np.floor(bounds[2])) - 2)
+                ymax = min(limits[3], int(np.ceil(bounds[3])) + 2)
+                if xmin > xmax or ymin > ymax:
+                    self.input_models.shelve(model, i, modify=False)
+                    continue
+                ny, nx = model.data.shape
+                sx0, sx1 = max(xmin - 1, 0), min(xmax + 1, nx - 1)
+                sy0, sy1 = max(ymin - 1, 0), min(ymax + 1, ny - 1)
+                sub = np.s_[sy0 : sy1 + 1, sx0 : sx1 + 1]
+
+                pixmap = resample_utils.calc_gwcs_pixmap_region(
+                    model.meta.wcs,
+                    self.output_wcs,
+                    (sx0, sx1, sy0, sy1),
+                    step=self.pixmap_step,
+                    tol=self.pixmap_tol,
+                )
+                pixmap[..., 0] -= x0
+                pixmap[..., 1] -= y0
+                driz_kwargs = dict(
+                    xmin=xmin - sx0,
+                    xmax=xmax - sx0,
+                    ymin=ymin - sy0,
+                    ymax=ymax - sy0,
+                    kernel=self.kernel,
+                    pixmap=pixmap,
+                )
+
+                data = model.data[sub]
+                if (
+                    hasattr(model.meta, "background")
+                    and model.meta.background.subtracted is False
+                    and model.meta.background.level is not None
+                ):
+                    data = data - model.meta.background.level
+                inwht = resample_utils.build_driz_weight(
+                    model,
+                    weight_type=self.weight_type,
+                    good_bits=self.good_bits,
+                    region=sub,
+                )
+                self.drizzle_arrays(
+                    data,
+                    inwht,
+                    model.meta.wcs,
+                    self.output_wcs,
+                    tile["data"],
+                    tile["weight"],
+                    tile["context"],
+                    uniqid=i + 1,
+                    pixfrac=self.pixfrac,
+                    fillval=self.fillval,
+                    **driz_kwargs,
+                )
+                ndrizzled += 1
+
+                if names or exptime_tot is not None:
+                    # unit weight map for all the input pixels with science data
+                    inwht = resample_utils.build_driz_weight(
+                        model, weight_type=None, good_bits=self.good_bits, region=sub
+                    )
+
+                for name in names:
+                    variance = getattr(model, name)
+                    if (
+                        variance is None
+                        or variance.size == 0
+                        or variance.shape != model.data.shape
+                    ):
+                        continue
+                    resampled_variance = np.zeros(shape, dtype=np.float32)
+                    self.drizzle_arrays(
+                        variance[sub],
+                        inwht,
+                        model.meta.wcs,
+                        self.output_wcs,
+                        resampled_variance,
+                        np.zeros(shape, dtype=np.float32),
+                        np.zeros(shape, dtype=np.int32),
+                        pixfrac=self.pixfrac,
+                        fillval=np.nan,
+                        **driz_kwargs,
+                    )
+                    mask = resampled_variance > 0
+                    inverse_variance_sum[name][mask] = np.nansum(
+                        [
+                            inverse_variance_sum[name][mask],
+                            np.reciprocal(resampled_variance[mask]),
+                        ],
+                        axis=0,
+                    )
+
+                if exptime_tot is not None:
+                    exptime = np.full(
+                        data.shape, model.meta.exposure.effective_exposure_time
+                    )
+                    resampled_exptime = np.zeros(shape, dtype=np.float32)
+                    self.drizzle_arrays(
+                        exptime * u.s,
+                        inwht,
+                        model.meta.wcs,
+                        self.output_wcs,
+                        resampled_exptime,
+                        np.zeros(shape, dtype=np.float32),
+                        np.zeros(shape, dtype=np.int32),
+                        pixfrac=1,  # for exposure time images, always use pixfrac = 1
+                        fillval=0,
+                        **driz_kwargs,
+                    )
+                    exptime_tot += resampled_exptime
+
+                del data, inwht, pixmap
+                self.input_models.shelve(model, i, modify=False)
+
+        # pixels no input overlaps are set to fillval by drizzle, unless no
+        # input overlaps the tile at all
+        if not ndrizzled and not util.is_blank(str(self.fillval)):
+            tile["data"][:] = float(self.fillval)
+
+        for name in names:
+            tile[name] = np.reciprocal(inverse_variance_sum[name])
+        if names:
+            tile["err"] = np.sqrt(
+                np.nansum([tile[name] for name in names], axis=0)
+            )
+        if exptime_tot is not None:
+            tile["exptime"] = exptime_tot
+        return tile
+
     def resample_variance_array(self, name, output_model):
         """Resample variance arrays from ``self.input_models`` to the ``output_model``.
 
@@ -497,9 +818,7 @@ class ResampleData:
                 outwht = np.zeros_like(output_model.data)
                 outcon = np.zeros_like(output_model.context)
 
-                xmin, xmax, ymin, ymax = resample_utils.resample_range(
-                    variance.shape, model.meta.wcs.bounding_box
-                )
+                xmin, xmax, ymin, ymax = self._resample_limits(model, model.data)
 
                 # resample the variance array (fill "unpopulated" pixels with NaNs)
                 self.drizzle_arrays(
@@ -517,6 +836,7 @@ class ResampleData:
                     xmax=xmax,
                     ymin=ymin,
                     ymax=ymax,
+                    pixmap=self._calc_pixmap(model, variance.shape, (xmin, xmax, ymin, ymax)),
                 )
 
                 # Add the inverse of the resampled variance to a running sum.
@@ -566,9 +886,7 @@ class ResampleData:
                 outcon = np.zeros_like(output_model.context, dtype="i4")
                 # drizzle wants an i4, but datamodels wants a u4.
 
-                xmin, xmax, ymin, ymax = resample_utils.resample_range(
-                    exptime.shape, model.meta.wcs.bounding_box
-                )
+                xmin, xmax, ymin, ymax = self._resample_limits(model, model.data)
 
                 # resample the exptime array
                 self.drizzle_arrays(
@@ -586,6 +904,7 @@ class ResampleData:
                     xmax=xmax,
                     ymin=ymin,
                     ymax=ymax,
+                    pixmap=self._calc_pixmap(model, exptime.shape, (xmin, xmax, ymin, ymax)),
                 )
 
                 exptime_tot += resampled_exptime
@@ -593,24 +912,85 @@ class ResampleData:
 
         return exptime_tot
 
-    def update_exposure_times(self, output_model, exptime_tot):
-        """Update exposure time metadata (in-place)."""
-        m = exptime_tot > 0
-        total_exposure_time = np.mean(exptime_tot[m]) if np.any(m) else 0
-        max_exposure_time = np.max(exptime_tot)
-        log.info(
-            f"Mean, max exposure times: {total_exposure_time:.1f}, "
-            f"{max_exposure_time:.1f}"
+    def _calc_pixmap(self, model, shape, limits):
+        """Pixel map from ``model`` to the output frame, only for ``limits``
+        if ``data_bbox`` is set, interpolated if ``pixmap_step`` is set, and
+        from the pixel map cache if enabled."""
+        kwargs = dict(
+            limits=limits if self.data_bbox else None,
+            step=self.pixmap_step,
+            tol=self.pixmap_tol,
+        )
+        if self.pixmap_cache is None:
+            return resample_utils.calc_gwcs_pixmap(
+                model.meta.wcs, self.output_wcs, shape, **kwargs
+            )
+        return self.pixmap_cache.pixmap(
+            model.meta.wcs,
+            self.output_wcs,
+            shape,
+            resample_utils.calc_gwcs_pixmap,
+            **kwargs,
+        )
+
+    def _resample_limits(self, model, data):
+        """Range of input pixels to resample: the WCS bounding box, narrowed
+        to the data bounding box of the input if ``data_bbox`` is set."""
+        limits = resample_utils.resample_range(data.shape, model.meta.wcs.bounding_box)
+        if not self.data_bbox:
+            return limits
+
+        if isinstance(self.data_bbox, dict):
+            bbox = self.data_bbox.get(model.meta.filename)
+        else:
+            bbox = resample_utils.data_bounding_box(data)
+        if bbox is None:
+            return limits
+
+        log.debug(f"Data bounding box of {model.meta.filename}: {bbox}")
+        return (
+            max(limits[0], bbox[0]),
+            min(limits[1], bbox[1]),
+            max(limits[2], bbox[2]),
+            min(limits[3], bbox[3]),
         )
-        exposure_times = {"start": [], "end": []}
+
+    def update_exposure_times(self, output_model, exptime_tot):
+        """Update exposure time metadata (in-place).
+
+        If ``exptime_tot`` is `None` (``skip_exptime``), the mean and maximum
+        exposure times are both set to the summed effective exposure time of
+        the input exposures, i.e. assuming they all overlap. A tiled resample
+        passes the ``(mean, max)`` exposure times it accumulated instead of
+        the exposure time image.
+        """
+        exposure_times = {"start": [], "end": [], "effective": []}
         with self.input_models:
             for group_id, indices in self.input_models.group_indices.items():
                 index = indices[0]
                 model = self.input_models.borrow(index)
                 exposure_times["start"].append(model.meta.exposure.start_time)
                 exposure_times["end"].append(model.meta.exposure.end_time)
+                exposure_times["effective"].append(
+                    model.meta.exposure.effective_exposure_time
+                )
                 self.input_models.shelve(model, index, modify=False)
 
+        if exptime_tot is None:
+            total_exposure_time = max_exposure_time = float(
+                np.sum(exposure_times["effective"])
+            )
+        elif isinstance(exptime_tot, tuple):
+            total_exposure_time, max_exposure_time = exptime_tot
+        else:
+            m = exptime_tot > 0
+            total_exposure_time = np.mean(exptime_tot[m]) if np.any(m) else 0
+            max_exposure_time = np.max(exptime_tot)
+        log.info(
+            f"Mean, max exposure times: {total_exposure_time:.1f}, "
+            f"{max_exposure_time:.1f}"
+        )
+
         # Update some basic exposure time values based on output_model
         output_model.meta.basic.mean_exposure_time = total_exposure_time
         output_model.meta.basic.time_first_mjd = min(exposure_times["start"]).mjd
@@ -636,6 +1016,7 @@ class ResampleData:
         kernel="square",
         fillval="INDEF",
         wtscale=1.0,
+        pixmap=None,
     ):
         """
         Low level routine for performing 'drizzle' operation on one image.
@@ -725,6 +1106,11 @@ class ResampleData:
             The value a pixel is set to in the output if the input image does
             not overlap it. The default value of INDEF does not set a value.
 
+        pixmap : 3d array, optional
+            Precomputed pixel map from the input to the output frame (see
+            `~resample_utils.calc_gwcs_pixmap`). If not provided, it is
+            computed from ``input_wcs`` and ``output_wcs``.
+
         Returns
         -------
         : tuple
@@ -765,7 +1151,8 @@ class ResampleData:
 
         # Compute the mapping between the input and output pixel coordinates
         # for use in drizzle.cdrizzle.tdriz
-        pixmap = resample_utils.calc_gwcs_pixmap(input_wcs, output_wcs, insci.shape)
+        if pixmap is None:
+            pixmap = resample_utils.calc_gwcs_pixmap(input_wcs, output_wcs, insci.shape)
 
         log.debug(f"Pixmap shape: {pixmap[:,:,0].shape}")
         log.debug(f"Input Sci shape: {insci.shape}")
@@ -172,6 +172,7 @@ class GWCSDrizzle:
         expin=1.0,
         in_units="cps",
         wt_scl=1.0,
+        pixmap=None,
     ):
         """
         Combine an input image with the output drizzled image.
@@ -237,6 +238,11 @@ class GWCSDrizzle:
             initialized with wt_scl set to "exptime" or "expsq", the exposure time
             will be used to set the weight scaling and the value of this parameter
             will be ignored.
+
+        pixmap : array, optional
+            Precomputed pixel map from the input to the output frame (see
+            `~resample_utils.calc_gwcs_pixmap`). If not provided, it is
+            computed from ``inwcs``.
         """
         if self.wt_scl == "exptime":
             wt_scl = expin
@@ -265,6 +271,7 @@ class GWCSDrizzle:
             pixfrac=self.pixfrac,
             kernel=self.kernel,
             fillval=self.fillval,
+            pixmap=pixmap,
         )
 
     def increment_id(self):
@@ -312,6 +319,7 @@ def dodrizzle(
     pixfrac=1.0,
     kernel="square",
     fillval="INDEF",
+    pixmap=None,
 ):
     """
     Low level routine for performing 'drizzle' operation on one image.
@@ -407,6 +415,10 @@ def dodrizzle(
         The value a pixel is set to in the output if the input image does
         not overlap it. The default value of INDEF does not set a value.
 
+    pixmap : 3d array, optional
+        Precomputed pixel map from the input to the output frame. If not
+        provided, it is computed from ``input_wcs`` and ``output_wcs``.
+
     Returns
     -------
     A tuple with three values: a version string, the number of pixels
@@ -460,7 +472,8 @@ def dodrizzle(
 
     # Compute the mapping between the input and output pixel coordinates
     # for use in drizzle.cdrizzle.tdriz
-    pixmap = resample_utils.calc_gwcs_pixmap(input_wcs, output_wcs, insci.shape)
+    if pixmap is None:
+        pixmap = resample_utils.calc_gwcs_pixmap(input_wcs, output_wcs, insci.shape)
     # inwht[np.isnan(pixmap[:,:,0])] = 0.
 
     log.debug(f"Pixmap shape: {pixmap[:,:,0].shape}")
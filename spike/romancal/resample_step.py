@@ -111,6 +111,15 @@ class ResampleStep(RomanStep):
         allowed_memory = float(default=None)  # Fraction of memory to use for the combined image.
         in_memory = boolean(default=True)
         good_bits = string(default='~DO_NOT_USE+NON_SCIENCE')  # The good bits to use for building the resampling mask.
+        data_bbox = boolean(default=False)  # Resample only the non-zero region of each input
+        pixmap_step = integer(min=4, default=None)  # Interpolate pixel maps between exact transforms on this grid
+        pixmap_tol = float(min=0.0, default=0.001)  # Maximum pixel map interpolation error (output pixels)
+        pixmap_cache = float(min=0.0, default=None)  # Pixel map cache size (MB) shared by resample runs in this process
+        pixmap_cache_dir = string(default=None)  # Directory to also store cached pixel maps in, as .npy files
+        skip_variance = boolean(default=False)  # Do not resample variance arrays or compute the error array
+        skip_exptime = boolean(default=False)  # Do not resample the exposure time image
+        tile_size = integer(min=64, default=None)  # Resample the output in tiles of this size (pixels), with memory-mapped output arrays
+        tile_dir = string(default=None)  # Directory for the memory-mapped output arrays of a tiled resample
     """
 
     reference_file_types: ClassVar = []
@@ -179,6 +188,15 @@ class ResampleStep(RomanStep):
         kwargs["pscale"] = self.pixel_scale
         kwargs["pscale_ratio"] = self.pixel_scale_ratio
         kwargs["in_memory"] = self.in_memory
+        kwargs["data_bbox"] = self.data_bbox
+        kwargs["pixmap_step"] = self.pixmap_step
+        kwargs["pixmap_tol"] = self.pixmap_tol
+        kwargs["pixmap_cache"] = self.pixmap_cache
+        kwargs["pixmap_cache_dir"] = self.pixmap_cache_dir
+        kwargs["skip_variance"] = self.skip_variance
+        kwargs["skip_exptime"] = self.skip_exptime
+        kwargs["tile_size"] = self.tile_size
+        kwargs["tile_dir"] = self.tile_dir
 
         # Call the resampling routine
         resamp = resample.ResampleData(input_models, output=output, **kwargs)
@@ -47,6 +47,7 @@ import numpy as np
 from astropy import wcs as fitswcs
 from astropy.modeling import Model
 from astropy.nddata.bitmask import bitfield_to_boolean_mask
+from scipy.interpolate import RectBivariateSpline
 from roman_datamodels.dqflags import pixel
 from spike.stcal.alignment_util import wcs_from_footprints
 
@@ -143,6 +144,7 @@ def build_driz_weight(
     model,
     weight_type=None,
     good_bits: str = None,
+    region=None,
 ):
     """
     Builds the drizzle weight map for resampling.
@@ -156,6 +158,9 @@ def build_driz_weight(
         Defaults to None.
     good_bits : str, optional
         The good bits to use for building the mask. Defaults to None.
+    region : tuple of slice, optional
+        If given, the weight map is built for ``model.data[region]`` only,
+        e.g. the input pixels that map into one output tile.
 
     Returns
     -------
@@ -176,8 +181,11 @@ def build_driz_weight(
         print(weight_map)
     """
 
+    if region is None:
+        region = np.s_[...]
+
     dqmask = bitfield_to_boolean_mask(
-        model.dq,
+        model.dq[region],
         good_bits,
         good_mask_value=1,
         dtype=np.uint8,
@@ -191,7 +199,7 @@ def build_driz_weight(
             and model.var_rnoise.shape == model.data.shape
         ):
             with np.errstate(divide="ignore", invalid="ignore"):
-                inv_variance = model.var_rnoise**-1
+                inv_variance = model.var_rnoise[region] ** -1
             inv_variance[~np.isfinite(inv_variance)] = 1
         else:
             warnings.warn(
@@ -204,7 +212,7 @@ def build_driz_weight(
         exptime = model.meta.exposure.exposure_time
         result = exptime * dqmask
     elif weight_type is None:
-        result = np.ones(model.data.shape, dtype=model.data.dtype) * dqmask
+        result = np.ones(dqmask.shape, dtype=model.data.dtype) * dqmask
     else:
         raise ValueError(
             f"Invalid weight type: {weight_type}."
@@ -257,7 +265,7 @@ def build_mask(dqarr, bitvalue):
     return dqmask
 
 
-def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None):
+def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None, limits=None, step=None, tol=1e-3):
     """
     Generate a pixel map grid using the input and output WCS.
 
@@ -271,6 +279,19 @@ def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None):
         Shape of the data. If provided, the bounding box will be calculated
         from the shape. If not provided, the bounding box will be calculated
         from the input WCS.
+    limits : tuple, optional
+        ``(xmin, xmax, ymin, ymax)`` (inclusive) region of the input to map.
+        Requires ``shape``. The transforms are only evaluated inside this
+        region (plus a one pixel border for the drizzle kernel) and the rest
+        of the map is NaN, so those pixels are not drizzled.
+    step : int, optional
+        If provided (with ``shape``), the transforms are evaluated exactly on
+        a grid with this spacing in input pixels and interpolated in between
+        with bicubic splines.
+    tol : float, optional
+        Maximum deviation of the interpolated map from the exact transforms,
+        in output pixels, checked at the center of every grid cell. Cells
+        that exceed it are evaluated exactly.
 
     Returns
     -------
@@ -278,6 +299,21 @@ def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None):
         The calculated pixel map grid.
 
     """
+    if (limits is not None or step) and shape:
+        if limits is None:
+            x0, x1, y0, y1 = 0, shape[1] - 1, 0, shape[0] - 1
+        else:
+            xmin, xmax, ymin, ymax = limits
+            x0, x1 = max(xmin - 1, 0), min(xmax + 1, shape[1] - 1)
+            y0, y1 = max(ymin - 1, 0), min(ymax + 1, shape[0] - 1)
+        log.debug(f"Pixel map region from data limits: {(x0, x1, y0, y1)}")
+
+        pixmap = np.full(tuple(shape) + (2,), np.nan)
+        pixmap[y0 : y1 + 1, x0 : x1 + 1] = calc_gwcs_pixmap_region(
+            in_wcs, out_wcs, (x0, x1, y0, y1), step=step, tol=tol
+        )
+        return pixmap
+
     if shape:
         bb = wcs_bbox_from_shape(shape)
         log.debug(f"Bounding box from data shape: {bb}")
@@ -289,6 +325,73 @@ def calc_gwcs_pixmap(in_wcs, out_wcs, shape=None):
     return np.dstack(reproject(in_wcs, out_wcs)(grid[0], grid[1]))
 
 
+def calc_gwcs_pixmap_region(in_wcs, out_wcs, region, step=None, tol=1e-3):
+    """
+    Generate the pixel map of a region of the input only.
+
+    Parameters
+    ----------
+    in_wcs : `~astropy.wcs.WCS`
+        Input WCS.
+    out_wcs : `~astropy.wcs.WCS`
+        Output WCS.
+    region : tuple
+        ``(xmin, xmax, ymin, ymax)`` (inclusive) region of the input to map.
+    step : int, optional
+        If provided, interpolate the map between the exact transforms on a
+        grid with this spacing (see `calc_gwcs_pixmap`).
+    tol : float, optional
+        Interpolation tolerance in output pixels.
+
+    Returns
+    -------
+    pixmap : `~numpy.ndarray`
+        Pixel map of shape ``(ymax - ymin + 1, xmax - xmin + 1, 2)``, i.e. for
+        the input sub-array ``[ymin:ymax + 1, xmin:xmax + 1]``.
+    """
+    transform = reproject(in_wcs, out_wcs)
+    if step:
+        return _interp_pixmap(transform, region, step, tol)
+    x0, x1, y0, y1 = region
+    grid = gwcs.wcstools.grid_from_bounding_box(
+        ((x0 - 0.5, x1 + 0.5), (y0 - 0.5, y1 + 0.5))
+    )
+    return np.dstack(transform(grid[0], grid[1]))
+
+
+def map_box(transform, box, nsample=16):
+    """
+    Bounding box of a pixel box mapped by a transform.
+
+    Parameters
+    ----------
+    transform : func
+        Function taking ``(x, y)`` arrays and returning ``(x, y)`` arrays,
+        e.g. from `reproject`.
+    box : tuple
+        ``(xmin, xmax, ymin, ymax)`` (inclusive) pixel box.
+    nsample : int, optional
+        Number of points sampled along each edge of the box.
+
+    Returns
+    -------
+    : tuple or None
+        ``(xmin, xmax, ymin, ymax)`` of the mapped edges of the box (outer
+        pixel edges included), or `None` if ``transform`` is undefined on
+        all of them.
+    """
+    xmin, xmax, ymin, ymax = box
+    x = np.linspace(xmin - 0.5, xmax + 0.5, nsample)
+    y = np.linspace(ymin - 0.5, ymax + 0.5, nsample)
+    ex = np.concatenate([x, x, np.full(nsample, x[0]), np.full(nsample, x[-1])])
+    ey = np.concatenate([np.full(nsample, y[0]), np.full(nsample, y[-1]), y, y])
+    tx, ty = (np.asarray(v, dtype=float) for v in transform(ex, ey))
+    good = np.isfinite(tx) & np.isfinite(ty)
+    if not good.any():
+        return None
+    return (tx[good].min(), tx[good].max(), ty[good].min(), ty[good].max())
+
+
 def reproject(wcs1, wcs2):
     """
     Given two WCSs or transforms return a function which takes pixel
@@ -427,6 +530,103 @@ def decode_context(context, x, y):
     ]
 
 
+def _interp_pixmap(transform, limits, step, tol=1e-3):
+    """
+    Pixel map of a region from a transform evaluated on a coarse grid.
+
+    Parameters
+    ----------
+    transform : func
+        Function taking input ``(x, y)`` arrays and returning output
+        ``(x, y)`` arrays, e.g. from `reproject`.
+    limits : tuple
+        ``(xmin, xmax, ymin, ymax)`` (inclusive) region of the input to map.
+    step : int
+        Spacing of the grid on which ``transform`` is evaluated exactly.
+    tol : float, optional
+        Maximum deviation of the bicubic spline interpolation from
+        ``transform`` at the center of a grid cell. Cells that exceed it are
+        evaluated exactly.
+
+    Returns
+    -------
+    pixmap : `~numpy.ndarray`
+        Pixel map of shape ``(ymax - ymin + 1, xmax - xmin + 1, 2)``.
+    """
+    xmin, xmax, ymin, ymax = limits
+    x = np.arange(xmin, xmax + 1, dtype=float)
+    y = np.arange(ymin, ymax + 1, dtype=float)
+    xs = np.unique(np.r_[np.arange(xmin, xmax, step), xmax])
+    ys = np.unique(np.r_[np.arange(ymin, ymax, step), ymax])
+    if len(xs) < 4 or len(ys) < 4:
+        # too few nodes for a bicubic spline
+        gx, gy = np.meshgrid(x, y)
+        return np.dstack(transform(gx, gy))
+
+    gx, gy = np.meshgrid(xs.astype(float), ys.astype(float))
+    nodes = transform(gx, gy)
+    if not all(np.isfinite(n).all() for n in nodes):
+        log.debug("Transform undefined on the interpolation grid; using exact pixel map")
+        gx, gy = np.meshgrid(x, y)
+        return np.dstack(transform(gx, gy))
+
+    splines = [RectBivariateSpline(ys, xs, n) for n in nodes]
+    pixmap = np.dstack([s(y, x) for s in splines])
+
+    cx, cy = np.meshgrid((xs[:-1] + xs[1:]) / 2.0, (ys[:-1] + ys[1:]) / 2.0)
+    exact = transform(cx, cy)
+    err = np.hypot(
+        exact[0] - splines[0].ev(cy, cx), exact[1] - splines[1].ev(cy, cx)
+    )
+    refine = ~(err <= tol)
+    for j, i in zip(*np.nonzero(refine)):
+        sx = slice(xs[i] - xmin, xs[i + 1] - xmin + 1)
+        sy = slice(ys[j] - ymin, ys[j + 1] - ymin + 1)
+        bx, by = np.meshgrid(x[sx], y[sy])
+        pixmap[sy, sx] = np.dstack(transform(bx, by))
+
+    log.debug(
+        f"Interpolated pixel map from {nodes[0].size} nodes: max deviation "
+        f"{np.nanmax(err):.2g} pix, {np.count_nonzero(refine)}/{err.size} "
+        "cells evaluated exactly"
+    )
+    return pixmap
+
+
+def data_bounding_box(data, pad=2):
+    """
+    Find the region of finite, non-zero pixels of an image.
+
+    Used to resample only the populated region of sparse inputs, e.g. model
+    PSF frames that are zero away from the PSF.
+
+    Parameters
+    ----------
+    data : `~numpy.ndarray`
+        2D image.
+    pad : int, optional
+        Number of pixels by which to grow the region on each side.
+
+    Returns
+    -------
+    : tuple or None
+        ``(xmin, xmax, ymin, ymax)`` (inclusive), or `None` if all pixels
+        are zero or non-finite.
+    """
+    good = np.isfinite(data) & (data != 0)
+    rows = np.flatnonzero(good.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(good.any(axis=0))
+    ny, nx = data.shape
+    return (
+        max(int(cols[0]) - pad, 0),
+        min(int(cols[-1]) + pad, nx - 1),
+        max(int(rows[0]) - pad, 0),
+        min(int(rows[-1]) + pad, ny - 1),
+    )
+
+
 def resample_range(data_shape, bbox=None):
     # Find range of input pixels to resample:
     if bbox is None:
@@ -1 +1 @@
-from . import alignment_util, tweakreg_astrometric_utils, tweakreg_tweakreg
\ No newline at end of file
+from . import alignment_util, pixmap_cache, tweakreg_astrometric_utils, tweakreg_tweakreg
\ No newline at end of file
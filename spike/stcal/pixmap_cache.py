@@ -0,0 +1,229 @@
+"""
+In-process cache of drizzle pixel maps shared by the jwstcal and romancal
+resample steps (not part of STCAL).
+
+Model PSF frames are written with the WCS of the exposure they model, so when
+images are drizzled alongside their PSFs (or several targets share an output
+frame), the same input -> output pixel map is needed repeatedly. Maps are
+keyed by fingerprints of the input and output WCS, the input shape, and the
+options used to compute the map (including its limits), stored as float32, held in memory up to a byte budget with
+least-recently-used eviction, and optionally written to ``.npy`` files that
+are reused through memory maps (also by other processes sharing the
+directory).
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+__all__ = ["PixmapCache", "get_pixmap_cache", "pixmap_key", "wcs_fingerprint"]
+
+
+def _bbox_repr(wcs):
+    try:
+        bbox = wcs.bounding_box
+    except (AttributeError, NotImplementedError):
+        bbox = None
+    if bbox is None:
+        return ""
+    try:
+        return repr(np.asarray(bbox, dtype=float).tolist())
+    except (TypeError, ValueError):
+        return repr(bbox)
+
+
+def _sample_pixels(shape, nsample=7):
+    ny, nx = shape[:2]
+    x, y = np.meshgrid(np.linspace(0, nx - 1, nsample), np.linspace(0, ny - 1, nsample))
+    return x.ravel(), y.ravel()
+
+
+def _digest(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        if isinstance(p, np.ndarray):
+            h.update(np.ascontiguousarray(p, dtype=float).tobytes())
+        else:
+            h.update(repr(p).encode())
+    return h.hexdigest()
+
+
+def wcs_fingerprint(in_wcs, shape, out_wcs=None, nsample=7):
+    """
+    Fingerprint a WCS (or an input -> output WCS pair) by sampling it.
+
+    Parameters
+    ----------
+    in_wcs : `~astropy.wcs.WCS` or `~gwcs.wcs.WCS`
+        Input WCS, evaluated (pixel -> world) on an ``nsample`` x ``nsample``
+        grid spanning ``shape``.
+    shape : tuple
+        Shape of the input array.
+    out_wcs : `~astropy.wcs.WCS` or `~gwcs.wcs.WCS`, optional
+        If given, the fingerprint is of ``out_wcs`` instead, evaluated
+        (world -> pixel) at the world coordinates of the input samples, i.e.
+        it identifies the output frame as seen by ``in_wcs``.
+    nsample : int, optional
+        Samples per axis.
+
+    Returns
+    -------
+    str
+        Hex digest, equal for WCSs that agree at every sample and have the
+        same bounding box.
+    """
+    x, y = _sample_pixels(shape, nsample)
+    world = np.asarray(in_wcs.pixel_to_world_values(x, y), dtype=float)
+    if out_wcs is None:
+        return _digest(world, _bbox_repr(in_wcs))
+    pix = np.asarray(out_wcs.world_to_pixel_values(*world), dtype=float)
+    return _digest(pix, _bbox_repr(out_wcs))
+
+
+def pixmap_key(in_wcs, out_wcs, shape, **options):
+    """
+    Cache key for the pixel map from ``in_wcs`` to ``out_wcs`` for an input
+    of ``shape``, computed with ``options`` (e.g. ``limits``, ``step``, ``tol``).
+    """
+    shape = tuple(int(s) for s in shape)
+    return _digest(
+        wcs_fingerprint(in_wcs, shape),
+        wcs_fingerprint(in_wcs, shape, out_wcs),
+        shape,
+        sorted(options.items()),
+    )
+
+
+class PixmapCache:
+    """
+    Least-recently-used cache of pixel maps with a memory budget.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory budget for the maps held in memory. Maps larger than the
+        budget are not held in memory (but are still written to
+        ``spill_dir``).
+    spill_dir : str, optional
+        Directory to which every new map is written as ``<key>.npy``. Maps
+        not held in memory are read back from there as copy-on-write memory
+        maps, so the directory can be shared between worker processes and
+        runs.
+    """
+
+    def __init__(self, max_bytes, spill_dir=None):
+        self.max_bytes = int(max_bytes)
+        self.spill_dir = spill_dir
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._maps)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.npy")
+
+    def get(self, key):
+        """Return the cached map for ``key``, or `None`."""
+        with self._lock:
+            pixmap = self._maps.get(key)
+            if pixmap is not None:
+                self._maps.move_to_end(key)
+                return pixmap
+        if self.spill_dir and os.path.exists(self._spill_path(key)):
+            return np.load(self._spill_path(key), mmap_mode="c")
+        return None
+
+    def put(self, key, pixmap):
+        """Add ``pixmap`` under ``key``, evicting older maps as needed."""
+        if self.spill_dir and not os.path.exists(self._spill_path(key)):
+            # write then rename, so concurrent readers never see a partial file
+            tmp = self._spill_path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, pixmap)
+            os.replace(tmp, self._spill_path(key))
+        if pixmap.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._maps:
+                self.nbytes -= self._maps.pop(key).nbytes
+            self._maps[key] = pixmap
+            self.nbytes += pixmap.nbytes
+            self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes:
+            _, old = self._maps.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def clear(self):
+        """Drop all maps held in memory (files in ``spill_dir`` are kept)."""
+        with self._lock:
+            self._maps.clear()
+            self.nbytes = 0
+
+    def pixmap(self, in_wcs, out_wcs, shape, calc, limits=None, **options):
+        """
+        Return the pixel map from ``in_wcs`` to ``out_wcs``, computing it with
+        ``calc(in_wcs, out_wcs, shape, limits=limits, **options)`` on a miss.
+
+        Maps are keyed by ``limits`` too, so a request restricted to e.g. a
+        model PSF's data bounding box only computes the map there. A map of
+        the full input (``limits=None``) that is already cached also serves
+        limited requests, since drizzle only reads the map within the limits.
+        Maps are stored as float32, which is well within the precision of
+        the transforms for any detector size.
+        """
+        if limits is not None:
+            limits = tuple(int(v) for v in limits)
+        key = pixmap_key(in_wcs, out_wcs, shape, limits=limits, **options)
+        pixmap = self.get(key)
+        if pixmap is None and limits is not None:
+            pixmap = self.get(pixmap_key(in_wcs, out_wcs, shape, limits=None, **options))
+        if pixmap is None:
+            self.misses += 1
+            pixmap = np.asarray(
+                calc(in_wcs, out_wcs, shape, limits=limits, **options), dtype=np.float32
+            )
+            self.put(key, pixmap)
+        else:
+            self.hits += 1
+        log.debug(
+            f"Pixel map cache: {self.hits} hits, {self.misses} misses, "
+            f"{len(self)} maps ({self.nbytes / 2**20:.1f} MB) in memory"
+        )
+        return pixmap
+
+
+_cache = None
+
+
+def get_pixmap_cache(max_bytes, spill_dir=None):
+    """
+    Return the process-wide `PixmapCache`, created on first use and updated
+    to ``max_bytes`` and ``spill_dir``, so that successive resample runs (e.g.
+    of model PSFs and of the images they model) share pixel maps.
+    """
+    global _cache
+    if _cache is None:
+        _cache = PixmapCache(max_bytes, spill_dir)
+    else:
+        with _cache._lock:
+            _cache.max_bytes = int(max_bytes)
+            _cache._evict()
+        if spill_dir and spill_dir != _cache.spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        _cache.spill_dir = spill_dir
+    return _cache
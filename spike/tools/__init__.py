@@ -1,2 +1,8 @@
-from .tools import objloc, checkpixloc, to_asdf, pysextractor, psfexim
-from .tools import pypsfex, rewrite_fits, regridarr, mask_fits, cutout
\ No newline at end of file
+from .tools import objloc, objcache, resolvenames, sesame, tableresolver
+from .tools import iscatalog, readcatalog, appendresults
+from .tools import mosaicshape, planrun
+from .tools import imgindex, batchpixloc, checkpixloc, to_asdf, pysextractor, psfexim
+from .tools import pypsfex, rewrite_fits, regridarr, mask_fits, cutout
+from .tools import loadmanifest, savemanifest, checksum, imagechecksum, taskkey, checkmanifest, updatemanifest
+from .tools import renamefile, copyfile, copyfiles, movefiles, removefiles, scratchdir, filelock
+from .tools import isstamp, expandstamp, expandstamps, compimagehdu, iscompressed, decompress
\ No newline at end of file
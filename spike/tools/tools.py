@@ -1,12 +1,27 @@
 from asdf import AsdfFile
 import astropy
 from astropy.coordinates import SkyCoord, name_resolve
-from astropy.io import fits
+from astropy.io import ascii, fits
+from astropy.table import Table
 import astropy.units as u
 from astropy.wcs import WCS, utils
+import contextlib
+import csv
+import errno
+import fnmatch
+import hashlib
+import json
 import numpy as np
 import os
+import pickle
+import psutil
 from scipy.interpolate import RectBivariateSpline
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
 import warnings
 
 def warning_on_one_line(message, category, filename, lineno, file=None, line=None):
@@ -26,13 +41,199 @@ except:
 #  * * * * 
 # #########
 
+# name resolution settings and cache for objloc -- see spike.tools.objcache
+_objconfig = {'cachefile':os.environ.get('SPIKE_OBJCACHE'), 'ttl':30., 'resolver':None}
+_objcache = {}
+
+
+def sesame(name):
+	"""
+	Resolve an object name to ICRS coordinates with Sesame. This is the default resolver for spike.tools.objloc.
+
+	Parameters:
+		name (str): Object name.
+
+	Returns:
+		coords (astropy coordinates object)
+	"""
+
+	try: 
+	#simbad should be most reliable and should be queried first
+	#seems astropy changed recently, though because I've seen funky behavior
+		name_resolve.sesame_database.set('simbad')
+		coords = name_resolve.get_icrs_coordinates(name)
+	except:
+	#if no simbad results, THEN query other databses for coordinates
+		name_resolve.sesame_database.set('all')
+		coords = name_resolve.get_icrs_coordinates(name)
+
+	return coords
+
+
+def tableresolver(table, namecol = 'name', racol = 'ra', deccol = 'dec'):
+	"""
+	Make a resolver for spike.tools.objcache that looks names up in a local table (e.g., for use without network access).
+
+	Parameters:
+		table (str or astropy table): Table, or path to any table astropy can read (e.g., .fits, .csv, .ecsv).
+		namecol, racol, deccol (str): Columns storing object names and ICRS coordinates. Coordinates are taken
+			to be in degrees unless the columns have units.
+
+	Returns:
+		resolver (callable): Takes an object name and returns its coordinates, raising a KeyError if not in table.
+	"""
+
+	if type(table) == str:
+		table = Table.read(table)
+
+	ras = u.Quantity(table[racol], u.deg).value
+	decs = u.Quantity(table[deccol], u.deg).value
+	lookup = {str(n).strip():(ra, dec) for n, ra, dec in zip(table[namecol], ras, decs)}
+
+	def resolver(name):
+		ra, dec = lookup[name.strip()]
+		return SkyCoord(ra, dec, unit = u.deg, frame = 'icrs')
+
+	return resolver
+
+
+def _readobjcache(cachefile):
+	"""
+	Read name resolution cache (JSON) from disk. Returns an empty cache if it cannot be read.
+	"""
+
+	if not (cachefile and os.path.exists(cachefile)):
+		return {}
+	try:
+		with open(cachefile, 'r') as file:
+			return json.load(file)
+	except:
+		warnings.warn('Could not read %s; starting a new name cache.'%cachefile, Warning, stacklevel = 3)
+		return {}
+
+
+def _saveobjcache():
+	"""
+	Write the name resolution cache to disk, keeping entries added by other processes in the meantime.
+	"""
+
+	cachefile = _objconfig['cachefile']
+	if not cachefile:
+		return
+
+	saved = _readobjcache(cachefile)
+	for name, entry in _objcache.items():
+		if (name not in saved) or (saved[name]['time'] < entry['time']):
+			saved[name] = entry
+	_objcache.update(saved)
+
+	tmpfile = '%s.%i.tmp'%(cachefile, os.getpid())
+	with open(tmpfile, 'w') as file:
+		json.dump(saved, file, indent = 1)
+	os.replace(tmpfile, cachefile)
+
+
+def objcache(cachefile = None, ttl = 30., resolver = None):
+	"""
+	Set how spike.tools.objloc resolves object names. Resolved names are always reused within a session; 
+	with a cache file, they are also reused across sessions and processes.
+
+	Parameters:
+		cachefile (str): Path to cache (JSON) of name -> ICRS coordinates. Created if it does not exist. If None,
+			uses the SPIKE_OBJCACHE environment variable, if set, and otherwise only caches in memory.
+		ttl (float): Time in days after which a cached name is resolved again. If None, entries do not expire.
+			Expired entries are still used (with a warning) if the name can no longer be resolved -- e.g., offline.
+		resolver (callable or str): Function that takes an object name and returns its coordinates (as an astropy 
+			coordinates object), raising an exception if it cannot. If a path, uses spike.tools.tableresolver on 
+			that table. Default is spike.tools.sesame.
+
+	Returns:
+		cache (dict): Cached entries, {name: {'ra', 'dec', 'time'}}, in degrees and seconds since epoch.
+	"""
+
+	if type(resolver) == str:
+		resolver = tableresolver(resolver)
+
+	_objconfig['cachefile'] = cachefile or os.environ.get('SPIKE_OBJCACHE')
+	_objconfig['ttl'] = ttl
+	_objconfig['resolver'] = resolver
+
+	_objcache.update(_readobjcache(_objconfig['cachefile']))
+
+	return _objcache
+
+
+def _isname(obj):
+	"""
+	Check whether obj is an object name rather than coordinates.
+	"""
+
+	for s in obj:
+		if s.isalpha():
+			return True
+
+	return False
+
+
+def _cachedloc(name, expired = False):
+	"""
+	Get coordinates of name from the cache, or None if not cached (or expired, unless expired = True).
+	"""
+
+	if (not _objcache) and _objconfig['cachefile']: #first lookup of the session
+		_objcache.update(_readobjcache(_objconfig['cachefile']))
+
+	entry = _objcache.get(name.strip())
+	if not entry:
+		return None
+	ttl = _objconfig['ttl']
+	if (not expired) and (ttl is not None) and (time.time() - entry['time'] > ttl*86400):
+		return None
+
+	return SkyCoord(entry['ra'], entry['dec'], unit = u.deg, frame = 'icrs')
+
+
+def _resolve(name, prompt = True, save = True):
+	"""
+	Resolve name, using the cache where possible and adding new results to it.
+	"""
+
+	coords = _cachedloc(name)
+	if coords is not None:
+		return coords
+
+	resolver = _objconfig['resolver'] or sesame
+	try:
+		coords = resolver(name)
+	except Exception:
+		coords = _cachedloc(name, expired = True)
+		if coords is not None:
+			warnings.warn('Could not resolve %s; using expired cached coordinates.'%name, Warning, stacklevel = 3)
+			return coords
+		if not prompt:
+			raise
+		coordobj = input('Object name (%s) not resolvable, please enter coordinates:  '%name)
+		if ':' in coordobj:
+			coords = SkyCoord(coordobj, unit = (u.hour, u.deg), frame = 'icrs')
+		if not ':' in coordobj:
+			coords = SkyCoord(coordobj, unit = u.deg, frame = 'icrs')
+
+	coords = coords.icrs
+	_objcache[name.strip()] = {'ra':coords.ra.deg, 'dec':coords.dec.deg, 'time':time.time()}
+	if save:
+		_saveobjcache()
+
+	return coords
+
+
 def objloc(obj, prompt = True):
 	"""
 	Get object location.
 
 	Parameters:
 		obj (str): Name or coordinates for object of interest. If coordinates, should be in
-			HH:MM:SS DD:MM:SS or degree formats. Names must be resolvable in SIMBAD.
+			HH:MM:SS DD:MM:SS or degree formats. Names must be resolvable in SIMBAD (or by the 
+			resolver set with spike.tools.objcache). Resolved names are cached.
 		prompt (bool): If prompt, will ask for coordinates in the case that obj name is not resolvable.
 	Returns:
 		coords (astropy coordinates object)
@@ -42,41 +243,10 @@ def objloc(obj, prompt = True):
 		return obj
 
 	else:
-		isname = False #check if obj is name or coordinates
-		for s in obj:
-			if s.isalpha():
-				isname = True
-				break
+		isname = _isname(obj) #check if obj is name or coordinates
 
 		if isname:
-			if not prompt:
-				try: 
-				#simbad should be most reliable and should be queried first
-				#seems astropy changed recently, though because I've seen funky behavior
-					name_resolve.sesame_database.set('simbad')
-					coords = name_resolve.get_icrs_coordinates(obj)
-				except:
-				#if no simbad results, THEN query other databses for coordinates
-					name_resolve.sesame_database.set('all')
-					coords = name_resolve.get_icrs_coordinates(obj)
-
-			if prompt:
-				try:
-					try: 
-					#simbad should be most reliable and should be queried first
-					#seems astropy changed recently, though because I've seen funky behavior
-						name_resolve.sesame_database.set('simbad')
-						coords = name_resolve.get_icrs_coordinates(obj)
-					except:
-					#if no simbad results, THEN query other databses for coordinates
-						name_resolve.sesame_database.set('all')
-						coords = name_resolve.get_icrs_coordinates(obj)
-				except:
-					coordobj = input('Object name (%s) not resolvable, please enter coordinates:  '%obj)
-					if ':' in coordobj:
-						coords = SkyCoord(coordobj, unit = (u.hour, u.deg), frame = 'icrs')
-					if not ':' in coordobj:
-						coords = SkyCoord(coordobj, unit = u.deg, frame = 'icrs')
+			coords = _resolve(obj, prompt)
 
 		if not isname:
 			if ':' in obj:
@@ -87,7 +257,323 @@ def objloc(obj, prompt = True):
 		return coords
 
 
-def checkpixloc(coords, img, inst, camera = None):
+def resolvenames(objs, prompt = True):
+	"""
+	Get locations of a list of objects, resolving each distinct name once and writing the cache once.
+
+	Parameters:
+		objs (list): Names or coordinates of objects of interest, as for spike.tools.objloc.
+		prompt (bool): If prompt, will ask for coordinates in the case that an object name is not resolvable.
+
+	Returns:
+		coords (list): Astropy coordinates objects, in the order of objs.
+	"""
+
+	resolved = {}
+	try:
+		for o in objs:
+			if (type(o) == str) and _isname(o) and (o not in resolved):
+				resolved[o] = _resolve(o, prompt, save = False)
+	finally:
+		if resolved:
+			_saveobjcache()
+
+	return [resolved[o] if (type(o) == str) and (o in resolved) else objloc(o, prompt) for o in objs]
+
+
+def _catalogchunks(catalog, chunksize):
+	"""
+	Read a catalog in blocks of rows. FITS tables are memory-mapped and CSV files are parsed in blocks.
+	"""
+
+	if type(catalog) == str:
+		if catalog.lower().endswith('.csv'):
+			for block in ascii.read(catalog, format = 'csv', guess = False, 
+				fast_reader = {'chunk_size':2**22, 'chunk_generator':True}):
+				yield block
+			return
+		if catalog.lower().split('.gz')[0].endswith(('.fits', '.fit')):
+			catalog = Table.read(catalog, memmap = True)
+		else:
+			catalog = Table.read(catalog)
+
+	for start in range(0, len(catalog), chunksize):
+		yield catalog[start:start+chunksize]
+
+
+def iscatalog(obj):
+	"""
+	Check whether obj is a target catalog (an astropy table or path to a FITS, CSV, or ECSV table) rather than 
+	an object name, coordinates, or list of these.
+	"""
+
+	if isinstance(obj, Table):
+		return True
+	if type(obj) == str:
+		return os.path.isfile(obj) and obj.lower().split('.gz')[0].endswith(('.fits', '.fit', '.csv', '.ecsv'))
+
+	return False
+
+
+def readcatalog(catalog, chunksize = 1000, columns = None):
+	"""
+	Read targets from a catalog in chunks, so that a large catalog is never held in memory as a whole.
+
+	Parameters:
+		catalog (str or astropy table): Table, or path to a FITS, CSV, or ECSV table of targets.
+		chunksize (int): Number of targets per chunk.
+		columns (str or tuple): Column of object names, or (RA, Dec) columns of ICRS coordinates -- in degrees
+			unless the columns have units. If None, uses 'ra' and 'dec' columns if present (case-insensitive) 
+			and otherwise a 'name' column or the first column.
+
+	Returns:
+		Generator of lists of targets (names, or 'RA Dec' strings in degrees), as accepted by spike.tools.objloc.
+	"""
+
+	targets = []
+	for block in _catalogchunks(catalog, chunksize):
+		if columns is None:
+			lower = {c.lower():c for c in block.colnames}
+			if ('ra' in lower) and ('dec' in lower):
+				columns = (lower['ra'], lower['dec'])
+			else:
+				columns = lower.get('name', block.colnames[0])
+
+		if type(columns) == str:
+			targets += [str(n).strip() for n in block[columns]]
+		else:
+			ras = u.Quantity(block[columns[0]], u.deg).value
+			decs = u.Quantity(block[columns[1]], u.deg).value
+			targets += ['%.8f %.8f'%(ra, dec) for ra, dec in zip(ras, decs)]
+
+		while len(targets) >= chunksize:
+			yield targets[:chunksize]
+			targets = targets[chunksize:]
+
+	if targets:
+		yield targets
+
+
+def appendresults(resultsfile, rows, colnames):
+	"""
+	Append rows to a results table (CSV), writing the header if the file is new.
+
+	Parameters:
+		resultsfile (str): Path to results table.
+		rows (list): List of rows, each a list of values in the order of colnames.
+		colnames (list): Column names.
+
+	Returns:
+		Updates resultsfile.
+	"""
+
+	isnew = not os.path.exists(resultsfile)
+	with open(resultsfile, 'a', newline = '') as file:
+		writer = csv.writer(file)
+		if isnew:
+			writer.writerow(colnames)
+		writer.writerows(rows)
+
+
+def _getfilt(hdr, inst):
+	"""
+	Read filter name from primary header.
+
+	Parameters:
+		hdr (FITS header): Primary header of image.
+		inst (str): Instrument of interest.
+
+	Returns:
+		filt (str): Filter name.
+	"""
+	try: #get filter
+		filt = hdr['FILTER']
+	except:
+		if inst.upper() == 'WFPC2':
+			if str(hdr['FILTNAM1']).startswith('F'):
+				filt = hdr['FILTNAM1'].rstrip()
+			else:
+				filt = hdr['FILTNAM2'].rstrip()
+
+		if inst.upper() != 'WFPC2':
+			if str(hdr['FILTER1']).startswith('F'):
+				filt = hdr['FILTER1']
+			else:
+				filt = hdr['FILTER2']
+
+	return filt
+
+
+def imgindex(imgs, inst, camera = None, index = None, indexfile = None, verbose = False):
+	"""
+	Index the filter, instrument, detector/chip layout, data shapes, and WCS of each image in 
+	a single pass, so that headers are only parsed and WCS only constructed once per run.
+
+	Parameters:
+		imgs (str or list): Path to image or list of paths to images.
+		inst (str): Instrument of interest. 
+				HST: 'ACS', 'WFC3', 'WFPC', WFPC2', 'NICMOS'
+				JWST: 'MIRI', 'NIRCAM', 'NIRISS'
+				Roman: 'WFI', 'CGI'
+		camera (str): Camera associated with instrument.
+				HST/ACS: 'WFC', 'HRC'
+				HST/WFC3: 'UVIS', 'IR'
+				JWST/NIRISS: 'Imaging', 'AMI'
+		index (dict): Existing index (as from spike.tools.imgindex) to update. Entries for files that 
+			have not changed on disk are reused rather than rebuilt.
+		indexfile (str): If specified, path to a serialized (pickled) index. Unchanged entries are read 
+			from it and the updated index is written back to it, so later runs on the same files start warm.
+		verbose (bool): If True, prints progress messages.
+
+	Returns:
+		index (dict): Image path-indexed dict. Each entry stores 'filter', 'inst', 'imcam', and 'chips' -- 
+			a list with the 'chip' (chip number (HST) or detector name (JWST/Roman)), 'ext', 'shape' 
+			(numpy order), and 'wcs' (astropy.wcs.WCS) of each detector/chip -- plus the 'size' and 
+			'mtime' of the file used to check whether the entry is current.
+	"""
+
+	if type(imgs) == str:
+		imgs = [imgs]
+
+	if camera:
+		imcam = inst.upper() + '/' + camera.upper()
+	if not camera:
+		imcam = inst.upper()
+
+	cached = {}
+	if index:
+		cached.update(index)
+	if indexfile and os.path.exists(indexfile):
+		try:
+			with open(indexfile, 'rb') as file:
+				cached = {**pickle.load(file), **cached}
+		except:
+			warnings.warn('Could not read %s; rebuilding image index.'%indexfile, Warning, stacklevel = 2)
+
+	out = {}
+	nbuilt = 0
+	for img in imgs:
+		stat = os.stat(img)
+		if img in cached:
+			entry = cached[img]
+			if (entry['size'] == stat.st_size) and (entry['mtime'] == stat.st_mtime_ns) and (entry['imcam'] == imcam):
+				out[img] = entry
+				continue
+
+		hdu = fits.open(img)
+
+		### instrument checks ###
+		if imcam in ['ACS/WFC', 'WFC3/UVIS']:
+			chiplayout = [(4, 1), (1, 2)] #(extension, chip)
+		elif imcam in ['WFPC', 'WFPC1']: #accounting for use of both names
+			chiplayout = [(e, e) for e in range(1, 9)]
+		elif imcam == 'WFPC2':
+			chiplayout = [(e, e) for e in range(1, 5)]
+		else:
+			# for WFC3, only checks the final readout by design
+			chip = 0 #no chip
+			if imcam == 'NIRCAM':
+				chip = hdu[0].header['DETECTOR']
+				if chip in ['NRCALONG', 'NRCBLONG']:
+					chip = chip.replace('LONG', '5')
+			if imcam == 'WFI':
+				# based on how SCA detector is identified in simulated data: https://roman.ipac.caltech.edu/sims/Simulations_csv.html
+				strlist = img.split('_')
+				chip = 'SCA%s'%strlist[-1].split('.')[0].rjust(2, '0')
+			chiplayout = [(1, chip)]
+
+		chips = []
+		for ext, chip in chiplayout:
+			a = hdu[ext]
+			chips.append({'chip':chip, 'ext':ext, 
+				'shape':(a.header['NAXIS2'], a.header['NAXIS1']), #avoid reading data just for its shape
+				'wcs':WCS(a.header, fobj = hdu)})
+
+		out[img] = {'filter':_getfilt(hdu[0].header, inst), 'inst':inst.upper(), 'imcam':imcam, 
+			'chips':chips, 'size':stat.st_size, 'mtime':stat.st_mtime_ns}
+		hdu.close()
+		nbuilt += 1
+
+	if verbose:
+		print('Indexed %i images (%i from cache).'%(len(out), len(out) - nbuilt))
+
+	if indexfile and (nbuilt > 0):
+		with open(indexfile, 'wb') as file:
+			pickle.dump({**cached, **out}, file)
+
+	return out
+
+
+def batchpixloc(coords, img, inst, camera = None, index = None):
+	"""
+	Get locations of many objects on detector at once, using one vectorized world-to-pixel
+	transformation per chip/detector.
+
+	Parameters:
+		coords (astropy skycoord object): Array of N coordinates of objects of interest (a list of 
+			skycoord objects is also accepted).
+		img (str): Path to image.
+		inst (str): Instrument of interest. 
+				HST: 'ACS', 'WFC3', 'WFPC', WFPC2', 'NICMOS'
+				JWST: 'MIRI', 'NIRCAM', 'NIRISS'
+				Roman: 'WFI', 'CGI'
+		camera (str): Camera associated with instrument.
+				HST/ACS: 'WFC', 'HRC'
+				HST/WFC3: 'UVIS', 'IR'
+				JWST/NIRISS: 'Imaging', 'AMI'
+		index (dict): Image index as from spike.tools.imgindex. If img is indexed, the stored filter, 
+			chip layout, and WCS are used rather than re-opening the image.
+
+	Returns:
+		locs (structured arr): Length N array with fields 'x', 'y' (pixel coordinates), 'chip' (chip number (HST) 
+			or detector name (JWST/Roman) as a string), 'filter', and 'on_detector'. For objects that do not fall 
+			onto the detector, x and y are NaN and chip is empty.
+	"""
+	if index and (img in index):
+		entry = index[img]
+	else:
+		entry = imgindex(img, inst, camera)[img]
+
+	if type(coords) != astropy.coordinates.sky_coordinate.SkyCoord:
+		coords = SkyCoord([c.icrs for c in coords])
+	if coords.isscalar:
+		coords = coords.reshape((1,))
+
+	locs = np.zeros(len(coords), dtype = [('x', 'f8'), ('y', 'f8'), ('chip', 'U16'), 
+		('filter', 'U32'), ('on_detector', '?')])
+	locs['x'] = np.nan
+	locs['y'] = np.nan
+	locs['filter'] = entry['filter']
+
+	for a in entry['chips']:
+		xpix, ypix = utils.skycoord_to_pixel(coords, a['wcs'])
+		datshape = a['shape'][::-1] #transposed based on numpy vs. fits preference
+		with np.errstate(invalid = 'ignore'):
+			ondet = (0 <= xpix) & (xpix <= datshape[0]) & (0 <= ypix) & (ypix <= datshape[1])
+		locs['x'][ondet] = xpix[ondet]
+		locs['y'][ondet] = ypix[ondet]
+		locs['chip'][ondet] = str(a['chip'])
+		locs['on_detector'] |= ondet
+
+	return locs
+
+
+def _topos(loc):
+	"""
+	Convert one row of spike.tools.batchpixloc output to [X, Y, chip, filter], restoring the 
+	integer chip numbers used for HST.
+	"""
+	if not loc['on_detector']:
+		return [np.nan] * 4
+
+	chip = str(loc['chip'])
+	if chip.isdigit():
+		chip = int(chip)
+
+	return [float(loc['x']), float(loc['y']), chip, str(loc['filter'])]
+
+
+def checkpixloc(coords, img, inst, camera = None, index = None):
 	"""
 	Get object location on detector. 
 
@@ -102,179 +588,657 @@ def checkpixloc(coords, img, inst, camera = None):
 				HST/ACS: 'WFC', 'HRC'
 				HST/WFC3: 'UVIS', 'IR'
 				JWST/NIRISS: 'Imaging', 'AMI' #AMI has different multi-extension mode
+		index (dict): Image index as from spike.tools.imgindex. If img is indexed, the stored filter, 
+			chip layout, and WCS are used rather than re-opening the image.
 
 	Returns:
 		[X, Y, chip, filter] (list): Pixel coordinates, chip number (HST) or detector name (JWST/Roman) if relevant, and filter name.
 			Only returned if object coordinates fall onto detector - returns NaNs if not.
+			If coords is a list (or array) of skycoord objects, returns a list of [X, Y, chip, filter], one per object, 
+			with the same types as for a single object (integer HST chip numbers) and NaNs for each object that does 
+			not fall onto the detector.
 
 	"""
-	hdu = fits.open(img)
-	if camera:
-		imcam = inst.upper() + '/' + camera.upper()
-	if not camera:
-		imcam = inst.upper()
+	locs = batchpixloc(coords, img, inst, camera, index = index)
 
-	try: #get filter
-		filt = hdu[0].header['FILTER']
-	except:
-		if inst.upper() == 'WFPC2':
-			if str(hdu[0].header['FILTNAM1']).startswith('F'):
-				filt = hdu[0].header['FILTNAM1'].rstrip()
-			else:
-				filt = hdu[0].header['FILTNAM2'].rstrip()
+	if (type(coords) == astropy.coordinates.sky_coordinate.SkyCoord) and coords.isscalar:
+		return _topos(locs[0])
 
-		if inst.upper() != 'WFPC2':
-			if str(hdu[0].header['FILTER1']).startswith('F'):
-				filt = hdu[0].header['FILTER1']
-			else:
-				filt = hdu[0].header['FILTER2']
-
-	### instrument checks ###
-	if imcam in ['ACS/WFC', 'WFC3/UVIS']:
-		chip1 = hdu[4]
-		chip2 = hdu[1]
-		chips = [chip1, chip2]
-
-		chip = np.nan
-		for a in chips:
-			wcs1 = WCS(a.header, fobj = hdu)
-			datshape = a.data.shape[::-1] #transposed based on numpy vs. fits preference
-			if type(coords) != astropy.coordinates.sky_coordinate.SkyCoord:
-				xcoord_out = []
-				ycoord_out = []
-				chip_out = []
-				for coord in coords:
-					check = utils.skycoord_to_pixel(coord, wcs1)
-					if np.logical_and(0 <= check[0] <= datshape[0], 0 <= check[1] <= datshape[1]):
-						xcoord_out.append(check[0])
-						ycoord_out.append(check[1])
-						if a == chip1:
-							chip_out.append('1')
-						if a == chip2:
-							chip_out.append('2')
-				if len(xcoord_out) >= 1:
-					out = [[xcoord_out[i], ycoord_out[i], chip_out[i], filt] for i in range(len(coords))]
-				if len(xcoord_out) == 0:
-					out = [np.nan] * 4
-			if type(coords) == astropy.coordinates.sky_coordinate.SkyCoord:
-				check = utils.skycoord_to_pixel(coords, wcs1)
-				if np.logical_and(0 <= check[0] <= datshape[0], 0 <= check[1] <= datshape[1]):
-					x_coord = check[0]
-					y_coord = check[1]
-					if a == chip1:
-						chip = 1
-					if a == chip2:
-						chip = 2
-		if (type(chip) != str) and (np.isnan(chip)):
-			out = [np.nan, np.nan, chip, np.nan]
-		else:
-			out = [float(x_coord), float(y_coord), chip, filt]
+	return [_topos(loc) for loc in locs]
 
-	if imcam in ['WFPC', 'WFPC1', 'WFPC2']:
-		# make chip indexing explicit for consistency with other instruments
-		if imcam in ['WFPC', 'WFPC1']: #accounting for use of both names
-			chip1 = hdu[1]
-			chip2 = hdu[2]
-			chip3 = hdu[3]
-			chip4 = hdu[4]
-			chip5 = hdu[5]
-			chip6 = hdu[6]
-			chip7 = hdu[7]
-			chip8 = hdu[8]
-			chips = [chip1, chip2, chip3, chip4, chip5, chip6, chip7, chip8]
-		if imcam == 'WFPC2':
-			chip1 = hdu[1]
-			chip2 = hdu[2]
-			chip3 = hdu[3]
-			chip4 = hdu[4]
-			chips = [chip1, chip2, chip3, chip4]
-
-		chip = np.nan
-		for aa, a in enumerate(chips):
-			wcs1 = WCS(a.header, fobj = hdu)
-			datshape = a.data.shape[::-1] #transposed based on numpy vs. fits preference
-			if type(coords) != astropy.coordinates.sky_coordinate.SkyCoord:
-				xcoord_out = []
-				ycoord_out = []
-				chip_out = []
-				for coord in coords:
-					check = utils.skycoord_to_pixel(coord, wcs1)
-					if np.logical_and(0 <= check[0] <= datshape[0], 0 <= check[1] <= datshape[1]):
-						xcoord_out.append(check[0])
-						ycoord_out.append(check[1])
-						# if a == chip1: ## will remove once I confirm that the simpler line works
-						# 	chip_out.append('1')
-						# if a == chip2:
-						# 	chip_out.append('2')
-						chip_out.append(str(1 + aa))
-				if len(xcoord_out) >= 1:
-					out = [[float(xcoord_out[i]), float(ycoord_out[i]), chip_out[i], filt] for i in range(len(coords))]
-				if len(xcoord_out) == 0:
-					out = [np.nan] * 4
-			if type(coords) == astropy.coordinates.sky_coordinate.SkyCoord:
-				check = utils.skycoord_to_pixel(coords, wcs1)
-				if np.logical_and(0 <= check[0] <= datshape[0], 0 <= check[1] <= datshape[1]):
-					x_coord = check[0]
-					y_coord = check[1]
-
-					chip = np.where(np.array(chips) == a)[0][0] + 1
-					
-		if (type(chip) != str) and (np.isnan(chip)):
-			out = [np.nan, np.nan, chip, np.nan]
+	#add support for FOC and NIRISS AMI
+
+
+def mosaicshape(index, imgs):
+	"""
+	Estimate the shape of a drizzled/resampled mosaic of images from their WCS alone, at the finest 
+	pixel scale of the inputs.
+
+	Parameters:
+		index (dict): Image index, as from spike.tools.imgindex.
+		imgs (list): Paths to images (in index) to combine.
+
+	Returns:
+		shape (tuple): (ny, nx) of output mosaic.
+	"""
+
+	corners = []
+	scales = []
+	for img in imgs:
+		for a in index[img]['chips']:
+			ny, nx = a['shape']
+			pix = np.array([[0, 0], [nx-1, 0], [0, ny-1], [nx-1, ny-1]], dtype = float)
+			corners.append(a['wcs'].celestial.all_pix2world(pix, 0))
+			scales.append(np.min(utils.proj_plane_pixel_scales(a['wcs'].celestial)))
+	corners = np.concatenate(corners)
+
+	radec = SkyCoord(corners[:, 0], corners[:, 1], unit = u.deg, frame = 'icrs')
+	xyz = radec.cartesian.xyz.mean(axis = 1) #center of footprint, robust to RA wrapping
+	center = SkyCoord(x = xyz[0], y = xyz[1], z = xyz[2], representation_type = 'cartesian', frame = 'icrs')
+	dlon, dlat = center.spherical_offsets_to(radec)
+
+	scale = min(scales)
+	return (int(np.ceil(np.ptp(dlat.deg)/scale)) + 1, int(np.ceil(np.ptp(dlon.deg)/scale)) + 1)
+
+
+def planrun(index, obj, drizzleimgs = False, objonly = True, parallel = False, nworkers = None, windowsize = None, 
+	multitarget = False, verbose = False):
+	"""
+	Plan a spike.psf run from image headers and WCS alone -- which model PSFs would be generated, which 
+	drizzle/resample jobs would be run, and roughly how much memory each stage needs.
+
+	Parameters:
+		index (dict): Image index, as from spike.tools.imgindex.
+		obj (str, arr-like): Name(s) or coordinates of object(s) of interest.
+		drizzleimgs (bool): If True, also plan drizzling/resampling of the images.
+		objonly (bool): If True, images are only drizzled/resampled per object (from the images covering it).
+		parallel (bool): If True, memory is estimated for nworkers concurrent tasks.
+		nworkers (int): Number of workers. Default is one fewer than the number of CPUs.
+		windowsize (int): If specified, side length (pixels) of the per-object frames PSFs are drizzled/resampled 
+			onto (see window in spike.psf), rather than the full footprint of their inputs.
+		multitarget (bool): If True, the PSFs of all objects in a filter are resampled in one task, each onto its 
+			own windowsize x windowsize frame (see multitarget in spike.psf.jwst).
+		verbose (bool): If True, prints a summary.
+
+	Returns:
+		plan (dict): Stores 'models' (list of (image, obj, filter, chip)), 'drizzles' and 'imgdrizzles' (lists of 
+			(obj, filter, input images, output shape); obj is None for whole-filter image drizzles), 'noutputs' 
+			(number of output mosaics), 'memory' (estimated bytes per task for 'model', 'drizzle', and 'imgdrizzle'),
+			'peak_memory' (bytes, with concurrent tasks), 'available_memory' (bytes), and 'feasible' (True if 
+			the peak fits in available memory).
+	"""
+
+	if (type(obj) == str) or (type(obj) == astropy.coordinates.sky_coordinate.SkyCoord):
+		objs = [obj]
+	else:
+		objs = list(obj)
+	coords = resolvenames(objs)
+	objs = [o if type(o) == str else o.to_string() for o in objs]
+
+	imgs = sorted(index.keys())
+	models = []
+	covering = {} #images covering each object per filter
+	for img in imgs:
+		locs = batchpixloc(coords, img, index[img]['inst'], index = index)
+		for o, loc in zip(objs, locs):
+			if loc['on_detector']:
+				models.append((img, o, loc['filter'], loc['chip']))
+				covering.setdefault((o, loc['filter']), []).append(img)
+
+	drizzles = [(o, filt, ims, (windowsize, windowsize) if windowsize else mosaicshape(index, ims)) 
+		for (o, filt), ims in covering.items()]
+
+	imgdrizzles = []
+	if drizzleimgs and objonly: #images are not windowed
+		imgdrizzles = [(o, filt, ims, mosaicshape(index, ims)) for (o, filt), ims in covering.items()]
+	if drizzleimgs and not objonly:
+		byfilt = {}
+		for img in imgs:
+			byfilt.setdefault(index[img]['filter'], []).append(img)
+		imgdrizzles = [(None, filt, ims, mosaicshape(index, ims)) for filt, ims in byfilt.items()]
+
+	hst = imgs and index[imgs[0]]['inst'] in ['ACS', 'WFC3', 'WFPC', 'WFPC1', 'WFPC2', 'NICMOS']
+	bytesperpix = 8 if hst else 28 #sci + wht (+ err and variance arrays for JWST/Roman)
+
+	def drizmemory(tasks):
+		# output arrays, one 32-bit context plane per 32 inputs, and one input in memory at a time per task
+		return max([sum(np.prod(shape)*(bytesperpix + 4*int(np.ceil(len(ims)/32))) for o, filt, ims, shape in jobs) + 
+			max(index[i]['size'] for o, filt, ims, shape in jobs for i in ims) for jobs in tasks] + [0])
+
+	psftasks = [[job] for job in drizzles]
+	if multitarget: #one task per filter, holding the frames of all of its objects
+		byfilt = {}
+		for job in drizzles:
+			byfilt.setdefault(job[1], []).append(job)
+		psftasks = list(byfilt.values())
+
+	memory = {'model':2*max([index[m[0]]['size'] for m in models] + [0]), #input image + full-frame model
+		'drizzle':drizmemory(psftasks), 'imgdrizzle':drizmemory([[job] for job in imgdrizzles])}
+
+	if not nworkers:
+		nworkers = max(1, os.cpu_count() - 1)
+	ntasks = nworkers if parallel else 1
+	peak = int(ntasks*max(memory.values()))
+	available = psutil.virtual_memory().available
+
+	plan = {'models':models, 'drizzles':drizzles, 'imgdrizzles':imgdrizzles, 
+		'noutputs':len(drizzles) + len(imgdrizzles), 'memory':memory, 'peak_memory':peak, 
+		'available_memory':available, 'feasible':peak <= available}
+
+	if verbose:
+		print('%i model PSFs, %i PSF drizzle/resample jobs, %i image drizzle/resample jobs (%i output mosaics).'%(
+			len(models), len(drizzles), len(imgdrizzles), plan['noutputs']))
+		for stage in memory.keys():
+			print('  %s: ~%.2f GB per task'%(stage, memory[stage]/1e9))
+		print('Estimated peak memory: %.2f GB (%i concurrent tasks) of %.2f GB available.'%(
+			peak/1e9, ntasks, available/1e9))
+
+	return plan
+
+
+def loadmanifest(manifestfile):
+	"""
+	Read (or start) a run manifest, which records the intermediate and final products of a run so 
+	that a restarted run can skip any task whose outputs are already current.
+
+	Parameters:
+		manifestfile (str): Path to the manifest (JSON). If it does not exist, a new manifest is started.
+
+	Returns:
+		manifest (dict): Stores 'file' (path written to), 'checksums' (cached SHA-256 checksums of input 
+			files, with the 'size' and 'mtime' used to check that they are current), and 'tasks' (the 'key' 
+			and 'outputs' of each completed task, with the 'size' and 'mtime' of each output).
+	"""
+
+	manifest = {'file':manifestfile, 'checksums':{}, 'tasks':{}, 'saved':time.time()}
+	if os.path.exists(manifestfile):
+		try:
+			with open(manifestfile, 'r') as file:
+				saved = json.load(file)
+			manifest['checksums'].update(saved['checksums'])
+			manifest['tasks'].update(saved['tasks'])
+		except:
+			warnings.warn('Could not read %s; starting a new manifest.'%manifestfile, Warning, stacklevel = 2)
+
+	return manifest
+
+
+def savemanifest(manifest):
+	"""
+	Write a run manifest (as from spike.tools.loadmanifest) to its file.
+
+	Parameters:
+		manifest (dict): Run manifest.
+
+	Returns:
+		Writes manifest['file'] (replacing it only once the new version is complete).
+	"""
+
+	tmpfile = manifest['file'] + '.tmp'
+	with open(tmpfile, 'w') as file:
+		json.dump({'checksums':manifest['checksums'], 'tasks':manifest['tasks']}, file, indent = 1)
+	os.replace(tmpfile, manifest['file'])
+	manifest['saved'] = time.time()
+
+
+def checksum(path, manifest = None):
+	"""
+	Get the SHA-256 checksum of a file.
+
+	Parameters:
+		path (str): Path to file.
+		manifest (dict): Run manifest, as from spike.tools.loadmanifest. If specified, checksums are cached
+			in it and only recomputed for files that have changed on disk.
+
+	Returns:
+		checksum (str): Hex digest.
+	"""
+
+	stat = os.stat(path)
+	if manifest:
+		entry = manifest['checksums'].get(path)
+		if entry and (entry['size'] == stat.st_size) and (entry['mtime'] == stat.st_mtime_ns):
+			return entry['sha256']
+
+	sha = hashlib.sha256()
+	with open(path, 'rb') as file:
+		for block in iter(lambda: file.read(2**20), b''):
+			sha.update(block)
+
+	if manifest:
+		manifest['checksums'][path] = {'size':stat.st_size, 'mtime':stat.st_mtime_ns, 'sha256':sha.hexdigest()}
+
+	return sha.hexdigest()
+
+
+def imagechecksum(path, manifest = None):
+	"""
+	Get the SHA-256 checksum of the science content of an image -- the data and WCS keywords of its 
+	SCI extension(s) and, for JWST/Roman, its ASDF extension (which stores the GWCS) -- so that it 
+	does not change when other extensions are updated in place, e.g., DQ arrays by AstroDrizzle.
+
+	Parameters:
+		path (str): Path to image.
+		manifest (dict): Run manifest, as from spike.tools.loadmanifest. If specified, checksums are cached
+			in it and only recomputed for files that have changed on disk.
+
+	Returns:
+		checksum (str): Hex digest.
+	"""
+
+	stat = os.stat(path)
+	if manifest:
+		entry = manifest['checksums'].get('image:'+path)
+		if entry and (entry['size'] == stat.st_size) and (entry['mtime'] == stat.st_mtime_ns):
+			return entry['sha256']
+
+	sha = hashlib.sha256()
+	with fits.open(path) as hdu:
+		sci = [h for h in hdu if h.name == 'SCI']
+		if len(sci) == 0: #e.g., WFPC2 c0m files
+			sci = [h for h in hdu if h.is_image and (h.header.get('NAXIS', 0) > 0)]
+		for h in sci:
+			sha.update(np.ascontiguousarray(h.data).tobytes())
+			with warnings.catch_warnings():
+				warnings.simplefilter('ignore')
+				sha.update(WCS(h.header, fobj = hdu).to_header(relax = True).tostring().encode())
+		if 'ASDF' in hdu:
+			sha.update(hdu['ASDF'].data.tobytes())
+
+	if manifest:
+		manifest['checksums']['image:'+path] = {'size':stat.st_size, 'mtime':stat.st_mtime_ns, 'sha256':sha.hexdigest()}
+
+	return sha.hexdigest()
+
+
+def taskkey(files = [], manifest = None, images = [], **params):
+	"""
+	Hash the inputs of a task -- the contents of its input files and its parameters.
+
+	Parameters:
+		files (list): Paths to input files. Their contents (not names) enter the hash.
+		manifest (dict): Run manifest, as from spike.tools.loadmanifest, used to cache file checksums.
+		images (list): Paths to input images of which only the science content enters the hash (see 
+			spike.tools.imagechecksum).
+		**params: Other inputs, e.g., position, filter, method, and keyword arguments. Values enter 
+			the hash in a form that is the same from run to run (see _keyrepr); values without one 
+			(e.g., objects whose repr is their memory address) raise a TypeError.
+
+	Returns:
+		key (str): Hex digest.
+	"""
+
+	sha = hashlib.sha256()
+	for f in files:
+		sha.update(checksum(f, manifest).encode())
+	for f in images:
+		sha.update(('image:'+imagechecksum(f, manifest)).encode())
+	for p in sorted(params.keys()):
+		sha.update(('%s=%s;'%(p, _keyrepr(params[p], p))).encode())
+
+	return sha.hexdigest()
+
+
+def _keyrepr(value, name = None):
+	"""
+	String form of a task input for spike.tools.taskkey that does not change between runs -- arrays by 
+	their contents, sky coordinates by position, and functions and classes by their import path.
+
+	Parameters:
+		value: Task input.
+		name (str): Name of the input, used in the error message.
+
+	Returns:
+		key (str): Reproducible string form of value.
+	"""
+
+	if isinstance(value, dict):
+		items = sorted((repr(k), _keyrepr(v, name)) for k, v in value.items())
+		return '{%s}'%', '.join('%s: %s'%item for item in items)
+	if isinstance(value, (list, tuple)):
+		return '[%s]'%', '.join(_keyrepr(v, name) for v in value)
+	if isinstance(value, np.ndarray):
+		value = np.ascontiguousarray(value)
+		return 'array(%s, %s, %s)'%(value.dtype.str, value.shape, hashlib.sha256(value.tobytes()).hexdigest())
+	if isinstance(value, SkyCoord):
+		return 'SkyCoord(%r, %r)'%(value.icrs.ra.deg.tolist(), value.icrs.dec.deg.tolist())
+	if callable(value) and hasattr(value, '__qualname__'): #functions, classes
+		return '%s.%s'%(getattr(value, '__module__', None), value.__qualname__)
+
+	key = repr(value)
+	if ' at 0x' in key: #default object repr, which changes every run
+		raise TypeError('Input %s (%s) cannot be recorded in the run manifest; pass a value with a reproducible repr.'%(name, type(value).__name__))
+	return key
+
+
+def checkmanifest(manifest, task, key):
+	"""
+	Check whether a task was already completed with the same inputs and its outputs are unchanged.
+
+	Parameters:
+		manifest (dict): Run manifest, as from spike.tools.loadmanifest. If None, always returns False.
+		task (str): Name of task.
+		key (str): Hash of task inputs, as from spike.tools.taskkey.
+
+	Returns:
+		done (bool): True if the task can be skipped.
+	"""
+
+	if not manifest:
+		return False
+
+	entry = manifest['tasks'].get(task)
+	if (not entry) or (entry['key'] != key):
+		return False
+
+	for path, rec in entry['outputs'].items():
+		if not os.path.exists(path):
+			return False
+		stat = os.stat(path)
+		if (rec['size'] != stat.st_size) or (rec['mtime'] != stat.st_mtime_ns):
+			return False
+
+	return True
+
+
+def updatemanifest(manifest, task, key, outputs, saveevery = 10):
+	"""
+	Record a completed task and its outputs in a run manifest.
+
+	Parameters:
+		manifest (dict): Run manifest, as from spike.tools.loadmanifest. If None, nothing is recorded.
+		task (str): Name of task.
+		key (str): Hash of task inputs, as from spike.tools.taskkey.
+		outputs (list): Paths to files written by the task. If any is missing, the task is not recorded. 
+			A task with no outputs (e.g., one that updates its inputs in place) is recorded by key alone.
+		saveevery (float): Minimum time in seconds between writes of the manifest file. The manifest 
+			is always written if saveevery = 0.
+
+	Returns:
+		Updates manifest (and its file).
+	"""
+
+	if not manifest:
+		return
+
+	recs = {}
+	for path in outputs:
+		if not os.path.exists(path):
+			return
+		stat = os.stat(path)
+		recs[path] = {'size':stat.st_size, 'mtime':stat.st_mtime_ns}
+	manifest['tasks'][task] = {'key':key, 'outputs':recs}
+
+	if time.time() - manifest['saved'] >= saveevery:
+		savemanifest(manifest)
+
+
+def _matchfiles(patterns, exclude = []):
+	"""
+	Find the files matching any of a list of glob patterns, listing each directory only once.
+
+	Parameters:
+		patterns (list): Glob patterns. Wildcards are only supported in the file name, not the directory.
+		exclude (list): Paths to leave out of the matches (e.g., the destination directory).
+
+	Returns:
+		matches (list): Matching paths, each included once.
+	"""
+
+	bydir = {}
+	for p in patterns:
+		d, base = os.path.split(p.rstrip(os.sep))
+		bydir.setdefault(d, []).append(base)
+
+	seen = set(os.path.abspath(e) for e in exclude)
+	matches = []
+	for d, bases in bydir.items():
+		try:
+			names = sorted(os.listdir(d or '.'))
+		except FileNotFoundError:
+			continue
+		for name in names:
+			for base in bases:
+				if name.startswith('.') and not base.startswith('.'):
+					continue #as with glob, wildcards do not match hidden files
+				if fnmatch.fnmatch(name, base):
+					path = os.path.join(d, name)
+					if os.path.abspath(path) not in seen:
+						seen.add(os.path.abspath(path))
+						matches.append(path)
+					break
+
+	return matches
+
+
+def renamefile(src, dst):
+	"""
+	Move a file in-process, replacing dst if it exists.
+
+	Parameters:
+		src (str): Path to file.
+		dst (str): New path.
+
+	Returns:
+		dst (str): New path, or None (with a warning) if src does not exist.
+	"""
+
+	try:
+		os.replace(src, dst)
+	except FileNotFoundError:
+		warnings.warn('%s does not exist and cannot be moved.'%src, Warning, stacklevel = 2)
+		return None
+	except OSError as err:
+		if err.errno != errno.EXDEV:
+			raise
+		if os.path.isdir(src):
+			shutil.move(src, dst)
+		else: #across filesystems, copy next to dst first so dst is never seen half-written
+			tmp = '%s.%i_%i.tmp'%(dst, os.getpid(), threading.get_ident())
+			shutil.copy2(src, tmp)
+			os.replace(tmp, dst)
+			os.remove(src)
+
+	return dst
+
+
+def _reflink(src, dst):
+	"""
+	Make dst a copy-on-write clone of src, if the filesystem supports it (e.g., btrfs or XFS on Linux).
+
+	Returns:
+		True if the clone was made.
+	"""
+
+	try:
+		import fcntl
+	except ImportError:
+		return False
+
+	try:
+		with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+			fcntl.ioctl(fout.fileno(), 0x40049409, fin.fileno()) #FICLONE, from linux/fs.h
+	except (OSError, ValueError):
+		if os.path.exists(dst):
+			os.remove(dst)
+		return False
+
+	shutil.copystat(src, dst)
+	return True
+
+
+def copyfile(src, dst, hardlink = False):
+	"""
+	Copy a file in-process, using a hard link or reflink where the filesystem supports it.
+
+	Parameters:
+		src (str): Path to file.
+		dst (str): Path to copy. If it exists, it is replaced.
+		hardlink (bool): If True, link dst to src where possible. Only use for files that will not be
+			modified in place, as both paths then share the same data. Otherwise, a copy-on-write 
+			reflink is tried before a full copy.
+
+	Returns:
+		dst (str): Path to copy.
+	"""
+
+	if os.path.lexists(dst):
+		os.remove(dst) #never write through an existing link to src
+
+	if hardlink:
+		try:
+			os.link(src, dst)
+			return dst
+		except OSError:
+			pass
+
+	if not _reflink(src, dst):
+		shutil.copy2(src, dst)
+
+	return dst
+
+
+def copyfiles(patterns, dest, hardlink = False):
+	"""
+	Copy all files matching any of a list of glob patterns into a directory.
+
+	Parameters:
+		patterns (str or list): Glob pattern(s).
+		dest (str): Destination directory. Created if it does not exist.
+		hardlink (bool): If True, hard link files where possible (see spike.tools.copyfile).
+
+	Returns:
+		copied (list): Paths to copies.
+	"""
+
+	if type(patterns) == str:
+		patterns = [patterns]
+
+	if not os.path.exists(dest):
+		os.makedirs(dest)
+
+	copied = []
+	for path in _matchfiles(patterns, exclude = [dest]):
+		if os.path.isfile(path):
+			copied.append(copyfile(path, os.path.join(dest, os.path.basename(path)), hardlink = hardlink))
+
+	return copied
+
+
+def movefiles(patterns, dest):
+	"""
+	Move all files (or directories) matching any of a list of glob patterns into a directory, 
+	listing each source directory once rather than once per pattern.
+
+	Parameters:
+		patterns (str or list): Glob pattern(s).
+		dest (str): Destination directory. Created if it does not exist.
+
+	Returns:
+		moved (list): New paths.
+	"""
+
+	if type(patterns) == str:
+		patterns = [patterns]
+
+	if not os.path.exists(dest):
+		os.makedirs(dest)
+
+	moved = []
+	for path in _matchfiles(patterns, exclude = [dest]):
+		try:
+			moved.append(renamefile(path, os.path.join(dest, os.path.basename(path))))
+		except OSError as err:
+			warnings.warn('Could not move %s to %s: %s'%(path, dest, err), Warning, stacklevel = 2)
+
+	return moved
+
+
+def removefiles(patterns):
+	"""
+	Delete all files (or directories) matching any of a list of glob patterns.
+
+	Parameters:
+		patterns (str or list): Glob pattern(s) or paths.
+
+	Returns:
+		removed (list): Deleted paths.
+	"""
+
+	if type(patterns) == str:
+		patterns = [patterns]
+
+	removed = []
+	for path in _matchfiles(patterns):
+		if os.path.isdir(path) and not os.path.islink(path):
+			shutil.rmtree(path)
 		else:
-			out = [float(x_coord), float(y_coord), chip, filt]
-
-
-	if imcam in ['ACS/HRC', 'WFC3/IR', 'NICMOS',
-				 'MIRI', 'NIRCAM', 'NIRISS', 'NIRISS/IMAGING', 
-				 'WFI', 'CGI']:
-		# for WFC3, only checks the final readout by design
-		chip = 0 #no chip
-		wcs1 = WCS(hdu[1].header, fobj = hdu)
-		datshape = hdu[1].data.shape[::-1] #transposed based on numpy vs. fits preference
-		if type(coords) != astropy.coordinates.sky_coordinate.SkyCoord:
-			xcoord_out = []
-			ycoord_out = []
-			chip_out = []
-			for coord in coords:
-				check = utils.skycoord_to_pixel(coord, wcs1)
-				xcoord_out.append(check[0])
-				ycoord_out.append(check[1])
-				if imcam == 'NIRCAM':
-					chip = hdu[0].header['DETECTOR']
-					if chip in ['NRCALONG', 'NRCBLONG']:
-						chip = chip.replace('LONG', '5')
-				if imcam == 'WFI':
-					# based on how SCA detector is identified in simulated data: https://roman.ipac.caltech.edu/sims/Simulations_csv.html
-					strlist = img.split('_')
-					chip = 'SCA%s'%strlist[-1].split('.')[0].rjust(2, '0')
-				chip_out.append(chip)
-			if len(xcoord_out) >= 1:
-				out = [[float(xcoord_out[i]), float(ycoord_out[i]), chip_out[i], filt] for i in range(len(coords))]
-			if len(xcoord_out) == 0:
-				out = [np.nan] * 4
-
-
-		if type(coords) == astropy.coordinates.sky_coordinate.SkyCoord:
-			check = utils.skycoord_to_pixel(coords, wcs1)
-			if np.logical_and(0 <= check[0] <= datshape[0], 0 <= check[1] <= datshape[1]):
-				x_coord = check[0]
-				y_coord = check[1]
-				if imcam == 'NIRCAM':
-					chip = hdu[0].header['DETECTOR']
-					if chip in ['NRCALONG', 'NRCBLONG']:
-						chip = chip.replace('LONG', '5')
-				if imcam == 'WFI':
-					# based on how SCA detector is identified in simulated data: https://roman.ipac.caltech.edu/sims/Simulations_csv.html
-					strlist = img.split('_')
-					chip = 'SCA%s'%strlist[-1].split('.')[0].rjust(2, '0')
-				out = [float(x_coord), float(y_coord), chip, filt]
-			else:
-				out = [np.nan] * 4
+			os.remove(path)
+		removed.append(path)
 
-	return out
+	return removed
 
-	#add support for FOC and NIRISS AMI
+
+@contextlib.contextmanager
+def scratchdir(keep = False, dir = None):
+	"""
+	Temporary working directory for a single call to an external tool (e.g., TinyTim, SExtractor, PSFEx),
+	so that concurrent calls do not overwrite each other's parameter files and outputs.
+
+	Parameters:
+		keep (bool): If True, the directory and its contents are not deleted on exit.
+		dir (str): Parent directory. If None, the system temporary directory is used 
+			(set by the TMPDIR environment variable).
+
+	Returns:
+		path (str): Absolute path to the directory.
+	"""
+
+	path = os.path.abspath(tempfile.mkdtemp(prefix = 'spike_', dir = dir))
+	try:
+		yield path
+	finally:
+		if not keep:
+			shutil.rmtree(path, ignore_errors = True)
+
+
+@contextlib.contextmanager
+def filelock(path, poll = 1., stale = None):
+	"""
+	Exclusive lock shared by processes (and threads) through a lock file, e.g., so that one worker computes 
+	a product that the others wait for and then read.
+
+	Parameters:
+		path (str): Path to the lock file, created while the lock is held.
+		poll (float): Seconds between attempts to take the lock.
+		stale (float): If specified, age in seconds after which an existing lock file is assumed to be left 
+			behind by a process that failed, and is removed.
+
+	Returns:
+		path (str): Path to the lock file.
+	"""
+
+	while True:
+		try:
+			fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+			break
+		except FileExistsError:
+			try:
+				if (stale is not None) and (time.time() - os.path.getmtime(path) > stale):
+					os.remove(path)
+					continue
+			except FileNotFoundError: #released in the meantime
+				continue
+			time.sleep(poll)
+	try:
+		os.write(fd, str(os.getpid()).encode())
+		os.close(fd)
+		yield path
+	finally:
+		try:
+			os.remove(path)
+		except FileNotFoundError:
+			pass
 
 
 def to_asdf(fitspath, save = True, clobber = False):
@@ -314,6 +1278,33 @@ def to_asdf(fitspath, save = True, clobber = False):
 	return asdf_out
 
 
+def _configinputs(configpath, keys):
+	"""
+	Command line overrides that point relative input files named in a SExtractor/PSFEx config file 
+	at the working directory, since the tools run from a scratch directory.
+
+	Parameters:
+		configpath (str): Path to config file.
+		keys (list): Config keywords that name input files.
+
+	Returns:
+		args (str): Command line arguments (with a leading space), or '' if there are none.
+	"""
+
+	args = ''
+	with open(configpath) as f:
+		for line in f:
+			entry = line.split('#')[0].split()
+			if len(entry) < 2 or entry[0] not in keys:
+				continue
+			paths = entry[1].split(',')
+			if all(os.path.isabs(path) for path in paths) or not all(os.path.exists(path) for path in paths):
+				continue
+			args += ' -'+entry[0]+' '+shlex.quote(','.join(os.path.abspath(path) for path in paths))
+
+	return args
+
+
 def pysextractor(img_path, config = None, psf = True, userargs = None, keepconfig = False):
 	"""
 	Wrapper to easily call SExtractor from python. 
@@ -326,39 +1317,44 @@ def pysextractor(img_path, config = None, psf = True, userargs = None, keepconfi
 		userargs (str): Any additional command line arguments to feed to SExtractor. The preferred way to include
 			user arguments is via specification in the config file as command line arguments simply override the 
 			corresponding configuration setting.
-		keepconfig (str): If True, retain parameter files and convolutional kernels moved to working dir.
+			SExtractor runs in its own temporary directory (spike.tools.scratchdir), so outputs other than 
+			the .cat file are not kept. Relative input files named in a custom config (e.g., PARAMETERS_NAME) 
+			are still found from the working directory.
+		keepconfig (str): If True, also copy parameter files and convolutional kernels to the working dir.
 
 	Returns:
 		Generates a .cat file with the same name as img_path
 
 	"""
 
-	if not config:
-		if psf:
-			configpath = CONFIG_PATH + 'sextractor_config/default_psf.sex'
-		if not psf:
-			configpath = CONFIG_PATH + 'sextractor_config/default.sex'
-		os.system('cp '+ CONFIG_PATH +'sextractor_config/default.conv .')
-		os.system('cp '+ CONFIG_PATH +'sextractor_config/* .')
-	if config:
-		configpath = config
+	imgpath = img_path.split('[')[0]
+	if imgpath.split('_')[-1].startswith('mask'):
+		imgpath = imgpath.replace('_mask.fits', '.fits')
 
-	sextractor_args = 'sex '+img_path+' -c '+configpath
+	if config: #resolve custom paths against the working directory before running elsewhere
+		configpath = os.path.abspath(config)
+		configargs = _configinputs(configpath, ['PARAMETERS_NAME', 'FILTER_NAME', 'STARNNW_NAME', 
+			'ASSOC_NAME', 'WEIGHT_IMAGE', 'FLAG_IMAGE'])
 
-	if userargs:
-		sextractor_args += ' '+userargs
+	with scratchdir() as scratch: #run in isolation so that calls can be made concurrently
+		if not config:
+			if psf:
+				configpath = CONFIG_PATH + 'sextractor_config/default_psf.sex'
+			if not psf:
+				configpath = CONFIG_PATH + 'sextractor_config/default.sex'
+			configargs = ''
+			copyfiles(CONFIG_PATH +'sextractor_config/*', scratch, hardlink = True)
+			if keepconfig:
+				copyfiles(CONFIG_PATH +'sextractor_config/*', '.', hardlink = True)
 
-	os.system(sextractor_args)
+		sextractor_args = 'sex '+shlex.quote(os.path.abspath(img_path))+' -c '+shlex.quote(configpath)+configargs
 
-	imgpath = img_path.split('[')[0]
-	if imgpath.split('_')[-1].startswith('mask'):
-		imgpath = imgpath.replace('_mask.fits', '.fits')
-	os.system('mv test.cat ' + imgpath.replace('fits', 'cat')) #move to img name
+		if userargs:
+			sextractor_args += ' '+userargs
 
-	if (not keepconfig) and (not config):
-		# clean up user directory by removing copied files
-		os.system('rm default*')
-		os.system('rm *.conv')
+		subprocess.call(sextractor_args, shell = True, cwd = scratch)
+
+		renamefile(os.path.join(scratch, 'test.cat'), imgpath.replace('fits', 'cat')) #move to img name
 
 
 def regridarr (im, sample):
@@ -466,9 +1462,11 @@ def pypsfex(cat_path, pos, config = None, userargs = None, makepsf = True,
 		userargs (str): Any additional command line arguments to feed to PSFEx. The preferred way to include
 			user arguments is via specification in the config file as command line arguments simply override the 
 			corresponding configuration setting.
+			PSFEx runs in its own temporary directory (spike.tools.scratchdir), so outputs other than 
+			the .psf file are not kept.
 		makepsf (bool): If True, returns 2D PSF model.
 		savepsf (str): If 'fits', 'arr', or 'txt', will save 2D model PSF in that file format with the same name as the catalog.
-		keepconfig (str): If True, retain parameter files and convolutional kernels moved to working dir.
+		keepconfig (str): If True, also copy parameter files and convolutional kernels to the working dir.
 		regrid (bool): If True, will (interpolate and) regrid model PSF to image pixel scale.
 		clobber (bool): If True, will overwrite existing files with the same name on save.
 			(Default state -- clobber = False -- is recommended.)
@@ -478,24 +1476,27 @@ def pypsfex(cat_path, pos, config = None, userargs = None, makepsf = True,
 		If makepsf = True, also returns 2D array containing PSF model.
 	"""
 
-	if not config:
-		configpath = CONFIG_PATH + 'psfex_config/default.psfex'
-		os.system('cp '+ CONFIG_PATH +'psfex_config/* .')
-	if config:
-		configpath = config
+	if config: #resolve custom paths against the working directory before running elsewhere
+		configpath = os.path.abspath(config)
 
-	psfex_args = 'psfex '+cat_path+' -c '+configpath
+	with scratchdir() as scratch: #run in isolation so that calls can be made concurrently
+		if not config:
+			configpath = CONFIG_PATH + 'psfex_config/default.psfex'
+			copyfiles(CONFIG_PATH +'psfex_config/*', scratch, hardlink = True)
+			if keepconfig:
+				copyfiles(CONFIG_PATH +'psfex_config/*', '.', hardlink = True)
 
-	if userargs:
-		psfex_args += ' '+userargs
+		psfex_args = 'psfex '+shlex.quote(os.path.abspath(cat_path))+' -c '+shlex.quote(configpath)
+		psfex_args += ' -PSF_DIR '+shlex.quote(scratch)
 
-	os.system(psfex_args)
-	os.system('mv test.psf ' + cat_path.replace('cat', 'psf')) #move to img name
+		if userargs:
+			psfex_args += ' '+userargs
 
-	if (not keepconfig) and (not config):
-		# clean up user directory by removing copied files
-		os.system('rm default*')
-		os.system('rm *.conv')
+		subprocess.call(psfex_args, shell = True, cwd = scratch)
+		psfout = os.path.join(scratch, os.path.basename(cat_path).replace('.cat', '.psf'))
+		if not os.path.exists(psfout):
+			psfout = os.path.join(scratch, 'test.psf')
+		renamefile(psfout, cat_path.replace('cat', 'psf')) #move to img name
 
 	if makepsf:
 
@@ -514,10 +1515,12 @@ def pypsfex(cat_path, pos, config = None, userargs = None, makepsf = True,
 		return psfmodel
 
 
-def rewrite_fits(psfarr, coords, img, imcam, pos, method = None, clobber = False):
+def rewrite_fits(psfarr, coords, img, imcam, pos, method = None, clobber = False, stamp = False, compress = None):
 	"""
 	Write relevant image headers to the model PSFs and modify the coordinates and WCS.
 	Creates a full _topsf_*.fits file with only one SCI extension for use with drizzle/resample.
+	If stamp = True, only the PSF stamp and its pixel origin are stored in the SCI extension, 
+	and full-size arrays are reconstructed on demand by spike.tools.expandstamp.
 
 	Parameters:
 		psfarr (arr): The 2D PSF model.
@@ -528,6 +1531,10 @@ def rewrite_fits(psfarr, coords, img, imcam, pos, method = None, clobber = False
 		method (list): Method used to generate PSF.
 		clobber (bool): If True, will overwrite existing FITS files with the same name.
 			(Default state -- clobber = False -- is recommended.)
+		stamp (bool): If True, writes a compact file holding only the PSF stamp, its origin in the 
+			full frame, and header-only placeholders for the ERR/DQ (and JWST AREA/VAR_*) extensions.
+		compress (str): If specified, lossless tile compression ('GZIP_1' or 'GZIP_2') used for the image 
+			extensions. See spike.tools.compimagehdu.
 
 	Returns: 
 		Generates a new FITS file with a _topsf suffix, which stores the 2D PSF model in the 
@@ -549,7 +1556,11 @@ def rewrite_fits(psfarr, coords, img, imcam, pos, method = None, clobber = False
 
 	imgdat = fits.open(img)
 
-	psfim = np.zeros_like(imgdat[ext].data)
+	if stamp: #zero-stride view with the frame's shape, so the edge handling below is unchanged
+		psfim = np.broadcast_to(np.zeros(1, dtype = _hdrdtype(imgdat[ext].header)), 
+			(imgdat[ext].header['NAXIS2'], imgdat[ext].header['NAXIS1']))
+	else:
+		psfim = np.zeros_like(imgdat[ext].data)
 	xmin = int(pos[0]) - psfarr.shape[1]//2
 	xmax = int(pos[0]) + psfarr.shape[1]//2
 	ymin = int(pos[1]) - psfarr.shape[0]//2
@@ -591,7 +1602,12 @@ def rewrite_fits(psfarr, coords, img, imcam, pos, method = None, clobber = False
 		if update_ymax == 0:
 			ymin -= 1
 
-	psfim[ymin:ymax, xmin:xmax] += psfarr
+	if stamp:
+		fullshape = psfim.shape
+		psfim = np.zeros(psfim[ymin:ymax, xmin:xmax].shape, dtype = psfim.dtype)
+		psfim += psfarr
+	else:
+		psfim[ymin:ymax, xmin:xmax] += psfarr
 
 
 	cphdr = fits.PrimaryHDU(header = imgdat[0].header)
@@ -602,16 +1618,27 @@ def rewrite_fits(psfarr, coords, img, imcam, pos, method = None, clobber = False
 	if not method:
 		hdr['COMMENT'] = "PSF generated via spike."
 
-	cihdr = fits.ImageHDU(data = psfim, header = hdr, name = 'SCI', ver = 1)
+	if stamp:
+		hdr['SPKSTAMP'] = (True, 'SCI holds a PSF stamp (spike.tools.expandstamp)')
+		hdr['STAMPX0'] = (slice(xmin, xmax).indices(fullshape[1])[0], 'Stamp origin in full frame (x, 0-based)')
+		hdr['STAMPY0'] = (slice(ymin, ymax).indices(fullshape[0])[0], 'Stamp origin in full frame (y, 0-based)')
+		hdr['FULLNX'] = (fullshape[1], 'Full frame NAXIS1')
+		hdr['FULLNY'] = (fullshape[0], 'Full frame NAXIS2')
 
-	if img.split('_')[-1] == 'c0m.fits':
-		c1mhdr = fits.ImageHDU(data = np.zeros_like(psfim, dtype = np.int16), header = hdr, name = 'SCI', ver = 1)
+	cihdr = compimagehdu(psfim, hdr, 'SCI', 1, compress)
 
-	if img.split('_')[-1] != 'c0m.fits':
+	if (img.split('_')[-1] == 'c0m.fits') and not stamp:
+		c1mhdr = compimagehdu(np.zeros_like(psfim, dtype = np.int16), hdr, 'SCI', 1, compress)
+
+	if (img.split('_')[-1] != 'c0m.fits') and stamp:
+		cehdr = _stampplaceholder(imgdat[('ERR', extv)].header, 'ERR')
+		cdqhdr = _stampplaceholder(imgdat[('DQ', extv)].header, 'DQ')
+
+	elif img.split('_')[-1] != 'c0m.fits':
 		ehdrdat = np.zeros_like(imgdat[('ERR', extv)].data) #shouldn't matter, but doing this explicitly anyway
 		dqhdrdat = np.zeros_like(imgdat[('DQ', extv)].data)
-		cehdr = fits.ImageHDU(data = ehdrdat, header = imgdat[('ERR', extv)].header, name = 'ERR', ver = 1)
-		cdqhdr = fits.ImageHDU(data = dqhdrdat, header = imgdat[('DQ', extv)].header, name = 'DQ', ver = 1)
+		cehdr = compimagehdu(ehdrdat, imgdat[('ERR', extv)].header, 'ERR', 1, compress)
+		cdqhdr = compimagehdu(dqhdrdat, imgdat[('DQ', extv)].header, 'DQ', 1, compress)
 
 	coordstring = coords.ra.to_string(u.hour)
 	if coords.dec.deg >= 0:
@@ -685,11 +1712,13 @@ def rewrite_fits(psfarr, coords, img, imcam, pos, method = None, clobber = False
 		hdlist.append(fits.ImageHDU(data = imgdat[('WCSDVARR', 4)].data, header = imgdat[('WCSDVARR', 4)].header, 
 			name = 'WCSDVARR', ver = 4))
 
+	if (imcam in ['NIRCAM', 'MIRI', 'NIRISS']) and stamp: #copied from the image on expansion
+		for extname in ['AREA', 'VAR_POISSON', 'VAR_RNOISE', 'VAR_FLAT']:
+			hdlist.append(_stampplaceholder(imgdat[extname, 1].header, extname, source = img))
+	elif imcam in ['NIRCAM', 'MIRI', 'NIRISS']:
+		for extname in ['AREA', 'VAR_POISSON', 'VAR_RNOISE', 'VAR_FLAT']:
+			hdlist.append(compimagehdu(imgdat[extname, 1].data, imgdat[extname, 1].header, extname, 1, compress))
 	if imcam in ['NIRCAM', 'MIRI', 'NIRISS']:
-		hdlist.append(fits.ImageHDU(data = imgdat['AREA', 1].data, header = imgdat['AREA', 1].header))
-		hdlist.append(fits.ImageHDU(data = imgdat['VAR_POISSON', 1].data, header = imgdat['VAR_POISSON', 1].header))
-		hdlist.append(fits.ImageHDU(data = imgdat['VAR_RNOISE', 1].data, header = imgdat['VAR_RNOISE', 1].header))
-		hdlist.append(fits.ImageHDU(data = imgdat['VAR_FLAT', 1].data, header = imgdat['VAR_FLAT', 1].header))
 		hdlist.append(fits.BinTableHDU(data = imgdat['ASDF', 1].data, header = imgdat['ASDF', 1].header))
 
 	hdulist = fits.HDUList(hdlist)
@@ -701,12 +1730,210 @@ def rewrite_fits(psfarr, coords, img, imcam, pos, method = None, clobber = False
 		modname = modname.replace('_topsf.fits', '_topsf_c0m.fits')
 		hdulist.writeto(modname, overwrite = clobber)
 		
-		#write DQ arrays, all with no flags
-		fits.HDUList([cphdr, c1mhdr]).writeto(modname.replace('c0m.fits', 'c1m.fits'))
+		#write DQ arrays, all with no flags (stamps get theirs on expansion)
+		if not stamp:
+			fits.HDUList([cphdr, c1mhdr]).writeto(modname.replace('c0m.fits', 'c1m.fits'))
+
+
+def _hdrdtype(header):
+	"""
+	Numpy dtype of an image extension's data, as astropy would return it, from its header alone.
+	"""
+
+	bitpix = header['BITPIX']
+	dtype = {8:'uint8', 16:'int16', 32:'int32', 64:'int64', -32:'float32', -64:'float64'}[bitpix]
+	if (bitpix > 8) and (header.get('BZERO') == 2**(bitpix - 1)) and (header.get('BSCALE', 1) == 1):
+		dtype = 'u' + dtype
+	return np.dtype(dtype)
+
+
+def _stampplaceholder(header, name, source = None):
+	"""
+	Header-only stand-in for a full-frame extension of a PSF stamp file. Zero-filled on expansion, 
+	or copied from the (name, 1) extension of source if given.
+	"""
+
+	header = header.copy()
+	header['SPKDTYPE'] = (_hdrdtype(header).name, 'Data type of full-frame array')
+	if source:
+		header['SPKSRC'] = (os.path.abspath(source), 'Copy data from this file on expansion')
+	return fits.ImageHDU(data = None, header = header, name = name, ver = header.get('EXTVER', 1))
+
+
+def isstamp(img):
+	"""
+	Check whether a FITS file is a PSF stamp written by rewrite_fits(..., stamp = True).
+
+	Parameters:
+		img (str): Path to FITS file.
+
+	Returns:
+		bool: True if the SCI extension holds a PSF stamp.
+	"""
+
+	with fits.open(img) as hdul:
+		return len(hdul) > 1 and bool(hdul[1].header.get('SPKSTAMP', False))
+
+
+def expandstamp(img, outname = None, clobber = False, compress = None):
+	"""
+	Expand a PSF stamp file (see rewrite_fits) into the full-frame _topsf file rewrite_fits would 
+	otherwise have written: the stamp pasted into a zero image, zero ERR/DQ arrays (or a _c1m.fits 
+	file for WFPC2), plus the distortion and, for JWST, AREA/VAR_*/ASDF extensions.
+
+	Parameters:
+		img (str): Path to PSF stamp file.
+		outname (str): Path for the full-frame file. If None, img is overwritten.
+		clobber (bool): If True, will overwrite an existing outname.
+		compress (str): If specified, tile compression used for the full-frame image extensions 
+			(see compimagehdu).
+
+	Returns:
+		str: Path to the full-frame file.
+	"""
+
+	if outname is None:
+		outname, clobber = img, True
+
+	with fits.open(img) as stampdat:
+		hdr = stampdat[1].header.copy()
+		shape = (hdr['FULLNY'], hdr['FULLNX'])
+		x0, y0 = hdr['STAMPX0'], hdr['STAMPY0']
+		for key in ['SPKSTAMP', 'STAMPX0', 'STAMPY0', 'FULLNX', 'FULLNY']:
+			del hdr[key]
+
+		psfim = np.zeros(shape, dtype = stampdat[1].data.dtype)
+		ny, nx = stampdat[1].data.shape
+		psfim[y0:y0+ny, x0:x0+nx] = stampdat[1].data
+
+		cphdr = fits.PrimaryHDU(header = stampdat[0].header)
+		hdlist = [cphdr, compimagehdu(psfim, hdr, 'SCI', 1, compress)]
+		for hdu in stampdat[2:]:
+			if 'SPKDTYPE' not in hdu.header:
+				hdlist.append(hdu)
+				continue
+			exthdr = hdu.header.copy()
+			dtype = exthdr.pop('SPKDTYPE')
+			source = exthdr.pop('SPKSRC', None)
+			if source:
+				with fits.open(source) as srcdat:
+					data = srcdat[hdu.name, 1].data.copy()
+			else:
+				data = np.zeros(shape, dtype = dtype)
+			hdlist.append(compimagehdu(data, exthdr, hdu.name, hdu.ver, compress))
+
+		hdulist = fits.HDUList(hdlist)
+		hdulist.writeto(outname, overwrite = clobber)
+
+	if outname.endswith('c0m.fits'):
+		c1mhdr = compimagehdu(np.zeros(shape, dtype = np.int16), hdr, 'SCI', 1, compress)
+		fits.HDUList([cphdr, c1mhdr]).writeto(outname.replace('c0m.fits', 'c1m.fits'), overwrite = clobber)
+
+	return outname
+
+
+def expandstamps(imgs, outdir):
+	"""
+	Expand any PSF stamp files in a list into full-frame copies in outdir for drizzle/resample, and 
+	write uncompressed copies of any tile-compressed files. Other files are passed through unchanged.
+
+	Parameters:
+		imgs (list): Paths to FITS files.
+		outdir (str): Directory in which to write expanded copies.
+
+	Returns:
+		list: Paths to full-frame files, in the same order as imgs.
+	"""
+
+	expanded = []
+	for img in imgs:
+		outname = os.path.join(outdir, os.path.basename(img))
+		if isstamp(img):
+			expanded.append(expandstamp(img, outname))
+		elif iscompressed(img):
+			expanded.append(decompress(img, outname))
+		else:
+			expanded.append(img)
+	return expanded
+
+
+def compimagehdu(data, header, name, ver = 1, compress = None):
+	"""
+	Image extension, tile-compressed if requested. Floating-point data are not quantized, so 
+	compression is lossless; mostly-empty PSF frames shrink by orders of magnitude.
+	Unquantized floating-point data can only be compressed with GZIP.
+
+	Parameters:
+		data (arr): Image data.
+		header (astropy header): Extension header.
+		name (str): Extension name.
+		ver (int): Extension version.
+		compress (str): Compression type, 'GZIP_1' or 'GZIP_2' (or, for integer data only, 'RICE_1', 
+			'HCOMPRESS_1', or 'PLIO_1'). If None, an uncompressed ImageHDU is returned.
+
+	Returns:
+		astropy ImageHDU or CompImageHDU
+	"""
+
+	if not compress:
+		return fits.ImageHDU(data = data, header = header, name = name, ver = ver)
+	lossless = ['GZIP_1', 'GZIP_2']
+	if (data is None) or not np.issubdtype(np.asarray(data).dtype, np.floating):
+		lossless += ['RICE_1', 'HCOMPRESS_1', 'PLIO_1']
+	if compress not in lossless:
+		raise ValueError("compress = '%s' is not available for %s extension %s; use one of %s."%(compress, 
+			'integer' if 'RICE_1' in lossless else 'floating-point', name, str(lossless)))
+	hdu = fits.CompImageHDU(data = data, header = header, name = name, compression_type = compress, 
+		quantize_level = 0.)
+	hdu.ver = ver
+	return hdu
+
+
+def iscompressed(img):
+	"""
+	Check whether a FITS file has any tile-compressed image extensions.
+
+	Parameters:
+		img (str): Path to FITS file.
+
+	Returns:
+		bool: True if any extension is a CompImageHDU.
+	"""
+
+	with fits.open(img) as hdul:
+		return any(isinstance(hdu, fits.CompImageHDU) for hdu in hdul)
+
+
+def decompress(img, outname = None, clobber = False):
+	"""
+	Write an uncompressed copy of a tile-compressed FITS file, e.g., for tools that cannot read 
+	compressed images (AstroDrizzle, SExtractor).
+
+	Parameters:
+		img (str): Path to tile-compressed FITS file.
+		outname (str): Path for the uncompressed file. If None, img is overwritten.
+		clobber (bool): If True, will overwrite an existing outname.
+
+	Returns:
+		str: Path to the uncompressed file.
+	"""
+
+	if outname is None:
+		outname, clobber = img, True
+
+	with fits.open(img) as hdul:
+		hdlist = [hdul[0]]
+		for hdu in hdul[1:]:
+			if isinstance(hdu, fits.CompImageHDU):
+				hdu = fits.ImageHDU(data = hdu.data, header = hdu.header, name = hdu.name, ver = hdu.ver)
+			hdlist.append(hdu)
+		fits.HDUList(hdlist).writeto(outname, overwrite = clobber)
+
+	return outname
 
 
 def mask_fits(img, ext = 1, maskdq = True, dqthresh = 0, maskerr = False, 
-	errthresh = 20, usermask = None, fillval = 0, clobber = False):
+	errthresh = 20, usermask = None, fillval = 0, clobber = False, compress = None):
 	"""
 	Generate a FITS file that fills in masked pixels with a specified value. Useful for
 	feeding to e.g., SExtractor. Preserves truncated FITS extension structure, for the specified
@@ -726,6 +1953,7 @@ def mask_fits(img, ext = 1, maskdq = True, dqthresh = 0, maskerr = False,
 		fillval (float): Value with which to fill the masked pixels.
 		clobber (bool): If True , will overwrite existing FITS files with the same name.
 			(Default state -- clobber = False -- is recommended.)
+		compress (str): If specified, tile compression used for the output (see compimagehdu).
 
 	Returns: 
 		Generates a new FITS file with a _mask suffix with masked pixels filled in by fillval.
@@ -753,9 +1981,9 @@ def mask_fits(img, ext = 1, maskdq = True, dqthresh = 0, maskerr = False,
 		if usermask:
 			dat[usermask > 0] = fillval
 
-		cihdr = fits.ImageHDU(data = dat, header = hdr, name = 'SCI')
-		cehdr = fits.ImageHDU(data = err, header = errdat[('ERR', ext)].header, name = 'ERR')
-		cdqhdr = fits.ImageHDU(data = dq, header = errdat[('DQ', ext)].header, name = 'DQ')
+		cihdr = compimagehdu(dat, hdr, 'SCI', compress = compress)
+		cehdr = compimagehdu(err, errdat[('ERR', ext)].header, 'ERR', compress = compress)
+		cdqhdr = compimagehdu(dq, errdat[('DQ', ext)].header, 'DQ', compress = compress)
 
 
 	else:
@@ -770,9 +1998,9 @@ def mask_fits(img, ext = 1, maskdq = True, dqthresh = 0, maskerr = False,
 		if usermask:
 			dat[usermask > 0] = fillval
 
-		cihdr = fits.ImageHDU(data = dat, header = hdr, name = 'SCI')
-		cehdr = fits.ImageHDU(data = err, header = imgdat[('ERR', ext)].header, name = 'ERR')
-		cdqhdr = fits.ImageHDU(data = dq, header = imgdat[('DQ', ext)].header, name = 'DQ')
+		cihdr = compimagehdu(dat, hdr, 'SCI', compress = compress)
+		cehdr = compimagehdu(err, imgdat[('ERR', ext)].header, 'ERR', compress = compress)
+		cdqhdr = compimagehdu(dq, imgdat[('DQ', ext)].header, 'DQ', compress = compress)
 
 
 	hdlist = [cphdr, cihdr, cehdr, cdqhdr]
@@ -781,7 +2009,7 @@ def mask_fits(img, ext = 1, maskdq = True, dqthresh = 0, maskerr = False,
 	hdulist.writeto(img.replace('.fits', '_mask.fits'), overwrite = clobber)
 
 
-def cutout(img, coords, ext = 1, fov_pixel = 120, save = True, clobber = False):
+def cutout(img, coords, ext = 1, fov_pixel = 120, save = True, clobber = False, compress = None):
 	"""
 	Get cutout of image around some coordinates.
 
@@ -796,6 +2024,7 @@ def cutout(img, coords, ext = 1, fov_pixel = 120, save = True, clobber = False):
 			decontextualized from the original image.
 		clobber (bool): If True (and save = True), will overwrite existing FITS files with the same name.
 			(Default state -- clobber = False -- is recommended.)
+		compress (str): If specified (and save = True), tile compression used for the output (see compimagehdu).
 
 	Returns: 
 		cutoutim (arr): Array containing cutout region of the image.
@@ -875,7 +2104,7 @@ def cutout(img, coords, ext = 1, fov_pixel = 120, save = True, clobber = False):
 	except:
 		pass
 
-	cihdr = fits.ImageHDU(data = cutoutim, header = hdr, name = 'SCI')
+	cihdr = compimagehdu(cutoutim, hdr, 'SCI', compress = compress)
 
 	hdlist = [cphdr, cihdr]
 
@@ -1,4 +1,5 @@
 from spike import psf
+import numpy as np
 
 
 ############################################## HST #############################################
@@ -24,6 +25,17 @@ psf.hst(img_dir = acs_path, obj = '10:00:33.0178 +02:09:52.304', img_type = 'flc
 	inst = 'ACS', camera = 'WFC', method='stdpsf', savedir = 'psfs_stdpsf', verbose = True,
 	pretweaked = True)
 
+# ### check that a parallel run (per-filter stage graph) reproduces the serial output ###
+serial = psf.hst(img_dir = acs_path, obj = '10:00:33.0178 +02:09:52.304', img_type = 'flc', 
+	inst = 'ACS', camera = 'WFC', method='stdpsf', savedir = 'psfs_stdpsf_serial', pretweaked = True, 
+	returnpsf = 'full', clobber = True)
+parallel = psf.hst(img_dir = acs_path, obj = '10:00:33.0178 +02:09:52.304', img_type = 'flc', 
+	inst = 'ACS', camera = 'WFC', method='stdpsf', savedir = 'psfs_stdpsf_parallel', pretweaked = True, 
+	returnpsf = 'full', clobber = True, parallel = True)
+for o in serial:
+	for f in serial[o]:
+		assert np.array_equal(serial[o][f], parallel[o][f])
+
 # ### test ePSF output ###
 psf.hst(img_dir = acs_path, obj = '10:00:33.0178 +02:09:52.304', img_type = 'flc', 
 	inst = 'ACS', camera = 'WFC', method='epsf', savedir = 'psfs_epsf', verbose = True,
@@ -42,3 +42,945 @@ def test_multiprocessing():
 
 
 
+
+
+def _wfc3image(tmp_path):
+	# 100 x 100 WFC3/IR F160W image centered on 150.125125 2.1498528
+	import numpy as np
+	from astropy.io import fits
+	from astropy.wcs import WCS
+
+	w = WCS(naxis = 2)
+	w.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+	w.wcs.crval = [150.125125, 2.1498528]
+	w.wcs.crpix = [50.5, 50.5]
+	w.wcs.cdelt = [-0.13/3600, 0.13/3600]
+	img = str(tmp_path / 'test_flt.fits')
+	fits.HDUList([fits.PrimaryHDU(header = fits.Header({'FILTER':'F160W'})), 
+		fits.ImageHDU(data = np.zeros((100, 100)), header = w.to_header(), name = 'SCI')]).writeto(img)
+	return img
+
+
+def test_imgindex(tmp_path):
+	# index is built once, then reused from the saved file while the image is unchanged
+	from spike.tools import imgindex, checkpixloc
+
+	img = _wfc3image(tmp_path)
+
+	indexfile = str(tmp_path / 'index.pkl')
+	index = imgindex([img], 'WFC3', 'IR', indexfile = indexfile)
+	assert index[img]['filter'] == 'F160W'
+	assert index[img]['chips'][0]['shape'] == (100, 100)
+
+	warm = imgindex([img], 'WFC3', 'IR', indexfile = indexfile)
+	assert warm[img]['mtime'] == index[img]['mtime']
+
+	pos = checkpixloc(objloc('150.125125 2.1498528'), img, 'WFC3', 'IR', index = warm)
+	assert abs(pos[0] - 49.5) < 0.01 and abs(pos[1] - 49.5) < 0.01
+	assert pos[3] == 'F160W'
+
+
+def test_batchpixloc(tmp_path):
+	# vectorized lookup agrees with the single-object path and flags off-detector objects
+	import numpy as np
+	from spike.tools import batchpixloc, checkpixloc
+
+	img = _wfc3image(tmp_path)
+
+	coords = SkyCoord([150.125125, 150.125125, 151.], [2.1498528, 2.15, 2.], unit = 'deg')
+	locs = batchpixloc(coords, img, 'WFC3', 'IR')
+	assert list(locs['on_detector']) == [True, True, False]
+	assert np.all(locs['filter'] == 'F160W')
+	assert np.isnan(locs['x'][2])
+
+	pos = checkpixloc(coords[1], img, 'WFC3', 'IR')
+	assert pos == checkpixloc([coords[0], coords[1]], img, 'WFC3', 'IR')[1]
+	onoff = checkpixloc([coords[0], coords[2]], img, 'WFC3', 'IR') #same types as one object; NaNs off the detector
+	assert onoff[0][2] == 0 and np.isnan(onoff[1]).all()
+
+
+def test_manifest(tmp_path):
+	# tasks are skipped only while their inputs hash the same and their outputs are untouched
+	from spike.tools import loadmanifest, savemanifest, taskkey, checkmanifest, updatemanifest
+
+	img = tmp_path / 'test_flt.fits'
+	img.write_bytes(b'image')
+	out = tmp_path / 'test_topsf_flt.fits'
+	manifestfile = str(tmp_path / 'manifest.json')
+
+	manifest = loadmanifest(manifestfile)
+	key = taskkey([str(img)], manifest, pos = [10., 20., 1, 'F160W'], method = 'TinyTim')
+	assert not checkmanifest(manifest, 'model', key)
+
+	out.write_bytes(b'psf')
+	updatemanifest(manifest, 'model', key, [str(out)])
+	savemanifest(manifest)
+
+	restarted = loadmanifest(manifestfile)
+	assert checkmanifest(restarted, 'model', taskkey([str(img)], restarted, pos = [10., 20., 1, 'F160W'], method = 'TinyTim'))
+	assert not checkmanifest(restarted, 'model', taskkey([str(img)], restarted, pos = [10., 20., 1, 'F814W'], method = 'TinyTim'))
+
+	img.write_bytes(b'changed image')
+	assert not checkmanifest(restarted, 'model', taskkey([str(img)], restarted, pos = [10., 20., 1, 'F160W'], method = 'TinyTim'))
+
+
+def test_taskkey():
+	# keys are the same for equal inputs from run to run, and inputs without a stable form are refused
+	import numpy as np
+	from spike import psfgen
+	from spike.tools import taskkey
+
+	params = {'psffunc':psfgen.tinypsf, 'coords':SkyCoord(10., 20., unit = 'deg'), 
+		'kwargs':{'usermask':np.zeros((5, 5)), 'fov_arcsec':6}}
+	key = taskkey(**params)
+	assert key == taskkey(psffunc = psfgen.tinypsf, coords = SkyCoord(10., 20., unit = 'deg'), 
+		kwargs = {'fov_arcsec':6, 'usermask':np.zeros((5, 5))})
+	assert key != taskkey(**dict(params, kwargs = {'usermask':np.ones((5, 5)), 'fov_arcsec':6}))
+	assert key != taskkey(**dict(params, psffunc = psfgen.stdpsf))
+
+	with pytest.raises(TypeError):
+		taskkey(kwargs = {'starselect':object()})
+
+
+def test_imagechecksum(tmp_path):
+	# image keys follow the SCI data and WCS, not DQ arrays updated in place (e.g., by CR flagging)
+	import numpy as np
+	from astropy.io import fits
+	from spike.tools import loadmanifest, taskkey
+
+	img = _wfc3image(tmp_path)
+	fits.append(img, np.zeros((100, 100), dtype = np.int16), fits.Header({'EXTNAME':'DQ'}))
+	manifest = loadmanifest(str(tmp_path / 'manifest.json'))
+	key = taskkey(manifest = manifest, images = [img], pos = [50., 50., 1, 'F160W'])
+	assert ('image:'+img) in manifest['checksums']
+
+	with fits.open(img, mode = 'update') as hdu:
+		hdu['DQ'].data[10:20, 10:20] = 4096
+	assert taskkey(manifest = manifest, images = [img], pos = [50., 50., 1, 'F160W']) == key
+
+	with fits.open(img, mode = 'update') as hdu: #e.g., realigned
+		hdu['SCI'].header['CRVAL1'] += 1e-4
+	tweaked = taskkey(manifest = manifest, images = [img], pos = [50., 50., 1, 'F160W'])
+	assert tweaked != key
+
+	with fits.open(img, mode = 'update') as hdu:
+		hdu['SCI'].data[50, 50] = 1.
+	assert taskkey(manifest = manifest, images = [img], pos = [50., 50., 1, 'F160W']) not in [key, tweaked]
+
+
+def test_filemanagement(tmp_path):
+	# products are moved, copied and deleted in-process, without touching unmatched files
+	from spike.tools import copyfiles, movefiles, removefiles
+
+	img_dir = str(tmp_path) + '/'
+	for name in ['a_flc.fits', 'a_topsf_flc.fits', 'a.cat', 'keep.txt']:
+		(tmp_path / name).write_bytes(name.encode())
+
+	orig = copyfiles(img_dir+'*_flc.fits', img_dir+'_orig')
+	assert sorted(orig) == [img_dir+'_orig/a_flc.fits', img_dir+'_orig/a_topsf_flc.fits']
+	(tmp_path / 'a_flc.fits').write_bytes(b'updated')
+	assert (tmp_path / '_orig' / 'a_flc.fits').read_bytes() == b'a_flc.fits' #copies are independent
+
+	moved = movefiles([img_dir+'*_topsf*', img_dir+'*.cat', img_dir+'*.cat'], img_dir+'psfs')
+	assert sorted(moved) == [img_dir+'psfs/a.cat', img_dir+'psfs/a_topsf_flc.fits']
+
+	removefiles([img_dir+'psfs', img_dir+'_orig'])
+	assert sorted(p.name for p in tmp_path.iterdir()) == ['a_flc.fits', 'keep.txt']
+
+
+def test_scratchdir():
+	# each call gets its own working directory, which is removed afterwards
+	import os
+	from spike.tools import scratchdir
+
+	with scratchdir() as a, scratchdir() as b:
+		assert a != b
+		assert os.path.isdir(a) and os.path.isdir(b)
+	assert not os.path.exists(a) and not os.path.exists(b)
+
+
+def test_objcache(tmp_path):
+	# names resolve from a local table and are served from the on-disk cache afterwards
+	from astropy.table import Table
+	from spike.tools import objcache, resolvenames, tools
+
+	tablefile = str(tmp_path / 'targets.ecsv')
+	Table({'name':['M51'], 'ra':[202.469575], 'dec':[47.19525833]}).write(tablefile)
+	cachefile = str(tmp_path / 'objcache.json')
+
+	objcache(cachefile, resolver = tablefile)
+	m51, coord = resolvenames(['M51', '150.125125 2.1498528'])
+	assert m51.separation(SkyCoord(202.469575, 47.19525833, unit = u.deg)).arcsec <= 0.05
+	assert coord.separation(SkyCoord(150.125125, 2.1498528, unit = u.deg)).arcsec <= 0.05
+
+	def offline(name):
+		raise ConnectionError
+	tools._objcache.clear()
+	objcache(cachefile, ttl = 0., resolver = offline) #expired, but still usable offline
+	with pytest.warns(Warning):
+		assert resolvenames(['M51'], prompt = False)[0].separation(m51).arcsec <= 0.05
+
+	objcache(None) #restore defaults
+	tools._objcache.clear()
+
+
+def test_readcatalog(tmp_path):
+	# targets stream out in fixed-size chunks, from coordinates or names
+	from astropy.table import Table
+	from spike.tools import iscatalog, readcatalog
+
+	catfile = str(tmp_path / 'targets.csv')
+	Table({'ID':['a', 'b', 'c', 'd', 'e'], 'RA':[10., 11., 12., 13., 14.], 'Dec':[-1., 0., 1., 2., 3.]}).write(catfile)
+	assert iscatalog(catfile) and not iscatalog('M51')
+
+	chunks = list(readcatalog(catfile, chunksize = 2))
+	assert [len(c) for c in chunks] == [2, 2, 1]
+	assert objloc(chunks[0][1]).separation(SkyCoord(11., 0., unit = u.deg)).arcsec <= 0.05
+
+	assert list(readcatalog(Table.read(catfile), chunksize = 5, columns = 'ID')) == [['a', 'b', 'c', 'd', 'e']]
+
+
+def test_runcatalog(tmp_path):
+	# catalogs run chunk by chunk, aligning once, and a restarted run only adds the targets still missing
+	import os
+	import shutil
+	from astropy.table import Table
+	from spike.psf.psf import _runcatalog
+
+	img = _wfc3image(tmp_path)
+	catfile = str(tmp_path / 'targets.csv')
+	Table({'ra':[150.125125, 10., 150.1255], 'dec':[2.1498528, 20., 2.1499]}).write(catfile) #on, off, on the image
+	resultsfile = str(tmp_path / 'results.csv')
+
+	calls = []
+	def func(**params): #stands in for spike.psf.jwst, writing its tweaked copies on the first call
+		calls.append((params['obj'], params['pretweaked'], params['keeporig'], params['img_type'], params['returnpsf']))
+		if not params['pretweaked']:
+			shutil.copy(img, img.replace('_flt.fits', '_tweakregstep.fits'))
+		return {o:{'F160W':str(tmp_path / ('%s_F160W_psf.fits'%o.replace(' ', '')))} for o in params['obj']}
+
+	def params():
+		return {'obj':catfile, 'img_dir':str(tmp_path), 'img_type':'flt', 'inst':'WFC3', 'camera':'IR',
+			'savedir':str(tmp_path / 'psfs'), 'resultsfile':resultsfile, 'returnpsf':'full', 'chunksize':1,
+			'catalogcols':None, 'indexfile':None, 'pretweaked':False, 'keeporig':True, 'dryrun':False,
+			'verbose':False, 'clobber':False, 'compress':None, 'cutout_fov':81, 'kwargs':{}}
+
+	assert _runcatalog(func, params()) == resultsfile
+	on1, off, on2 = [o for o in Table.read(resultsfile, format = 'csv')['obj']]
+	assert [c[0] for c in calls] == [[on1], [on2]] #the target on no image is not passed on
+	assert calls[0][1:] == (False, True, 'flt', 'path')
+	assert calls[1][1:] == (True, False, 'tweakregstep', 'path') #continues from the aligned copies
+
+	results = Table.read(resultsfile, format = 'csv')
+	assert list(results['filter'].filled('')) == ['F160W', '', 'F160W']
+	assert results['psf'][2].endswith('_F160W_psf.fits')
+
+	with open(resultsfile) as file: #interrupted before the last chunk was written
+		lines = file.readlines()
+	with open(resultsfile, 'w') as file:
+		file.writelines(lines[:3])
+	os.remove(img.replace('_flt.fits', '_tweakregstep.fits'))
+	calls.clear()
+	_runcatalog(func, params())
+	assert [c[0] for c in calls] == [[on2]]
+	assert list(Table.read(resultsfile, format = 'csv')['obj']) == [on1, off, on2]
+
+
+def test_mosaicshape():
+	# output mosaic size follows from the input footprints and pixel scale alone
+	from astropy.wcs import WCS
+	from spike.tools import mosaicshape
+
+	index = {}
+	for i, crpix in enumerate([50.5, -49.5]): #two 100 x 100 frames side by side
+		wcs = WCS(naxis = 2)
+		wcs.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+		wcs.wcs.crval = [150., 2.]
+		wcs.wcs.crpix = [crpix, 50.5]
+		wcs.wcs.cdelt = [-0.1/3600, 0.1/3600]
+		index['img%i'%i] = {'chips':[{'shape':(100, 100), 'wcs':wcs}]}
+
+	ny, nx = mosaicshape(index, ['img0', 'img1'])
+	assert abs(ny - 100) <= 1 and abs(nx - 200) <= 1
+
+
+def test_planrun(monkeypatch):
+	# job counts and memory follow from a header-only index, and runs that would not fit are flagged
+	from types import SimpleNamespace
+	from astropy.wcs import WCS
+	from spike import tools
+
+	index = {}
+	for i, (crpix, filt) in enumerate([(50.5, 'F160W'), (-49.5, 'F160W'), (50.5, 'F814W')]):
+		wcs = WCS(naxis = 2)
+		wcs.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+		wcs.wcs.crval = [150., 2.]
+		wcs.wcs.crpix = [crpix, 50.5]
+		wcs.wcs.cdelt = [-0.1/3600, 0.1/3600]
+		index['img%i'%i] = {'inst':'WFC3', 'filter':filt, 'size':10**6,
+			'chips':[{'chip':1, 'shape':(100, 100), 'wcs':wcs}]}
+	objs = ['150.0 2.0', '149.996 2.0', '150.1 2.1'] #on img0 + img2, on img1, on no image
+
+	monkeypatch.setattr(tools.tools.psutil, 'virtual_memory', lambda: SimpleNamespace(available = 10**9))
+	plan = tools.planrun(index, objs, drizzleimgs = True, objonly = False)
+	assert len(plan['models']) == 3
+	assert sorted((o, filt) for o, filt, ims, shape in plan['drizzles']) == [
+		('149.996 2.0', 'F160W'), ('150.0 2.0', 'F160W'), ('150.0 2.0', 'F814W')]
+	assert sorted(filt for o, filt, ims, shape in plan['imgdrizzles']) == ['F160W', 'F814W']
+	assert plan['noutputs'] == 5
+	assert plan['feasible']
+
+	windowed = tools.planrun(index, objs, windowsize = 20)
+	assert all(shape == (20, 20) for o, filt, ims, shape in windowed['drizzles'])
+	assert windowed['memory']['drizzle'] < plan['memory']['drizzle']
+	multi = tools.planrun(index, objs, windowsize = 20, multitarget = True) #both F160W objects in one task
+	assert multi['memory']['drizzle'] == 2*20*20*12 + 10**6
+
+	crowded = tools.planrun(index, objs, parallel = True, nworkers = 1000)
+	assert crowded['peak_memory'] == 1000*max(crowded['memory'].values())
+	assert not crowded['feasible']
+
+
+def _flatimage(tmp_path):
+	# 100 x 100 image with unit SCI/ERR and DQ extensions, as input to spike.tools.rewrite_fits
+	import numpy as np
+	from astropy.io import fits
+
+	img = str(tmp_path / 'test_flt.fits')
+	fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(data = np.ones((100, 100), dtype = np.float32), name = 'SCI'), 
+		fits.ImageHDU(data = np.ones((100, 100), dtype = np.float32), name = 'ERR'), 
+		fits.ImageHDU(data = np.ones((100, 100), dtype = np.int16), name = 'DQ')]).writeto(img)
+	return img
+
+
+def test_stamps(tmp_path):
+	# a stamp _topsf file expands to the same full-frame file rewrite_fits writes otherwise
+	import glob
+	import numpy as np
+	from astropy.io import fits
+	from spike.tools import rewrite_fits, isstamp, expandstamp
+
+	img = _flatimage(tmp_path)
+	psfarr = np.random.default_rng(0).random((11, 11))
+	coords = objloc('150.125125 2.1498528')
+
+	rewrite_fits(psfarr, coords, img, 'WFC3/IR', [95, 40, 1, 'F160W'])
+	modname = glob.glob(str(tmp_path / '*_topsf_flt.fits'))[0]
+	full = fits.open(modname)
+	assert not isstamp(modname)
+
+	rewrite_fits(psfarr, coords, img, 'WFC3/IR', [95, 40, 1, 'F160W'], clobber = True, stamp = True)
+	assert isstamp(modname)
+	assert fits.getdata(modname, 'SCI').size < psfarr.size + 1
+
+	expanded = fits.open(expandstamp(modname, str(tmp_path / 'expanded.fits')))
+	for ext in ['SCI', 'ERR', 'DQ']:
+		assert expanded[ext].data.dtype == full[ext].data.dtype
+		assert np.array_equal(expanded[ext].data, full[ext].data)
+
+
+def test_target_inputs(tmp_path):
+	# multi-target resampling reads stamps as stored and full frames cut to their PSF
+	import glob
+	import numpy as np
+	from astropy.io import fits
+	from spike.tools import rewrite_fits
+	from spike.jwstcal.resample import _read_target_input
+
+	img = _flatimage(tmp_path)
+	psfarr = np.random.default_rng(0).random((11, 11)) + 0.1
+	coords = objloc('150.125125 2.1498528')
+
+	rewrite_fits(psfarr, coords, img, 'WFC3/IR', [50, 40, 1, 'F160W'])
+	modname = glob.glob(str(tmp_path / '*_topsf_flt.fits'))[0]
+	full = fits.getdata(modname, 'SCI')
+	data, x0, y0 = _read_target_input(modname)
+	assert np.array_equal(full[y0:y0 + data.shape[0], x0:x0 + data.shape[1]], data)
+	assert np.isclose(full.sum(), data.sum())
+
+	rewrite_fits(psfarr, coords, img, 'WFC3/IR', [50, 40, 1, 'F160W'], clobber = True, stamp = True)
+	stamp, sx0, sy0 = _read_target_input(modname)
+	assert np.array_equal(full[sy0:sy0 + stamp.shape[0], sx0:sx0 + stamp.shape[1]], stamp)
+
+
+@pytest.mark.parametrize("weight_type", ['ivm', 'exptime', None])
+def test_target_weight(weight_type):
+	# multi-target weights over a region of the exposure match those of the (empty-DQ) per-target input
+	from types import SimpleNamespace
+	import numpy as np
+	from stdatamodels.jwst import datamodels
+	from spike.jwstcal.resample import ResampleData
+	from spike.jwstcal.resample_utils import build_driz_weight
+
+	rng = np.random.default_rng(0)
+	img = datamodels.ImageModel((40, 50))
+	img.var_rnoise = rng.random((40, 50)).astype(np.float32) + 0.1
+	img.var_rnoise[5, 5] = 0 #non-finite inverse variance
+	img.dq = rng.integers(0, 4, (40, 50)).astype(np.uint32) #ignored, as the inputs' DQ is empty
+	img.meta.exposure.exposure_time = 100.
+	img.meta.exposure.measurement_time = 90.
+
+	model = img.copy()
+	model.dq = np.zeros((40, 50), dtype = np.uint32)
+	expected = build_driz_weight(model, weight_type = weight_type, good_bits = 0)
+
+	step = SimpleNamespace(weight_type = weight_type, good_bits = 0)
+	weight = ResampleData._target_weight(step, img, (3, 21, 2, 30))
+	assert weight.dtype == np.float32
+	assert np.array_equal(weight, expected[2:31, 3:22])
+
+
+def test_compress(tmp_path):
+	# tile-compressed frames are lossless and read back uncompressed for drizzle/resample
+	import numpy as np
+	from astropy.io import fits
+	from spike.tools import compimagehdu, iscompressed, expandstamps
+
+	data = np.zeros((200, 200), dtype = np.float32)
+	data[90:110, 90:110] = np.random.default_rng(0).random((20, 20))
+	img = str(tmp_path / 'test_topsf_flt.fits')
+	fits.HDUList([fits.PrimaryHDU(), compimagehdu(data, fits.Header(), 'SCI', 1, 'GZIP_2')]).writeto(img)
+	assert iscompressed(img)
+	assert np.array_equal(fits.getdata(img, 'SCI'), data)
+
+	outdir = tmp_path / 'scratch'
+	outdir.mkdir()
+	expanded = expandstamps([img], str(outdir))[0]
+	assert not iscompressed(expanded)
+	assert np.array_equal(fits.getdata(expanded, 'SCI'), data)
+
+	with pytest.raises(ValueError): #would quantize (or fail on) float data
+		compimagehdu(data, fits.Header(), 'SCI', 1, 'RICE_1')
+	compimagehdu(data.astype(np.int16), fits.Header(), 'DQ', 1, 'RICE_1') #lossless for integers
+
+
+def test_windowparams():
+	# windowed drizzle/resample frames are size x size pixels centered on the object, for both tools
+	from spike.psf.psf import _windowparams
+
+	coord = SkyCoord(150.1, 2.2, unit = 'deg')
+	assert _windowparams(coord, None, 'astrodrizzle') == {}
+	assert _windowparams(coord, None, 'resample') == {}
+
+	driz = _windowparams(coord, 110, 'astrodrizzle')
+	for step in ['driz_sep', 'final']: #the single drizzles feed the median, so are windowed too
+		assert driz[step+'_wcs']
+		assert (driz[step+'_outnx'], driz[step+'_outny']) == (110, 110)
+		assert driz[step+'_ra'] == pytest.approx(150.1) and driz[step+'_dec'] == pytest.approx(2.2)
+
+	resamp = _windowparams(coord, 110, 'resample')
+	assert resamp['output_shape'] == [110, 110]
+	assert resamp['crval'] == pytest.approx([150.1, 2.2])
+
+
+def _failtask():
+	raise RuntimeError('worker failed')
+
+
+@pytest.mark.parametrize("backend", ['thread', 'serial'])
+def test_rundag(backend):
+	# tasks run after their dependencies, whether on a pool or inline, and graph errors are raised
+	from spike.psf.psf import _makepool, _rundag
+
+	order = []
+	def run(name):
+		order.append(name)
+		return name
+
+	def add(tasks): #local task that queues more work once it runs
+		tasks['c'] = {'func':run, 'args':('c',), 'deps':['b']}
+
+	tasks = {'a':{'func':run, 'args':('a',)},
+		'b':{'func':run, 'args':('b',), 'deps':['a', 'skip'], 'callback':lambda: order.append('b done')},
+		'skip':{'func':None},
+		'add':{'func':add, 'args':(None,), 'deps':['a'], 'local':True}}
+	tasks['add']['args'] = (tasks,)
+	pool = _makepool(2, backend)
+	try:
+		results = _rundag(pool, tasks)
+
+		assert results == {'a':'a', 'b':'b', 'c':'c', 'skip':None, 'add':None}
+		assert order.index('a') < order.index('b') < order.index('b done') < order.index('c')
+
+		with pytest.raises(RuntimeError, match = 'worker failed'): #worker errors reach the caller
+			_rundag(pool, {'fail':{'func':_failtask}, 'after':{'func':run, 'args':('after',), 'deps':['fail']}})
+		assert 'after' not in order
+
+		with pytest.raises(ValueError, match = 'circular'):
+			_rundag(pool, {'x':{'func':run, 'args':('x',), 'deps':['y']}, 'y':{'func':run, 'args':('y',), 'deps':['x']}})
+		with pytest.raises(ValueError, match = 'unknown'):
+			_rundag(pool, {'x':{'func':run, 'args':('x',), 'deps':['z']}})
+	finally:
+		pool.terminate()
+		pool.join()
+
+
+def test_pixmap_bbox():
+	# pixel map computed on the data bounding box only matches the full map there
+	import numpy as np
+	from astropy.wcs import WCS
+	from spike.jwstcal import resample_utils
+
+	data = np.zeros((60, 80))
+	data[20:30, 40:45] = 1.
+	bbox = resample_utils.data_bounding_box(data, pad = 2)
+	assert bbox == (38, 46, 18, 31)
+
+	w1, w2 = WCS(naxis = 2), WCS(naxis = 2)
+	for w, crpix in [(w1, [40., 30.]), (w2, [35., 25.])]:
+		w.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+		w.wcs.crval = [150., 2.]
+		w.wcs.crpix = crpix
+		w.wcs.cdelt = [-0.1/3600, 0.1/3600]
+	full = resample_utils.calc_gwcs_pixmap(w1, w2, data.shape)
+	part = resample_utils.calc_gwcs_pixmap(w1, w2, data.shape, limits = bbox)
+	assert np.allclose(part[18:32, 38:47], full[18:32, 38:47])
+	assert np.isnan(part[0, 0]).all()
+
+	# interpolated pixel map stays within tolerance of the exact one
+	interp = resample_utils.calc_gwcs_pixmap(w1, w2, data.shape, step = 16, tol = 1e-3)
+	assert np.nanmax(np.abs(interp - full)) <= 1e-3
+
+
+def test_tile_region():
+	# tiles of the output map back to the input pixels that drizzle into them
+	import numpy as np
+	import gwcs
+	from astropy.modeling import models
+	from spike.romancal import resample_utils
+
+	w1 = gwcs.WCS(forward_transform = models.Shift(-5.) & models.Shift(-5.),
+		input_frame = 'detector', output_frame = 'world')
+	w2 = gwcs.WCS(forward_transform = models.Identity(2), input_frame = 'detector',
+		output_frame = 'world')
+	full = resample_utils.calc_gwcs_pixmap(w1, w2, (60, 80))
+	part = resample_utils.calc_gwcs_pixmap_region(w1, w2, (10, 29, 5, 14))
+	assert np.allclose(part, full[5:15, 10:30])
+
+	box = resample_utils.map_box(resample_utils.reproject(w2, w1), (0, 15, 0, 15))
+	assert np.allclose(box, (4.5, 20.5, 4.5, 20.5))
+
+
+def test_driz_weight_region():
+	# weight maps built for an input region (one output tile) match the full map cut to it
+	import numpy as np
+	from types import SimpleNamespace
+	from spike.romancal import resample_utils
+
+	rng = np.random.default_rng(0)
+	model = SimpleNamespace(data = rng.random((30, 40), dtype = np.float32), 
+		dq = rng.integers(0, 2, (30, 40)).astype(np.uint32), var_rnoise = rng.random((30, 40)) + 0.1, 
+		meta = SimpleNamespace(exposure = SimpleNamespace(exposure_time = 100.)))
+	region = np.s_[5:17, 12:33]
+	for weight_type in ['ivm', 'exptime', None]:
+		full = resample_utils.build_driz_weight(model, weight_type = weight_type, good_bits = 0)
+		part = resample_utils.build_driz_weight(model, weight_type = weight_type, good_bits = 0, region = region)
+		assert np.array_equal(part, full[region])
+
+
+def test_pixmap_cache(tmp_path):
+	# pixel maps are computed once per input/output WCS pair and reused from memory or disk
+	import numpy as np
+	from astropy.wcs import WCS
+	from spike.jwstcal import resample_utils
+	from spike.stcal.pixmap_cache import PixmapCache
+
+	w1, w2, w3 = WCS(naxis = 2), WCS(naxis = 2), WCS(naxis = 2)
+	for w, crpix in [(w1, [40., 30.]), (w2, [35., 25.]), (w3, [35., 25.])]:
+		w.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+		w.wcs.crval = [150., 2.]
+		w.wcs.crpix = crpix
+		w.wcs.cdelt = [-0.1/3600, 0.1/3600]
+
+	calls = []
+	def calc(*args, **kwargs):
+		calls.append(args)
+		return resample_utils.calc_gwcs_pixmap(*args, **kwargs)
+
+	cache = PixmapCache(2**20, spill_dir = str(tmp_path))
+	full = cache.pixmap(w1, w2, (60, 80), calc)
+	assert cache.pixmap(w1, w3, (60, 80), calc) is full # equal WCS, separate objects
+	cache.pixmap(w1, w2, (60, 80), calc, limits = (38, 46, 18, 31)) # served by the full map
+	assert len(calls) == 1
+
+	cache.clear()
+	spilled = cache.pixmap(w1, w2, (60, 80), calc)
+	assert isinstance(spilled, np.memmap) and np.array_equal(spilled, full, equal_nan = True)
+	assert len(calls) == 1
+
+	cache.pixmap(w2, w1, (60, 80), calc)
+	assert len(calls) == 2
+
+	# a limited request (e.g., a model PSF's data bounding box) only computes and stores the limited map
+	cache = PixmapCache(2**20)
+	part = cache.pixmap(w1, w2, (60, 80), calc, limits = (38, 46, 18, 31))
+	assert part.dtype == np.float32 and np.isnan(part[0, 0]).all()
+	assert cache.pixmap(w1, w2, (60, 80), calc, limits = (38, 46, 18, 31)) is part
+	assert len(calls) == 3
+	assert not np.isnan(cache.pixmap(w1, w2, (60, 80), calc)).any()
+	assert len(calls) == 4
+
+
+def _imagegwcs(shape, crval = (150., 2.)):
+	# tangent-plane gwcs of a shape (ny, nx) image at 0.1"/pixel centered on crval, as on JWST/Roman exposures
+	import gwcs
+	from astropy import coordinates
+	from astropy.modeling import models
+	from gwcs import coordinate_frames
+
+	transform = ((models.Shift(-shape[1]/2) & models.Shift(-shape[0]/2)) | 
+		(models.Scale(-0.1/3600) & models.Scale(0.1/3600)) | models.Pix2Sky_TAN() | 
+		models.RotateNative2Celestial(crval[0], crval[1], 180.))
+	detector = coordinate_frames.Frame2D(name = 'detector', axes_order = (0, 1), unit = (u.pix, u.pix))
+	sky = coordinate_frames.CelestialFrame(reference_frame = coordinates.ICRS(), name = 'world')
+	wcs = gwcs.WCS([(detector, transform), (sky, None)])
+	wcs.bounding_box = ((-0.5, shape[1] - 0.5), (-0.5, shape[0] - 0.5))
+	wcs.array_shape = shape
+	return wcs
+
+
+def test_skip_variance():
+	# skip_variance resamples the science data only, leaving the variance and error arrays unset
+	import numpy as np
+	from stdatamodels.jwst import datamodels
+	from spike.jwstcal.datamodels_library import ModelLibrary
+	from spike.jwstcal.resample import ResampleData
+
+	def resample(**kwargs):
+		model = datamodels.ImageModel((40, 40))
+		model.data[18:22, 18:22] = 1.
+		for var in ['var_rnoise', 'var_poisson', 'var_flat']:
+			setattr(model, var, np.ones((40, 40), dtype = np.float32))
+		model.meta.wcs = _imagegwcs((40, 40))
+		model.meta.filename = 'test_cal.fits'
+		model.meta.group_id = '1'
+		model.meta.background.subtracted = False
+		model.meta.exposure.exposure_time = model.meta.exposure.measurement_time = 100.
+		model.meta.exposure.duration = 100.
+		model.meta.exposure.start_time, model.meta.exposure.end_time = 60000., 60000.001
+
+		outwcs = _imagegwcs((40, 40))
+		outwcs.pixel_area = np.deg2rad(0.1/3600)**2
+		library = ModelLibrary([model], on_disk = False)
+		resamp = ResampleData(library, output_wcs = outwcs, wht_type = 'exptime', blendheaders = False, 
+			allowed_memory = None, **kwargs)
+		output = resamp.resample_many_to_one(library)
+		with output:
+			out = output.borrow(0)
+			output.shelve(out, 0, modify = False)
+		return out
+
+	full = resample()
+	skipped = resample(skip_variance = True)
+	assert np.array_equal(skipped.data, full.data, equal_nan = True)
+	assert all(arr in full.instance for arr in ['err', 'var_rnoise', 'var_poisson', 'var_flat'])
+	assert not any(arr in skipped.instance for arr in ['err', 'var_rnoise', 'var_poisson', 'var_flat'])
+
+
+def test_tiled_resample():
+	# resampling one output tile at a time gives the same mosaic as resampling it whole
+	import numpy as np
+	from roman_datamodels import maker_utils
+	from spike.romancal.datamodels_library import ModelLibrary
+	from spike.romancal.resample import ResampleData
+
+	rng = np.random.default_rng(0)
+	models = []
+	for k, crval in enumerate([(150., 2.), (150. + 0.4/3600, 2. + 0.6/3600)]): #offset by a few pixels
+		model = maker_utils.mk_level2_image(shape = (40, 40))
+		model.data = rng.random((40, 40), dtype = np.float32)
+		model.dq = np.zeros((40, 40), dtype = np.uint32)
+		for var in ['var_rnoise', 'var_poisson', 'var_flat']:
+			setattr(model, var, rng.random((40, 40), dtype = np.float32) + 0.1)
+		model.meta.wcs = _imagegwcs((40, 40), crval)
+		model.meta.filename = 'test%i_cal.asdf'%k
+		models.append(model)
+
+	def resample(**kwargs):
+		library = ModelLibrary(models, on_disk = False)
+		resamp = ResampleData(library, output_wcs = _imagegwcs((50, 60)), wht_type = 'ivm', blendheaders = False, 
+			**kwargs)
+		output = resamp.do_drizzle()
+		with output:
+			out = output.borrow(0)
+			output.shelve(out, 0, modify = False)
+		return resamp, out
+
+	_, full = resample()
+	resamp, tiled = resample(tile_size = 16) #4 x 4 tiles, the last ones partial
+	assert resamp.blank_output.data.shape == (1, 1)
+	for arr in ['data', 'weight', 'err', 'var_rnoise']:
+		assert np.allclose(getattr(tiled, arr), getattr(full, arr), equal_nan = True)
+	assert np.array_equal(tiled.context, full.context)
+
+	# per-group outputs still drizzle into full-size copies of the blank output
+	_, single = resample(tile_size = 16, single = True)
+	assert single.data.shape == (50, 60)
+
+
+def _synthgrid(oversampling = 1, seed = 0):
+	# 2 x 2 GriddedPSFModel of random 11 x 11 pixel PSFs on a 100 x 100 detector
+	import numpy as np
+	from astropy.nddata import NDData
+	from photutils.psf import GriddedPSFModel
+
+	size = 11*oversampling
+	data = np.random.default_rng(seed).random((4, size, size))
+	meta = {'grid_xypos':[(0., 0.), (99., 0.), (0., 99.), (99., 99.)], 'oversampling':[oversampling]*2}
+	return GriddedPSFModel(NDData(data, meta = meta))
+
+
+def test_stdpsfgrid(tmp_path, monkeypatch):
+	# grids are copied from a mirror and parsed once, then read from memory or from the stored array
+	import numpy as np
+	from collections import OrderedDict
+	from spike.psfgen import psfgen
+
+	grid = _synthgrid()
+	reads = []
+	def read(**kwargs):
+		reads.append(kwargs)
+		return grid
+	monkeypatch.setattr(psfgen.GriddedPSFModel, 'read', read)
+	monkeypatch.setattr(psfgen, '_stdpsfgrids', OrderedDict())
+	monkeypatch.setattr(psfgen.urllib.request, 'urlretrieve', lambda *args: pytest.fail('grid downloaded'))
+
+	mirror = tmp_path / 'mirror'
+	mirror.mkdir()
+	(mirror / 'STDPSF_WFC3IR_F160W.fits').write_bytes(b'grid')
+	cache = tmp_path / 'cache'
+	url = 'https://www.stsci.edu/~jayander/HST1PASS/LIB/PSFs/STDPSFs/WFC3IR/STDPSF_WFC3IR_F160W.fits'
+
+	model = psfgen._stdpsfgrid(url, cache_dir = str(cache), mirror = str(mirror))
+	assert (cache / 'STDPSF_WFC3IR_F160W.fits').exists()
+	assert (cache / 'STDPSF_WFC3IR_F160W.npy').exists() and (cache / 'STDPSF_WFC3IR_F160W.json').exists()
+	assert np.array_equal(model.data, grid.data)
+	assert psfgen._stdpsfgrid(url, cache_dir = str(cache), mirror = str(mirror)) is model
+	assert len(reads) == 1
+
+	psfgen._stdpsfgrids.clear() #as in a new process: the stored array is read, not the grid file
+	again = psfgen._stdpsfgrid(url, cache_dir = str(cache))
+	assert len(reads) == 1
+	assert np.array_equal(again.data, grid.data)
+	assert np.allclose(again.grid_xypos, grid.grid_xypos)
+
+
+@pytest.mark.parametrize('oversampling, dimxy', [(1, 7), (1, 15), (2, 9)])
+def test_evalgrid(oversampling, dimxy):
+	# one bilinear weighting of the grid matches GriddedPSFModel.evaluate at each position
+	import numpy as np
+	from spike.psfgen import evalgrid
+
+	model = _synthgrid(oversampling)
+	pos = [[10.3, 20.7, 1, 'F160W'], [55., 80., 1, 'F160W'], [99., 0., 1, 'F160W']]
+
+	psfs = evalgrid(model, pos, dimxy, norm = 2)
+	offsets = np.arange(-(dimxy//2), dimxy//2 + 1)
+	for psf, p in zip(psfs, pos):
+		x0, y0 = int(p[0]), int(p[1])
+		x, y = np.meshgrid(x0 + offsets, y0 + offsets)
+		assert np.allclose(psf, model.evaluate(x = x, y = y, flux = 2, x_0 = x0, y_0 = y0))
+
+
+class _FakeWebbPSF:
+	# stands in for webbpsf/stpsf: setup_sim_to_match_file(img).psf_grid(...) returns _synthgrid() and is counted
+	__version__ = 'test'
+
+	def __init__(self):
+		self.grids = []
+
+	def setup_sim_to_match_file(self, img):
+		fake = self
+		class Sim:
+			def psf_grid(self, **kwargs):
+				fake.grids.append((img, kwargs['fov_pixels']))
+				return _synthgrid()
+		return Sim()
+
+
+def _datedimage(tmp_path, name, date):
+	from astropy.io import fits
+
+	img = str(tmp_path / name)
+	fits.PrimaryHDU(header = fits.Header({'DATE-OBS':date})).writeto(img)
+	return img
+
+
+def test_jwpsfgrid(tmp_path, monkeypatch):
+	# a grid is computed once per detector, filter, and observation date, then reused from memory or from grid_dir
+	import os
+	from collections import OrderedDict
+	from spike.psfgen import psfgen
+
+	fake = _FakeWebbPSF()
+	monkeypatch.setattr(psfgen, 'webbpsf', fake)
+	monkeypatch.setattr(psfgen, '_jwpsfgrids', OrderedDict())
+	grid_dir = str(tmp_path / 'grids')
+	img1 = _datedimage(tmp_path, 'a_cal.fits', '2024-01-01')
+	img2 = _datedimage(tmp_path, 'b_cal.fits', '2024-01-01T12:00:00')
+	img3 = _datedimage(tmp_path, 'c_cal.fits', '2024-02-01')
+
+	grid = lambda img, filt = 'F770W': psfgen._jwpsfgrid(img, 'MIRI', 'MIRIMAGE', filt, 11, 4, 4, grid_dir = grid_dir)
+	model = grid(img1)
+	assert grid(img2) is model #same day
+	assert len(fake.grids) == 1
+	assert len([f for f in os.listdir(grid_dir) if f.endswith('.npy')]) == 1
+	assert not [f for f in os.listdir(grid_dir) if f.endswith('.lock')]
+
+	grid(img3)
+	grid(img1, 'F1000W')
+	assert len(fake.grids) == 3
+
+	psfgen._jwpsfgrids.clear()
+	assert (grid(img2).data == model.data).all()
+	assert len(fake.grids) == 3
+
+
+def test_jwpsfs_grid(tmp_path, monkeypatch):
+	# with grid, each object's PSF is the saved grid evaluated at its position
+	import numpy as np
+	from collections import OrderedDict
+	from astropy.coordinates import SkyCoord
+	from spike.psfgen import psfgen, evalgrid, jwpsfs
+
+	monkeypatch.setattr(psfgen, 'webbpsf', _FakeWebbPSF())
+	monkeypatch.setattr(psfgen, '_jwpsfgrids', OrderedDict())
+	img = _datedimage(tmp_path, 'a_cal.fits', '2024-01-01')
+	coords = [SkyCoord(10., 20., unit = 'deg'), SkyCoord(10.1, 20., unit = 'deg')]
+	pos = [[10.3, 20.7, 'MIRIMAGE', 'F770W'], [55., 80., 'MIRIMAGE', 'F770W']]
+
+	psfs = jwpsfs(coords, img, 'MIRI', pos, writeto = False, fov_arcsec = 1.1, grid = 4, grid_dir = str(tmp_path))
+	for psf, expected in zip(psfs, evalgrid(_synthgrid(), pos, psfgen._stampdim('MIRI', 'MIRIMAGE', 1.1))):
+		assert np.allclose(psf, expected)
+
+
+def test_filelock(tmp_path):
+	# a second holder waits until the lock is released; stale locks are taken over
+	import os
+	import threading
+	import time
+	from spike.tools import filelock
+
+	path = str(tmp_path / 'grid.lock')
+	order = []
+	def hold(name):
+		with filelock(path, poll = 0.01):
+			order.append(name)
+			time.sleep(0.1)
+			order.append(name)
+
+	threads = [threading.Thread(target = hold, args = (k,)) for k in range(3)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert all(order[k] == order[k+1] for k in range(0, len(order), 2))
+	assert not os.path.exists(path)
+
+	open(path, 'w').close()
+	os.utime(path, (0, 0))
+	with filelock(path, poll = 0.01, stale = 60):
+		assert os.path.exists(path)
+	assert not os.path.exists(path)
+
+
+def test_cachedepsf(tmp_path, monkeypatch):
+	# an ePSF is built once per image, chip, and parameters, then reused from memory or from epsfcache
+	import os
+	from collections import OrderedDict
+	from spike.psfgen import psfgen
+
+	builds = []
+	def build(img, imcam, chip, verbose = False, **params):
+		builds.append((img, chip))
+		return 'model %s'%chip, 'stars %s'%chip
+	monkeypatch.setattr(psfgen, '_buildepsf', build)
+	monkeypatch.setattr(psfgen, '_epsfs', OrderedDict())
+
+	img = str(tmp_path / 'test_flt.fits')
+	with open(img, 'wb') as file:
+		file.write(b'image')
+	params = {'thresh':125, 'epsfargs':{'oversampling':1, 'progress_bar':True}}
+
+	key = psfgen._epsfkey(img, 'WFC3/UVIS', 1, **params)
+	assert key == psfgen._epsfkey(img, 'WFC3/UVIS', 1, **dict(params, epsfargs = {'oversampling':1, 'progress_bar':False}))
+	assert key != psfgen._epsfkey(img, 'WFC3/UVIS', 2, **params)
+	assert key != psfgen._epsfkey(img, 'WFC3/UVIS', 1, **dict(params, thresh = 3))
+
+	cache = str(tmp_path / 'epsfs')
+	assert psfgen._cachedepsf(img, 'WFC3/UVIS', 1, epsfcache = cache, **params) == ('model 1', 'stars 1')
+	assert psfgen._cachedepsf(img, 'WFC3/UVIS', 1, epsfcache = cache, **params) == ('model 1', 'stars 1')
+	assert len(builds) == 1
+	assert os.path.exists(os.path.join(cache, key+'.pkl'))
+
+	psfgen._epsfs.clear() #as in a later run: read from epsfcache
+	assert psfgen._cachedepsf(img, 'WFC3/UVIS', 1, epsfcache = cache, **params) == ('model 1', 'stars 1')
+	assert len(builds) == 1
+
+	with open(img, 'wb') as file: #a changed image is a new key
+		file.write(b'changed image')
+	psfgen._cachedepsf(img, 'WFC3/UVIS', 1, epsfcache = cache, **params)
+	assert len(builds) == 2
+
+
+class _CountBuilder:
+	# stands in for photutils EPSFBuilder: the "ePSF" of n stars is an array of n
+	def __init__(self, **epsfargs):
+		pass
+
+	def __call__(self, stars):
+		import numpy as np
+		from types import SimpleNamespace
+		return SimpleNamespace(data = np.full((5, 5), float(len(stars))), oversampling = np.array([1, 1])), stars
+
+
+def _fakestars(centers):
+	# extracted stars of one chip, as from spike.psfgen.epsfstars
+	from types import SimpleNamespace
+	return SimpleNamespace(all_stars = [SimpleNamespace(center = c) for c in centers])
+
+
+def test_spatialepsf(monkeypatch):
+	# cells with at least minstars stars get their own ePSF; sparser cells fall back to the ePSF of all stars
+	import numpy as np
+	from spike.psfgen import psfgen
+
+	monkeypatch.setattr(psfgen, 'EPSFBuilder', _CountBuilder)
+	monkeypatch.setattr(psfgen, 'EPSFStars', list)
+
+	stars = _fakestars([(x, 10.) for x in np.linspace(0, 40, 12)] + [(x, 10.) for x in [80., 90., 100.]]).all_stars
+	model = _CountBuilder()(stars)[0]
+	grid = psfgen._spatialepsf(stars, model, 2, 1, 10, {})
+	assert np.allclose(np.asarray(grid.grid_xypos)[:, 0], [25., 75.])
+	assert np.all(grid.data[0] == 12) #own ePSF
+	assert np.all(grid.data[1] == 15) #too few stars, so the ePSF of all stars
+
+
+def test_filterepsf(tmp_path, monkeypatch):
+	# stars of all images (extracted, or saved by epsfstars) are combined into one ePSF per filter
+	import pickle
+	import numpy as np
+	from spike.psfgen import psfgen
+
+	monkeypatch.setattr(psfgen, 'EPSFBuilder', _CountBuilder)
+	monkeypatch.setattr(psfgen, 'EPSFStars', list)
+	monkeypatch.setattr(psfgen, '_findstars', 
+		lambda img, imcam, chip, verbose = False, **params: (_fakestars([(10., 10.*chip)]*3*chip), None))
+
+	img = str(tmp_path / 'test_flc.fits')
+	saved = str(tmp_path / 'test_flc_stars.pkl')
+	stars = psfgen.epsfstars(img, 'WFC3/UVIS', chips = [1, 2], writeto = saved)
+	assert [len(stars[chip].all_stars) for chip in [1, 2]] == [3, 6]
+	with open(saved, 'rb') as file:
+		assert [len(s.all_stars) for s in pickle.load(file).values()] == [3, 6]
+
+	other = {1:_fakestars([(500., 500.)]*12)}
+	models = psfgen.filterepsf([saved, other], 'WFC3/UVIS', writeto = str(tmp_path / 'F814W_epsf.pkl'))
+	assert np.all(models[None].data == 21) #every star of every image
+	assert models[1] is models[None] and models[2] is models[None]
+	with open(str(tmp_path / 'F814W_epsf.pkl'), 'rb') as file:
+		assert np.all(pickle.load(file)[None].data == 21)
+
+	models = psfgen.filterepsf([saved, other], 'WFC3/UVIS', spatial = (2, 1), minstars = 10)
+	assert hasattr(models[1], 'grid_xypos') #15 stars on chip 1
+	assert models[2] is models[None] #6 stars on chip 2, too few to vary